@@ -60,7 +60,8 @@ export async function initiateSignup(formData: FormData) {
   try {
     const check = await checkSubdomain(subdomain)
     if (!check.available) {
-      return { success: false, error: `The subdomain "${subdomain}" is already taken. Choose a different name.` }
+      const alternatives = check.suggestions?.length ? ` Available: ${check.suggestions.join(', ')}.` : ''
+      return { success: false, error: `The subdomain "${subdomain}" is not available. Choose a different name.${alternatives}` }
     }
   } catch (error) {
     console.error('[Signup] Subdomain check failed:', error)
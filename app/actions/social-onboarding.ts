@@ -96,7 +96,8 @@ export async function completeSocialOnboarding(data: {
   try {
     const check = await checkSubdomain(subdomain)
     if (!check.available) {
-      return { success: false, error: `"${subdomain}" is already taken. Choose a different organization name.` }
+      const alternatives = check.suggestions?.length ? ` Available: ${check.suggestions.join(', ')}.` : ''
+      return { success: false, error: `"${subdomain}" is not available. Choose a different organization name.${alternatives}` }
     }
   } catch (error) {
     console.error('[SocialOnboarding] Subdomain check failed:', error)
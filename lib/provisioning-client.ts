@@ -54,6 +54,8 @@ export interface SubdomainCheckResult {
   available: boolean
   subdomain: string
   reason?: string
+  /** Free alternatives, returned when the subdomain is taken or reserved. */
+  suggestions?: string[]
 }
 
 export interface TenantRecord {
@@ -88,9 +90,10 @@ async function serviceRequest<T>(
     method?: 'GET' | 'POST' | 'PUT' | 'DELETE'
     body?: Record<string, unknown>
     timeout?: number
+    headers?: Record<string, string>
   } = {}
 ): Promise<T> {
-  const { method = 'GET', body, timeout = 120_000 } = options
+  const { method = 'GET', body, timeout = 120_000, headers = {} } = options
 
   const controller = new AbortController()
   const timer = setTimeout(() => controller.abort(), timeout)
@@ -101,6 +104,7 @@ async function serviceRequest<T>(
       headers: {
         'Content-Type': 'application/json',
         'X-Provisioning-Secret': PROVISIONING_API_SECRET || '',
+        ...headers,
       },
       body: body ? JSON.stringify(body) : undefined,
       signal: controller.signal,
@@ -225,7 +229,7 @@ export async function checkServiceHealth(): Promise<ServiceHealth> {
 export async function checkSubdomain(subdomain: string): Promise<SubdomainCheckResult> {
   return serviceRequest<SubdomainCheckResult>(
     `/api/v1/check-subdomain/${encodeURIComponent(subdomain)}`,
-    { timeout: 30_000 }, // docker exec overhead can add 3-5s; 30s is safe
+    { timeout: 30_000 }, // usually answered from memory; a cold service loads the registry first
   )
 }
 
@@ -306,6 +310,38 @@ export async function listTenantsForUserEmail(email: string): Promise<TenantByUs
   return (result?.tenants || []).filter((t) => typeof t.subdomain === 'string' && t.subdomain.length > 0)
 }
 
+export interface LoginWorkspace extends TenantByUserResult {
+  is_owner: boolean
+  /** null when the tenant site could not be checked (see `errors`). */
+  user_exists: boolean | null
+  enabled: boolean | null
+  providers: string[]
+  has_social_login: boolean
+  /** Usable API key + secret already stored — generate-user-keys can be skipped. */
+  has_api_keys: boolean | null
+}
+
+export interface LoginResolution {
+  email: string
+  source: 'index' | 'scan'
+  workspaces: LoginWorkspace[]
+  errors: Record<string, string>
+  /** A fleet operation held the bench, so only registry / index matches are returned. */
+  probe_skipped: boolean
+}
+
+/**
+ * One call for root-domain login: workspaces (owner first), social providers
+ * per workspace and whether API keys exist. Replaces listTenantsForUserEmail
+ * + getTenantUserLoginHint per workspace.
+ */
+export async function resolveLogin(email: string): Promise<LoginResolution | null> {
+  return optionalServiceRequest<LoginResolution>(
+    `/api/v1/login-resolution?email=${encodeURIComponent(email)}`,
+    { timeout: 30_000 },
+  )
+}
+
 /** Active tenant subdomains from master DB — used for root-domain login discovery. */
 export async function listActiveTenantSubdomains(): Promise<string[]> {
   const result = await optionalServiceRequest<{ subdomains?: string[] }>(
@@ -315,6 +351,44 @@ export async function listActiveTenantSubdomains(): Promise<string[]> {
   return (result?.subdomains || []).filter((s): s is string => typeof s === 'string' && s.length > 0)
 }
 
+export interface TenantRegistrySnapshot {
+  epoch: string
+  version: number
+  tenants: TenantRecord[]
+}
+
+export interface TenantRegistryDelta {
+  epoch: string
+  version: number
+  /** Replica is from another service process or too far behind — reload the snapshot. */
+  reset: boolean
+  changes: { version: number; op: 'upsert' | 'remove'; name: string; tenant: TenantRecord | null }[]
+}
+
+/**
+ * Whole tenant registry for a local replica. Pass the previous snapshot's
+ * `epoch-version` ETag to get null back while nothing has changed.
+ */
+export async function fetchTenantRegistrySnapshot(etag?: string): Promise<TenantRegistrySnapshot | null> {
+  try {
+    return await serviceRequest<TenantRegistrySnapshot>('/api/v1/tenant-registry/snapshot', {
+      timeout: 30_000,
+      headers: etag ? { 'If-None-Match': etag } : {},
+    })
+  } catch (error) {
+    if (error instanceof ProvisioningError && error.status === 304) return null
+    throw error
+  }
+}
+
+/** Registry changes after `version` — cheap catch-up for a replica built from a snapshot. */
+export async function fetchTenantRegistryDelta(epoch: string, version: number): Promise<TenantRegistryDelta> {
+  return serviceRequest<TenantRegistryDelta>(
+    `/api/v1/tenant-registry/delta?since=${version}&epoch=${encodeURIComponent(epoch)}`,
+    { timeout: 10_000 },
+  )
+}
+
 /**
  * Provision a new tenant site.
  * 
@@ -452,17 +526,37 @@ export interface TenantItem {
   is_stock_item?: boolean
 }
 
+/**
+ * One page of a tenant list. Pass `next_cursor` back as `cursor` for the next
+ * page (null on the last one). Keep the first page's `sync_token` and send it
+ * as `modified_since` later to fetch only what changed; `removed` then lists
+ * deleted or deactivated records. Any other `modified_since` should carry a UTC
+ * offset (e.g. `toISOString()`); one without is read in the site's time zone.
+ */
+export interface TenantListPage {
+  success: boolean
+  site: string
+  removed: string[]
+  next_cursor: string | null
+  sync_token: string
+}
+
 /**
  * List Items on a tenant site via the provisioning service (ignore_permissions).
+ * A `q` search returns one relevance-ordered page of up to `limit` items
+ * (next_cursor is null): code and name prefixes first, then word prefixes,
+ * then fragments anywhere in the code or name. Only plain listings paginate.
  */
 export async function listTenantItems(
   subdomain: string,
-  params?: { q?: string; item_group?: string; limit?: number },
-): Promise<{ success: boolean; site: string; items: TenantItem[] }> {
+  params?: { q?: string; item_group?: string; limit?: number; cursor?: string; modified_since?: string },
+): Promise<TenantListPage & { items: TenantItem[] }> {
   const qs = new URLSearchParams()
   if (params?.q) qs.set('q', params.q)
   if (params?.item_group) qs.set('item_group', params.item_group)
   if (typeof params?.limit === 'number') qs.set('limit', String(params.limit))
+  if (params?.cursor) qs.set('cursor', params.cursor)
+  if (params?.modified_since) qs.set('modified_since', params.modified_since)
 
   const suffix = qs.toString()
   return serviceRequest(
@@ -616,7 +710,7 @@ export async function createTenantUser(
     invite_type?: 'admin' | 'sales' | 'accounts' | 'projects' | 'member'
     role?: 'Sales User' | 'Accounts User' | 'Projects User' | 'Stock Manager' | 'Stock User'
   },
-): Promise<{ success: boolean; user_email: string; roles: string[] }> {
+): Promise<{ success: boolean; user_email: string; roles: string[]; api_keys_ready?: boolean }> {
   return serviceRequest(
     `/api/v1/create-tenant-user/${encodeURIComponent(subdomain)}`,
     {
@@ -627,6 +721,23 @@ export async function createTenantUser(
   )
 }
 
+/**
+ * Mint (or read) API keys for every enabled user on a tenant so their first
+ * login is served from the provisioning key cache. Existing keys are kept.
+ */
+export async function premintTenantUserKeys(subdomain: string): Promise<{
+  success: boolean
+  users: number
+  minted: number
+  cached: number
+  errors: Record<string, string>
+}> {
+  return serviceRequest(
+    `/api/v1/premint-user-keys/${encodeURIComponent(subdomain)}`,
+    { method: 'POST', timeout: 120_000 },
+  )
+}
+
 /**
  * Change tenant user role and clear sessions.
  */
@@ -646,14 +757,31 @@ export async function changeTenantUserRole(
 
 /**
  * Deprovision (delete) a tenant site. Destructive operation.
+ * The tenant is tombstoned immediately; the site drop runs in the background
+ * and can be followed via `job_id`.
  */
-export async function deprovisionTenantSite(subdomain: string): Promise<{ success: boolean; message: string }> {
-  return serviceRequest<{ success: boolean; message: string }>(
+export async function deprovisionTenantSite(
+  subdomain: string,
+): Promise<{ success: boolean; message: string; job_id?: string; status?: string }> {
+  return serviceRequest<{ success: boolean; message: string; job_id?: string; status?: string }>(
     `/api/v1/deprovision/${encodeURIComponent(subdomain)}`,
     { method: 'DELETE', timeout: 60_000 },
   )
 }
 
+/**
+ * Requeue the removal of a tenant whose background deprovision failed
+ * (SaaS Tenant status "Deprovision Failed") or was lost in a service restart.
+ */
+export async function retryDeprovisionTenantSite(
+  subdomain: string,
+): Promise<{ success: boolean; job_id: string; status: string }> {
+  return serviceRequest<{ success: boolean; job_id: string; status: string }>(
+    `/api/v1/deprovision/${encodeURIComponent(subdomain)}/retry`,
+    { method: 'POST', timeout: 60_000 },
+  )
+}
+
 // ============================================================================
 // Employee CRUD (Operators module)
 // All calls use ignore_permissions=True on the Frappe side — no role required.
@@ -676,9 +804,16 @@ export interface TenantEmployee {
  */
 export async function listTenantEmployees(
   subdomain: string,
-): Promise<{ success: boolean; site: string; employees: TenantEmployee[] }> {
+  params?: { limit?: number; cursor?: string; modified_since?: string },
+): Promise<TenantListPage & { employees: TenantEmployee[] }> {
+  const qs = new URLSearchParams()
+  if (typeof params?.limit === 'number') qs.set('limit', String(params.limit))
+  if (params?.cursor) qs.set('cursor', params.cursor)
+  if (params?.modified_since) qs.set('modified_since', params.modified_since)
+
+  const suffix = qs.toString()
   return serviceRequest(
-    `/api/v1/employees/${encodeURIComponent(subdomain)}`,
+    `/api/v1/employees/${encodeURIComponent(subdomain)}${suffix ? `?${suffix}` : ''}`,
     { timeout: 30_000 },
   )
 }
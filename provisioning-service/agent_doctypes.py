@@ -4,10 +4,14 @@ Load Nexus agent DocType fixtures and build Frappe seed scripts for provisioning
 
 from __future__ import annotations
 
+import functools
 import json
 from pathlib import Path
 from typing import Any
 
+from custom_fields import CUSTOM_FIELD_RECONCILE_SNIPPET, normalize_field_specs
+from seed_fingerprints import manifest_hash
+
 # Custom fields added when Agent Action Log already exists (older tenants).
 AGENT_ACTION_LOG_CUSTOM_FIELDS: list[dict[str, Any]] = [
     {"fieldname": "tool_name", "label": "Tool Name", "fieldtype": "Data", "insert_after": "tenant"},
@@ -23,6 +27,10 @@ AGENT_ACTION_LOG_CUSTOM_FIELDS: list[dict[str, Any]] = [
 
 AGENT_DOCTYPE_FILES = ("agent_action_log.json", "agent_audit_log.json")
 
+# Global default (frappe.db.get_global) holding the hash of the fixture a site's
+# DocType was last imported or upgraded from; suffixed with the DocType name.
+FIXTURE_HASH_KEY = "nexus_agent_doctype_hash:"
+
 
 def frappe_config_dir() -> Path:
     here = Path(__file__).resolve().parent
@@ -44,60 +52,151 @@ def load_agent_doctype_fixtures() -> list[dict[str, Any]]:
     return fixtures
 
 
+def fixture_hash(fixture: dict[str, Any]) -> str:
+    return manifest_hash(fixture)
+
+
 def build_seed_agent_doctypes_frappe_code(
     doctype_specs: list[dict[str, Any]],
     extra_custom_fields: list[dict[str, Any]],
 ) -> str:
-    """Idempotent: import DocTypes if missing; upsert Custom Fields on Agent Action Log."""
+    """Idempotent: import DocTypes if missing, upgrade ones imported from an older
+    fixture, and reconcile Custom Fields on Agent Action Log.
+
+    `doctype_specs` may be just the DocTypes that need importing or upgrading;
+    the Custom Fields are reconciled on any target DocType left as it was.
+    """
+    extra_targets = {"Agent Action Log": normalize_field_specs(extra_custom_fields, "status")}
+    hashes = {spec["name"]: fixture_hash(spec) for spec in doctype_specs if spec.get("name")}
     return f"""
 import json
 import frappe
-
+{CUSTOM_FIELD_RECONCILE_SNIPPET}
 doctype_specs = {json.dumps(doctype_specs)}
-extra_fields = {json.dumps(extra_custom_fields)}
-result = {{"imported": [], "skipped": [], "errors": [], "custom_fields": {{"created": [], "skipped": [], "errors": []}}}}
+extra_targets = {json.dumps(extra_targets)}
+fixture_hashes = {json.dumps(hashes)}
+result = {{"imported": [], "upgraded": [], "skipped": [], "errors": [], "custom_fields": {{"created": [], "skipped": [], "errors": []}}}}
 
-def upsert_custom_field(dt, spec):
-    try:
-        if frappe.db.exists("Custom Field", {{"dt": dt, "fieldname": spec["fieldname"]}}):
-            result["custom_fields"]["skipped"].append(f"{{dt}}:{{spec['fieldname']}}")
-            return
-        doc = frappe.get_doc({{
-            "doctype": "Custom Field",
-            "dt": dt,
-            "fieldname": spec["fieldname"],
-            "label": spec.get("label") or spec["fieldname"],
-            "fieldtype": spec.get("fieldtype") or "Data",
-            "insert_after": spec.get("insert_after") or "status",
-            "reqd": 0,
-        }})
-        doc.insert(ignore_permissions=True)
-        result["custom_fields"]["created"].append(f"{{dt}}:{{spec['fieldname']}}")
-    except Exception as exc:
-        result["custom_fields"]["errors"].append(f"{{dt}}:{{spec.get('fieldname')}}: {{exc}}")
+def upgrade_doctype(spec):
+    # Fields the fixture now defines replace the Custom Field shims older
+    # tenants got; the columns stay, so existing rows keep their values.
+    fieldnames = [f.get("fieldname") for f in spec.get("fields") or [] if f.get("fieldname")]
+    for shim in frappe.get_all("Custom Field", filters={{"dt": spec["name"], "fieldname": ["in", fieldnames]}}, pluck="name"):
+        frappe.delete_doc("Custom Field", shim, ignore_permissions=True)
+    doc = frappe.get_doc("DocType", spec["name"])
+    for key, value in spec.items():
+        if key not in ("doctype", "name"):
+            doc.set(key, value)
+    doc.save(ignore_permissions=True)
 
 for spec in doctype_specs:
     name = spec.get("name")
     if not name:
         continue
     try:
-        if frappe.db.exists("DocType", name):
+        key = {json.dumps(FIXTURE_HASH_KEY)} + name
+        if not frappe.db.exists("DocType", name):
+            frappe.get_doc(spec).insert(ignore_permissions=True)
+            result["imported"].append(name)
+        elif frappe.db.get_global(key) != fixture_hashes[name]:
+            upgrade_doctype(spec)
+            result["upgraded"].append(name)
+        else:
             result["skipped"].append(name)
-            if name == "Agent Action Log":
-                for field_spec in extra_fields:
-                    upsert_custom_field(name, field_spec)
             continue
-        doc = frappe.get_doc(spec)
-        doc.insert(ignore_permissions=True)
-        result["imported"].append(name)
+        frappe.db.set_global(key, fixture_hashes[name])
     except Exception as exc:
         result["errors"].append(f"{{name}}: {{exc}}")
 
+# Older tenants already have Agent Action Log; add any missing fields in one
+# batch. Fields the DocType itself defines are not Custom Fields (Frappe
+# rejects a Custom Field whose fieldname is already in the meta).
+existing_targets = {{}}
+for dt, specs in extra_targets.items():
+    if dt in result["imported"] or dt in result["upgraded"] or not frappe.db.exists("DocType", dt):
+        continue
+    defined = set(frappe.get_all("DocField", filters={{"parent": dt}}, pluck="fieldname"))
+    specs = [spec for spec in specs if spec["fieldname"] not in defined]
+    if specs:
+        existing_targets[dt] = specs
+if existing_targets:
+    result["custom_fields"] = reconcile_custom_fields(existing_targets)
+
 frappe.db.commit()
-for spec in doctype_specs:
-    name = spec.get("name")
+for name in {{spec.get("name") for spec in doctype_specs}} | set(existing_targets):
     if name and frappe.db.exists("DocType", name):
         frappe.clear_cache(doctype=name)
 
 print(json.dumps(result, default=str))
 """
+
+
+def build_check_agent_doctypes_frappe_code(
+    fixture_hashes: dict[str, str],
+    extra_custom_fields: list[dict[str, Any]],
+) -> str:
+    """Read-only: which agent DocTypes are missing, which were imported from an
+    older fixture (stored hash differs), and which Action Log fields are absent."""
+    extra_fields = {"Agent Action Log": [spec["fieldname"] for spec in extra_custom_fields]}
+    return f"""
+import json
+import frappe
+
+fixture_hashes = {json.dumps(fixture_hashes)}
+names = list(fixture_hashes)
+extra_fields = {json.dumps(extra_fields)}
+present = set(frappe.get_all("DocType", filters={{"name": ["in", names]}}, pluck="name"))
+outdated = [
+    name for name in names
+    if name in present and frappe.db.get_global({json.dumps(FIXTURE_HASH_KEY)} + name) != fixture_hashes[name]
+]
+missing_fields = {{}}
+for dt, fieldnames in extra_fields.items():
+    if dt not in present:
+        continue
+    have = set(frappe.get_all("DocField", filters={{"parent": dt}}, pluck="fieldname"))
+    have |= set(frappe.get_all("Custom Field", filters={{"dt": dt}}, pluck="fieldname"))
+    lacking = [f for f in fieldnames if f not in have]
+    if lacking:
+        missing_fields[dt] = lacking
+
+print(json.dumps({{
+    "present": sorted(present),
+    "missing": [name for name in names if name not in present],
+    "outdated": outdated,
+    "missing_fields": missing_fields,
+}}))
+"""
+
+
+class AgentDoctypePayload:
+    """Agent DocType fixtures and their seed scripts, built once per process.
+
+    Seeding is two-phase: `check_code` is a tiny existence / version / field
+    check, and `seed_code(names)` (full DocType JSON) is only shipped to sites
+    that are missing a DocType or carry one imported from an older fixture.
+    """
+
+    def __init__(self, fixtures: list[dict[str, Any]], extra_custom_fields: list[dict[str, Any]]):
+        self.fixtures = fixtures
+        self.extra_custom_fields = extra_custom_fields
+        self.names = [fixture["name"] for fixture in fixtures if fixture.get("name")]
+        self.hashes = {fixture["name"]: fixture_hash(fixture) for fixture in fixtures if fixture.get("name")}
+        self.fingerprint = manifest_hash(fixtures, extra_custom_fields)
+        self.check_code = build_check_agent_doctypes_frappe_code(self.hashes, extra_custom_fields)
+        self._seed_codes: dict[tuple[str, ...], str] = {}
+        self.full_seed_code = self.seed_code(self.names)
+
+    def seed_code(self, names: list[str]) -> str:
+        """Seed script carrying only the fixtures for `names` (memoised per name set)."""
+        key = tuple(name for name in self.names if name in set(names))
+        if key not in self._seed_codes:
+            specs = [fixture for fixture in self.fixtures if fixture.get("name") in key]
+            self._seed_codes[key] = build_seed_agent_doctypes_frappe_code(specs, self.extra_custom_fields)
+        return self._seed_codes[key]
+
+
+@functools.lru_cache(maxsize=1)
+def agent_doctype_payload() -> AgentDoctypePayload:
+    """Load the fixtures from disk once; later calls reuse the prebuilt payload."""
+    return AgentDoctypePayload(load_agent_doctype_fixtures(), AGENT_ACTION_LOG_CUSTOM_FIELDS)
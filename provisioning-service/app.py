@@ -29,23 +29,59 @@ import secrets
 import logging
 import time
 import asyncio
-import urllib.request
-import urllib.error
 import urllib.parse
-from datetime import datetime
+import threading
+import contextlib
+import math
+import signal
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Any
+from typing import Optional, Any, Callable
 from enum import Enum
 
 from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, EmailStr, field_validator
 import uvicorn
 
-from agent_doctypes import (
-    AGENT_ACTION_LOG_CUSTOM_FIELDS,
-    build_seed_agent_doctypes_frappe_code,
-    load_agent_doctype_fixtures,
+from agent_doctypes import AGENT_ACTION_LOG_CUSTOM_FIELDS, FIXTURE_HASH_KEY, agent_doctype_payload
+from custom_fields import (
+    RENTAL_FIELD_SPECS,
+    RENTAL_TARGET_DOCTYPES,
+    build_seed_custom_fields_frappe_code,
+    rental_custom_field_targets,
 )
+from fleet_runner import build_multisite_script, parse_fleet_line, shard_round_robin
+from frappe_http import FrappeRouter, Route, is_connect_error
+from key_cache import KeyCache, LocalKeyCache, SQLiteKeyCache
+from master_data import MASTER_DATA_SEED_SNIPPET
+from tenant_members import (
+    SYSTEM_USERS,
+    TENANT_USERS_CODE,
+    build_member_lookup_frappe_code,
+    build_sync_members_frappe_code,
+    load_member_doctype_fixture,
+)
+from subdomain_index import RESERVED_SUBDOMAINS, SubdomainIndex
+from tenant_credentials import (
+    CALLBACK_URL_KEY,
+    TENANT_SECRET_HEADER,
+    TENANT_SECRET_KEY,
+    build_tenant_config_code,
+    tenant_secret,
+    verify_tenant_secret,
+)
+from tenant_registry import REGISTRY_INDEXED_FIELDS, TenantRegistry
+from provisioning_metrics import (
+    PROVISION_STEPS,
+    ProvisionMetricsStore,
+    StepDurationModel,
+    forecast_queue,
+    sustainable_per_hour,
+)
+from seed_fingerprints import SeedFingerprintStore, manifest_hash
 
 # ============================================================================
 # Configuration
@@ -61,6 +97,81 @@ DEFAULT_APPS = os.environ.get("DEFAULT_APPS", "erpnext,nexus_core").split(",")
 IS_PRODUCTION = os.environ.get("ENVIRONMENT", "production") == "production"
 # Same URL Nexus uses (ERP_NEXT_URL) — validate tokens the way server-side API calls do.
 FRAPPE_INTERNAL_URL = os.environ.get("FRAPPE_INTERNAL_URL", "http://127.0.0.1:8080").rstrip("/")
+# Background deprovisioning: how many drop-sites run at once, how many queued
+# removals are drained per batch, and the per-site drop timeout.
+DEPROVISION_CONCURRENCY = max(1, int(os.environ.get("DEPROVISION_CONCURRENCY", "2")))
+DEPROVISION_BATCH_SIZE = max(1, int(os.environ.get("DEPROVISION_BATCH_SIZE", "10")))
+DEPROVISION_DROP_TIMEOUT = int(os.environ.get("DEPROVISION_DROP_TIMEOUT", "600"))
+# A failed removal is retried with exponential backoff before the tenant is
+# marked as failed (requeue it with POST /api/v1/deprovision/{subdomain}/retry).
+DEPROVISION_MAX_ATTEMPTS = max(1, int(os.environ.get("DEPROVISION_MAX_ATTEMPTS", "3")))
+DEPROVISION_RETRY_BASE_SEC = float(os.environ.get("DEPROVISION_RETRY_BASE_SEC", "30"))
+# This service's base URL as seen from the Frappe containers. Written to each
+# tenant's site config so nexus_core can report User changes; the membership
+# index is only used for lookups once this is set.
+PROVISIONING_CALLBACK_URL = os.environ.get("PROVISIONING_CALLBACK_URL", "").rstrip("/")
+# Bench pool: provisions that may run at once; further requests queue for a slot.
+PROVISION_CONCURRENCY = max(1, int(os.environ.get("PROVISION_CONCURRENCY", "2")))
+# Local state (provisioning metrics, caches) that should survive restarts.
+PROVISIONING_DATA_DIR = Path(
+    os.environ.get("PROVISIONING_DATA_DIR", str(Path(__file__).resolve().parent / "data"))
+)
+# Fleet reconcile: long-lived interpreters run in parallel (each walks its shard
+# of tenants), and the per-site budget that bounds one interpreter's runtime.
+FLEET_WORKERS = max(1, int(os.environ.get("FLEET_WORKERS", "4")))
+FLEET_SITE_TIMEOUT = int(os.environ.get("FLEET_SITE_TIMEOUT", "180"))
+# Extra time the local docker exec client gets past the in-container limit.
+FLEET_EXEC_GRACE_SEC = 30
+# Login resolution probes candidate sites in one interpreter, never a fleet
+# sweep: at most this many sites, within this many seconds overall.
+LOGIN_PROBE_MAX_SITES = max(1, int(os.environ.get("LOGIN_PROBE_MAX_SITES", "100")))
+LOGIN_PROBE_TIMEOUT_SEC = max(1, int(os.environ.get("LOGIN_PROBE_TIMEOUT_SEC", "20")))
+# Fleet drift scan: how long a tenant's read-only drift result is reused.
+FLEET_DRIFT_TTL_SEC = int(os.environ.get("FLEET_DRIFT_TTL_SEC", "900"))
+# Seed calls whose manifest fingerprint matches answer from it; the site is
+# drift-probed out of band at most this often per manifest.
+SEED_DRIFT_PROBE_SEC = int(os.environ.get("SEED_DRIFT_PROBE_SEC", "900"))
+# Rolling fleet migrate: sites migrated at once and the per-site migrate timeout.
+MIGRATE_CONCURRENCY = max(1, int(os.environ.get("MIGRATE_CONCURRENCY", "2")))
+MIGRATE_TIMEOUT = int(os.environ.get("MIGRATE_TIMEOUT", "1800"))
+# In-process SaaS Tenant registry: background refresh interval, and whether a
+# lookup that misses memory falls through to a master-site query.
+TENANT_REGISTRY_TTL_SEC = max(5, int(os.environ.get("TENANT_REGISTRY_TTL_SEC", "60")))
+TENANT_REGISTRY_READ_THROUGH = os.environ.get("TENANT_REGISTRY_READ_THROUGH", "true").lower() == "true"
+# Subdomains never offered at signup, on top of the built-in list (comma separated).
+EXTRA_RESERVED_SUBDOMAINS = [
+    s.strip().lower() for s in os.environ.get("RESERVED_SUBDOMAINS", "").split(",") if s.strip()
+]
+# generate-user-keys cache shared by every worker: "sqlite" (one file, cross-worker
+# single-flight) or "local" (per process). The file holds plaintext secrets, so
+# a path that is not on tmpfs is refused (the service falls back to "local")
+# unless USER_KEY_CACHE_ALLOW_DISK is set.
+USER_KEY_CACHE_BACKEND = os.environ.get("USER_KEY_CACHE_BACKEND", "sqlite").lower()
+USER_KEY_CACHE_PATH = Path(
+    os.environ.get(
+        "USER_KEY_CACHE_PATH",
+        "/dev/shm/nexus-provisioning/user_keys.sqlite3"
+        if Path("/dev/shm").is_dir()
+        else str(PROVISIONING_DATA_DIR / "user_keys.sqlite3"),
+    )
+)
+USER_KEY_CACHE_ALLOW_DISK = os.environ.get("USER_KEY_CACHE_ALLOW_DISK", "false").lower() == "true"
+USER_KEY_CACHE_TTL_SEC = int(os.environ.get("USER_KEY_CACHE_TTL_SEC", "120"))
+# Hard cap on how long any cached secret lives, pre-minted ones included.
+USER_KEY_CACHE_MAX_TTL_SEC = int(os.environ.get("USER_KEY_CACHE_MAX_TTL_SEC", "86400"))
+USER_KEY_CACHE_MAX_ENTRIES = max(1, int(os.environ.get("USER_KEY_CACHE_MAX_ENTRIES", "10000")))
+# How long a request waits for another worker generating keys for the same user.
+USER_KEY_LOCK_TIMEOUT_SEC = int(os.environ.get("USER_KEY_LOCK_TIMEOUT_SEC", "90"))
+# Pooled HTTP to tenant Frappe sites: connection limits, and how long a failed
+# route is skipped (doubling per consecutive failure, capped).
+FRAPPE_HTTP_MAX_CONNECTIONS = max(1, int(os.environ.get("FRAPPE_HTTP_MAX_CONNECTIONS", "50")))
+FRAPPE_ROUTE_BACKOFF_SEC = float(os.environ.get("FRAPPE_ROUTE_BACKOFF_SEC", "2"))
+FRAPPE_ROUTE_BACKOFF_MAX_SEC = float(os.environ.get("FRAPPE_ROUTE_BACKOFF_MAX_SEC", "300"))
+# Keys minted at user creation wait in the cache for the first login (up to
+# USER_KEY_CACHE_MAX_TTL_SEC); the api_key_version stamp catches any rotation.
+USER_KEY_PREMINT_TTL_SEC = int(os.environ.get("USER_KEY_PREMINT_TTL_SEC", "86400"))
+# Tenants whose resolved catalog defaults (and resolution lock) are kept in memory.
+CATALOG_DEFAULTS_MAX_SITES = max(1, int(os.environ.get("CATALOG_DEFAULTS_MAX_SITES", "10000")))
 
 REQUIRED_ERP_ROLES = [
     "System Manager",
@@ -167,12 +278,6 @@ DIRECT_ASSIGNABLE_ROLES = {
 
 MANAGER_ROLES = {"Sales Manager", "Accounts Manager", "Projects Manager", "Stock Manager"}
 
-# Reuse freshly generated keys across parallel Next.js workers / dashboard requests.
-# Regenerating invalidates the previous secret and causes 401 races.
-_GENERATED_USER_KEYS_CACHE: dict[str, tuple[str, str, float]] = {}
-_GENERATED_USER_KEYS_TTL_SEC = 120
-_generate_keys_locks: dict[str, asyncio.Lock] = {}
-
 # Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -180,6 +285,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger("provisioning")
 
+# Reuse freshly generated keys across parallel Next.js workers / dashboard requests.
+# Regenerating invalidates the previous secret and causes 401 races.
+_user_key_cache: KeyCache
+if USER_KEY_CACHE_BACKEND != "local":
+    try:
+        _user_key_cache = SQLiteKeyCache(
+            USER_KEY_CACHE_PATH,
+            ttl_sec=USER_KEY_CACHE_TTL_SEC,
+            max_entries=USER_KEY_CACHE_MAX_ENTRIES,
+            max_ttl_sec=USER_KEY_CACHE_MAX_TTL_SEC,
+            allow_persistent=USER_KEY_CACHE_ALLOW_DISK,
+        )
+    except ValueError as e:
+        logger.warning(f"user key cache: {e}; using a per-process cache (set USER_KEY_CACHE_ALLOW_DISK to override)")
+        USER_KEY_CACHE_BACKEND = "local"
+if USER_KEY_CACHE_BACKEND == "local":
+    _user_key_cache = LocalKeyCache(
+        ttl_sec=USER_KEY_CACHE_TTL_SEC,
+        max_entries=USER_KEY_CACHE_MAX_ENTRIES,
+        max_ttl_sec=USER_KEY_CACHE_MAX_TTL_SEC,
+    )
+
 # ============================================================================
 # FastAPI App
 # ============================================================================
@@ -190,6 +317,17 @@ app = FastAPI(
     docs_url="/docs" if not IS_PRODUCTION else None,
 )
 
+
+@app.on_event("startup")
+async def _prebuild_seed_payloads() -> None:
+    """Load agent DocType fixtures and build their seed scripts once, before traffic."""
+    try:
+        agent_doctype_payload()
+    except Exception as e:
+        # Not fatal at boot: the agent seed step reports the error when it runs.
+        logger.warning(f"Agent doctype fixtures could not be preloaded: {e}")
+
+
 # ============================================================================
 # Auth Dependency
 # ============================================================================
@@ -201,6 +339,33 @@ async def verify_api_secret(x_provisioning_secret: str = Header(...)):
     return True
 
 
+async def verify_tenant_credential(x_tenant_site: str = Header(...), x_tenant_secret: str = Header(...)) -> str:
+    """Verify a tenant site's own credential; returns the site it was issued to."""
+    if x_tenant_site == MASTER_SITE or not verify_tenant_secret(PROVISIONING_SECRET, x_tenant_site, x_tenant_secret):
+        raise HTTPException(status_code=401, detail="Invalid tenant credential")
+    return x_tenant_site
+
+
+def _tenant_site_config(site_name: str) -> dict[str, str]:
+    """site_config.json entries nexus_core needs on a tenant site (none on master)."""
+    if site_name == MASTER_SITE:
+        return {}
+    config = {TENANT_SECRET_KEY: tenant_secret(PROVISIONING_SECRET, site_name)}
+    if PROVISIONING_CALLBACK_URL:
+        config[CALLBACK_URL_KEY] = PROVISIONING_CALLBACK_URL
+    return config
+
+
+def _tenant_auth_headers(site_name: str) -> dict[str, str]:
+    """Headers for nexus_core guest methods guarded by require_tenant_secret."""
+    return {TENANT_SECRET_HEADER: tenant_secret(PROVISIONING_SECRET, site_name)}
+
+
+def _tenant_config_code(*site_names: str) -> str:
+    """Snippet installing `_tenant_site_config` on whichever of `site_names` runs it."""
+    return build_tenant_config_code({site: _tenant_site_config(site) for site in site_names})
+
+
 # ============================================================================
 # Models
 # ============================================================================
@@ -260,6 +425,7 @@ class SubdomainCheckResponse(BaseModel):
     available: bool
     subdomain: str
     reason: Optional[str] = None
+    suggestions: list[str] = []
 
 
 class TenantRecordLookupRequest(BaseModel):
@@ -286,16 +452,78 @@ class TenantUserRoleChangeRequest(BaseModel):
     new_role: str
 
 
+class BulkDeprovisionRequest(BaseModel):
+    subdomains: list[str]
+    archive: bool = False
+
+    @field_validator("subdomains")
+    @classmethod
+    def validate_subdomains(cls, v: list[str]) -> list[str]:
+        import re
+        cleaned = []
+        for raw in v:
+            sub = (raw or "").strip().lower()
+            if not re.match(r"^[a-z0-9][a-z0-9\-]{1,61}[a-z0-9]$", sub):
+                raise ValueError(f"Invalid subdomain format: {raw!r}")
+            if sub not in cleaned:
+                cleaned.append(sub)
+        if not cleaned:
+            raise ValueError("At least one subdomain is required")
+        if len(cleaned) > 500:
+            raise ValueError("At most 500 subdomains per teardown")
+        return cleaned
+
+
+class FleetReconcileRequest(BaseModel):
+    operations: list[str] = ["docperms", "custom_fields", "agent_doctypes"]
+    subdomains: Optional[list[str]] = None
+    force: bool = False
+    workers: Optional[int] = None
+
+
+class TenantMemberEvent(BaseModel):
+    email: str
+    enabled: bool = True
+    removed: bool = False
+
+
+class TenantMemberEventsRequest(BaseModel):
+    events: list[TenantMemberEvent]
+
+    @field_validator("events")
+    @classmethod
+    def validate_events(cls, v: list[TenantMemberEvent]) -> list[TenantMemberEvent]:
+        if not v:
+            raise ValueError("At least one event is required")
+        if len(v) > 500:
+            raise ValueError("At most 500 events per call")
+        return v
+
+
+class FleetMigrateRequest(BaseModel):
+    subdomains: Optional[list[str]] = None
+    priority: list[str] = []
+    order: str = "smallest_first"
+    concurrency: Optional[int] = None
+    max_error_rate: float = 0.2
+    min_sample: int = 3
+
+
 # ============================================================================
 # Helper Functions — All commands run via docker exec
 # ============================================================================
 
-def docker_exec(args: list[str], timeout: int = 300) -> subprocess.CompletedProcess:
+def docker_exec(
+    args: list[str],
+    timeout: int = 300,
+    input_text: Optional[str] = None,
+) -> subprocess.CompletedProcess:
     """
     Execute a command inside the Frappe backend container via docker exec.
     This is the ONLY place in the system where shell commands run.
+    `input_text` is piped to the command's stdin (docker exec -i).
     """
-    cmd = ["docker", "exec", BACKEND_CONTAINER] + args
+    cmd = ["docker", "exec"] + (["-i"] if input_text is not None else []) + [BACKEND_CONTAINER] + args
     logger.info(f"Running: docker exec {BACKEND_CONTAINER} {' '.join(args)}")
 
     try:
@@ -304,6 +532,7 @@ def docker_exec(args: list[str], timeout: int = 300) -> subprocess.CompletedProc
             capture_output=True,
             text=True,
             timeout=timeout,
+            input=input_text,
         )
         if result.returncode != 0:
             logger.error(f"Command failed (exit {result.returncode})")
@@ -377,6 +606,100 @@ print(json.dumps({"docperms_set": ok}))
     return bool(_parse_json_output(run_frappe_code(site_name, code)).get("docperms_set"))
 
 
+def build_docperm_reconcile_code(matrix: list[dict[str, Any]]) -> str:
+    """
+    Bulk-diff reconcile of the DocPerm matrix (permlevel 0).
+    One query loads every existing row for the target doctypes; only rows that
+    differ are written (bulk update / bulk insert) and only doctypes that
+    changed get their meta cache cleared. A site with no drift costs one query.
+    """
+    return f"""import json
+
+matrix = {json.dumps(matrix)}
+PERM_FIELDS = ["read", "write", "create", "delete", "submit", "cancel", "amend"]
+doctypes = sorted({{row["doctype"] for row in matrix}})
+result = {{"updated": [], "inserted": [], "unchanged": 0, "count": 0, "errors": [], "cleared": []}}
+
+existing = {{}}
+for perm in frappe.get_all(
+    "DocPerm",
+    filters={{"parent": ["in", doctypes], "parenttype": "DocType", "permlevel": 0}},
+    fields=["name", "parent", "role", "idx"] + ["`" + f + "`" for f in PERM_FIELDS],
+    order_by="idx asc",
+):
+    existing.setdefault((perm["parent"], perm["role"]), perm)
+
+updates = {{}}
+inserts = []
+changed_doctypes = set()
+for row in matrix:
+    key = (row["doctype"], row["role"])
+    desired = {{f: int(row.get(f, 0)) for f in PERM_FIELDS}}
+    current = existing.get(key)
+    if current is None:
+        inserts.append((row, desired))
+    elif any(int(current.get(f) or 0) != v for f, v in desired.items()):
+        updates[current["name"]] = desired
+    else:
+        result["unchanged"] += 1
+        continue
+    changed_doctypes.add(row["doctype"])
+
+if updates:
+    try:
+        frappe.db.bulk_update("DocPerm", updates)
+        by_name = {{perm["name"]: key for key, perm in existing.items()}}
+        result["updated"] = [f"{{by_name[n][0]}}:{{by_name[n][1]}}" for n in updates]
+    except Exception as exc:
+        result["errors"].append(f"bulk_update: {{exc}}")
+
+if inserts:
+    try:
+        next_idx = {{
+            r["parent"]: int(r["max_idx"] or 0)
+            for r in frappe.get_all(
+                "DocPerm",
+                filters={{"parent": ["in", sorted({{row["doctype"] for row, _ in inserts}})], "parenttype": "DocType"}},
+                fields=["parent", "max(idx) as max_idx"],
+                group_by="parent",
+            )
+        }}
+        now = frappe.utils.now()
+        user = frappe.session.user
+        values = []
+        for row, desired in inserts:
+            next_idx[row["doctype"]] = next_idx.get(row["doctype"], 0) + 1
+            values.append(
+                [frappe.generate_hash(length=10), now, now, user, user, 0, next_idx[row["doctype"]],
+                 row["doctype"], "DocType", "permissions", row["role"], 0]
+                + [desired[f] for f in PERM_FIELDS]
+            )
+        frappe.db.bulk_insert(
+            "DocPerm",
+            fields=["name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+                    "parent", "parenttype", "parentfield", "role", "permlevel"] + PERM_FIELDS,
+            values=values,
+        )
+        result["inserted"] = [f"{{row['doctype']}}:{{row['role']}}" for row, _ in inserts]
+    except Exception as exc:
+        result["errors"].append(f"bulk_insert: {{exc}}")
+
+if changed_doctypes:
+    frappe.db.commit()
+    # DocPerm rows are served from cached doctype meta on the live web workers;
+    # refresh only the doctypes whose matrix actually changed.
+    for dt in sorted(changed_doctypes):
+        try:
+            frappe.clear_cache(doctype=dt)
+            result["cleared"].append(dt)
+        except Exception as exc:
+            result["errors"].append(f"clear_cache:{{dt}}: {{exc}}")
+
+result["count"] = result["unchanged"] + len(result["updated"]) + len(result["inserted"])
+print(json.dumps(result))
+"""
+
+
 def run_frappe_code(site_name: str, python_code: str) -> str:
     """
     Execute Python code in the context of a specific Frappe site.
@@ -446,10 +769,31 @@ def seed_agent_doctypes_on_site(site_name: str) -> dict[str, Any]:
     """
     Import Agent Action Log + Agent Audit Log on a tenant site (idempotent).
     Also upserts custom fields when Action Log already exists from an older schema.
+
+    Two phases: a small existence / version / field check first, then the full
+    DocType JSON is shipped only for the DocTypes the site is missing or has
+    from an older fixture (those are upgraded in place).
     """
-    fixtures = load_agent_doctype_fixtures()
-    code = build_seed_agent_doctypes_frappe_code(fixtures, AGENT_ACTION_LOG_CUSTOM_FIELDS)
-    return _parse_json_output(run_frappe_code(site_name, code))
+    payload = agent_doctype_payload()
+    check = _parse_json_output(run_frappe_code(site_name, payload.check_code))
+    present = check.get("present")
+    if present is None:
+        raise Exception(f"agent doctype check returned no result: {check}")
+    missing = (check.get("missing") or []) + (check.get("outdated") or [])
+    if not missing and not check.get("missing_fields"):
+        return {
+            "imported": [],
+            "upgraded": [],
+            "skipped": present,
+            "errors": [],
+            "custom_fields": {"created": [], "skipped": [], "errors": []},
+            "checked_only": True,
+        }
+
+    result = _parse_json_output(run_frappe_code(site_name, payload.seed_code(missing)))
+    if result:
+        result["skipped"] = sorted(set(result.get("skipped") or []) | (set(present) - set(missing)))
+    return result
 
 
 def generate_subdomain(org_name: str) -> str:
@@ -531,7 +875,39 @@ def _frappe_site_headers(site_name: str, base_url: str) -> dict[str, str]:
     return headers
 
 
-def _frappe_api_json(
+# Shared keep-alive client; remembers which route reaches each site.
+_frappe_router = FrappeRouter(
+    max_connections=FRAPPE_HTTP_MAX_CONNECTIONS,
+    backoff_base_sec=FRAPPE_ROUTE_BACKOFF_SEC,
+    backoff_max_sec=FRAPPE_ROUTE_BACKOFF_MAX_SEC,
+)
+
+
+@app.on_event("shutdown")
+async def _close_frappe_router() -> None:
+    await _frappe_router.aclose()
+
+
+@app.get("/api/v1/frappe-routes")
+async def frappe_route_stats(_auth: bool = Depends(verify_api_secret)):
+    """Sites with a memoized HTTP route, and routes currently backing off."""
+    return {"success": True, **_frappe_router.stats()}
+
+
+def _frappe_internal_routes(site_name: str) -> list[Route]:
+    """Direct Frappe bases (Docker container or host) with the site-selecting headers."""
+    return [
+        Route(base_url, tuple(_frappe_site_headers(site_name, base_url).items()))
+        for base_url in _frappe_base_url_candidates(site_name)
+    ]
+
+
+def _frappe_public_routes(site_name: str) -> list[Route]:
+    """Tenant FQDN through public nginx."""
+    return [Route(f"{scheme}://{site_name}") for scheme in (["https", "http"] if IS_PRODUCTION else ["http"])]
+
+
+async def _frappe_api_json(
     site_name: str,
     path: str,
     method: str = "GET",
@@ -540,34 +916,12 @@ def _frappe_api_json(
     timeout: int = 15,
 ) -> dict[str, Any]:
     """Call Frappe via internal/loopback URL + site Host header (works from Docker)."""
-    encoded_body = json.dumps(body).encode() if body is not None else None
-    last_error: Optional[Exception] = None
-
-    for base_url in _frappe_base_url_candidates(site_name):
-        try:
-            req = urllib.request.Request(
-                f"{base_url.rstrip('/')}{path}",
-                method=method,
-                data=encoded_body,
-            )
-            req.add_header("Content-Type", "application/json")
-            for key, value in _frappe_site_headers(site_name, base_url).items():
-                req.add_header(key, value)
-            for key, value in (headers or {}).items():
-                req.add_header(key, value)
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
-                raw = resp.read().decode("utf-8")
-                return json.loads(raw) if raw else {}
-        except Exception as exc:
-            last_error = exc
-            continue
-
-    if last_error:
-        raise last_error
-    raise Exception("Frappe API request failed")
+    return await _frappe_router.request_json(
+        site_name, _frappe_internal_routes(site_name), path, method, headers, body, timeout
+    )
 
 
-def _http_json(
+async def _http_json(
     site_name: str,
     path: str,
     method: str = "GET",
@@ -576,35 +930,18 @@ def _http_json(
     timeout: int = 15,
 ) -> dict[str, Any]:
     """HTTP to tenant FQDN (public nginx) with fallback to internal Frappe routing."""
-    schemes = ["https", "http"] if IS_PRODUCTION else ["http"]
-    encoded_body = json.dumps(body).encode() if body is not None else None
-    final_error: Optional[Exception] = None
-
-    for scheme in schemes:
-        try:
-            req = urllib.request.Request(
-                f"{scheme}://{site_name}{path}",
-                method=method,
-                data=encoded_body,
-            )
-            req.add_header("Content-Type", "application/json")
-            for key, value in (headers or {}).items():
-                req.add_header(key, value)
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
-                raw = resp.read().decode("utf-8")
-                return json.loads(raw) if raw else {}
-        except Exception as exc:
-            final_error = exc
-            continue
-
-    # From the provisioning container, tenant FQDN on :443/:80 often hits Next.js (404).
-    # Reach Frappe on host.docker.internal:8080 with Host: <site_name> instead.
-    try:
-        return _frappe_api_json(site_name, path, method, headers, body, timeout)
-    except Exception as internal_exc:
-        if final_error:
-            raise final_error from internal_exc
-        raise internal_exc
+    # From the provisioning container, tenant FQDN on :443/:80 often hits Next.js (404);
+    # the router then falls through to host.docker.internal:8080 with Host: <site_name>
+    # and remembers that route for the site.
+    return await _frappe_router.request_json(
+        site_name,
+        _frappe_public_routes(site_name) + _frappe_internal_routes(site_name),
+        path,
+        method,
+        headers,
+        body,
+        timeout,
+    )
 
 
 def _validate_user_api_token_bench(
@@ -645,31 +982,94 @@ except Exception as exc:
         return False
 
 
-def _validate_user_api_token(site_name: str, user_email: str, api_key: str, api_secret: str) -> bool:
-    # Prefer in-process validation — provisioning often runs in Docker where
-    # FRAPPE_INTERNAL_URL (127.0.0.1:8080) does not reach the host Frappe port.
-    if _validate_user_api_token_bench(site_name, user_email, api_key, api_secret):
-        return True
+async def _validate_user_api_token(site_name: str, user_email: str, api_key: str, api_secret: str) -> bool:
+    """Keys authenticate as user_email over HTTP, the way the Nexus app uses them.
+
+    Only when no HTTP route reaches Frappe (provisioning often runs in Docker
+    where FRAPPE_INTERNAL_URL does not reach the host Frappe port) does this
+    fall back to the in-process bench check.
+    """
+    verdict = await _http_check_user_api_token(site_name, user_email, api_key, api_secret, retries=2)
+    if verdict != "unreachable":
+        return verdict == "ok"
+    return await asyncio.to_thread(_validate_user_api_token_bench, site_name, user_email, api_key, api_secret)
+
+
+async def _read_api_key_version(site_name: str, user_email: str) -> Optional[int]:
+    """Current User.api_key_version (nexus_core stamp) via a running web worker.
+
+    Authenticated with the tenant's own credential, which every key read or
+    rotation script installs on the site. None when the stamp cannot be read
+    (HTTP unreachable, older nexus_core, credential not installed yet); callers
+    then fall back to validating the keys.
+    """
     try:
-        auth = _frappe_api_json(
+        result = await _frappe_api_json(
             site_name,
-            "/api/method/frappe.auth.get_logged_user",
-            headers={
-                "Authorization": f"token {api_key}:{api_secret}",
-            },
+            "/api/method/nexus_core.api_keys.get_api_key_version?"
+            + urllib.parse.urlencode({"user": user_email}),
+            headers=_tenant_auth_headers(site_name),
+            timeout=3,
         )
-        return auth.get("message") == user_email
     except Exception:
+        return None
+    version = (result.get("message") or {}).get("version")
+    return int(version) if version is not None else None
+
+
+# Embedded in tenant-site scripts that create users: returns the user's readable
+# key pair, or mints one in the same session (Frappe's own generate_keys rotates).
+_MINT_USER_KEYS_SNIPPET = """
+from frappe.utils.password import get_decrypted_password
+
+def mint_user_keys(email):
+    user = frappe.get_doc("User", email)
+    api_secret = None
+    if user.api_key:
+        api_secret = get_decrypted_password("User", email, "api_secret", raise_exception=False)
+    minted = not api_secret
+    if minted:
+        if not user.api_key:
+            user.api_key = frappe.generate_hash(length=15)
+        api_secret = frappe.generate_hash(length=15)
+        user.api_secret = api_secret
+        user.save(ignore_permissions=True)
+    return {
+        "api_key": user.api_key,
+        "api_secret": api_secret,
+        "api_key_version": user.get("api_key_version"),
+        "minted": minted,
+    }
+"""
+
+
+def _cache_minted_keys(site_name: str, user_email: str, keys: Optional[dict[str, Any]]) -> bool:
+    """Put keys from mint_user_keys into the shared cache for generate-user-keys."""
+    if not keys or keys.get("error") or not keys.get("api_key") or not keys.get("api_secret"):
+        logger.warning(
+            f"pre-mint: no keys for {user_email} on {site_name}: {(keys or {}).get('error', 'no output')}"
+        )
         return False
+    _user_key_cache.put(
+        site_name,
+        user_email,
+        keys["api_key"],
+        keys["api_secret"],
+        keys.get("api_key_version"),
+        ttl_sec=USER_KEY_PREMINT_TTL_SEC,
+    )
+    _user_key_cache.incr("premints")
+    return True
 
 
-def _http_check_user_api_token(
+async def _http_check_user_api_token(
     site_name: str,
     user_email: str,
     api_key: str,
     api_secret: str,
     retries: int = 4,
     delay: float = 0.4,
+    stagger: float = 0.25,
 ) -> str:
     """Check keys over HTTP exactly like Frappe's web auth (and the Nexus app) does.
 
@@ -679,50 +1079,64 @@ def _http_check_user_api_token(
       - "unreachable": no endpoint could be reached (e.g. provisioning runs in
                        Docker and cannot hit Frappe over HTTP)
 
-    `_validate_user_api_token` short-circuits on the bench check and reports keys
-    as valid even when Frappe's HTTP layer rejects them — the bench-valid-but-
-    HTTP-401 gap that drives the client-side rotation storm. This asserts the
-    keys actually authenticate over the same channel the web app uses, retrying
-    briefly to absorb commit/propagation timing, while degrading gracefully when
-    HTTP simply isn't reachable from here.
+    A bench check can pass for keys Frappe's HTTP layer rejects — the
+    bench-valid-but-HTTP-401 gap that drives the client-side rotation storm — so
+    `_validate_user_api_token` asks this first, retrying briefly to absorb
+    commit/propagation timing, and uses the bench only when HTTP is unreachable.
+
+    Endpoints are raced happy-eyeballs style: each starts `stagger` seconds after
+    the previous one (or as soon as it fails), and the first "ok" or "rejected"
+    cancels the rest, so one attempt costs at most one probe timeout.
     """
     path = "/api/method/frappe.auth.get_logged_user"
-    headers = {
-        "Authorization": f"token {api_key}:{api_secret}",
-        "Content-Type": "application/json",
-    }
+    headers = {"Authorization": f"token {api_key}:{api_secret}"}
+    routes = _frappe_internal_routes(site_name) + _frappe_public_routes(site_name)
 
-    urls: list[tuple[str, dict[str, str]]] = [
-        (f"{FRAPPE_INTERNAL_URL}{path}", {**headers, "X-Frappe-Site-Name": site_name}),
-    ]
-    for scheme in (["https", "http"] if IS_PRODUCTION else ["http"]):
-        urls.append((f"{scheme}://{site_name}{path}", dict(headers)))
+    async def probe(route: Route) -> str:
+        try:
+            resp = await _frappe_router.send(route, path, headers=headers, timeout=10)
+        except Exception as exc:
+            # Connection refused / DNS / timeout — cannot conclude anything.
+            _frappe_router.record_failure(site_name, route, repr(exc), transport=is_connect_error(exc))
+            return "unreachable"
+        if "json" not in resp.headers.get("content-type", ""):
+            # An HTML page (Next.js on the public host), not Frappe.
+            _frappe_router.record_failure(site_name, route, f"HTTP {resp.status_code} not Frappe", transport=False)
+            return "unreachable"
+        _frappe_router.record_success(site_name, route)
+        if resp.is_success:
+            data = resp.json() if resp.content else {}
+            return "ok" if data.get("message") == user_email else "rejected"
+        # Frappe answered; 401/403 means the keys genuinely do not authenticate.
+        return "rejected" if resp.status_code in (401, 403) else "unreachable"
+
+    async def race() -> str:
+        waiting = _frappe_router.ordered(site_name, routes)
+        running: set[asyncio.Task] = set()
+        try:
+            while waiting or running:
+                if waiting:
+                    running.add(asyncio.create_task(probe(waiting.pop(0))))
+                done, running = await asyncio.wait(
+                    running,
+                    timeout=stagger if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.result() != "unreachable":
+                        return task.result()
+            return "unreachable"
+        finally:
+            for task in running:
+                task.cancel()
 
     last = "unreachable"
     for attempt in range(retries):
-        for url, hdrs in urls:
-            req = urllib.request.Request(url, method="GET")
-            for key, value in hdrs.items():
-                req.add_header(key, value)
-            try:
-                with urllib.request.urlopen(req, timeout=10) as resp:
-                    raw = resp.read().decode("utf-8")
-                    data = json.loads(raw) if raw else {}
-                    if data.get("message") == user_email:
-                        return "ok"
-                    last = "rejected"
-            except urllib.error.HTTPError as exc:
-                # A response came back, so Frappe is reachable. 401/403 means the
-                # keys genuinely do not authenticate.
-                last = "rejected" if exc.code in (401, 403) else "unreachable"
-            except Exception:
-                # Connection refused / DNS / timeout — cannot conclude anything.
-                if last != "rejected":
-                    last = "unreachable"
+        last = await race()
         if last == "rejected" and attempt < retries - 1:
-            time.sleep(delay)
-        elif last != "rejected":
-            # Unreachable won't fix itself within this call; stop early.
+            await asyncio.sleep(delay * 2 ** attempt)
+        else:
+            # "ok" is final; unreachable won't fix itself within this call.
             break
     return last
 
@@ -773,28 +1187,28 @@ async def health_check():
 
 @app.get("/api/v1/check-subdomain/{subdomain}", response_model=SubdomainCheckResponse)
 async def check_subdomain(subdomain: str, _auth: bool = Depends(verify_api_secret)):
-    """Check if a subdomain is available by querying the Master DB."""
-    subdomain = generate_subdomain(subdomain)
-
-    try:
-        output = run_frappe_code(MASTER_SITE, f"""
-import json
-exists = frappe.db.exists("SaaS Tenant", {{"subdomain": "{subdomain}"}})
-print(json.dumps({{"exists": bool(exists)}}))
-""")
-        result = _parse_json_output(output)
+    """Check subdomain availability against the in-memory index (taken, reserved, provisioning).
 
-        if result.get("exists"):
-            return SubdomainCheckResponse(
-                available=False,
-                subdomain=subdomain,
-                reason="Subdomain already taken",
-            )
+    Taken or reserved names come back with free alternatives. Signup still
+    re-checks the master DB in the provisioning preflight.
+    """
+    subdomain = generate_subdomain(subdomain)
+    if not _subdomain_index.loaded and not await asyncio.to_thread(_registry_ready):
+        raise HTTPException(status_code=503, detail="Subdomain availability could not be verified")
+
+    in_flight = {run["subdomain"] for run in _PROVISION_RUNS.values()}
+    if _subdomain_index.is_reserved(subdomain):
+        reason = "Subdomain is reserved"
+    elif _subdomain_index.is_taken(subdomain) or subdomain in in_flight:
+        reason = "Subdomain already taken"
+    else:
         return SubdomainCheckResponse(available=True, subdomain=subdomain)
 
-    except Exception as e:
-        logger.warning(f"Subdomain check failed, assuming available: {e}")
-        return SubdomainCheckResponse(available=True, subdomain=subdomain)
+    suggestions = [
+        s for s in _subdomain_index.suggest(subdomain, generate_subdomain, count=3 + len(in_flight))
+        if s not in in_flight
+    ][:3]
+    return SubdomainCheckResponse(available=False, subdomain=subdomain, reason=reason, suggestions=suggestions)
 
 
 TENANT_RECORD_FIELDS = [
@@ -810,9 +1224,22 @@ TENANT_RECORD_FIELDS = [
 # Frappe get_all filters must be a list of conditions, each condition a 3-tuple list.
 # WRONG: ["status", "in", ["Active"]]          — flat 3-element list
 # RIGHT: [["status", "in", ["Active", ...]]]   — list wrapping one condition
-ACTIVE_TENANT_STATUS_FILTERS = [
-    ["status", "in", ["Active", "active", "provisioned", "Provisioned"]]
-]
+# The nexus_core saas_tenant_indexes patch normalises legacy spellings
+# (active, provisioned) to "Active", so this is one indexed equality check.
+ACTIVE_TENANT_STATUS_FILTERS = [["status", "=", "Active"]]
+# Matched in memory by the tenant registry; still accepts the legacy spellings.
+ACTIVE_TENANT_STATUSES = ["Active", "active", "provisioned", "Provisioned"]
+# Used by master queries while un-normalised rows remain (patch not run yet).
+LEGACY_ACTIVE_TENANT_STATUS_FILTERS = [["status", "in", ACTIVE_TENANT_STATUSES]]
+
+# Status written by deprovision_tenant before the site is dropped in the
+# background. Tombstoned rows are hidden from every lookup immediately, and the
+# record itself is removed once the drop-site completes.
+TOMBSTONED_TENANT_STATUS = "Deprovisioning"
+# Written once the background removal has used up its retries; the row stays
+# hidden until the removal is requeued.
+DEPROVISION_FAILED_STATUS = "Deprovision Failed"
+HIDDEN_TENANT_STATUSES = [TOMBSTONED_TENANT_STATUS, DEPROVISION_FAILED_STATUS]
 
 
 def _bench_literal(value) -> str:
@@ -820,8 +1247,74 @@ def _bench_literal(value) -> str:
     return json.dumps(value)
 
 
-def _lookup_saas_tenant_on_master(filters: dict) -> dict:
+def _load_saas_tenant_registry() -> list[dict]:
+    """Every SaaS Tenant row in one master-site call (the registry hides tombstoned ones)."""
+    code = f"""
+import json
+rows = frappe.get_all(
+    "SaaS Tenant",
+    fields={_bench_literal(TENANT_RECORD_FIELDS)},
+    order_by="modified desc",
+    limit=0,
+    ignore_permissions=True,
+)
+print(json.dumps({{"tenants": rows}}, default=str))
+"""
+    parsed = _parse_json_output(run_frappe_code(MASTER_SITE, code))
+    if "tenants" not in parsed:
+        raise Exception("master site returned no tenant list")
+    return parsed["tenants"]
+
+
+_tenant_registry = TenantRegistry(
+    _load_saas_tenant_registry,
+    active_statuses=ACTIVE_TENANT_STATUSES,
+    hidden_statuses=tuple(HIDDEN_TENANT_STATUSES),
+)
+_subdomain_index = SubdomainIndex(
+    RESERVED_SUBDOMAINS | set(EXTRA_RESERVED_SUBDOMAINS) | {MASTER_SITE.split(".")[0]}
+)
+_tenant_registry.subscribe(lambda registry: _subdomain_index.rebuild(registry.taken_subdomains()))
+_tenant_registry_refresher: Optional[asyncio.Task] = None
+
+
+def _registry_ready() -> bool:
+    """Bring the registry up to date (a missed background refresh reloads inline)."""
+    try:
+        _tenant_registry.ensure_fresh(TENANT_REGISTRY_TTL_SEC * 2)
+        return True
+    except Exception as e:
+        logger.warning(f"Tenant registry refresh failed, querying master directly: {e}")
+        return False
+
+
+def _invalidate_tenant_registry() -> None:
+    """Called after this service changes SaaS Tenant rows; the next read reloads."""
+    _tenant_registry.invalidate()
+    try:
+        asyncio.get_running_loop().create_task(asyncio.to_thread(_registry_ready))
+    except RuntimeError:
+        pass  # not on the event loop: the next lookup refreshes inline
+
+
+async def _refresh_tenant_registry_forever() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(_tenant_registry.refresh)
+        except Exception as e:
+            logger.warning(f"Tenant registry background refresh failed: {e}")
+        await asyncio.sleep(TENANT_REGISTRY_TTL_SEC)
+
+
+@app.on_event("startup")
+async def _start_tenant_registry_refresher() -> None:
+    global _tenant_registry_refresher
+    _tenant_registry_refresher = asyncio.get_running_loop().create_task(_refresh_tenant_registry_forever())
+
+
+def _query_saas_tenant_on_master(filters: dict) -> dict:
     """Read SaaS Tenant on the master site with ignore_permissions (bench console)."""
+    filters = {**filters, "status": ["not in", HIDDEN_TENANT_STATUSES]}
     code = f"""
 import json
 rows = frappe.get_all(
@@ -837,25 +1330,61 @@ print(json.dumps({{"found": bool(rows), "tenant": rows[0] if rows else None}}, d
     return _parse_json_output(output)
 
 
+def _lookup_saas_tenant_on_master(filters: dict, read_through: Optional[bool] = None) -> dict:
+    """Resolve one SaaS Tenant, from the in-process registry when the filter is indexed.
+
+    A miss falls through to master (and is remembered) when read-through is on;
+    other filters, or an unavailable registry, always query master.
+    """
+    if read_through is None:
+        read_through = TENANT_REGISTRY_READ_THROUGH
+    if len(filters) != 1 or next(iter(filters)) not in REGISTRY_INDEXED_FIELDS or not _registry_ready():
+        return _query_saas_tenant_on_master(filters)
+
+    field, value = next(iter(filters.items()))
+    row = _tenant_registry.get(field, value)
+    if row:
+        return {"found": True, "tenant": row}
+    if not read_through or (field == "subdomain" and str(value).lower() in _tenant_registry.taken_subdomains()):
+        # Known but tombstoned rows stay hidden without a master round trip.
+        return {"found": False, "tenant": None}
+    result = _query_saas_tenant_on_master(filters)
+    if result.get("found") and result.get("tenant"):
+        _tenant_registry.upsert(result["tenant"])
+    return result
+
+
 def _list_active_saas_tenant_rows(limit: int = 100) -> list[dict]:
-    """Active/provisioned tenants from master — tolerates mixed status casing."""
-    code = f"""
+    """Active tenants, served from the registry (master query if it cannot load)."""
+    if not _registry_ready():
+        code = f"""
 import json
+filters = {_bench_literal(ACTIVE_TENANT_STATUS_FILTERS)}
+# MariaDB's collation already matches "active"; "provisioned" is a different word.
+if frappe.db.exists("SaaS Tenant", {{"status": "Provisioned"}}):
+    filters = {_bench_literal(LEGACY_ACTIVE_TENANT_STATUS_FILTERS)}
 rows = frappe.get_all(
     "SaaS Tenant",
-    filters={_bench_literal(ACTIVE_TENANT_STATUS_FILTERS)},
+    filters=filters,
     fields={_bench_literal(TENANT_RECORD_FIELDS)},
     limit={limit},
     ignore_permissions=True,
 )
 print(json.dumps({{"tenants": rows}}, default=str))
 """
-    parsed = _parse_json_output(run_frappe_code(MASTER_SITE, code))
-    return parsed.get("tenants") or []
+        parsed = _parse_json_output(run_frappe_code(MASTER_SITE, code))
+        return parsed.get("tenants") or []
+    rows = _tenant_registry.active_rows()
+    return rows[:limit] if limit else rows
 
 
 def _find_tenants_for_user_email(user_email: str) -> list[dict]:
-    """All workspaces where user_email is owner or has a User record on the tenant site."""
+    """All workspaces where user_email is owner or has a User record on the tenant site.
+
+    Once the membership index is live (backfilled, with tenant doc_events
+    reporting here) this is one indexed master read; before that every active
+    tenant site is checked for the User.
+    """
     seen: set[str] = set()
     matches: list[dict] = []
 
@@ -867,6 +1396,15 @@ def _find_tenants_for_user_email(user_email: str) -> list[dict]:
             seen.add(sub)
             matches.append(row)
 
+    if _member_index_live():
+        parsed = _parse_json_output(run_frappe_code(MASTER_SITE, build_member_lookup_frappe_code(user_email)))
+        active = {row["subdomain"]: row for row in _list_active_saas_tenant_rows(0) if row.get("subdomain")}
+        for subdomain in parsed.get("subdomains") or []:
+            if subdomain in active and subdomain not in seen:
+                seen.add(subdomain)
+                matches.append(active[subdomain])
+        return matches
+
     for row in _list_active_saas_tenant_rows():
         subdomain = row.get("subdomain")
         if not subdomain or subdomain in seen:
@@ -899,25 +1437,73 @@ print(json.dumps({{"exists": bool(rows)}}))
 async def list_active_tenant_subdomains(_auth: bool = Depends(verify_api_secret)):
     """List active tenant subdomains from the Master DB (for root-domain login discovery)."""
     try:
-        code = f"""
-import json
-rows = frappe.get_all(
-    "SaaS Tenant",
-    filters={_bench_literal(ACTIVE_TENANT_STATUS_FILTERS)},
-    fields={_bench_literal(["subdomain"])},
-    limit=100,
-    ignore_permissions=True,
-)
-print(json.dumps({{"subdomains": [r["subdomain"] for r in rows if r.get("subdomain")]}}, default=str))
-"""
-        output = run_frappe_code(MASTER_SITE, code)
-        parsed = _parse_json_output(output)
-        return {"subdomains": parsed.get("subdomains") or []}
+        rows = await asyncio.to_thread(_list_active_saas_tenant_rows, 100)
+        return {"subdomains": [r["subdomain"] for r in rows if r.get("subdomain")]}
     except Exception as e:
         logger.error(f"active-subdomains list failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _tenant_registry_etag(version: int) -> str:
+    return f'"{_tenant_registry.epoch}-{version}"'
+
+
+@app.get("/api/v1/tenant-registry/snapshot")
+async def tenant_registry_snapshot(
+    if_none_match: Optional[str] = Header(None),
+    _auth: bool = Depends(verify_api_secret),
+):
+    """
+    The whole tenant registry (tombstoned tenants excluded) with its version.
+    Replicas send the ETag back as If-None-Match and get 304 while nothing
+    changed, then follow /tenant-registry/delta.
+    """
+    if not await asyncio.to_thread(_registry_ready):
+        raise HTTPException(status_code=503, detail="Tenant registry is not available")
+    version, rows = _tenant_registry.snapshot()
+    etag = _tenant_registry_etag(version)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(
+        {"epoch": _tenant_registry.epoch, "version": version, "tenants": rows},
+        headers={"ETag": etag},
+    )
+
+
+@app.get("/api/v1/tenant-registry/delta")
+async def tenant_registry_delta(since: int, epoch: str, _auth: bool = Depends(verify_api_secret)):
+    """
+    Changes after version `since`, oldest first: op is upsert (full row) or
+    remove. `reset` means the replica is from another process epoch or too far
+    behind the change log and must reload the snapshot.
+    """
+    if not await asyncio.to_thread(_registry_ready):
+        raise HTTPException(status_code=503, detail="Tenant registry is not available")
+    version, changes = _tenant_registry.changes_since(since)
+    if epoch != _tenant_registry.epoch:
+        changes = None
+    return {
+        "epoch": _tenant_registry.epoch,
+        "version": version,
+        "reset": changes is None,
+        "changes": changes or [],
+    }
+
+
+def _workspace_summary(row: dict) -> dict[str, Any]:
+    """Tenant row as returned to the login UI."""
+    site_name = get_site_name(row["subdomain"])
+    site_url = row.get("site_url") or (f"https://{site_name}" if IS_PRODUCTION else f"http://{site_name}")
+    return {
+        "subdomain": row["subdomain"],
+        "site_name": site_name,
+        "site_url": site_url,
+        "display_name": site_url.replace("https://", "").replace("http://", ""),
+        "status": row.get("status"),
+        "owner_email": row.get("owner_email"),
+    }
+
+
 @app.get("/api/v1/tenant-by-user")
 async def get_tenants_by_user(email: str, _auth: bool = Depends(verify_api_secret)):
     """
@@ -930,24 +1516,7 @@ async def get_tenants_by_user(email: str, _auth: bool = Depends(verify_api_secre
 
     try:
         rows = _find_tenants_for_user_email(user_email)
-        tenants = []
-        for row in rows:
-            subdomain = row.get("subdomain")
-            if not subdomain:
-                continue
-            site_name = get_site_name(subdomain)
-            site_url = row.get("site_url") or (
-                f"https://{site_name}" if IS_PRODUCTION else f"http://{site_name}"
-            )
-            tenants.append({
-                "subdomain": subdomain,
-                "site_name": site_name,
-                "site_url": site_url,
-                "display_name": site_url.replace("https://", "").replace("http://", ""),
-                "status": row.get("status"),
-                "owner_email": row.get("owner_email"),
-            })
-        return {"tenants": tenants}
+        return {"tenants": [_workspace_summary(row) for row in rows if row.get("subdomain")]}
     except Exception as e:
         logger.error(f"tenant-by-user failed for {user_email}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -992,6 +1561,126 @@ else:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _login_probe_code(user_email: str) -> str:
+    """Tenant-side: does the user exist, its social providers, and whether API keys are stored."""
+    return f"""import json
+email = {json.dumps(user_email)}
+user = frappe.db.get_value("User", email, ["name", "enabled", "api_key"], as_dict=True)
+if not user:
+    print(json.dumps({{"exists": False}}))
+else:
+    providers = frappe.get_all("User Social Login", filters={{"parent": user.name, "parenttype": "User"}}, pluck="provider")
+    has_secret = bool(frappe.db.sql(
+        "select 1 from `__Auth` where doctype = 'User' and name = %s and fieldname = 'api_secret' limit 1",
+        user.name,
+    ))
+    print(json.dumps({{
+        "exists": True,
+        "enabled": bool(user.enabled),
+        "providers": [str(p) for p in providers if p],
+        "has_api_keys": bool(user.api_key and has_secret),
+    }}))
+"""
+
+
+def _resolve_login(user_email: str) -> dict[str, Any]:
+    """Workspaces for `user_email` with per-site login details.
+
+    Candidates come from the registry (owner) and the membership index when it
+    is live; before that, up to LOGIN_PROBE_MAX_SITES active tenants. They are
+    probed by one interpreter killed after LOGIN_PROBE_TIMEOUT_SEC, and not at
+    all while a fleet operation (migrate, reconcile) holds the bench.
+    """
+    owner = _lookup_saas_tenant_on_master({"owner_email": user_email})
+    owner_row = owner.get("tenant") if owner.get("found") else None
+    candidates: dict[str, dict] = {}
+    if owner_row and owner_row.get("subdomain"):
+        candidates[owner_row["subdomain"]] = owner_row
+    if _member_index_live():
+        source = "index"
+        for row in _find_tenants_for_user_email(user_email):
+            candidates.setdefault(row["subdomain"], row)
+    else:
+        source = "scan"
+        for row in _list_active_saas_tenant_rows(LOGIN_PROBE_MAX_SITES):
+            if len(candidates) >= LOGIN_PROBE_MAX_SITES:
+                break
+            if row.get("subdomain"):
+                candidates.setdefault(row["subdomain"], row)
+
+    subdomain_by_site = {get_site_name(sub): sub for sub in list(candidates)[:LOGIN_PROBE_MAX_SITES]}
+    probes: dict[str, dict[str, Any]] = {}
+
+    def record(report: dict[str, Any]) -> None:
+        outcome = (report.get("operations") or {}).get("login") or {}
+        if outcome.get("output"):
+            probes[subdomain_by_site[report["site"]]] = _parse_json_output(outcome["output"])
+        else:
+            probes[subdomain_by_site[report["site"]]] = {"error": outcome.get("error") or report.get("error") or "no result"}
+
+    probe_skipped = _fleet_lock.locked()
+    if probe_skipped and source == "scan":
+        # Unprobed scan candidates are only guesses; answer from the registry alone.
+        candidates = {sub: row for sub, row in candidates.items() if row is owner_row}
+    elif subdomain_by_site:
+        _run_fleet_shard(
+            {site: ["login"] for site in subdomain_by_site},
+            {"login": _login_probe_code(user_email)},
+            record,
+            timeout=LOGIN_PROBE_TIMEOUT_SEC,
+        )
+    unprobed = "a fleet operation is running" if probe_skipped else "not probed"
+
+    owner_subdomain = owner_row.get("subdomain") if owner_row else None
+    workspaces = []
+    errors = {}
+    for subdomain, row in candidates.items():
+        probe = probes.get(subdomain) or {"error": unprobed}
+        is_owner = subdomain == owner_subdomain
+        if probe.get("error"):
+            errors[subdomain] = probe["error"]
+            if not (is_owner or source == "index"):
+                continue
+        elif not probe.get("exists"):
+            continue
+        providers = probe.get("providers") or []
+        workspaces.append({
+            **_workspace_summary(row),
+            "is_owner": is_owner,
+            "user_exists": probe.get("exists"),
+            "enabled": probe.get("enabled"),
+            "providers": providers,
+            "has_social_login": bool(providers),
+            "has_api_keys": probe.get("has_api_keys"),
+        })
+    workspaces.sort(key=lambda w: (not w["is_owner"], w["subdomain"]))
+    return {
+        "email": user_email,
+        "source": source,
+        "workspaces": workspaces,
+        "errors": errors,
+        "probe_skipped": probe_skipped,
+    }
+
+
+@app.get("/api/v1/login-resolution")
+async def resolve_login(email: str, _auth: bool = Depends(verify_api_secret)):
+    """
+    Everything root-domain login needs for an email in one call: accessible
+    workspaces (owner first), each one's social-login providers, and whether
+    the user already has API keys there (so generate-user-keys can be skipped).
+    Replaces tenant-by-user + user-login-hint per workspace.
+    """
+    user_email = (email or "").strip()
+    if not user_email or "@" not in user_email:
+        raise HTTPException(status_code=400, detail="A valid email query parameter is required")
+    try:
+        return await asyncio.to_thread(_resolve_login, user_email)
+    except Exception as e:
+        logger.error(f"login-resolution failed for {user_email}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/v1/tenant-record/subdomain/{subdomain}", response_model=TenantRecordLookupResponse)
 async def get_tenant_record_by_subdomain(subdomain: str, _auth: bool = Depends(verify_api_secret)):
     """Resolve a tenant by subdomain from the Master DB (ignores API user DocPerms)."""
@@ -1039,7 +1728,7 @@ if not user_email:
 else:
     rows = frappe.get_all(
         "SaaS Tenant",
-        filters={{"owner_email": user_email}},
+        filters={{"owner_email": user_email, "status": ["not in", {_bench_literal(HIDDEN_TENANT_STATUSES)}]}},
         fields={_bench_literal(TENANT_RECORD_FIELDS)},
         limit=1,
         ignore_permissions=True,
@@ -1057,20 +1746,391 @@ else:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/v1/provision", response_model=ProvisionResponse)
-async def provision_tenant(req: ProvisionRequest, _auth: bool = Depends(verify_api_secret)):
-    """Provision a tenant with strict role + DocPerm enforcement."""
-    subdomain = generate_subdomain(req.organization_name)
-    site_name = get_site_name(subdomain)
-    admin_password = req.admin_password or secrets.token_urlsafe(16)
-    steps_completed: list[str] = []
-    api_key: Optional[str] = None
-    api_secret: Optional[str] = None
+# ============================================================================
+# Tenant membership index — user -> tenant for login resolution
+# ============================================================================
 
-    logger.info(f"═══ PROVISIONING START: {site_name} ═══")
-    logger.info(f"  org={req.organization_name} email={req.admin_email} plan={req.plan_type.value}")
+# Written once a backfill has listed users on every tenant without a failure;
+# until then login resolution keeps checking tenant sites directly.
+_MEMBER_INDEX_STATE_PATH = PROVISIONING_DATA_DIR / "tenant_member_index.json"
+_member_index_cache: Optional[dict[str, Any]] = None
+_member_backfill_job: dict[str, Any] = {"status": "idle"}
+# Tenants per master-site write during a backfill.
+MEMBER_BACKFILL_BATCH = 50
 
-    # Step 0: pre-flight (idempotency guard)
+
+def _member_index_state() -> dict[str, Any]:
+    global _member_index_cache
+    if _member_index_cache is None:
+        try:
+            _member_index_cache = json.loads(_MEMBER_INDEX_STATE_PATH.read_text())
+        except (OSError, ValueError):
+            _member_index_cache = {}
+    return _member_index_cache
+
+
+def _save_member_index_state(state: dict[str, Any]) -> None:
+    global _member_index_cache
+    _MEMBER_INDEX_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    _MEMBER_INDEX_STATE_PATH.write_text(json.dumps(state))
+    _member_index_cache = state
+
+
+def _member_index_live() -> bool:
+    """Whether lookups may trust the index alone.
+
+    Needs a completed backfill that also wired every tenant's doc_events to
+    this service's current callback URL; until then users added on a tenant
+    would be missing, so callers keep scanning tenant sites.
+    """
+    state = _member_index_state()
+    return bool(
+        state.get("backfilled_at")
+        and PROVISIONING_CALLBACK_URL
+        and state.get("callback_url") == PROVISIONING_CALLBACK_URL
+    )
+
+
+def _sync_tenant_members(members_by_subdomain: dict[str, list[dict[str, Any]]], replace: bool) -> dict[str, Any]:
+    code = build_sync_members_frappe_code(load_member_doctype_fixture(), members_by_subdomain, replace)
+    return _parse_json_output(run_frappe_code(MASTER_SITE, code))
+
+
+def _index_tenant_member(subdomain: str, user_email: str) -> bool:
+    """Index a user this service created; failures are logged, a backfill repairs them."""
+    try:
+        _sync_tenant_members({subdomain: [{"email": user_email, "enabled": True}]}, False)
+        return True
+    except Exception as e:
+        logger.warning(f"tenant-members: could not index {user_email} on {subdomain}: {e}")
+        return False
+
+
+@app.post("/api/v1/tenant-members/events")
+async def record_tenant_member_events(
+    req: TenantMemberEventsRequest,
+    site_name: str = Depends(verify_tenant_credential),
+):
+    """User insert / enable / delete on a tenant site, posted by nexus_core doc_events.
+
+    Authenticated with the tenant's own credential, which also names the site
+    whose rows may be changed.
+    """
+    subdomain = site_name.split(".", 1)[0]
+    if get_site_name(subdomain) != site_name:
+        raise HTTPException(status_code=400, detail=f"{site_name} is not a tenant site")
+    try:
+        result = await asyncio.to_thread(
+            _sync_tenant_members, {subdomain: [event.model_dump() for event in req.events]}, False
+        )
+    except Exception as e:
+        logger.error(f"tenant-members events failed for {site_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"subdomain": subdomain, **result}
+
+
+def _run_member_backfill(job: dict[str, Any]) -> None:
+    """List users on every active tenant (fleet interpreters) and replace their index rows.
+
+    The same pass writes each tenant's credential and callback URL, so its
+    doc_events report later changes.
+    """
+    rows = _list_active_saas_tenant_rows(0)
+    subdomain_by_site = {get_site_name(row["subdomain"]): row["subdomain"] for row in rows if row.get("subdomain")}
+    job["sites"] = len(subdomain_by_site)
+    pending: dict[str, list[dict[str, Any]]] = {}
+    lock = threading.Lock()
+
+    def flush() -> None:
+        batch = dict(pending)
+        pending.clear()
+        result = _sync_tenant_members(batch, True)
+        for key in ("inserted", "updated", "deleted"):
+            job[key] += int(result.get(key) or 0)
+
+    def collect(report: dict[str, Any]) -> None:
+        outcome = (report.get("operations") or {}).get("users") or {}
+        parsed = _parse_json_output(outcome["output"]) if outcome.get("output") else {}
+        with lock:
+            if "users" not in parsed:
+                job["failed"][report["site"]] = outcome.get("error") or report.get("error") or "no user list"
+                return
+            pending[subdomain_by_site[report["site"]]] = [
+                {"email": email, "enabled": bool(enabled)} for email, enabled in parsed["users"]
+            ]
+            job["scanned"] += 1
+            if len(pending) >= MEMBER_BACKFILL_BATCH:
+                flush()
+
+    code = _tenant_config_code(*subdomain_by_site) + TENANT_USERS_CODE
+    _run_fleet_operation(list(subdomain_by_site), "users", code, collect)
+    with lock:
+        if pending:
+            flush()
+
+
+async def _member_backfill_task(job: dict[str, Any]) -> None:
+    try:
+        await asyncio.to_thread(_run_member_backfill, job)
+        job["status"] = "done" if not job["failed"] else "partial"
+        if not job["failed"]:
+            _save_member_index_state({
+                "backfilled_at": datetime.utcnow().isoformat(),
+                "sites": job["sites"],
+                "callback_url": PROVISIONING_CALLBACK_URL,
+            })
+    except Exception as exc:
+        job["status"] = "failed"
+        job["error"] = str(getattr(exc, "detail", exc))
+        logger.error(f"tenant-members backfill failed: {job['error']}")
+    job["finished_at"] = datetime.utcnow().isoformat()
+
+
+@app.post("/api/v1/tenant-members/backfill", status_code=202)
+async def backfill_tenant_members(_auth: bool = Depends(verify_api_secret)):
+    """
+    Rebuild the membership index from every active tenant's User table and
+    wire each tenant's doc_events to PROVISIONING_CALLBACK_URL. Run once after
+    deploying the index (login resolution switches over when it completes with
+    a callback URL set) and whenever events may have been missed. Idempotent.
+    """
+    global _member_backfill_job
+    if _member_backfill_job.get("status") == "running":
+        raise HTTPException(status_code=409, detail="A membership backfill is already running")
+    _member_backfill_job = {
+        "status": "running",
+        "started_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "sites": None,
+        "scanned": 0,
+        "inserted": 0,
+        "updated": 0,
+        "deleted": 0,
+        "failed": {},
+        "error": None,
+    }
+    asyncio.get_running_loop().create_task(_member_backfill_task(_member_backfill_job))
+    return _member_backfill_job
+
+
+@app.get("/api/v1/tenant-members/backfill")
+async def get_tenant_members_backfill(_auth: bool = Depends(verify_api_secret)):
+    """Progress of the latest backfill and whether login resolution uses the index."""
+    return {"job": _member_backfill_job, "index": {**_member_index_state(), "live": _member_index_live()}}
+
+
+# ============================================================================
+# Provisioning runs — per-step timing, ETA and capacity
+# ============================================================================
+
+# run_id -> in-flight run (queued or running). Finished runs are persisted to
+# the metrics store and dropped from here.
+_PROVISION_RUNS: dict[str, dict[str, Any]] = {}
+_provision_slots = asyncio.Semaphore(PROVISION_CONCURRENCY)
+_provision_metrics = ProvisionMetricsStore(PROVISIONING_DATA_DIR / "provisioning_metrics.sqlite3")
+_provision_model = StepDurationModel.from_samples(_provision_metrics.step_samples())
+
+
+def _running_provision_count() -> int:
+    return sum(1 for r in _PROVISION_RUNS.values() if r["state"] == "running")
+
+
+def _register_provision_run(subdomain: str, admin_email: str) -> dict[str, Any]:
+    run = {
+        "run_id": secrets.token_hex(8),
+        "subdomain": subdomain,
+        "admin_email": admin_email.lower(),
+        "state": "queued",
+        "queued_at": time.time(),
+        "started_at": None,
+        "step": None,
+        "step_started_at": None,
+        "steps": [],
+    }
+    _PROVISION_RUNS[run["run_id"]] = run
+    return run
+
+
+def _close_provision_step(run: dict[str, Any]) -> None:
+    if run["steps"] and run["steps"][-1]["duration_sec"] is None:
+        current = run["steps"][-1]
+        current["duration_sec"] = round(time.time() - current["started_at"], 3)
+
+
+def _provision_step(run: dict[str, Any], step: str) -> None:
+    """Close the current step and start timing `step` (load = running provisions)."""
+    _close_provision_step(run)
+    now = time.time()
+    run["step"] = step
+    run["step_started_at"] = now
+    run["steps"].append({
+        "step": step,
+        "started_at": now,
+        "duration_sec": None,
+        "concurrency": max(1, _running_provision_count()),
+    })
+
+
+async def _finish_provision_run(run: dict[str, Any], success: bool) -> None:
+    global _provision_model
+
+    _close_provision_step(run)
+    _PROVISION_RUNS.pop(run["run_id"], None)
+    if not run["steps"]:
+        return
+    run["finished_at"] = time.time()
+    run["success"] = success
+    try:
+        await asyncio.to_thread(_provision_metrics.record_run, run)
+        samples = await asyncio.to_thread(_provision_metrics.step_samples)
+        _provision_model = StepDurationModel.from_samples(samples)
+    except Exception as e:
+        logger.warning(f"Could not persist provisioning metrics for {run['subdomain']}: {e}")
+
+
+def _provision_etas() -> list[dict[str, Any]]:
+    """ETA (seconds until done) for every queued or running provision."""
+    now = time.time()
+    load = max(1, _running_provision_count())
+    running = [r for r in _PROVISION_RUNS.values() if r["state"] == "running"]
+    queued = sorted(
+        (r for r in _PROVISION_RUNS.values() if r["state"] == "queued"),
+        key=lambda r: r["queued_at"],
+    )
+
+    jobs: list[dict[str, Any]] = []
+    running_remaining: list[float] = []
+    for r in running:
+        remaining = _provision_model.predict_remaining(
+            r["step"], now - (r["step_started_at"] or now), load
+        )
+        running_remaining.append(remaining)
+        jobs.append({
+            "run_id": r["run_id"],
+            "subdomain": r["subdomain"],
+            "state": "running",
+            "current_step": r["step"],
+            "steps_done": max(0, len(r["steps"]) - 1),
+            "steps_total": len(PROVISION_STEPS),
+            "elapsed_sec": round(now - (r["started_at"] or now), 1),
+            "eta_sec": round(remaining, 1),
+        })
+
+    queued_etas = forecast_queue(_provision_model, running_remaining, len(queued), PROVISION_CONCURRENCY)
+    for position, (r, eta) in enumerate(zip(queued, queued_etas)):
+        jobs.append({
+            "run_id": r["run_id"],
+            "subdomain": r["subdomain"],
+            "state": "queued",
+            "queue_position": position + 1,
+            "waiting_sec": round(now - r["queued_at"], 1),
+            "eta_sec": round(eta, 1),
+        })
+    return jobs
+
+
+@app.get("/api/v1/provision/eta")
+async def list_provision_etas(_auth: bool = Depends(verify_api_secret)):
+    """Predicted completion time for every queued or running provision."""
+    return {"jobs": _provision_etas()}
+
+
+@app.get("/api/v1/provision/eta/{subdomain}")
+async def get_provision_eta(subdomain: str, _auth: bool = Depends(verify_api_secret)):
+    """Predicted completion time for one tenant's provision (for the signup UI)."""
+    normalized = generate_subdomain(subdomain)
+    jobs = _provision_etas()
+    for job in jobs:
+        if job["subdomain"] == normalized:
+            return {"found": True, "job": job}
+    # Not started yet: forecast as if it were queued now.
+    etas = forecast_queue(
+        _provision_model,
+        [job["eta_sec"] for job in jobs if job["state"] == "running"],
+        sum(1 for job in jobs if job["state"] == "queued") + 1,
+        PROVISION_CONCURRENCY,
+    )
+    return {"found": False, "job": None, "predicted_eta_sec": round(etas[-1], 1)}
+
+
+@app.get("/api/v1/provision/capacity")
+async def get_provision_capacity(_auth: bool = Depends(verify_api_secret)):
+    """Sustainable provisions per hour for the current bench pool, from recorded step timings."""
+    pool = PROVISION_CONCURRENCY
+    runs_recorded = await asyncio.to_thread(_provision_metrics.run_count)
+    return {
+        "bench_pool_size": pool,
+        "running": _running_provision_count(),
+        "queued": sum(1 for r in _PROVISION_RUNS.values() if r["state"] == "queued"),
+        "runs_recorded": runs_recorded,
+        "predicted_run_sec": round(_provision_model.predict_total(pool), 1),
+        "sustainable_per_hour": round(sustainable_per_hour(_provision_model, pool), 2),
+        "by_concurrency": [
+            {
+                "concurrency": load,
+                "predicted_run_sec": round(_provision_model.predict_total(load), 1),
+                "per_hour": round(sustainable_per_hour(_provision_model, load), 2),
+            }
+            for load in range(1, max(4, pool * 2) + 1)
+        ],
+        "step_model": _provision_model.describe(),
+    }
+
+
+@app.post("/api/v1/provision", response_model=ProvisionResponse)
+async def provision_tenant(req: ProvisionRequest, _auth: bool = Depends(verify_api_secret)):
+    """Provision a tenant with strict role + DocPerm enforcement.
+
+    Runs wait for a free bench slot (PROVISION_CONCURRENCY) and execute off the
+    event loop, so ETA/capacity endpoints stay responsive while sites build.
+    A request for a subdomain or owner email that is already queued or running
+    is refused rather than racing the first run on the same site.
+    """
+    subdomain = generate_subdomain(req.organization_name)
+    admin_email = str(req.admin_email).lower()
+    if any(r["subdomain"] == subdomain or r["admin_email"] == admin_email for r in _PROVISION_RUNS.values()):
+        logger.warning(f"Provisioning of '{subdomain}' / {admin_email} is already in progress")
+        return ProvisionResponse(
+            success=False,
+            subdomain=subdomain,
+            error="Provisioning for this organization or email is already in progress",
+        )
+    run = _register_provision_run(subdomain, admin_email)
+    response: Optional[ProvisionResponse] = None
+    try:
+        async with _provision_slots:
+            run["state"] = "running"
+            run["started_at"] = time.time()
+            response = await asyncio.to_thread(
+                _provision_tenant_steps, req, run, asyncio.get_running_loop()
+            )
+        return response
+    finally:
+        if response and response.success:
+            _subdomain_index.add(run["subdomain"])
+            _invalidate_tenant_registry()
+        await _finish_provision_run(run, bool(response and response.success))
+
+
+def _provision_tenant_steps(
+    req: ProvisionRequest,
+    run: dict[str, Any],
+    loop: asyncio.AbstractEventLoop,
+) -> ProvisionResponse:
+    """Blocking provisioning pipeline; each step is timed on `run`."""
+    subdomain = generate_subdomain(req.organization_name)
+    site_name = get_site_name(subdomain)
+    admin_password = req.admin_password or secrets.token_urlsafe(16)
+    steps_completed: list[str] = []
+    api_key: Optional[str] = None
+    api_secret: Optional[str] = None
+    owner_api_keys: Optional[dict[str, Any]] = None
+
+    logger.info(f"═══ PROVISIONING START: {site_name} ═══")
+    logger.info(f"  org={req.organization_name} email={req.admin_email} plan={req.plan_type.value}")
+
+    # Step 0: pre-flight (idempotency guard)
+    _provision_step(run, "preflight")
     try:
         output = run_frappe_code(MASTER_SITE, f"""
 import json
@@ -1102,6 +2162,7 @@ print(json.dumps({{"subdomain_exists": bool(subdomain_exists), "email_exists": i
         logger.warning(f"Pre-flight check failed, proceeding anyway: {e}")
 
     # Step 1: create site
+    _provision_step(run, "site_create")
     try:
         result = run_bench_command(
             [
@@ -1131,6 +2192,7 @@ print(json.dumps({{"subdomain_exists": bool(subdomain_exists), "email_exists": i
         return ProvisionResponse(success=False, error=str(e), steps_completed=steps_completed)
 
     # Step 1b: ping check (must pass before continuing)
+    _provision_step(run, "ping")
     try:
         _ping_site_via_bench(site_name)
         steps_completed.append("ping_ok")
@@ -1145,6 +2207,7 @@ print(json.dumps({{"subdomain_exists": bool(subdomain_exists), "email_exists": i
         )
 
     # Step 2: install extra apps (erpnext is already installed in new-site)
+    _provision_step(run, "install_apps")
     for app_name in DEFAULT_APPS:
         app_name = app_name.strip()
         if not app_name or app_name == "erpnext":
@@ -1163,6 +2226,7 @@ print(json.dumps({{"subdomain_exists": bool(subdomain_exists), "email_exists": i
             logger.warning(f"Failed to install {app_name}: {e}")
 
     # Step 3: ensure required roles exist
+    _provision_step(run, "roles")
     try:
         roles_code = f"""
 import json
@@ -1186,6 +2250,7 @@ print(json.dumps({{"missing": missing, "created": created}}))
         return ProvisionResponse(success=False, site_name=site_name, subdomain=subdomain, error=str(e), steps_completed=steps_completed)
 
     # Step 4: generate master (Administrator) API keys
+    _provision_step(run, "administrator_keys")
     try:
         admin_key_code = """
 import json
@@ -1205,12 +2270,15 @@ print(json.dumps({"api_key": api_key, "api_secret": api_secret}))
         return ProvisionResponse(success=False, site_name=site_name, subdomain=subdomain, error=str(e), steps_completed=steps_completed)
 
     # Step 5: create tenant owner with only System Manager + All
+    _provision_step(run, "owner")
     try:
         first_name = (req.admin_full_name or req.organization_name).split(" ")[0]
         last_name = " ".join((req.admin_full_name or req.organization_name).split(" ")[1:])
         owner_code = f"""
 import json
 import frappe.utils.password
+{_MINT_USER_KEYS_SNIPPET}
+{_tenant_config_code(site_name)}
 email = {json.dumps(str(req.admin_email))}
 first_name = {json.dumps(first_name)}
 last_name = {json.dumps(last_name)}
@@ -1235,15 +2303,24 @@ user.roles = []
 for role_name in owner_roles:
     user.append("roles", {{"role": role_name, "doctype": "Has Role"}})
 user.save(ignore_permissions=True)
+try:
+    api_keys = mint_user_keys(email)
+except Exception as exc:
+    api_keys = {{"error": str(exc)}}
 
 frappe.db.commit()
-print(json.dumps({{"roles": [r.role for r in user.roles]}}, default=str))
+print(json.dumps({{"roles": [r.role for r in user.roles], "api_keys": api_keys}}, default=str))
 """
-        _parse_json_output(run_frappe_code(site_name, owner_code))
+        owner_result = _parse_json_output(run_frappe_code(site_name, owner_code))
         steps_completed.append("owner_created")
+        if _cache_minted_keys(site_name, str(req.admin_email), owner_result.get("api_keys")):
+            owner_api_keys = owner_result["api_keys"]
+            steps_completed.append("owner_keys_minted")
     except Exception as e:
         logger.error(f"Owner creation failed: {e}")
-        _cleanup_failed_site(site_name)
+        # Only drop a site this run created; "site_exists" may be a live tenant.
+        if "site_created" in steps_completed:
+            loop.call_soon_threadsafe(_cleanup_failed_site, site_name)
         return ProvisionResponse(
             success=False,
             error=f"Owner user creation failed: {e}",
@@ -1251,6 +2328,7 @@ print(json.dumps({{"roles": [r.role for r in user.roles]}}, default=str))
         )
 
     # Step 5b: verify owner roles and patch if required
+    _provision_step(run, "owner_roles")
     try:
         role_verify_code = f"""
 import json
@@ -1276,6 +2354,7 @@ print(json.dumps({{"roles": current_roles}}))
         return ProvisionResponse(success=False, site_name=site_name, subdomain=subdomain, error=str(e), steps_completed=steps_completed)
 
     # Step 5.9: Agent Action Log + Agent Audit Log (required for Agent Inbox / agentic-ai plugin)
+    _provision_step(run, "agent_doctypes")
     try:
         agent_dt_result = seed_agent_doctypes_on_site(site_name)
         if agent_dt_result.get("errors"):
@@ -1299,49 +2378,9 @@ print(json.dumps({{"roles": current_roles}}))
         )
 
     # Step 6: set DocPerm matrix
+    _provision_step(run, "docperms")
     try:
-        docperm_code = f"""
-import json
-matrix = {json.dumps(DOC_PERM_MINIMUM)}
-updated = []
-for row in matrix:
-    filters = {{
-        "parent": row["doctype"],
-        "parenttype": "DocType",
-        "parentfield": "permissions",
-        "role": row["role"],
-        "permlevel": 0,
-    }}
-    name = frappe.db.exists("DocPerm", filters)
-    doc = frappe.get_doc("DocPerm", name) if name else frappe.new_doc("DocPerm")
-    doc.parent = row["doctype"]
-    doc.parenttype = "DocType"
-    doc.parentfield = "permissions"
-    doc.role = row["role"]
-    doc.permlevel = 0
-    doc.read = int(row["read"])
-    doc.write = int(row["write"])
-    doc.create = int(row["create"])
-    doc.delete = int(row["delete"])
-    doc.submit = 0
-    doc.amend = 0
-    if name:
-        doc.save(ignore_permissions=True)
-    else:
-        doc.insert(ignore_permissions=True)
-    updated.append(f'{{row["doctype"]}}:{{row["role"]}}')
-frappe.db.commit()
-# Refresh cached doctype meta so the new DocPerm rows take effect on live
-# web workers (committing alone leaves workers on the stale perm matrix).
-_cleared = []
-for row in matrix:
-    dt = row["doctype"]
-    if dt not in _cleared:
-        _cleared.append(dt)
-        frappe.clear_cache(doctype=dt)
-frappe.clear_cache()
-print(json.dumps({{"updated": updated, "count": len(updated)}}))
-"""
+        docperm_code = build_docperm_reconcile_code(DOC_PERM_MINIMUM)
         docperm_result = _parse_json_output(run_frappe_code(site_name, docperm_code))
         if int(docperm_result.get("count", 0)) < len(DOC_PERM_MINIMUM):
             raise Exception(f"DocPerm incomplete: {docperm_result}")
@@ -1350,62 +2389,10 @@ print(json.dumps({{"updated": updated, "count": len(updated)}}))
         return ProvisionResponse(success=False, site_name=site_name, subdomain=subdomain, error=f"DocPerm setup failed: {e}", steps_completed=steps_completed)
 
     # Step 6b: seed required Custom Fields (rental fields on line items)
+    _provision_step(run, "custom_fields")
     # This prevents Frappe from silently dropping the app's custom_* payload on insert/save.
     try:
-        seed_cf_code = """import json
-
-result = {"created": [], "skipped": [], "errors": []}
-TARGET_DOCTYPES = ["Quotation Item", "Sales Order Item", "Sales Invoice Item"]
-FIELD_SPECS = [
-  {"fieldname": "custom_is_rental", "label": "Is Rental", "fieldtype": "Check", "insert_after": "description"},
-  {"fieldname": "custom_rental_type", "label": "Rental Type", "fieldtype": "Select", "options": "Hours\\nDays\\nMonths", "insert_after": "custom_is_rental"},
-  {"fieldname": "custom_rental_duration", "label": "Rental Duration", "fieldtype": "Int", "insert_after": "custom_rental_type"},
-  {"fieldname": "custom_rental_start_date", "label": "Rental Start Date", "fieldtype": "Date", "insert_after": "custom_rental_duration"},
-  {"fieldname": "custom_rental_end_date", "label": "Rental End Date", "fieldtype": "Date", "insert_after": "custom_rental_start_date"},
-  {"fieldname": "custom_rental_start_time", "label": "Rental Start Time", "fieldtype": "Time", "insert_after": "custom_rental_end_date"},
-  {"fieldname": "custom_rental_end_time", "label": "Rental End Time", "fieldtype": "Time", "insert_after": "custom_rental_start_time"},
-  {"fieldname": "custom_requires_operator", "label": "Requires Operator", "fieldtype": "Check", "insert_after": "custom_rental_end_time"},
-  {"fieldname": "custom_operator_included", "label": "Operator Included", "fieldtype": "Check", "insert_after": "custom_requires_operator"},
-  {"fieldname": "custom_operator_name", "label": "Operator Name", "fieldtype": "Data", "insert_after": "custom_operator_included"},
-  {"fieldname": "custom_base_rental_cost", "label": "Base Rental Cost", "fieldtype": "Currency", "insert_after": "custom_operator_name"},
-  {"fieldname": "custom_accommodation_charges", "label": "Accommodation Charges", "fieldtype": "Currency", "insert_after": "custom_base_rental_cost"},
-  {"fieldname": "custom_usage_charges", "label": "Usage Charges", "fieldtype": "Currency", "insert_after": "custom_accommodation_charges"},
-  {"fieldname": "custom_fuel_charges", "label": "Fuel Charges", "fieldtype": "Currency", "insert_after": "custom_usage_charges"},
-  {"fieldname": "custom_elongation_charges", "label": "Elongation Charges", "fieldtype": "Currency", "insert_after": "custom_fuel_charges"},
-  {"fieldname": "custom_risk_charges", "label": "Risk Charges", "fieldtype": "Currency", "insert_after": "custom_elongation_charges"},
-  {"fieldname": "custom_commercial_charges", "label": "Commercial Charges", "fieldtype": "Currency", "insert_after": "custom_risk_charges"},
-  {"fieldname": "custom_incidental_charges", "label": "Incidental Charges", "fieldtype": "Currency", "insert_after": "custom_commercial_charges"},
-  {"fieldname": "custom_other_charges", "label": "Other Charges", "fieldtype": "Currency", "insert_after": "custom_incidental_charges"},
-  {"fieldname": "custom_total_rental_cost", "label": "Total Rental Cost", "fieldtype": "Currency", "insert_after": "custom_other_charges"},
-  {"fieldname": "custom_rental_data", "label": "Rental Data", "fieldtype": "Long Text", "insert_after": "custom_total_rental_cost"},
-]
-
-def upsert(dt: str, spec: dict):
-    try:
-        if frappe.db.exists("Custom Field", {"dt": dt, "fieldname": spec["fieldname"]}):
-            result["skipped"].append(f"{dt}:{spec['fieldname']}")
-            return
-        doc = frappe.get_doc({
-            "doctype": "Custom Field",
-            "dt": dt,
-            "fieldname": spec["fieldname"],
-            "label": spec.get("label") or spec["fieldname"],
-            "fieldtype": spec.get("fieldtype") or "Data",
-            "insert_after": spec.get("insert_after") or "description",
-            "options": spec.get("options") or None,
-        })
-        doc.insert(ignore_permissions=True)
-        result["created"].append(f"{dt}:{spec['fieldname']}")
-    except Exception as exc:
-        result["errors"].append(f"{dt}:{spec.get('fieldname')}: {exc}")
-
-for dt in TARGET_DOCTYPES:
-    for spec in FIELD_SPECS:
-        upsert(dt, spec)
-
-frappe.db.commit()
-print(json.dumps(result))
-"""
+        seed_cf_code = build_seed_custom_fields_frappe_code(rental_custom_field_targets())
         cf_result = _parse_json_output(run_frappe_code(site_name, seed_cf_code))
         steps_completed.append("custom_fields_seeded")
         if cf_result.get("errors"):
@@ -1416,6 +2403,7 @@ print(json.dumps(result))
         steps_completed.append("custom_fields_seed_failed")
 
     # Step 6c: seed tenant defaults (includes Fiscal Year + selling price list).
+    _provision_step(run, "defaults")
     # This is CRITICAL for production: without an active Fiscal Year that covers
     # today, ERPNext will block submissions with FiscalYearError.
     try:
@@ -1540,21 +2528,22 @@ print(json.dumps(result))
         logger.warning(f"Defaults seeding failed (non-fatal) for {site_name}: {e}")
         steps_completed.append("defaults_seed_failed")
 
-    # Step 7: generate API key for tenant admin
+    # Step 7: API key for tenant admin — the pair minted (and cached) by the
+    # owner step; only if that failed are keys read or minted here. Never
+    # rotates, so the cached pair stays valid for the owner's first login.
+    _provision_step(run, "owner_keys")
     try:
-        owner_key_code = f"""
+        owner_key_result = owner_api_keys
+        if not owner_key_result:
+            owner_key_code = f"""
 import json
-email = {json.dumps(str(req.admin_email))}
-user = frappe.get_doc("User", email)
-api_key = frappe.generate_hash(length=15)
-api_secret = frappe.generate_hash(length=15)
-user.api_key = api_key
-user.api_secret = api_secret
-user.save(ignore_permissions=True)
+{_MINT_USER_KEYS_SNIPPET}
+keys = mint_user_keys({json.dumps(str(req.admin_email))})
 frappe.db.commit()
-print(json.dumps({{"api_key": api_key, "api_secret": api_secret}}))
+print(json.dumps(keys, default=str))
 """
-        owner_key_result = _parse_json_output(run_frappe_code(site_name, owner_key_code))
+            owner_key_result = _parse_json_output(run_frappe_code(site_name, owner_key_code))
+            _cache_minted_keys(site_name, str(req.admin_email), owner_key_result)
         api_key = owner_key_result.get("api_key")
         api_secret = owner_key_result.get("api_secret")
         if not api_key or not api_secret:
@@ -1564,6 +2553,7 @@ print(json.dumps({{"api_key": api_key, "api_secret": api_secret}}))
         return ProvisionResponse(success=False, site_name=site_name, subdomain=subdomain, error=f"Owner API key generation failed: {e}", steps_completed=steps_completed)
 
     # Existing behavior: register tenant in master DB
+    _provision_step(run, "register")
     try:
         protocol = "https" if IS_PRODUCTION else "http"
         site_url = f"{protocol}://{site_name}"
@@ -1607,6 +2597,8 @@ else:
 
         steps_completed.append("master_db_registered")
         logger.info(f"Master DB registration ({reg_result.get('action', 'done')})")
+        if _index_tenant_member(subdomain, str(req.admin_email)):
+            steps_completed.append("owner_member_indexed")
 
     except Exception as e:
         logger.error(f"Master DB registration failed: {e}")
@@ -1622,6 +2614,7 @@ else:
         )
 
     # Step 8: validation checks (all must pass)
+    _provision_step(run, "validation")
     warnings = []
     checks = {
         "site_alive": False,
@@ -1669,6 +2662,7 @@ else:
         )
 
     # Keep prior nginx behavior for production.
+    _provision_step(run, "nginx")
     if IS_PRODUCTION:
         try:
             result = run_bench_command(["setup", "nginx", "--yes"], timeout=60)
@@ -1720,18 +2714,211 @@ else:
     )
 
 
+# ============================================================================
+# Seed manifests — fingerprinted so self-heal calls are no-ops when unchanged
+# ============================================================================
+
+_seed_fingerprints = SeedFingerprintStore(PROVISIONING_DATA_DIR / "seed_fingerprints.sqlite3")
+
+
+def _fingerprint_matches(applied: Optional[dict[str, Any]], fingerprint: str) -> bool:
+    return bool(applied) and applied["hash"] == fingerprint
+
+
+def _seed_result_clean(result: dict) -> bool:
+    return bool(result) and not result.get("errors")
+
+
+def _agent_seed_result_clean(result: dict) -> bool:
+    return _seed_result_clean(result) and not (result.get("custom_fields") or {}).get("errors")
+
+
+# (site, manifest) -> when its last out-of-band drift probe started.
+_seed_probe_started: dict[tuple[str, str], float] = {}
+
+
+def _scanned_seed_drift(site_name: str, manifest: str) -> Optional[list[str]]:
+    """Checks of `manifest` a fresh fleet drift scan found drifted on the site;
+    None when there is no fresh scan covering all of them."""
+    entry = _DRIFT_CACHE.get(site_name)
+    checks = SEED_DRIFT_CHECKS[manifest]
+    if (
+        not entry
+        or time.time() - entry["checked_at"] >= FLEET_DRIFT_TTL_SEC
+        or any(name not in entry["checks"] for name in checks)
+    ):
+        return None
+    return [name for name in checks if not entry["checks"][name].get("ok")]
+
+
+def _probe_seed_drift(site_name: str, manifest: str, started: float, prelude: str, heal: str) -> None:
+    """Run the manifest's SEED_DRIFT_CHECKS on the site (no manifest writes) and,
+    when clean, the `heal` expression defined in `prelude`. Drift forgets the
+    applied fingerprint, so the next seed call reconciles."""
+    probe_code = build_drift_check_code(
+        SEED_DRIFT_CHECKS[manifest],
+        prelude=prelude,
+        finish=f"""drifted = {{name: entry for name, entry in report.items() if not entry["ok"]}}
+print(json.dumps({{"drifted": drifted, "healed": None if drifted else {heal or "None"}}}, default=str))""",
+    )
+    try:
+        probe = _parse_json_output(run_frappe_code(site_name, probe_code))
+        if "drifted" not in probe:
+            raise Exception(f"drift probe returned no result: {probe}")
+    except Exception as exc:
+        logger.warning(f"{manifest} drift probe failed on {site_name}: {exc}")
+        _seed_probe_started.pop((site_name, manifest), None)
+        return
+    if probe["drifted"]:
+        applied = _seed_fingerprints.get(site_name, manifest)
+        # A reconcile that finished after the probe started already fixed it.
+        if applied and applied["applied_at"] <= started:
+            _seed_fingerprints.invalidate(site_name, manifest)
+        logger.info(f"{manifest} drifted on {site_name}: {sorted(probe['drifted'])}; next seed call reconciles")
+    elif probe.get("healed"):
+        logger.info(f"{manifest} heal on {site_name}: {probe['healed']}")
+
+
+def _schedule_seed_drift_probe(site_name: str, manifest: str, prelude: str, heal: str) -> None:
+    now = time.time()
+    if now - _seed_probe_started.get((site_name, manifest), 0) < SEED_DRIFT_PROBE_SEC:
+        return
+    for key in [k for k, at in _seed_probe_started.items() if now - at >= SEED_DRIFT_PROBE_SEC]:
+        del _seed_probe_started[key]
+    _seed_probe_started[(site_name, manifest)] = now
+    asyncio.get_running_loop().create_task(
+        asyncio.to_thread(_probe_seed_drift, site_name, manifest, now, prelude, heal)
+    )
+
+
+def _seed_with_fingerprint(
+    site_name: str,
+    manifest: str,
+    fingerprint: str,
+    force: bool,
+    reconcile: Callable[[], dict],
+    succeeded: Callable[[dict], bool],
+    prelude: str = "",
+    heal: str = "",
+) -> dict[str, Any]:
+    """Return the stored result, with no tenant round trip, when `fingerprint` was
+    already applied to the site.
+
+    Drift is caught out of band: a fresh fleet drift scan that saw the manifest's
+    checks fail triggers a reconcile here, and otherwise a background probe
+    (at most every SEED_DRIFT_PROBE_SEC) forgets the fingerprint when the site
+    drifted. A full reconcile runs when the manifest changed, drift was seen,
+    or `force` is set. Only clean reconciles are recorded, so failures are
+    retried on the next call.
+    """
+    applied = _seed_fingerprints.get(site_name, manifest)
+    drifted: Optional[list[str]] = None
+    if not force and _fingerprint_matches(applied, fingerprint):
+        drifted = _scanned_seed_drift(site_name, manifest)
+        if not drifted:
+            if drifted is None:
+                _schedule_seed_drift_probe(site_name, manifest, prelude, heal)
+            return {
+                "success": True,
+                "site": site_name,
+                "result": applied["result"],
+                "cached": True,
+                "fingerprint": fingerprint,
+            }
+        logger.info(f"{manifest} drifted on {site_name} per the fleet drift scan: {drifted}; reconciling")
+
+    result = reconcile()
+    _DRIFT_CACHE.pop(site_name, None)
+    if succeeded(result):
+        _seed_fingerprints.set(site_name, manifest, fingerprint, result)
+    return {
+        "success": True,
+        "site": site_name,
+        "result": result,
+        "cached": False,
+        "drifted": drifted or None,
+        "fingerprint": fingerprint,
+    }
+
+
+# Read access to dropdown doctypes and the domain manager roles of System
+# Managers. Depends on the users on the site, not on the defaults manifest, so
+# it also runs in the out-of-band drift probe of seed-defaults calls answered
+# from the fingerprint.
+_DEFAULTS_HEAL_SNIPPET = """
+def heal_defaults():
+    healed = {}
+
+    # Fix DocPerms for dropdowns so standard users can read them
+    docperms_fixed = []
+    read_doctypes = ["Item Group", "Brand", "Opportunity Type", "Sales Stage", "Designation", "UOM", "Manufacturer"]
+    for dt in read_doctypes:
+        if not frappe.db.exists("DocPerm", {"parent": dt, "role": "All", "permlevel": 0}):
+            try:
+                doc = frappe.new_doc("DocPerm")
+                doc.parent = dt
+                doc.parenttype = "DocType"
+                doc.parentfield = "permissions"
+                doc.role = "All"
+                doc.permlevel = 0
+                doc.read = 1
+                doc.insert(ignore_permissions=True)
+                docperms_fixed.append(dt)
+            except Exception:
+                pass
+    healed["docperms"] = f"fixed read access: {docperms_fixed}" if docperms_fixed else "all ok"
+
+    # Self-heal existing System Managers by guaranteeing they have all domain manager roles
+    sm_users = frappe.get_all("Has Role", filters={"role": "System Manager", "parenttype": "User"}, fields=["parent"])
+    healed_users = []
+    domain_roles = ["Sales Manager", "Accounts Manager", "Projects Manager", "Stock Manager", "Employee"]
+    for ur in sm_users:
+        user_email = ur.get("parent")
+        if user_email and user_email != "Administrator":
+            user_doc = frappe.get_doc("User", user_email)
+            current_roles = [r.role for r in user_doc.roles]
+            added = False
+            for r in domain_roles:
+                if r not in current_roles:
+                    user_doc.append("roles", {"role": r, "doctype": "Has Role"})
+                    added = True
+            if added:
+                user_doc.save(ignore_permissions=True)
+                healed_users.append(user_email)
+    if healed_users:
+        healed["healed_users"] = healed_users
+
+    frappe.db.commit()
+
+    # Refresh cached doctype meta / user role caches so the DocPerm read-access
+    # fixes and self-healed roles above take effect on live web workers instead
+    # of being masked by the stale cached permission matrix.
+    for dt in docperms_fixed:
+        frappe.clear_cache(doctype=dt)
+    for u in healed_users:
+        frappe.clear_cache(user=u)
+    if docperms_fixed or healed_users:
+        frappe.clear_cache()
+    return healed
+"""
+
+
 @app.post("/api/v1/seed-defaults/{subdomain}")
-async def seed_tenant_defaults(subdomain: str, _auth: bool = Depends(verify_api_secret)):
+async def seed_tenant_defaults(
+    subdomain: str,
+    force: bool = False,
+    _auth: bool = Depends(verify_api_secret),
+):
     """
     Re-seed tree defaults (Territory, Customer Group, Item Groups, CRM data) for an existing tenant.
     Uses ignore_permissions=True so regular tenant users don't need System Manager.
-    Idempotent — safe to call multiple times.
+    Idempotent — safe to call multiple times; a no-op while the defaults manifest is unchanged.
     """
     site_name = f"{subdomain}.{PARENT_DOMAIN}" if IS_PRODUCTION else f"{subdomain}.localhost"
 
     seed_code = """import json
 import datetime
-
+""" + MASTER_DATA_SEED_SNIPPET + _DEFAULTS_HEAL_SNIPPET + """
 result = {"territory": "skipped", "customer_group": "skipped", "item_groups": "skipped", "opportunity_types": "skipped", "sales_stages": "skipped", "price_list": "skipped", "selling_settings": "skipped", "fiscal_year": "skipped"}
 
 # Selling Price List (required for Quotation / Sales Order / Sales Invoice)
@@ -1840,62 +3027,19 @@ try:
 except Exception as _fy_err:
     result["fiscal_year"] = f"error: {_fy_err}"
 
+# Tree master data: missing nodes are bulk inserted and each tree's nested set
+# is rebuilt once, instead of a controller insert renumbering lft/rgt per node.
 # Territory tree (All Territories → India)
-territory_root = frappe.get_all("Territory", filters={"parent_territory": ""}, fields=["name"], limit=1)
-if not territory_root:
-    if not frappe.db.exists("Territory", "All Territories"):
-        frappe.get_doc({
-            "doctype": "Territory",
-            "territory_name": "All Territories",
-            "is_group": 1,
-        }).insert(ignore_permissions=True)
-    if not frappe.db.exists("Territory", "India"):
-        frappe.get_doc({
-            "doctype": "Territory",
-            "territory_name": "India",
-            "parent_territory": "All Territories",
-            "is_group": 0,
-        }).insert(ignore_permissions=True)
-    result["territory"] = "seeded"
-else:
-    result["territory"] = f"exists: {territory_root[0].get('name')}"
+result["territory"] = seed_tree("Territory", "All Territories", ["India"])
 
 # Customer Group tree (All Customer Groups → Commercial / Individual / Retail)
-cg_root_list = frappe.get_all("Customer Group", filters={"parent_customer_group": ""}, fields=["name"], limit=1)
-if not cg_root_list:
-    if not frappe.db.exists("Customer Group", "All Customer Groups"):
-        frappe.get_doc({
-            "doctype": "Customer Group",
-            "customer_group_name": "All Customer Groups",
-            "is_group": 1,
-        }).insert(ignore_permissions=True)
-    for cg_name in ["Commercial", "Individual", "Retail"]:
-        if not frappe.db.exists("Customer Group", cg_name):
-            frappe.get_doc({
-                "doctype": "Customer Group",
-                "customer_group_name": cg_name,
-                "parent_customer_group": "All Customer Groups",
-                "is_group": 0,
-            }).insert(ignore_permissions=True)
-    result["customer_group"] = "seeded"
-else:
-    result["customer_group"] = f"exists: {cg_root_list[0].get('name')}"
+result["customer_group"] = seed_tree("Customer Group", "All Customer Groups", ["Commercial", "Individual", "Retail"])
 
 # Item Group tree (All Item Groups → leaf groups for equipment rental)
-ig_leaves = frappe.get_all("Item Group", filters={"is_group": 0}, fields=["name"], limit=1)
-if not ig_leaves:
-    # Ensure root group exists
-    ig_roots = frappe.get_all("Item Group", filters={"is_group": 1}, fields=["name"], limit=1)
-    root_group = ig_roots[0].get("name") if ig_roots else "All Item Groups"
-    if not ig_roots:
-        frappe.get_doc({
-            "doctype": "Item Group",
-            "item_group_name": "All Item Groups",
-            "is_group": 1,
-        }).insert(ignore_permissions=True)
-        root_group = "All Item Groups"
-
-    leaf_groups = [
+result["item_groups"] = seed_tree(
+    "Item Group",
+    "All Item Groups",
+    [
         "Heavy Equipment Rental",
         "Construction Services",
         "Consulting",
@@ -1904,125 +3048,67 @@ if not ig_leaves:
         "Spare Parts",
         "Equipment",
         "Consumables",
-    ]
-    created_groups = []
-    for group_name in leaf_groups:
-        if not frappe.db.exists("Item Group", group_name):
-            frappe.get_doc({
-                "doctype": "Item Group",
-                "item_group_name": group_name,
-                "parent_item_group": root_group,
-                "is_group": 0,
-            }).insert(ignore_permissions=True)
-            created_groups.append(group_name)
-    result["item_groups"] = f"seeded: {created_groups}" if created_groups else "seeded (all already existed)"
-else:
-    result["item_groups"] = f"exists: {len(ig_leaves)}+ groups"
+    ],
+    seed_when="no_leaf",
+)
 
 # Opportunity Types (for CRM)
-opp_types = ["Sales", "Rental", "Maintenance", "Service"]
-created_opp = []
-for opp_name in opp_types:
-    if not frappe.db.exists("Opportunity Type", opp_name):
-        frappe.get_doc({
-            "doctype": "Opportunity Type",
-            "name": opp_name,
-        }).insert(ignore_permissions=True)
-        created_opp.append(opp_name)
+created_opp = seed_flat_master("Opportunity Type", None, ["Sales", "Rental", "Maintenance", "Service"])
 result["opportunity_types"] = f"seeded: {created_opp}" if created_opp else "all exist"
 
 # Sales Stages (for CRM)
-sales_stages = ["Prospecting", "Qualification", "Needs Analysis", "Proposal", "Negotiation", "Won", "Lost"]
-created_stages = []
-for stage_name in sales_stages:
-    if not frappe.db.exists("Sales Stage", stage_name):
-        frappe.get_doc({
-            "doctype": "Sales Stage",
-            "stage_name": stage_name,
-        }).insert(ignore_permissions=True)
-        created_stages.append(stage_name)
+created_stages = seed_flat_master(
+    "Sales Stage",
+    "stage_name",
+    ["Prospecting", "Qualification", "Needs Analysis", "Proposal", "Negotiation", "Won", "Lost"],
+)
 result["sales_stages"] = f"seeded: {created_stages}" if created_stages else "all exist"
 
 # Standard UOMs (Unit of Measure)
-uoms = ["Nos", "Unit", "Kg", "M", "Hr", "Day", "Month", "Hour"]
-created_uoms = []
-for uom_name in uoms:
-    if not frappe.db.exists("UOM", uom_name):
-        frappe.get_doc({
-            "doctype": "UOM",
-            "uom_name": uom_name,
-            "must_be_whole_number": 1 if uom_name in ("Nos", "Unit") else 0
-        }).insert(ignore_permissions=True)
-        created_uoms.append(uom_name)
+created_uoms = seed_flat_master(
+    "UOM",
+    "uom_name",
+    [
+        {"name": uom_name, "must_be_whole_number": 1 if uom_name in ("Nos", "Unit") else 0}
+        for uom_name in ["Nos", "Unit", "Kg", "M", "Hr", "Day", "Month", "Hour"]
+    ],
+)
 result["uoms"] = f"seeded: {created_uoms}" if created_uoms else "all exist"
 
 
-# Fix DocPerms for dropdowns so standard users can read them
-docperms_fixed = []
-read_doctypes = ["Item Group", "Brand", "Opportunity Type", "Sales Stage", "Designation", "UOM", "Manufacturer"]
-for dt in read_doctypes:
-    if not frappe.db.exists("DocPerm", {"parent": dt, "role": "All", "permlevel": 0}):
-        try:
-            doc = frappe.new_doc("DocPerm")
-            doc.parent = dt
-            doc.parenttype = "DocType"
-            doc.parentfield = "permissions"
-            doc.role = "All"
-            doc.permlevel = 0
-            doc.read = 1
-            doc.insert(ignore_permissions=True)
-            docperms_fixed.append(dt)
-        except Exception:
-            pass
-result["docperms"] = f"fixed read access: {docperms_fixed}" if docperms_fixed else "all ok"
-
-# Self-heal existing System Managers by guaranteeing they have all domain manager roles
-sm_users = frappe.get_all("Has Role", filters={"role": "System Manager", "parenttype": "User"}, fields=["parent"])
-healed_users = []
-domain_roles = ["Sales Manager", "Accounts Manager", "Projects Manager", "Stock Manager", "Employee"]
-for ur in sm_users:
-    user_email = ur.get("parent")
-    if user_email and user_email != "Administrator":
-        user_doc = frappe.get_doc("User", user_email)
-        current_roles = [r.role for r in user_doc.roles]
-        added = False
-        for r in domain_roles:
-            if r not in current_roles:
-                user_doc.append("roles", {"role": r, "doctype": "Has Role"})
-                added = True
-        if added:
-            user_doc.save(ignore_permissions=True)
-            healed_users.append(user_email)
-if healed_users:
-    result["healed_users"] = healed_users
-
 frappe.db.commit()
-
-# Refresh cached doctype meta / user role caches so the DocPerm read-access
-# fixes and self-healed roles above take effect on live web workers instead
-# of being masked by the stale cached permission matrix.
-for dt in docperms_fixed:
-    frappe.clear_cache(doctype=dt)
-for u in healed_users:
-    frappe.clear_cache(user=u)
-if docperms_fixed or healed_users:
-    frappe.clear_cache()
+result.update(heal_defaults())
 
 print(json.dumps(result))
 """
 
-    try:
-        output = run_frappe_code(site_name, seed_code)
-        seed_result = _parse_json_output(output)
+    def reconcile() -> dict:
+        seed_result = _parse_json_output(run_frappe_code(site_name, seed_code))
         logger.info(f"seed-defaults for {site_name}: {seed_result}")
-        return {"success": True, "site": site_name, "result": seed_result}
+        return seed_result
+
+    try:
+        return _seed_with_fingerprint(
+            site_name,
+            "defaults",
+            manifest_hash(seed_code),
+            force,
+            reconcile,
+            lambda r: bool(r) and not any(str(v).startswith("error:") for v in r.values()),
+            prelude=_DEFAULTS_HEAL_SNIPPET,
+            heal="heal_defaults()",
+        )
     except Exception as e:
         logger.error(f"seed-defaults failed for {site_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/v1/seed-custom-fields/{subdomain}")
-async def seed_tenant_custom_fields(subdomain: str, _auth: bool = Depends(verify_api_secret)):
+async def seed_tenant_custom_fields(
+    subdomain: str,
+    force: bool = False,
+    _auth: bool = Depends(verify_api_secret),
+):
     """
     Ensure required Custom Fields exist on tenant DocTypes (idempotent).
     This is the production-safe way to guarantee the web app's custom_* fields
@@ -2035,90 +3121,33 @@ async def seed_tenant_custom_fields(subdomain: str, _auth: bool = Depends(verify
 
     site_name = get_site_name(subdomain)
 
-    custom_fields_code = """import json
-
-result = {"created": [], "skipped": [], "errors": []}
-
-# Rental fields used by Nexus ERP frontend.
-# These MUST exist on the tenant site or rental data will be dropped on insert.
-TARGET_DOCTYPES = ["Quotation Item", "Sales Order Item", "Sales Invoice Item"]
-
-FIELD_SPECS = [
-  # Rental flags + schedule
-  {"fieldname": "custom_is_rental", "label": "Is Rental", "fieldtype": "Check", "insert_after": "description"},
-  {"fieldname": "custom_rental_type", "label": "Rental Type", "fieldtype": "Select", "options": "Hours\\nDays\\nMonths", "insert_after": "custom_is_rental"},
-  {"fieldname": "custom_rental_duration", "label": "Rental Duration", "fieldtype": "Int", "insert_after": "custom_rental_type"},
-  {"fieldname": "custom_rental_start_date", "label": "Rental Start Date", "fieldtype": "Date", "insert_after": "custom_rental_duration"},
-  {"fieldname": "custom_rental_end_date", "label": "Rental End Date", "fieldtype": "Date", "insert_after": "custom_rental_start_date"},
-  {"fieldname": "custom_rental_start_time", "label": "Rental Start Time", "fieldtype": "Time", "insert_after": "custom_rental_end_date"},
-  {"fieldname": "custom_rental_end_time", "label": "Rental End Time", "fieldtype": "Time", "insert_after": "custom_rental_start_time"},
-
-  # Operator
-  {"fieldname": "custom_requires_operator", "label": "Requires Operator", "fieldtype": "Check", "insert_after": "custom_rental_end_time"},
-  {"fieldname": "custom_operator_included", "label": "Operator Included", "fieldtype": "Check", "insert_after": "custom_requires_operator"},
-  {"fieldname": "custom_operator_name", "label": "Operator Name", "fieldtype": "Data", "insert_after": "custom_operator_included"},
-
-  # Pricing components (Currency so ERPNext formats correctly)
-  {"fieldname": "custom_base_rental_cost", "label": "Base Rental Cost", "fieldtype": "Currency", "insert_after": "custom_operator_name"},
-  {"fieldname": "custom_accommodation_charges", "label": "Accommodation Charges", "fieldtype": "Currency", "insert_after": "custom_base_rental_cost"},
-  {"fieldname": "custom_usage_charges", "label": "Usage Charges", "fieldtype": "Currency", "insert_after": "custom_accommodation_charges"},
-  {"fieldname": "custom_fuel_charges", "label": "Fuel Charges", "fieldtype": "Currency", "insert_after": "custom_usage_charges"},
-  {"fieldname": "custom_elongation_charges", "label": "Elongation Charges", "fieldtype": "Currency", "insert_after": "custom_fuel_charges"},
-  {"fieldname": "custom_risk_charges", "label": "Risk Charges", "fieldtype": "Currency", "insert_after": "custom_elongation_charges"},
-  {"fieldname": "custom_commercial_charges", "label": "Commercial Charges", "fieldtype": "Currency", "insert_after": "custom_risk_charges"},
-  {"fieldname": "custom_incidental_charges", "label": "Incidental Charges", "fieldtype": "Currency", "insert_after": "custom_commercial_charges"},
-  {"fieldname": "custom_other_charges", "label": "Other Charges", "fieldtype": "Currency", "insert_after": "custom_incidental_charges"},
-  {"fieldname": "custom_total_rental_cost", "label": "Total Rental Cost", "fieldtype": "Currency", "insert_after": "custom_other_charges"},
-
-  # Debug/support payload (JSON string)
-  {"fieldname": "custom_rental_data", "label": "Rental Data", "fieldtype": "Long Text", "insert_after": "custom_total_rental_cost"},
-]
-
-def upsert_custom_field(dt: str, spec: dict):
-    try:
-        existing = frappe.db.exists("Custom Field", {"dt": dt, "fieldname": spec["fieldname"]})
-        if existing:
-            result["skipped"].append(f"{dt}:{spec['fieldname']}")
-            return
-
-        doc = frappe.get_doc({
-            "doctype": "Custom Field",
-            "dt": dt,
-            "fieldname": spec["fieldname"],
-            "label": spec.get("label") or spec["fieldname"],
-            "fieldtype": spec.get("fieldtype") or "Data",
-            "insert_after": spec.get("insert_after") or "description",
-            "options": spec.get("options") or None,
-            "reqd": 0,
-            "read_only": 0,
-            "no_copy": 0,
-            "print_hide": 0,
-        })
-        doc.insert(ignore_permissions=True)
-        result["created"].append(f"{dt}:{spec['fieldname']}")
-    except Exception as exc:
-        result["errors"].append(f"{dt}:{spec.get('fieldname')}: {exc}")
-
-for dt in TARGET_DOCTYPES:
-    for spec in FIELD_SPECS:
-        upsert_custom_field(dt, spec)
+    custom_fields_code = build_seed_custom_fields_frappe_code(rental_custom_field_targets())
 
-frappe.db.commit()
-print(json.dumps(result))
-"""
+    def reconcile() -> dict:
+        parsed = _parse_json_output(run_frappe_code(site_name, custom_fields_code))
+        logger.info(f"seed-custom-fields for {site_name}: {parsed}")
+        return parsed
 
     try:
-        output = run_frappe_code(site_name, custom_fields_code)
-        parsed = _parse_json_output(output)
-        logger.info(f"seed-custom-fields for {site_name}: {parsed}")
-        return {"success": True, "site": site_name, "result": parsed}
+        return _seed_with_fingerprint(
+            site_name,
+            "custom_fields",
+            manifest_hash(RENTAL_TARGET_DOCTYPES, RENTAL_FIELD_SPECS),
+            force,
+            reconcile,
+            _seed_result_clean,
+        )
     except Exception as e:
         logger.error(f"seed-custom-fields failed for {site_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/v1/seed-agent-doctypes/{subdomain}")
-async def seed_tenant_agent_doctypes(subdomain: str, _auth: bool = Depends(verify_api_secret)):
+async def seed_tenant_agent_doctypes(
+    subdomain: str,
+    force: bool = False,
+    _auth: bool = Depends(verify_api_secret),
+):
     """
     Import Agent Action Log and Agent Audit Log on an existing tenant (idempotent).
     Repairs tenants provisioned before agentic-ai doctypes were part of provisioning.
@@ -2130,17 +3159,31 @@ async def seed_tenant_agent_doctypes(subdomain: str, _auth: bool = Depends(verif
 
     site_name = get_site_name(subdomain)
 
-    try:
+    def reconcile() -> dict:
         parsed = seed_agent_doctypes_on_site(site_name)
         logger.info(f"seed-agent-doctypes for {site_name}: {parsed}")
-        return {"success": True, "site": site_name, "result": parsed}
+        return parsed
+
+    try:
+        return _seed_with_fingerprint(
+            site_name,
+            "agent_doctypes",
+            agent_doctype_payload().fingerprint,
+            force,
+            reconcile,
+            _agent_seed_result_clean,
+        )
     except Exception as e:
         logger.error(f"seed-agent-doctypes failed for {site_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/v1/seed-docperms/{subdomain}")
-async def seed_tenant_docperms(subdomain: str, _auth: bool = Depends(verify_api_secret)):
+async def seed_tenant_docperms(
+    subdomain: str,
+    force: bool = False,
+    _auth: bool = Depends(verify_api_secret),
+):
     """
     Ensure the minimum DocPerm matrix is present on an existing tenant.
     This is used to repair tenants provisioned before certain modules (e.g. Inspections)
@@ -2150,107 +3193,960 @@ async def seed_tenant_docperms(subdomain: str, _auth: bool = Depends(verify_api_
     site_name = f"{subdomain}.{PARENT_DOMAIN}" if IS_PRODUCTION else f"{subdomain}.localhost"
 
     try:
-        docperm_code = f"""
-import json
+        docperm_code = build_docperm_reconcile_code(DOC_PERM_MINIMUM)
 
-matrix = {json.dumps(DOC_PERM_MINIMUM)}
-updated = []
-errors = []
+        def reconcile() -> dict:
+            parsed = _parse_json_output(run_frappe_code(site_name, docperm_code))
+            logger.info(f"seed-docperms for {site_name}: {parsed}")
+            return parsed
 
-def upsert(row):
-    try:
-        filters = {{
-            "parent": row["doctype"],
-            "parenttype": "DocType",
-            "parentfield": "permissions",
-            "role": row["role"],
-            "permlevel": 0,
-        }}
-        name = frappe.db.exists("DocPerm", filters)
-        doc = frappe.get_doc("DocPerm", name) if name else frappe.new_doc("DocPerm")
-        doc.parent = row["doctype"]
-        doc.parenttype = "DocType"
-        doc.parentfield = "permissions"
-        doc.role = row["role"]
-        doc.permlevel = 0
-        doc.read = int(row.get("read", 0))
-        doc.write = int(row.get("write", 0))
-        doc.create = int(row.get("create", 0))
-        doc.delete = int(row.get("delete", 0))
-        doc.submit = int(row.get("submit", 0))
-        doc.cancel = int(row.get("cancel", 0))
-        doc.amend = int(row.get("amend", 0))
-        if name:
-            doc.save(ignore_permissions=True)
-        else:
-            doc.insert(ignore_permissions=True)
-        updated.append(f'{{row["doctype"]}}:{{row["role"]}}')
+        return _seed_with_fingerprint(
+            site_name,
+            "docperms",
+            manifest_hash(DOC_PERM_MINIMUM),
+            force,
+            reconcile,
+            _seed_result_clean,
+        )
     except Exception as e:
-        errors.append(f'{{row.get("doctype")}}:{{row.get("role")}}: {{e}}')
-
-for row in matrix:
-    upsert(row)
+        logger.error(f"seed-docperms failed for {site_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-frappe.db.commit()
 
-# CRITICAL: DocPerm rows are served from cached doctype meta held by the
-# running web workers. Committing new rows from this out-of-process script
-# does NOT refresh that cache, so workers keep evaluating against the stale
-# (often empty) permission matrix and return 403 "does not have doctype
-# access via role permission" indefinitely. Clear the cache so the new
-# permissions take effect immediately on the live site.
-cleared = set()
-for row in matrix:
-    dt = row.get("doctype")
-    if dt and dt not in cleared:
-        try:
-            frappe.clear_cache(doctype=dt)
-            cleared.add(dt)
-        except Exception as e:
-            errors.append(f'clear_cache:{{dt}}: {{e}}')
-frappe.clear_cache()
+# ============================================================================
+# Fleet reconcile — many tenants per interpreter, results streamed per tenant
+# ============================================================================
 
-print(json.dumps({{"updated": updated, "count": len(updated), "errors": errors}}))
-"""
+FLEET_OPERATIONS = ("docperms", "custom_fields", "agent_doctypes")
+# Plan entry for an operation whose fingerprint matches: drift check first,
+# reconcile only when the site drifted (see build_verified_seed_code).
+VERIFIED_OP_PREFIX = "verify:"
 
-        parsed = _parse_json_output(run_frappe_code(site_name, docperm_code))
-        logger.info(f"seed-docperms for {site_name}: {parsed}")
-        return {"success": True, "site": site_name, "result": parsed}
-    except Exception as e:
-        logger.error(f"seed-docperms failed for {site_name}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+# One fleet run at a time: parallel runs would contend for the same bench.
+_fleet_lock = asyncio.Lock()
 
 
+def _fleet_seed_manifests(operations: list[str]) -> dict[str, dict[str, Any]]:
+    """Code, fingerprint and success check per operation (same as the seed endpoints)."""
+    manifests: dict[str, dict[str, Any]] = {}
+    if "docperms" in operations:
+        manifests["docperms"] = {
+            "code": build_docperm_reconcile_code(DOC_PERM_MINIMUM),
+            "fingerprint": manifest_hash(DOC_PERM_MINIMUM),
+            "succeeded": _seed_result_clean,
+        }
+    if "custom_fields" in operations:
+        manifests["custom_fields"] = {
+            "code": build_seed_custom_fields_frappe_code(rental_custom_field_targets()),
+            "fingerprint": manifest_hash(RENTAL_TARGET_DOCTYPES, RENTAL_FIELD_SPECS),
+            "succeeded": _seed_result_clean,
+        }
+    if "agent_doctypes" in operations:
+        payload = agent_doctype_payload()
+        manifests["agent_doctypes"] = {
+            "code": payload.full_seed_code,
+            "fingerprint": payload.fingerprint,
+            "succeeded": _agent_seed_result_clean,
+        }
+    return manifests
 
-@app.get("/api/v1/employees/{subdomain}")
-async def list_employees(subdomain: str, _auth: bool = Depends(verify_api_secret)):
-    """
-    List active Employee records on a tenant site.
-    Uses ignore_permissions=True — no Frappe role required on the caller side.
-    """
-    import re
-    if not re.match(r'^[a-z0-9][a-z0-9\-]{1,61}[a-z0-9]$', subdomain):
-        raise HTTPException(status_code=400, detail="Invalid subdomain format")
 
-    site_name = get_site_name(subdomain)
+def _run_fleet_shard(
+    plan: dict[str, list[str]],
+    operations: dict[str, str],
+    emit: Callable[[dict[str, Any]], None],
+    timeout: Optional[float] = None,
+) -> None:
+    """Run one multi-site interpreter and emit each site report as soon as it is printed.
 
-    list_code = """import json
-employees = frappe.get_all(
-    "Employee",
-    filters={"status": "Active"},
-    fields=["name", "employee_name", "status", "date_of_joining",
-            "cell_number", "bio", "date_of_birth", "creation"],
-    order_by="creation desc",
-    limit=500,
-    ignore_permissions=True,
-)
-print(json.dumps(employees, default=str))
-"""
+    The interpreter is killed after `timeout` seconds (default FLEET_SITE_TIMEOUT
+    per site). Sites it never reported (crash, timeout) are emitted as failures.
+
+    The limit is enforced inside the container with `timeout -s KILL`: killing
+    the local docker exec client would leave the interpreter running there.
+    """
+    limit = math.ceil(timeout or FLEET_SITE_TIMEOUT * len(plan))
+    reported: set[str] = set()
+    tail: deque[str] = deque(maxlen=20)
+    tmp_file = f"/tmp/_fleet_{secrets.token_hex(8)}.py"
+    failure: Optional[str] = None
+    try:
+        script = build_multisite_script(f"{BENCH_PATH}/sites", plan, operations)
+        write_result = docker_exec(
+            ["bash", "-c", f"base64 -d > {tmp_file}"],
+            timeout=30,
+            input_text=base64.b64encode(script.encode()).decode(),
+        )
+        if write_result.returncode != 0:
+            raise Exception(f"Failed to write fleet script to container: {write_result.stderr}")
+
+        cmd = [
+            "docker", "exec", BACKEND_CONTAINER, "bash", "-c",
+            f"cd {BENCH_PATH}/sites && exec timeout -s KILL {limit} {BENCH_PATH}/env/bin/python -u {tmp_file}",
+        ]
+        logger.info(f"fleet: interpreter for {len(plan)} site(s)")
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        # Backstop for a docker exec that hangs after the interpreter is gone.
+        watchdog = threading.Timer(limit + FLEET_EXEC_GRACE_SEC, proc.kill)
+        watchdog.start()
+        try:
+            for line in proc.stdout:
+                report = parse_fleet_line(line.rstrip("\n"))
+                if report is None:
+                    tail.append(line.rstrip())
+                    continue
+                reported.add(report.get("site"))
+                emit(report)
+            proc.wait()
+        finally:
+            watchdog.cancel()
+        if proc.returncode == 128 + signal.SIGKILL:
+            failure = f"interpreter killed after {limit}s"
+        elif proc.returncode != 0:
+            failure = f"interpreter exited with {proc.returncode}: {' | '.join(tail)[-500:]}"
+    except Exception as exc:
+        failure = str(getattr(exc, "detail", exc))
+    finally:
+        try:
+            docker_exec(["rm", "-f", tmp_file], timeout=5)
+        except Exception:
+            pass
+
+    for site in plan:
+        if site not in reported:
+            emit({
+                "site": site,
+                "operations": {},
+                "error": failure or "interpreter finished without reporting this site",
+                "duration_sec": None,
+            })
+
+
+def _run_fleet_operation(
+    sites: list[str],
+    name: str,
+    code: str,
+    on_report: Callable[[dict[str, Any]], None],
+    workers: int = FLEET_WORKERS,
+) -> None:
+    """Run one operation on `sites` over at most `workers` multi-site interpreters (blocking)."""
+    threads = [
+        threading.Thread(target=_run_fleet_shard, args=({site: [name] for site in shard}, {name: code}, on_report))
+        for shard in shard_round_robin(sites, workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _fleet_tenant_result(
+    report: dict[str, Any],
+    subdomain: str,
+    pending_ops: list[str],
+    manifests: dict[str, dict[str, Any]],
+) -> dict[str, Any]:
+    """Turn a site report into the streamed tenant line; record clean reconciles."""
+    site_name = report["site"]
+    operations: dict[str, Any] = {}
+    outcomes = report.get("operations") or {}
+    for planned in pending_ops:
+        op = planned.removeprefix(VERIFIED_OP_PREFIX)
+        outcome = outcomes.get(planned)
+        if outcome is None:
+            operations[op] = {"status": "failed", "error": report.get("error") or "not run"}
+            continue
+        if outcome.get("error"):
+            operations[op] = {"status": "failed", "error": outcome["error"]}
+            continue
+        result = _parse_json_output(outcome.get("output") or "")
+        if result.get("cached"):
+            operations[op] = {"status": "cached"}
+            continue
+        _DRIFT_CACHE.pop(site_name, None)
+        if manifests[op]["succeeded"](result):
+            _seed_fingerprints.set(site_name, op, manifests[op]["fingerprint"], result)
+            operations[op] = {"status": "applied", "result": result}
+        else:
+            operations[op] = {"status": "failed", "result": result}
+    return {
+        "type": "tenant",
+        "subdomain": subdomain,
+        "site": site_name,
+        "success": all(o["status"] != "failed" for o in operations.values()),
+        "duration_sec": report.get("duration_sec"),
+        "operations": operations,
+    }
+
+
+@app.post("/api/v1/fleet/reconcile")
+async def fleet_reconcile(req: FleetReconcileRequest, _auth: bool = Depends(verify_api_secret)):
+    """
+    Run seed / reconcile operations across all active tenants (or `subdomains`).
+    Tenants are sharded over FLEET_WORKERS long-lived interpreters that switch
+    sites in-process. Streams NDJSON: one line per tenant as it finishes, then a
+    summary. Operations whose manifest fingerprint matches are only drift-checked
+    and reconciled where the site drifted, unless `force`.
+    """
+    unknown = [op for op in req.operations if op not in FLEET_OPERATIONS]
+    if unknown or not req.operations:
+        raise HTTPException(
+            status_code=400,
+            detail=f"operations must be a non-empty subset of {list(FLEET_OPERATIONS)}",
+        )
+    if _fleet_lock.locked():
+        raise HTTPException(status_code=409, detail="A fleet reconcile is already running")
+
+    await _fleet_lock.acquire()
+    try:
+        # limit=0: every active tenant, not just the first page.
+        rows = await asyncio.to_thread(_list_active_saas_tenant_rows, 0)
+        operations = list(dict.fromkeys(req.operations))
+        manifests = _fleet_seed_manifests(operations)
+    except Exception as e:
+        _fleet_lock.release()
+        logger.error(f"fleet reconcile: could not prepare run: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    wanted = {s.strip().lower() for s in req.subdomains} if req.subdomains else None
+    subdomain_by_site: dict[str, str] = {}
+    plan: dict[str, list[str]] = {}
+    for row in rows:
+        subdomain = row.get("subdomain")
+        if not subdomain or (wanted is not None and subdomain not in wanted):
+            continue
+        site_name = get_site_name(subdomain)
+        subdomain_by_site[site_name] = subdomain
+        plan[site_name] = []
+        for op in operations:
+            applied = _seed_fingerprints.get(site_name, op)
+            if not req.force and _fingerprint_matches(applied, manifests[op]["fingerprint"]):
+                # Drift-checked in the interpreter; reconciled there only if drifted.
+                plan[site_name].append(VERIFIED_OP_PREFIX + op)
+            else:
+                plan[site_name].append(op)
+    workers = max(1, min(req.workers or FLEET_WORKERS, FLEET_WORKERS))
+    runner: Optional[asyncio.Future] = None
+    released = False
+
+    async def release_fleet() -> None:
+        # Called from the stream's finally and as the response's background task:
+        # a client that disconnects before the first chunk never starts the
+        # generator, so its finally alone would leave the fleet locked.
+        nonlocal released
+        if released:
+            return
+        released = True
+        # A disconnected client must not free the bench while interpreters still run.
+        if runner is not None and not runner.done():
+            runner.add_done_callback(lambda _: _fleet_lock.release())
+        else:
+            _fleet_lock.release()
+
+    async def stream():
+        nonlocal runner
+        started = time.time()
+        counts = {"tenants": len(plan), "succeeded": 0, "failed": 0, "cached": 0}
+        try:
+            loop = asyncio.get_running_loop()
+            queue: "asyncio.Queue[dict[str, Any]]" = asyncio.Queue()
+            code = {op: manifest["code"] for op, manifest in manifests.items()}
+            code.update({
+                VERIFIED_OP_PREFIX + op: build_verified_seed_code(op, manifest["code"])
+                for op, manifest in manifests.items()
+            })
+            shards = shard_round_robin(list(plan.items()), workers) if plan else []
+            runner = asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        _run_fleet_shard,
+                        dict(shard),
+                        code,
+                        lambda report: loop.call_soon_threadsafe(queue.put_nowait, report),
+                    )
+                    for shard in shards
+                ),
+                return_exceptions=True,
+            )
+            remaining = set(plan)
+            while remaining:
+                report = await queue.get()
+                site_name = report.get("site")
+                if site_name not in remaining:
+                    continue
+                remaining.discard(site_name)
+                line = _fleet_tenant_result(report, subdomain_by_site[site_name], plan[site_name], manifests)
+                counts["succeeded" if line["success"] else "failed"] += 1
+                if all(o["status"] == "cached" for o in line["operations"].values()):
+                    counts["cached"] += 1
+                yield json.dumps(line, default=str) + "\n"
+            await runner
+
+            summary = {
+                "type": "summary",
+                **counts,
+                "operations": operations,
+                "workers": len(shards),
+                "duration_sec": round(time.time() - started, 3),
+            }
+            logger.info(f"fleet reconcile finished: {summary}")
+            yield json.dumps(summary) + "\n"
+        finally:
+            await release_fleet()
+
+    return StreamingResponse(
+        stream(), media_type="application/x-ndjson", background=BackgroundTask(release_fleet)
+    )
+
+
+# ============================================================================
+# Fleet drift scan — read-only tenant × check matrix
+# ============================================================================
+
+DRIFT_CHECKS = ("docperms", "custom_fields", "agent_doctypes", "fiscal_year", "selling_price_list")
+# Checks that must pass before a seed call whose fingerprint matches is skipped.
+SEED_DRIFT_CHECKS = {
+    "defaults": ("fiscal_year", "selling_price_list", "master_data"),
+    "docperms": ("docperms",),
+    "custom_fields": ("custom_fields",),
+    "agent_doctypes": ("agent_doctypes",),
+}
+
+# site -> {"checked_at", "code_hash", "checks"}; entries older than
+# FLEET_DRIFT_TTL_SEC (or scanned with a different manifest) are rescanned.
+_DRIFT_CACHE: dict[str, dict[str, Any]] = {}
+_drift_scan_lock = asyncio.Lock()
+
+
+# Flat master data seed-defaults creates; the trees are checked for a root (and
+# Item Group for a leaf), matching when seed_tree would seed them.
+DEFAULT_FLAT_MASTERS = {
+    "Opportunity Type": ["Sales", "Rental", "Maintenance", "Service"],
+    "Sales Stage": ["Prospecting", "Qualification", "Needs Analysis", "Proposal", "Negotiation", "Won", "Lost"],
+    "UOM": ["Nos", "Unit", "Kg", "M", "Hr", "Day", "Month", "Hour"],
+}
+
+
+def build_drift_check_code(checks: tuple[str, ...] = DRIFT_CHECKS, prelude: str = "", finish: str = "") -> str:
+    """Read-only check of one site against the seed manifests (a handful of queries, no writes).
+
+    Runs `checks` into `report`; `prelude` is inserted before them and `finish`
+    replaces the final print of the report.
+    """
+    rental_targets = rental_custom_field_targets()
+    agent_doctypes = agent_doctype_payload().names
+    return f"""import json
+from frappe.utils import nowdate
+
+matrix = {json.dumps(DOC_PERM_MINIMUM)}
+rental_targets = {json.dumps({dt: [f["fieldname"] for f in specs] for dt, specs in rental_targets.items()})}
+agent_doctypes = {json.dumps(agent_doctypes)}
+agent_hashes = {json.dumps(agent_doctype_payload().hashes)}
+agent_hash_key = {json.dumps(FIXTURE_HASH_KEY)}
+agent_fields = {json.dumps([f["fieldname"] for f in AGENT_ACTION_LOG_CUSTOM_FIELDS])}
+flat_masters = {json.dumps(DEFAULT_FLAT_MASTERS)}
+PERM_FIELDS = ["read", "write", "create", "delete", "submit", "cancel", "amend"]
+report = {{}}
+
+def check(name, fn):
+    try:
+        missing = fn()
+        report[name] = {{"ok": not missing, "missing": missing}}
+    except Exception as exc:
+        report[name] = {{"ok": False, "error": str(exc)}}
+
+def docperms():
+    existing = {{}}
+    for perm in frappe.get_all(
+        "DocPerm",
+        filters={{"parent": ["in", sorted({{row["doctype"] for row in matrix}})], "parenttype": "DocType", "permlevel": 0}},
+        fields=["parent", "role", "idx"] + ["`" + f + "`" for f in PERM_FIELDS],
+        order_by="idx asc",
+    ):
+        existing.setdefault((perm["parent"], perm["role"]), perm)
+    missing = []
+    for row in matrix:
+        current = existing.get((row["doctype"], row["role"]))
+        if current is None or any(int(current.get(f) or 0) != int(row.get(f, 0)) for f in PERM_FIELDS):
+            missing.append(row["doctype"] + ":" + row["role"])
+    return missing
+
+def custom_fields():
+    have = {{
+        (r["dt"], r["fieldname"])
+        for r in frappe.get_all("Custom Field", filters={{"dt": ["in", list(rental_targets)]}}, fields=["dt", "fieldname"])
+    }}
+    return [dt + ":" + f for dt, fields in rental_targets.items() for f in fields if (dt, f) not in have]
+
+def agent():
+    present = set(frappe.get_all("DocType", filters={{"name": ["in", agent_doctypes]}}, pluck="name"))
+    missing = [name for name in agent_doctypes if name not in present]
+    missing += [
+        name + ":outdated" for name in agent_doctypes
+        if name in present and frappe.db.get_global(agent_hash_key + name) != agent_hashes[name]
+    ]
+    if "Agent Action Log" in present:
+        fields = set(frappe.get_all("DocField", filters={{"parent": "Agent Action Log"}}, pluck="fieldname"))
+        fields |= set(frappe.get_all("Custom Field", filters={{"dt": "Agent Action Log"}}, pluck="fieldname"))
+        missing += ["Agent Action Log:" + f for f in agent_fields if f not in fields]
+    return missing
+
+def fiscal_year():
+    today = nowdate()
+    rows = frappe.get_all(
+        "Fiscal Year",
+        filters={{"year_start_date": ["<=", today], "year_end_date": [">=", today], "disabled": 0}},
+        limit=1,
+    )
+    return [] if rows else [today]
+
+def selling_price_list():
+    name = frappe.db.get_single_value("Selling Settings", "selling_price_list")
+    if not name:
+        return ["Selling Settings.selling_price_list"]
+    if not frappe.db.exists("Price List", {{"name": name, "enabled": 1, "selling": 1}}):
+        return [name]
+    return []
+
+def master_data():
+    missing = [doctype for doctype in ("Territory", "Customer Group") if not frappe.db.count(doctype)]
+    if not frappe.db.exists("Item Group", {{"is_group": 0}}):
+        missing.append("Item Group")
+    for doctype, names in flat_masters.items():
+        have = set(frappe.get_all(doctype, filters={{"name": ["in", names]}}, pluck="name"))
+        missing += [doctype + ":" + name for name in names if name not in have]
+    return missing
+
+CHECKS = {{
+    "docperms": docperms,
+    "custom_fields": custom_fields,
+    "agent_doctypes": agent,
+    "fiscal_year": fiscal_year,
+    "selling_price_list": selling_price_list,
+    "master_data": master_data,
+}}
+
+{prelude}
+for name in {json.dumps(list(checks))}:
+    check(name, CHECKS[name])
+{finish or "print(json.dumps(report, default=str))"}
+"""
+
+
+def build_verified_seed_code(manifest: str, reconcile_code: str) -> str:
+    """Drift-check the site for `manifest` and run `reconcile_code` only if it drifted.
+
+    Used when the manifest fingerprint already matches: a clean site prints
+    {"cached": true}, a drifted one gets the full reconcile in the same interpreter.
+    """
+    return build_drift_check_code(
+        SEED_DRIFT_CHECKS[manifest],
+        finish=f"""if all(entry["ok"] for entry in report.values()):
+    print(json.dumps({{"cached": True}}))
+else:
+    exec(compile({json.dumps(reconcile_code)}, "<reconcile>", "exec"), globals())""",
+    )
+
+
+def _scan_drift(sites: list[str], code: str, workers: int) -> dict[str, dict[str, Any]]:
+    """Run the drift check on `sites` over at most `workers` multi-site interpreters."""
+    reports: dict[str, dict[str, Any]] = {}
+    _run_fleet_operation(sites, "drift", code, lambda r: reports.__setitem__(r["site"], r), workers)
+
+    checks: dict[str, dict[str, Any]] = {}
+    for site in sites:
+        report = reports.get(site) or {}
+        outcome = (report.get("operations") or {}).get("drift") or {}
+        parsed = _parse_json_output(outcome.get("output") or "") if outcome.get("output") else {}
+        error = outcome.get("error") or report.get("error") or "no drift report"
+        checks[site] = {name: parsed.get(name) or {"ok": False, "error": error} for name in DRIFT_CHECKS}
+    return checks
+
+
+@app.get("/api/v1/fleet/drift")
+async def fleet_drift_scan(refresh: bool = False, _auth: bool = Depends(verify_api_secret)):
+    """
+    Read-only drift report: every active tenant against the DocPerm, rental
+    custom field and agent doctype manifests plus Fiscal Year / selling price
+    list. Per-tenant results are cached for FLEET_DRIFT_TTL_SEC; `refresh`
+    rescans everyone. `matrix` is subdomain -> one ok|drift|error per check.
+    """
+    try:
+        async with _drift_scan_lock:
+            rows = await asyncio.to_thread(_list_active_saas_tenant_rows, 0)
+            code = build_drift_check_code()
+            code_hash = manifest_hash(code)
+            site_by_subdomain = {
+                row["subdomain"]: get_site_name(row["subdomain"]) for row in rows if row.get("subdomain")
+            }
+            now = time.time()
+            stale = [
+                site for site in site_by_subdomain.values()
+                if refresh
+                or site not in _DRIFT_CACHE
+                or _DRIFT_CACHE[site]["code_hash"] != code_hash
+                or now - _DRIFT_CACHE[site]["checked_at"] >= FLEET_DRIFT_TTL_SEC
+            ]
+            if stale:
+                scanned = await asyncio.to_thread(_scan_drift, stale, code, FLEET_WORKERS)
+                for site, checks in scanned.items():
+                    _DRIFT_CACHE[site] = {"checked_at": time.time(), "code_hash": code_hash, "checks": checks}
+    except Exception as e:
+        logger.error(f"fleet drift scan failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    matrix: dict[str, dict[str, str]] = {}
+    details: dict[str, dict[str, Any]] = {}
+    drifted = {name: 0 for name in DRIFT_CHECKS}
+    for subdomain, site in sorted(site_by_subdomain.items()):
+        entry = _DRIFT_CACHE.get(site) or {"checks": {}}
+        row: dict[str, str] = {}
+        for name in DRIFT_CHECKS:
+            result = entry["checks"].get(name) or {"ok": False, "error": "not scanned"}
+            row[name] = "ok" if result.get("ok") else ("error" if result.get("error") else "drift")
+            if row[name] != "ok":
+                drifted[name] += 1
+                details.setdefault(subdomain, {})[name] = result.get("error") or result.get("missing")
+        matrix[subdomain] = row
+
+    return {
+        "checks": list(DRIFT_CHECKS),
+        "tenants": len(matrix),
+        "scanned": len(stale),
+        "drifted": drifted,
+        "matrix": matrix,
+        "details": details,
+        "generated_at": datetime.utcnow().isoformat(),
+    }
+
+
+# ============================================================================
+# Fleet migrate — rolling `bench migrate` across tenants
+# ============================================================================
+
+MIGRATION_ORDERS = ("smallest_first", "largest_first", "name")
+
+# job_id -> job state (see _new_migration_job); only one job may hold the fleet.
+_MIGRATION_JOBS: dict[str, dict[str, Any]] = {}
+
+SITE_SIZE_CODE = """import json
+row = frappe.db.sql(
+    "select coalesce(sum(data_length + index_length), 0) from information_schema.tables where table_schema = %s",
+    frappe.conf.db_name,
+)
+print(json.dumps({"size_bytes": int(row[0][0] or 0)}))
+"""
+
+
+def _site_sizes(sites: list[str]) -> dict[str, Optional[int]]:
+    """Database size per site, measured on the fleet interpreters (None when unknown)."""
+    sizes: dict[str, Optional[int]] = {site: None for site in sites}
+    if not sites:
+        return sizes
+
+    def record(report: dict[str, Any]) -> None:
+        output = ((report.get("operations") or {}).get("size") or {}).get("output")
+        if output:
+            sizes[report["site"]] = _parse_json_output(output).get("size_bytes")
+
+    _run_fleet_operation(sites, "size", SITE_SIZE_CODE, record)
+    return sizes
+
+
+def _migration_health_check(site_name: str) -> dict[str, Any]:
+    """Post-migrate check: the site boots, answers queries and is out of maintenance mode."""
+    code = """import json
+frappe.get_all("DocType", limit=1)
+print(json.dumps({
+    "message": "pong",
+    "maintenance_mode": int(frappe.conf.get("maintenance_mode") or 0),
+    "apps": frappe.get_installed_apps(),
+}))
+"""
+    result = _parse_json_output(run_frappe_code(site_name, code))
+    if result.get("message") != "pong":
+        raise Exception(f"Unexpected health check response: {result}")
+    if result.get("maintenance_mode"):
+        raise Exception("site is still in maintenance mode after migrate")
+    return result
+
+
+def _migration_job_view(job: dict[str, Any]) -> dict[str, Any]:
+    tenants = job["tenants"]
+    counts: dict[str, int] = {}
+    for tenant in tenants:
+        counts[tenant["status"]] = counts.get(tenant["status"], 0) + 1
+    timings = sorted(t["migrate_sec"] for t in tenants if t.get("migrate_sec") is not None)
+    return {
+        **{k: v for k, v in job.items() if k not in ("tenants", "window", "task", "holds_fleet_lock")},
+        "counts": counts,
+        "migrate_sec": {
+            "median": timings[len(timings) // 2] if timings else None,
+            "max": timings[-1] if timings else None,
+            "total": round(sum(timings), 2),
+        },
+        "tenants": tenants,
+    }
+
+
+async def _migrate_tenant(job: dict[str, Any], tenant: dict[str, Any]) -> None:
+    site_name = tenant["site"]
+    tenant["status"] = "migrating"
+    tenant["started_at"] = datetime.utcnow().isoformat()
+    started = time.time()
+    try:
+        result = await asyncio.to_thread(
+            run_bench_command, ["--site", site_name, "migrate"], MIGRATE_TIMEOUT
+        )
+        tenant["migrate_sec"] = round(time.time() - started, 2)
+        if result.returncode != 0:
+            raise Exception(f"bench migrate failed: {(result.stderr or result.stdout)[-300:]}")
+        tenant["status"] = "checking"
+        check_started = time.time()
+        await asyncio.to_thread(_migration_health_check, site_name)
+        tenant["health_sec"] = round(time.time() - check_started, 2)
+        tenant["status"] = "done"
+    except Exception as exc:
+        tenant.setdefault("migrate_sec", round(time.time() - started, 2))
+        tenant["status"] = "failed"
+        tenant["error"] = str(getattr(exc, "detail", exc))
+        logger.warning(f"migrate: {site_name} failed: {tenant['error']}")
+    finally:
+        # migrate re-syncs standard DocTypes, so seeded manifests must be re-verified.
+        _seed_fingerprints.invalidate(site_name)
+        _DRIFT_CACHE.pop(site_name, None)
+
+    window = job["window"]
+    window["completed"] += 1
+    if tenant["status"] == "failed":
+        window["failed"] += 1
+    if (
+        job["status"] == "running"
+        and window["completed"] >= job["min_sample"]
+        and window["failed"] / window["completed"] > job["max_error_rate"]
+    ):
+        job["status"] = "paused"
+        job["pause_reason"] = (
+            f"error rate {window['failed']}/{window['completed']} exceeded {job['max_error_rate']:.0%}"
+        )
+        logger.error(f"migrate job {job['job_id']} paused: {job['pause_reason']}")
+
+
+async def _run_migration_job(job: dict[str, Any]) -> None:
+    """Migrate pending tenants with bounded parallelism until done, paused or cancelled."""
+    semaphore = asyncio.Semaphore(job["concurrency"])
+    in_flight: set[asyncio.Task] = set()
+
+    async def run(tenant: dict[str, Any]) -> None:
+        try:
+            await _migrate_tenant(job, tenant)
+        finally:
+            semaphore.release()
+
+    try:
+        for tenant in job["tenants"]:
+            if tenant["status"] != "pending":
+                continue
+            await semaphore.acquire()
+            if job["status"] != "running":
+                semaphore.release()
+                break
+            task = asyncio.create_task(run(tenant))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+    finally:
+        if job["status"] == "running":
+            job["status"] = "done"
+        if job["status"] in ("done", "cancelled"):
+            job["finished_at"] = datetime.utcnow().isoformat()
+        # A paused job gives the fleet back too (reconcile, seeding and login
+        # probes must not wait on an operator); resume takes it again.
+        _release_migration_fleet_lock(job)
+        logger.info(f"migrate job {job['job_id']}: {job['status']} {_migration_job_view(job)['counts']}")
+
+
+def _release_migration_fleet_lock(job: dict[str, Any]) -> None:
+    if job.get("holds_fleet_lock"):
+        job["holds_fleet_lock"] = False
+        _fleet_lock.release()
+
+
+def _migration_job_or_404(job_id: str) -> dict[str, Any]:
+    job = _MIGRATION_JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Migration job not found")
+    return job
+
+
+@app.post("/api/v1/fleet/migrate", status_code=202)
+async def start_fleet_migration(req: FleetMigrateRequest, _auth: bool = Depends(verify_api_secret)):
+    """
+    Start a rolling `bench migrate` over active tenants (or `subdomains`).
+    `priority` subdomains go first, the rest follow `order` (database size or
+    name). Each site is health-checked after migrating; the job pauses itself
+    when the failure rate crosses `max_error_rate`. Holds the fleet lock while
+    it runs; a paused job releases it until resumed.
+    """
+    if req.order not in MIGRATION_ORDERS:
+        raise HTTPException(status_code=400, detail=f"order must be one of {list(MIGRATION_ORDERS)}")
+    if _fleet_lock.locked():
+        raise HTTPException(status_code=409, detail="Another fleet operation is running")
+
+    await _fleet_lock.acquire()
+    try:
+        rows = await asyncio.to_thread(_list_active_saas_tenant_rows, 0)
+        wanted = {s.strip().lower() for s in req.subdomains} if req.subdomains else None
+        subdomains = [
+            row["subdomain"] for row in rows
+            if row.get("subdomain") and (wanted is None or row["subdomain"] in wanted)
+        ]
+        sites = {sub: get_site_name(sub) for sub in subdomains}
+        sizes = await asyncio.to_thread(_site_sizes, list(sites.values())) if req.order != "name" else {}
+    except Exception as e:
+        _fleet_lock.release()
+        logger.error(f"migrate: could not plan run: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    priority = {sub: index for index, sub in enumerate(s.strip().lower() for s in req.priority)}
+
+    def sort_key(sub: str):
+        size = sizes.get(sites[sub])
+        if req.order == "name":
+            rank: Any = sub
+        elif size is None:
+            # Unknown size (site did not boot for the probe): migrate last.
+            rank = float("inf")
+        else:
+            rank = size if req.order == "smallest_first" else -size
+        return (priority.get(sub, len(priority)), rank, sub)
+
+    job = {
+        "job_id": secrets.token_hex(8),
+        "status": "running",
+        "order": req.order,
+        "concurrency": max(1, min(req.concurrency or MIGRATE_CONCURRENCY, FLEET_WORKERS * 2)),
+        "max_error_rate": req.max_error_rate,
+        "min_sample": req.min_sample,
+        "pause_reason": None,
+        "started_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "window": {"completed": 0, "failed": 0},
+        "holds_fleet_lock": True,
+        "tenants": [
+            {
+                "subdomain": sub,
+                "site": sites[sub],
+                "size_bytes": sizes.get(sites[sub]),
+                "status": "pending",
+                "error": None,
+            }
+            for sub in sorted(subdomains, key=sort_key)
+        ],
+    }
+    _MIGRATION_JOBS[job["job_id"]] = job
+    job["task"] = asyncio.get_running_loop().create_task(_run_migration_job(job))
+    return {"job_id": job["job_id"], "status": job["status"], "tenants": len(job["tenants"])}
+
+
+@app.get("/api/v1/fleet/migrate/{job_id}")
+async def get_fleet_migration(job_id: str, _auth: bool = Depends(verify_api_secret)):
+    return _migration_job_view(_migration_job_or_404(job_id))
+
+
+@app.post("/api/v1/fleet/migrate/{job_id}/resume")
+async def resume_fleet_migration(job_id: str, _auth: bool = Depends(verify_api_secret)):
+    """Continue a paused job; the error-rate window restarts from zero.
+    The job retakes the fleet lock, so it waits for no one: 409 if another fleet
+    operation started while it was paused."""
+    job = _migration_job_or_404(job_id)
+    if job["status"] != "paused":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not paused")
+    if job.get("task") and not job["task"].done():
+        raise HTTPException(status_code=409, detail="Job is still draining in-flight tenants")
+    if _fleet_lock.locked():
+        raise HTTPException(status_code=409, detail="Another fleet operation is running")
+    await _fleet_lock.acquire()
+    job["holds_fleet_lock"] = True
+    job["status"] = "running"
+    job["pause_reason"] = None
+    job["window"] = {"completed": 0, "failed": 0}
+    job["task"] = asyncio.get_running_loop().create_task(_run_migration_job(job))
+    return {"job_id": job_id, "status": job["status"]}
+
+
+@app.post("/api/v1/fleet/migrate/{job_id}/cancel")
+async def cancel_fleet_migration(job_id: str, _auth: bool = Depends(verify_api_secret)):
+    """Stop launching tenants; in-flight migrations finish. Releases the fleet lock."""
+    job = _migration_job_or_404(job_id)
+    if job["status"] not in ("running", "paused"):
+        raise HTTPException(status_code=409, detail=f"Job is already {job['status']}")
+    was_paused = job["status"] == "paused" and (not job.get("task") or job["task"].done())
+    job["status"] = "cancelled"
+    if was_paused:
+        # The lock went back when the job paused; nothing is running to release it.
+        job["finished_at"] = datetime.utcnow().isoformat()
+    return {"job_id": job_id, "status": job["status"]}
+
+
+# Tenant list endpoints page with an opaque keyset cursor: the sort key of the last
+# row returned plus the sync_token taken when the first page was read.
+_KEYSET_PAGE_SNIPPET = """
+def keyset_page(doctype, fields, keys, descending, conditions, params, after, limit):
+    op, direction = ("<", "desc") if descending else (">", "asc")
+    conditions = list(conditions)
+    params = dict(params)
+    if after:
+        params["_after0"], params["_after1"] = after
+        conditions.append(
+            f"(`{keys[0]}` {op} %(_after0)s or (`{keys[0]}` = %(_after0)s and `{keys[1]}` {op} %(_after1)s))"
+        )
+    rows = frappe.db.sql(
+        "select " + ", ".join(f"`{field}`" for field in fields) + f" from `tab{doctype}`"
+        + (" where " + " and ".join(conditions) if conditions else "")
+        + f" order by `{keys[0]}` {direction}, `{keys[1]}` {direction} limit {int(limit) + 1}",
+        params,
+        as_dict=True,
+    )
+    next_keys = [str(rows[limit - 1][keys[0]]), str(rows[limit - 1][keys[1]])] if len(rows) > limit else None
+    return rows[:limit], next_keys
+
+
+# modified_since as a naive datetime in the site's time zone, which Frappe stores.
+def site_datetime(value):
+    if not value or not value.endswith("+00:00"):
+        return value
+    from frappe.utils import convert_utc_to_system_timezone, get_datetime
+    local = convert_utc_to_system_timezone(get_datetime(value[:-len("+00:00")]))
+    return local.replace(tzinfo=None).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def deleted_since(doctype, since):
+    return frappe.get_all(
+        "Deleted Document",
+        filters={"deleted_doctype": doctype, "creation": [">=", since]},
+        pluck="deleted_name",
+        limit=0,
+    )
+"""
+
+
+def _encode_list_cursor(keys: Optional[list[str]], sync_token: str) -> Optional[str]:
+    if not keys:
+        return None
+    raw = json.dumps({"k": keys, "t": sync_token}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_list_cursor(cursor: Optional[str]) -> tuple[Optional[list[str]], Optional[str]]:
+    """(after keys, sync_token) from a cursor; (None, None) for the first page."""
+    if not cursor:
+        return None, None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        keys, sync_token = data["k"], data["t"]
+        if len(keys) != 2 or not all(isinstance(k, str) for k in keys) or not isinstance(sync_token, str):
+            raise ValueError("malformed cursor")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return keys, sync_token
+
+
+def _parse_modified_since(value: Optional[str]) -> Optional[str]:
+    """Normalise modified_since (normally a previous sync_token) to Frappe's datetime format.
+
+    A value with a UTC offset keeps it, as UTC, for the tenant script to convert.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="modified_since must be an ISO datetime (use sync_token)")
+    if parsed.tzinfo is None:
+        # Naive values (sync_token) are already in the site's time zone.
+        return parsed.strftime("%Y-%m-%d %H:%M:%S.%f")
+    # Only the tenant knows its time zone; the list script converts (site_datetime).
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f+00:00")
+
+
+@app.get("/api/v1/employees/{subdomain}")
+async def list_employees(
+    subdomain: str,
+    limit: int = 500,
+    cursor: Optional[str] = None,
+    modified_since: Optional[str] = None,
+    _auth: bool = Depends(verify_api_secret),
+):
+    """
+    List active Employee records on a tenant site, newest first.
+    Uses ignore_permissions=True — no Frappe role required on the caller side.
+    Query params:
+      - limit: page size (default 500, max 1000)
+      - cursor: next_cursor from the previous page
+      - modified_since: a previous sync_token; only employees changed since then,
+        plus `removed` (deleted, or no longer Active)
+    """
+    import re
+    if not re.match(r'^[a-z0-9][a-z0-9\-]{1,61}[a-z0-9]$', subdomain):
+        raise HTTPException(status_code=400, detail="Invalid subdomain format")
+
+    site_name = get_site_name(subdomain)
+    after, sync_token = _decode_list_cursor(cursor)
+    page = {
+        "limit": min(max(1, limit), 1000),
+        "after": after,
+        "sync_token": sync_token,
+        "since": _parse_modified_since(modified_since),
+    }
+
+    list_code = f"""import json
+import frappe.utils
+page = json.loads({json.dumps(json.dumps(page))})
+{_KEYSET_PAGE_SNIPPET}
+page["since"] = site_datetime(page["since"])
+sync_token = page["sync_token"] or frappe.utils.now()
+conditions, params = [], {{}}
+if page["since"]:
+    conditions.append("modified >= %(since)s")
+    params["since"] = page["since"]
+else:
+    conditions.append("status = 'Active'")
+rows, next_keys = keyset_page(
+    "Employee",
+    ["name", "employee_name", "status", "date_of_joining", "cell_number", "bio", "date_of_birth", "creation"],
+    ["creation", "name"],
+    True,
+    conditions,
+    params,
+    page["after"],
+    page["limit"],
+)
+removed = [row["name"] for row in rows if row["status"] != "Active"]
+if page["since"] and not page["after"]:
+    removed += deleted_since("Employee", page["since"])
+print(json.dumps({{
+    "employees": [row for row in rows if row["status"] == "Active"],
+    "removed": removed,
+    "next": next_keys,
+    "sync_token": sync_token,
+}}, default=str))
+"""
 
     try:
         output = run_frappe_code(site_name, list_code)
-        employees = _parse_json_output_list(output)
-        return {"success": True, "site": site_name, "employees": employees}
+        result = _parse_json_output(output)
+        if "employees" not in result:
+            raise Exception(f"no employee page in output: {output[-300:]}")
+        return {
+            "success": True,
+            "site": site_name,
+            "employees": result["employees"],
+            "removed": result["removed"],
+            "next_cursor": _encode_list_cursor(result["next"], result["sync_token"]),
+            "sync_token": result["sync_token"],
+        }
     except Exception as e:
         logger.error(f"list-employees failed for {site_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2441,81 +4337,120 @@ async def list_items(
     q: str | None = None,
     item_group: str | None = None,
     limit: int = 500,
+    cursor: str | None = None,
+    modified_since: str | None = None,
     _auth: bool = Depends(verify_api_secret),
 ):
     """
     List Items on a tenant site using ignore_permissions=True.
     Query params:
-      - q: optional search term (matches item_code or item_name)
+      - q: optional search term. Served by nexus_core.item_search when installed:
+        relevance-ordered (exact code, code prefix, name prefix, word prefixes,
+        then substrings inside a word or code to fill the page). Those results are a single page of at most `limit`
+        items and do not paginate: next_cursor is always null and `cursor` is
+        ignored. Otherwise (older nexus_core, or with modified_since) q pages
+        like a plain listing, matching item_code or item_name.
       - item_group: optional exact Item Group filter
-      - limit: max rows (default 500)
+      - limit: page size (default 500, max 2000)
+      - cursor: next_cursor from the previous page
+      - modified_since: a previous sync_token; only items changed since then,
+        plus `removed` (deleted or disabled item codes)
     """
     import re
     if not re.match(r'^[a-z0-9][a-z0-9\-]{1,61}[a-z0-9]$', subdomain):
         raise HTTPException(status_code=400, detail="Invalid subdomain format")
 
     site_name = get_site_name(subdomain)
-    safe_q = json.dumps((q or "").strip())
-    safe_group = json.dumps((item_group or "").strip())
     safe_limit = int(limit) if isinstance(limit, int) else 500
     if safe_limit <= 0:
         safe_limit = 500
     if safe_limit > 2000:
         safe_limit = 2000
+    after, sync_token = _decode_list_cursor(cursor)
+    page = {
+        "q": (q or "").strip(),
+        "item_group": (item_group or "").strip(),
+        "limit": safe_limit,
+        "after": after,
+        "sync_token": sync_token,
+        "since": _parse_modified_since(modified_since),
+    }
 
     list_code = f"""import json
-
-q = {safe_q}
-item_group = {safe_group}
-limit = {safe_limit}
-
-filters = {{"disabled": 0}}
-if item_group:
-    filters["item_group"] = item_group
-
-or_filters = None
-if q:
-    or_filters = [
-        ["Item", "item_code", "like", f"%{{q}}%"],
-        ["Item", "item_name", "like", f"%{{q}}%"],
-    ]
-
-items = frappe.get_all(
-    "Item",
-    filters=filters,
-    or_filters=or_filters,
-    fields=["item_code", "item_name", "description", "item_group", "standard_rate", "is_stock_item"],
-    order_by="item_group asc, item_code asc",
-    limit=limit,
-    ignore_permissions=True,
-)
-
-print(json.dumps(items, default=str))
+import frappe.utils
+page = json.loads({json.dumps(json.dumps(page))})
+{_KEYSET_PAGE_SNIPPET}
+page["since"] = site_datetime(page["since"])
+sync_token = page["sync_token"] or frappe.utils.now()
+search_items = None
+if page["q"] and not page["since"]:
+    try:
+        from nexus_core.item_search import search_items
+    except ImportError:
+        pass
+if search_items:
+    items = search_items(page["q"], page["item_group"] or None, page["limit"])
+    removed, next_keys = [], None
+else:
+    conditions, params = [], {{}}
+    if page["since"]:
+        conditions.append("modified >= %(since)s")
+        params["since"] = page["since"]
+    else:
+        conditions.append("disabled = 0")
+    if page["item_group"]:
+        conditions.append("item_group = %(item_group)s")
+        params["item_group"] = page["item_group"]
+    if page["q"]:
+        conditions.append("(item_code like %(q)s or item_name like %(q)s)")
+        params["q"] = "%" + page["q"] + "%"
+    rows, next_keys = keyset_page(
+        "Item",
+        ["item_code", "item_name", "description", "item_group", "standard_rate", "is_stock_item", "disabled"],
+        ["item_group", "item_code"],
+        False,
+        conditions,
+        params,
+        page["after"],
+        page["limit"],
+    )
+    items = [row for row in rows if not row["disabled"]]
+    removed = [row["item_code"] for row in rows if row["disabled"]]
+    for row in items:
+        del row["disabled"]
+    if page["since"] and not page["after"]:
+        removed += deleted_since("Item", page["since"])
+print(json.dumps({{"items": items, "removed": removed, "next": next_keys, "sync_token": sync_token}}, default=str))
 """
 
     try:
         output = run_frappe_code(site_name, list_code)
-        items = _parse_json_output_list(output)
-        return {"success": True, "site": site_name, "items": items}
+        result = _parse_json_output(output)
+        if "items" not in result:
+            raise Exception(f"no item page in output: {output[-300:]}")
+        return {
+            "success": True,
+            "site": site_name,
+            "items": result["items"],
+            "removed": result["removed"],
+            "next_cursor": _encode_list_cursor(result["next"], result["sync_token"]),
+            "sync_token": result["sync_token"],
+        }
     except Exception as e:
         logger.error(f"list-items failed for {site_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/v1/catalog-defaults/{subdomain}")
-async def get_catalog_defaults(subdomain: str, _auth: bool = Depends(verify_api_secret)):
-    """
-    Return tenant-valid Item Group and UOM defaults from ERPNext.
-    Uses bench execute context, so it bypasses regular API role visibility issues.
-    """
-    import re
-
-    if not re.match(r'^[a-z0-9][a-z0-9\-]{1,61}[a-z0-9]$', subdomain):
-        raise HTTPException(status_code=400, detail="Invalid subdomain format")
-
-    site_name = f"{subdomain}.{PARENT_DOMAIN}" if IS_PRODUCTION else f"{subdomain}.localhost"
-
-    defaults_code = """import json
+# Resolves a tenant's Item Group / UOM defaults into resolved_group, resolved_uom,
+# group_names and uom_names. The nexus_core catalog stamp is read before the
+# lists, so a concurrent edit leaves an older stamp behind and the next check
+# re-resolves.
+_CATALOG_RESOLVE_SNIPPET = """
+try:
+    from nexus_core.catalog import catalog_stamp
+    stamp = catalog_stamp()
+except ImportError:
+    stamp = None
 
 preferred_groups = [
     "Heavy Equipment Rental",
@@ -2557,23 +4492,154 @@ for name in preferred_uoms:
 if not resolved_uom and uom_names:
     resolved_uom = uom_names[0]
 
-print(json.dumps({
+catalog = {
     "item_group": resolved_group,
     "stock_uom": resolved_uom,
     "item_groups": group_names,
     "uoms": uom_names,
-}))
+    "stamp": stamp,
+}
 """
 
+# site -> {"stamp", "defaults", "etag"}, least recently used first; an entry is
+# served only while the tenant's catalog stamp still matches.
+_catalog_defaults_cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
+_catalog_defaults_locks: OrderedDict[str, asyncio.Lock] = OrderedDict()
+
+
+def _catalog_defaults_lock(site_name: str) -> asyncio.Lock:
+    lock = _catalog_defaults_locks.get(site_name)
+    if lock is None:
+        lock = _catalog_defaults_locks[site_name] = asyncio.Lock()
+        # Evict the least recently used locks nobody holds.
+        for key in list(_catalog_defaults_locks):
+            if len(_catalog_defaults_locks) <= CATALOG_DEFAULTS_MAX_SITES:
+                break
+            if key != site_name and not _catalog_defaults_locks[key].locked():
+                del _catalog_defaults_locks[key]
+    _catalog_defaults_locks.move_to_end(site_name)
+    return lock
+
+
+def _catalog_resolve_code(site_name: str) -> str:
+    """Bench snippet resolving the defaults into `catalog`.
+
+    Also installs the tenant credential, so later stamp reads over HTTP succeed.
+    """
+    return _tenant_config_code(site_name) + _CATALOG_RESOLVE_SNIPPET
+
+
+def _store_catalog_defaults(site_name: str, catalog: dict[str, Any]) -> dict[str, Any]:
+    """Cache entry for a `catalog` printed by a resolve script; kept only when stamped."""
+    catalog = dict(catalog)
+    stamp = catalog.pop("stamp", None)
+    entry = {"stamp": stamp, "defaults": catalog, "etag": f'"{manifest_hash(catalog)[:32]}"'}
+    if stamp:
+        _catalog_defaults_cache[site_name] = entry
+        _catalog_defaults_cache.move_to_end(site_name)
+        while len(_catalog_defaults_cache) > CATALOG_DEFAULTS_MAX_SITES:
+            _catalog_defaults_cache.popitem(last=False)
+    else:
+        _catalog_defaults_cache.pop(site_name, None)
+    return entry
+
+
+async def _read_catalog_stamp(site_name: str) -> Optional[str]:
+    """nexus_core catalog stamp via a running web worker; None when unreadable.
+
+    Authenticated with the tenant credential every resolve script installs.
+    """
+    try:
+        result = await _frappe_api_json(
+            site_name,
+            "/api/method/nexus_core.catalog.get_catalog_stamp",
+            headers=_tenant_auth_headers(site_name),
+            timeout=3,
+        )
+    except Exception:
+        return None
+    return (result.get("message") or {}).get("stamp")
+
+
+async def _fresh_catalog_defaults(site_name: str) -> Optional[dict[str, Any]]:
+    """The cached entry while the tenant's stamp still matches it, else None.
+
+    Nothing is read over HTTP for a site with no entry.
+    """
+    cached = _catalog_defaults_cache.get(site_name)
+    if cached and await _read_catalog_stamp(site_name) == cached["stamp"]:
+        _catalog_defaults_cache.move_to_end(site_name)
+        return cached
+    return None
+
+
+async def _catalog_defaults(site_name: str, refresh: bool = False) -> dict[str, Any]:
+    """Cached resolution for the site, re-resolved in bench context when the stamp
+    moved, cannot be read, or `refresh` is set."""
+    async with _catalog_defaults_lock(site_name):
+        cached = None if refresh else await _fresh_catalog_defaults(site_name)
+        if cached:
+            return cached
+        code = f"""import json
+{_catalog_resolve_code(site_name)}
+print(json.dumps(catalog))
+"""
+        return _store_catalog_defaults(site_name, _parse_json_output(run_frappe_code(site_name, code)))
+
+
+@app.get("/api/v1/catalog-defaults/{subdomain}")
+async def get_catalog_defaults(
+    subdomain: str,
+    if_none_match: Optional[str] = Header(None),
+    _auth: bool = Depends(verify_api_secret),
+):
+    """
+    Return tenant-valid Item Group and UOM defaults from ERPNext.
+    Uses bench execute context, so it bypasses regular API role visibility issues.
+    The resolution is cached per tenant while its Item Group / UOM stamp is unchanged;
+    send the ETag back as If-None-Match to get 304 while the defaults are the same.
+    """
+    import re
+
+    if not re.match(r'^[a-z0-9][a-z0-9\-]{1,61}[a-z0-9]$', subdomain):
+        raise HTTPException(status_code=400, detail="Invalid subdomain format")
+
+    site_name = f"{subdomain}.{PARENT_DOMAIN}" if IS_PRODUCTION else f"{subdomain}.localhost"
+
     try:
-        output = run_frappe_code(site_name, defaults_code)
-        defaults = _parse_json_output(output)
-        return {"success": True, "site": site_name, "defaults": defaults}
+        catalog = await _catalog_defaults(site_name)
     except Exception as e:
         logger.error(f"catalog-defaults failed for {site_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    if if_none_match == catalog["etag"]:
+        return Response(status_code=304, headers={"ETag": catalog["etag"]})
+    return JSONResponse(
+        {"success": True, "site": site_name, "defaults": catalog["defaults"]},
+        headers={"ETag": catalog["etag"]},
+    )
 
 
+@contextlib.asynccontextmanager
+async def _user_key_single_flight(site_name: str, user_email: str):
+    """One key read/rotation per (site, user) at a time, across every worker sharing the cache."""
+    token = await asyncio.to_thread(
+        _user_key_cache.acquire, site_name, user_email, USER_KEY_LOCK_TIMEOUT_SEC
+    )
+    if token is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Keys for {user_email} on {site_name} are being generated by another request; retry shortly",
+        )
+    try:
+        yield
+    finally:
+        _user_key_cache.release(site_name, user_email, token)
+
+
+@app.get("/api/v1/user-keys/cache-stats")
+async def user_key_cache_stats(_auth: bool = Depends(verify_api_secret)):
+    """Hit rate and rotation rate of the shared generate-user-keys cache."""
+    return {"success": True, "backend": USER_KEY_CACHE_BACKEND, **_user_key_cache.stats()}
 
 
 @app.post("/api/v1/generate-user-keys/{subdomain}")
@@ -2597,27 +4663,35 @@ async def generate_user_api_keys(subdomain: str, request: Request, _auth: bool =
     site_name = f"{subdomain}.{PARENT_DOMAIN}" if IS_PRODUCTION else f"{subdomain}.localhost"
     logger.info(f"generate-user-keys: site={site_name} user={user_email[:3]}***")
 
-    cache_key = f"{site_name}:{user_email}"
-    if cache_key not in _generate_keys_locks:
-        _generate_keys_locks[cache_key] = asyncio.Lock()
-
-    async with _generate_keys_locks[cache_key]:
-        cached = _GENERATED_USER_KEYS_CACHE.get(cache_key)
+    async with _user_key_single_flight(site_name, user_email):
+        cached = _user_key_cache.get(site_name, user_email)
         if cached:
-            cached_key, cached_secret, cached_at = cached
-            if time.time() - cached_at < _GENERATED_USER_KEYS_TTL_SEC:
-                if _validate_user_api_token(site_name, user_email, cached_key, cached_secret):
-                    logger.info(f"generate-user-keys: returning cached keys for {user_email} on {site_name}")
-                    return {"success": True, "api_key": cached_key, "api_secret": cached_secret}
-                _GENERATED_USER_KEYS_CACHE.pop(cache_key, None)
+            # A matching key-version stamp proves the keys were not rotated since
+            # they were cached; only without a stamp do we pay for a validation.
+            current_version = (
+                await _read_api_key_version(site_name, user_email) if cached["version"] is not None else None
+            )
+            if current_version is not None:
+                valid = current_version == cached["version"]
+            else:
+                _user_key_cache.incr("validations")
+                valid = await _validate_user_api_token(site_name, user_email, cached["api_key"], cached["api_secret"])
+            if valid:
+                _user_key_cache.incr("hits")
+                logger.info(f"generate-user-keys: returning cached keys for {user_email} on {site_name}")
+                return {"success": True, "api_key": cached["api_key"], "api_secret": cached["api_secret"]}
+            _user_key_cache.incr("stale")
+            _user_key_cache.invalidate(site_name, user_email)
+        _user_key_cache.incr("misses")
 
         # Read existing keys first — only rotate when missing or invalid (avoids
         # invalidating browser cookies on every login/refresh).
         safe_email = json.dumps(user_email)
+        tenant_config = _tenant_config_code(site_name)
         read_code = f"""import json
 import frappe
 from frappe.utils.password import get_decrypted_password
-
+{tenant_config}
 user_email = {safe_email}
 try:
     user = frappe.get_doc("User", user_email)
@@ -2626,7 +4700,7 @@ try:
     if not api_key or not api_secret_val:
         print(json.dumps({{"missing": True}}))
     else:
-        print(json.dumps({{"api_key": api_key, "api_secret": api_secret_val}}))
+        print(json.dumps({{"api_key": api_key, "api_secret": api_secret_val, "api_key_version": user.get("api_key_version")}}))
 except Exception as exc:
     print(json.dumps({{"error": str(exc)}}))
 """
@@ -2634,7 +4708,7 @@ except Exception as exc:
 import frappe
 from frappe.core.doctype.user.user import generate_keys
 from frappe.utils.password import get_decrypted_password
-
+{tenant_config}
 user_email = {safe_email}
 try:
     _gen = generate_keys(user_email)
@@ -2660,6 +4734,7 @@ try:
     print(json.dumps({{
         "api_key": api_key,
         "api_secret": api_secret_val,
+        "api_key_version": user.get("api_key_version"),
         "valid": valid,
         "diag": {{
             "api_key_present": bool(api_key),
@@ -2675,17 +4750,19 @@ except Exception as exc:
     print(json.dumps({{"error": str(exc)}}))
 """
 
-        def _accept_keys(api_key_val: str, api_secret_val: str, action: str) -> dict:
-            _GENERATED_USER_KEYS_CACHE[cache_key] = (api_key_val, api_secret_val, time.time())
+        def _accept_keys(api_key_val: str, api_secret_val: str, action: str, version: Optional[int]) -> dict:
+            _user_key_cache.put(site_name, user_email, api_key_val, api_secret_val, version)
+            _user_key_cache.incr("rotations" if action == "rotated" else "reads")
             logger.info(f"generate-user-keys: {action} keys for {user_email} on {site_name}")
             return {"success": True, "api_key": api_key_val, "api_secret": api_secret_val}
 
-        def _return_validated_keys(
+        async def _return_validated_keys(
             api_key_val: str,
             api_secret_val: str,
             *,
             rotated: bool,
             prevalidated: bool = False,
+            version: Optional[int] = None,
         ) -> dict:
             action = "rotated" if rotated else "returned existing"
             # When prevalidated=True the rotate script's inline bench check already
@@ -2698,8 +4775,8 @@ except Exception as exc:
             # from within Docker). The Next.js app performs its own HTTP validation
             # via verifyTenantApiToken after receiving these keys — that is the
             # correct final gate.
-            if prevalidated or _validate_user_api_token(site_name, user_email, api_key_val, api_secret_val):
-                return _accept_keys(api_key_val, api_secret_val, action)
+            if prevalidated or await _validate_user_api_token(site_name, user_email, api_key_val, api_secret_val):
+                return _accept_keys(api_key_val, api_secret_val, action, version)
             raise HTTPException(
                 status_code=502,
                 detail=f"API keys failed validation for {user_email} on {site_name}",
@@ -2707,7 +4784,7 @@ except Exception as exc:
 
         try:
             if force_rotate:
-                _GENERATED_USER_KEYS_CACHE.pop(cache_key, None)
+                _user_key_cache.invalidate(site_name, user_email)
                 output = run_frappe_code(site_name, rotate_code)
                 result = _parse_json_output(output)
                 if not result or result.get("error"):
@@ -2726,8 +4803,9 @@ except Exception as exc:
                         status_code=502,
                         detail=f"Rotated keys failed inline validation for {user_email} on {site_name}",
                     )
-                return _return_validated_keys(
-                    api_key_val, api_secret_val, rotated=True, prevalidated=True
+                return await _return_validated_keys(
+                    api_key_val, api_secret_val, rotated=True, prevalidated=True,
+                    version=result.get("api_key_version"),
                 )
 
             output = run_frappe_code(site_name, read_code)
@@ -2744,7 +4822,9 @@ except Exception as exc:
             api_secret_val = result.get("api_secret")
             if api_key_val and api_secret_val and not result.get("missing"):
                 try:
-                    return _return_validated_keys(api_key_val, api_secret_val, rotated=False)
+                    return await _return_validated_keys(
+                        api_key_val, api_secret_val, rotated=False, version=result.get("api_key_version")
+                    )
                 except HTTPException:
                     logger.warning(
                         f"generate-user-keys: existing keys invalid for {user_email} on {site_name}; rotating"
@@ -2782,8 +4862,9 @@ except Exception as exc:
                     status_code=502,
                     detail=f"Rotated keys failed inline validation for {user_email} on {site_name}",
                 )
-            return _return_validated_keys(
-                api_key_val, api_secret_val, rotated=True, prevalidated=True
+            return await _return_validated_keys(
+                api_key_val, api_secret_val, rotated=True, prevalidated=True,
+                version=result.get("api_key_version"),
             )
         except HTTPException:
             raise
@@ -2795,7 +4876,9 @@ except Exception as exc:
 @app.post("/api/v1/create-item/{subdomain}")
 async def create_item_with_defaults(subdomain: str, request: Request, _auth: bool = Depends(verify_api_secret)):
     """
-    Create Item with ignore_permissions, resolving valid Item Group and UOM in tenant context.
+    Create Item with ignore_permissions. Item Group and UOM come from the cached
+    catalog defaults while the tenant's stamp confirms them; otherwise they are
+    resolved in the same bench script as the insert, which refills the cache.
     """
     import re
 
@@ -2804,57 +4887,56 @@ async def create_item_with_defaults(subdomain: str, request: Request, _auth: boo
 
     payload = await request.json()
     site_name = f"{subdomain}.{PARENT_DOMAIN}" if IS_PRODUCTION else f"{subdomain}.localhost"
-    safe_payload = json.dumps(payload)
-
-    create_code = f"""import json
-
-data = json.loads({json.dumps(safe_payload)})
-
-preferred_groups = [
-    "Heavy Equipment Rental",
-    "Equipment",
-    "Service",
-]
-preferred_uoms = ["Nos", "Unit"]
-
-item_groups = frappe.get_all(
-    "Item Group",
-    filters={{"is_group": 0}},
-    fields=["name"],
-    order_by="name asc",
-    limit=200,
-)
-uoms = frappe.get_all(
-    "UOM",
-    fields=["name"],
-    order_by="name asc",
-    limit=200,
-)
-
-group_names = [g.get("name") for g in item_groups if g.get("name")]
-uom_names = [u.get("name") for u in uoms if u.get("name")]
 
+    def resolve(defaults: dict[str, Any]) -> tuple[str, str]:
+        requested_group = (payload.get("item_group") or "").strip()
+        requested_uom = (payload.get("stock_uom") or "").strip()
+        group = requested_group if requested_group in defaults["item_groups"] else defaults["item_group"]
+        uom = requested_uom if requested_uom in defaults["uoms"] else defaults["stock_uom"]
+        return group, uom
+
+    def build_create_code(resolved: Optional[tuple[str, str]]) -> str:
+        if resolved:
+            resolve_code = f"""
+catalog = None
+resolved_group = {json.dumps(resolved[0])}
+resolved_uom = {json.dumps(resolved[1])}
+"""
+            # A cached link that no longer exists is reported, not raised, so
+            # only that failure is retried with freshly resolved defaults.
+            insert_code = """
+link_error = None
+try:
+    item.insert(ignore_permissions=True)
+except frappe.LinkValidationError:
+    link_error = [
+        field for field, doctype, value in (
+            ("item_group", "Item Group", resolved_group),
+            ("stock_uom", "UOM", resolved_uom),
+        )
+        if not frappe.db.exists(doctype, value)
+    ]
+    if not link_error:
+        raise
+    frappe.db.rollback()
+"""
+        else:
+            insert_code = """
+link_error = None
+item.insert(ignore_permissions=True)
+"""
+            resolve_code = _catalog_resolve_code(site_name) + """
 requested_group = (data.get("item_group") or "").strip()
 requested_uom = (data.get("stock_uom") or "").strip()
+if requested_group in group_names:
+    resolved_group = requested_group
+if requested_uom in uom_names:
+    resolved_uom = requested_uom
+"""
+        return f"""import json
 
-resolved_group = requested_group if requested_group in group_names else None
-if not resolved_group:
-    for name in preferred_groups:
-        if name in group_names:
-            resolved_group = name
-            break
-if not resolved_group and group_names:
-    resolved_group = group_names[0]
-
-resolved_uom = requested_uom if requested_uom in uom_names else None
-if not resolved_uom:
-    for name in preferred_uoms:
-        if name in uom_names:
-            resolved_uom = name
-            break
-if not resolved_uom and uom_names:
-    resolved_uom = uom_names[0]
-
+data = json.loads({json.dumps(json.dumps(payload))})
+{resolve_code}
 if not resolved_group:
     raise Exception("No Item Group found in tenant")
 if not resolved_uom:
@@ -2881,19 +4963,32 @@ if data.get("reorder_level") not in [None, ""]:
     doc["reorder_level"] = float(data.get("reorder_level"))
 
 item = frappe.get_doc(doc)
-item.insert(ignore_permissions=True)
-frappe.db.commit()
-
-print(json.dumps({{
-    "name": item.name,
-    "item_group": resolved_group,
-    "stock_uom": resolved_uom,
-}}))
+{insert_code}
+if link_error:
+    print(json.dumps({{"link_error": link_error}}))
+else:
+    frappe.db.commit()
+    print(json.dumps({{
+        "name": item.name,
+        "item_group": resolved_group,
+        "stock_uom": resolved_uom,
+        "catalog": catalog,
+    }}))
 """
 
     try:
-        output = run_frappe_code(site_name, create_code)
-        created = _parse_json_output(output)
+        cached = await _fresh_catalog_defaults(site_name)
+        resolved = resolve(cached["defaults"]) if cached else None
+        created = _parse_json_output(run_frappe_code(site_name, build_create_code(resolved)))
+        if created.get("link_error"):
+            # A link the stamp did not catch (e.g. a renamed group): retry once,
+            # resolving in the insert script against the current lists.
+            logger.info(f"create-item: cached {', '.join(created['link_error'])} gone on {site_name}, resolving again")
+            _catalog_defaults_cache.pop(site_name, None)
+            created = _parse_json_output(run_frappe_code(site_name, build_create_code(None)))
+        catalog = created.pop("catalog", None)
+        if catalog:
+            _store_catalog_defaults(site_name, catalog)
         return {"success": True, "site": site_name, "item": created}
     except Exception as e:
         logger.error(f"create-item failed for {site_name}: {e}")
@@ -3056,7 +5151,8 @@ async def create_tenant_user(
     create_code = f"""import json
 import frappe.utils
 from frappe.utils.password import update_password
-
+{_MINT_USER_KEYS_SNIPPET}
+{_tenant_config_code(site_name)}
 email = {json.dumps(str(payload.user_email))}
 first_name = {json.dumps(payload.first_name.strip())}
 last_name = {json.dumps((payload.last_name or "").strip())}
@@ -3085,8 +5181,13 @@ if is_new_user:
     initial_password = frappe.utils.random_string(12)
     update_password(email, initial_password, logout_all_sessions=0)
 
+try:
+    api_keys = mint_user_keys(email)
+except Exception as exc:
+    api_keys = {{"error": str(exc)}}
+
 frappe.db.commit()
-result = {{"roles": [r.role for r in user.roles], "is_new": is_new_user}}
+result = {{"roles": [r.role for r in user.roles], "is_new": is_new_user, "api_keys": api_keys}}
 if initial_password:
     result["initial_password"] = initial_password
 print(json.dumps(result))
@@ -3120,6 +5221,8 @@ print(json.dumps({{"roles": [r.role for r in user.roles]}}))
             "success": True,
             "user_email": str(payload.user_email),
             "roles": assigned,
+            "api_keys_ready": _cache_minted_keys(site_name, str(payload.user_email), create_result.get("api_keys")),
+            "member_indexed": await asyncio.to_thread(_index_tenant_member, subdomain, str(payload.user_email)),
         }
         if create_result.get("initial_password"):
             response_payload["initial_password"] = create_result["initial_password"]
@@ -3132,6 +5235,53 @@ print(json.dumps({{"roles": [r.role for r in user.roles]}}))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/premint-user-keys/{subdomain}")
+async def premint_tenant_user_keys(subdomain: str, _auth: bool = Depends(verify_api_secret)):
+    """Mint (or read) API keys for every enabled user on a tenant and load them into the key cache.
+
+    Existing readable keys are kept, so signed-in sessions are not invalidated.
+    """
+    import re
+
+    if not re.match(r'^[a-z0-9][a-z0-9\-]{1,61}[a-z0-9]$', subdomain):
+        raise HTTPException(status_code=400, detail="Invalid subdomain format")
+    site_name = get_site_name(subdomain)
+    premint_code = f"""import json
+{_MINT_USER_KEYS_SNIPPET}
+users = frappe.get_all(
+    "User",
+    filters={{"enabled": 1, "user_type": "System User", "name": ["not in", {json.dumps(list(SYSTEM_USERS))}]}},
+    pluck="name",
+    limit=0,
+)
+keys = {{}}
+for email in users:
+    try:
+        keys[email] = mint_user_keys(email)
+    except Exception as exc:
+        keys[email] = {{"error": str(exc)}}
+frappe.db.commit()
+print(json.dumps({{"keys": keys}}))
+"""
+    try:
+        result = _parse_json_output(run_frappe_code(site_name, premint_code))
+    except Exception as e:
+        logger.error(f"premint-user-keys failed for {site_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    keys = result.get("keys") or {}
+    cached = [email for email, user_keys in keys.items() if _cache_minted_keys(site_name, email, user_keys)]
+    logger.info(f"premint-user-keys: cached keys for {len(cached)}/{len(keys)} users on {site_name}")
+    return {
+        "success": True,
+        "site": site_name,
+        "users": len(keys),
+        "minted": sum(1 for user_keys in keys.values() if user_keys.get("minted")),
+        "cached": len(cached),
+        "errors": {email: user_keys["error"] for email, user_keys in keys.items() if user_keys.get("error")},
+    }
+
+
 @app.post("/api/v1/change-tenant-user-role/{subdomain}")
 async def change_tenant_user_role(
     subdomain: str,
@@ -3188,31 +5338,323 @@ print(json.dumps({{"cleared": True}}))
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.delete("/api/v1/deprovision/{subdomain}")
-async def deprovision_tenant(subdomain: str, _auth: bool = Depends(verify_api_secret)):
-    """Remove a tenant site (destructive — for cleanup/testing)."""
-    site_name = f"{subdomain}.{PARENT_DOMAIN}" if IS_PRODUCTION else f"{subdomain}.localhost"
+# ============================================================================
+# Deprovisioning — tombstone now, drop-site in the background
+# ============================================================================
+
+# job_id -> job state; bounded so long-running services don't accumulate history.
+_DEPROVISION_JOBS: dict[str, dict[str, Any]] = {}
+_DEPROVISION_JOBS_MAX = 1000
+_deprovision_queue: "asyncio.Queue[dict[str, Any]]" = asyncio.Queue()
+_deprovision_worker_task: Optional[asyncio.Task] = None
 
+
+def _tombstone_saas_tenants(subdomains: list[str], status: str = TOMBSTONED_TENANT_STATUS) -> dict[str, Any]:
+    """Mark SaaS Tenant rows as deprovisioning (or failed) in one master-site call."""
+    code = f"""
+import json
+subdomains = {_bench_literal(subdomains)}
+tombstoned, missing = [], []
+for name in subdomains:
+    if frappe.db.exists("SaaS Tenant", name):
+        frappe.db.set_value("SaaS Tenant", name, "status", {json.dumps(status)})
+        tombstoned.append(name)
+    else:
+        missing.append(name)
+frappe.db.commit()
+print(json.dumps({{"tombstoned": tombstoned, "missing": missing}}))
+"""
+    result = _parse_json_output(run_frappe_code(MASTER_SITE, code))
+    _invalidate_tenant_registry()
+    return result
+
+
+def _query_tenant_status_on_master(subdomain: str) -> Optional[dict[str, Any]]:
+    """SaaS Tenant name and status, hidden rows included (the registry skips them)."""
+    code = f"""
+import json
+print(json.dumps({{"tenant": frappe.db.get_value("SaaS Tenant", {json.dumps(subdomain)}, ["name", "status"], as_dict=True)}}))
+"""
+    return _parse_json_output(run_frappe_code(MASTER_SITE, code)).get("tenant")
+
+
+def _delete_saas_tenant_rows(subdomains: list[str]) -> dict[str, Any]:
+    """Remove SaaS Tenant rows for dropped sites in one master-site call."""
+    code = f"""
+import json
+subdomains = {_bench_literal(subdomains)}
+deleted, errors = [], []
+for name in subdomains:
     try:
-        run_bench_command([
-            "drop-site", site_name,
-            "--db-root-password", DB_ROOT_PASSWORD,
-            "--force",
-        ], timeout=60)
+        if frappe.db.exists("SaaS Tenant", name):
+            frappe.delete_doc("SaaS Tenant", name, ignore_permissions=True)
+        deleted.append(name)
+    except Exception as exc:
+        errors.append({{"subdomain": name, "error": str(exc)}})
+frappe.db.commit()
+print(json.dumps({{"deleted": deleted, "errors": errors}}))
+"""
+    result = _parse_json_output(run_frappe_code(MASTER_SITE, code))
+    _invalidate_tenant_registry()
+    return result
+
+
+def _site_exists(site_name: str) -> bool:
+    return docker_exec(["test", "-d", f"{BENCH_PATH}/sites/{site_name}"], timeout=30).returncode == 0
+
+
+def _drop_site(site_name: str, archive: bool) -> None:
+    """Run `bench drop-site`; bench archives a backup unless --no-backup is passed.
+    A site that is already gone counts as dropped, so retries are idempotent."""
+    if not _site_exists(site_name):
+        logger.info(f"deprovision: {site_name} no longer exists, nothing to drop")
+        return
+    args = [
+        "drop-site", site_name,
+        "--db-root-password", DB_ROOT_PASSWORD,
+        "--force",
+    ]
+    if not archive:
+        args.append("--no-backup")
+    result = run_bench_command(args, timeout=DEPROVISION_DROP_TIMEOUT)
+    if result.returncode != 0:
+        raise Exception(f"bench drop-site failed: {(result.stderr or result.stdout)[:300]}")
+
+
+def _enqueue_deprovision(site_name: str, subdomain: Optional[str], archive: bool) -> dict[str, Any]:
+    """Queue a drop-site for the background worker and return the job record."""
+    job = {
+        "job_id": secrets.token_hex(8),
+        "site_name": site_name,
+        "subdomain": subdomain,
+        "archive": archive,
+        "status": "queued",
+        "error": None,
+        "attempts": 0,
+        "site_dropped": False,
+        "next_retry_at": None,
+        "queued_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+    }
+    _DEPROVISION_JOBS[job["job_id"]] = job
+    while len(_DEPROVISION_JOBS) > _DEPROVISION_JOBS_MAX:
+        oldest = next(
+            (jid for jid, j in _DEPROVISION_JOBS.items() if j["status"] in ("done", "failed")),
+            None,
+        )
+        if oldest is None:
+            break
+        _DEPROVISION_JOBS.pop(oldest, None)
+
+    _start_deprovision(job)
+    return job
 
+
+def _start_deprovision(job: dict[str, Any]) -> None:
+    global _deprovision_worker_task
+
+    _deprovision_queue.put_nowait(job)
+    if _deprovision_worker_task is None or _deprovision_worker_task.done():
+        _deprovision_worker_task = asyncio.get_running_loop().create_task(_deprovision_worker())
+
+
+async def _retry_deprovision_later(job: dict[str, Any], delay: float) -> None:
+    await asyncio.sleep(delay)
+    if job["status"] == "retrying":
+        job["status"] = "queued"
+        _start_deprovision(job)
+
+
+async def _settle_deprovision_failures(failed: list[dict[str, Any]]) -> None:
+    """Requeue failed jobs with backoff; once out of attempts, record the failure
+    on the SaaS Tenant row so it is visible after a restart."""
+    exhausted = []
+    for job in failed:
+        if job["attempts"] < DEPROVISION_MAX_ATTEMPTS:
+            delay = DEPROVISION_RETRY_BASE_SEC * 2 ** (job["attempts"] - 1)
+            job["status"] = "retrying"
+            job["next_retry_at"] = datetime.utcfromtimestamp(time.time() + delay).isoformat()
+            asyncio.get_running_loop().create_task(_retry_deprovision_later(job, delay))
+            logger.warning(f"deprovision: retrying {job['site_name']} in {delay:.0f}s: {job['error']}")
+        else:
+            job["status"] = "failed"
+            job["next_retry_at"] = None
+            exhausted.append(job)
+    subdomains = [job["subdomain"] for job in exhausted if job["subdomain"]]
+    if subdomains:
         try:
-            run_frappe_code(MASTER_SITE, f"""
-if frappe.db.exists("SaaS Tenant", "{subdomain}"):
-    frappe.delete_doc("SaaS Tenant", "{subdomain}", ignore_permissions=True)
-    frappe.db.commit()
-print("deleted")
-""")
-        except Exception:
-            pass
+            await asyncio.to_thread(_tombstone_saas_tenants, subdomains, DEPROVISION_FAILED_STATUS)
+        except Exception as exc:
+            logger.error(f"deprovision: could not mark {subdomains} as failed: {exc}")
 
-        return {"success": True, "message": f"Site {site_name} removed"}
+
+async def _run_deprovision_batch(batch: list[dict[str, Any]]) -> None:
+    semaphore = asyncio.Semaphore(DEPROVISION_CONCURRENCY)
+    failed: list[dict[str, Any]] = []
+
+    async def drop(job: dict[str, Any]) -> None:
+        async with semaphore:
+            job["attempts"] += 1
+            job["error"] = None
+            if job["site_dropped"]:
+                job["status"] = "dropped"  # an earlier attempt dropped it; only the row is left
+                return
+            job["status"] = "dropping"
+            try:
+                await asyncio.to_thread(_drop_site, job["site_name"], job["archive"])
+                job["status"] = "dropped"
+                job["site_dropped"] = True
+                _seed_fingerprints.invalidate(job["site_name"])
+                logger.info(f"deprovision: dropped {job['site_name']}")
+            except Exception as exc:
+                job["status"] = "failed"
+                job["error"] = str(getattr(exc, "detail", exc))
+                failed.append(job)
+                logger.error(f"deprovision: drop-site failed for {job['site_name']}: {job['error']}")
+
+    await asyncio.gather(*(drop(job) for job in batch))
+
+    dropped = [job for job in batch if job["status"] == "dropped"]
+    registry_jobs = {job["subdomain"]: job for job in dropped if job["subdomain"]}
+    if registry_jobs:
+        try:
+            outcome = await asyncio.to_thread(_delete_saas_tenant_rows, list(registry_jobs))
+            if not outcome:
+                raise Exception("master site returned no result")
+            for failure in outcome.get("errors") or []:
+                job = registry_jobs.get(failure.get("subdomain"))
+                if job:
+                    job["status"] = "failed"
+                    job["error"] = f"site dropped but SaaS Tenant removal failed: {failure.get('error')}"
+                    failed.append(job)
+                    logger.error(f"deprovision: {job['error']} ({job['subdomain']})")
+        except Exception as exc:
+            for job in registry_jobs.values():
+                job["status"] = "failed"
+                job["error"] = f"site dropped but SaaS Tenant removal failed: {exc}"
+                failed.append(job)
+            logger.error(f"deprovision: SaaS Tenant removal failed for {list(registry_jobs)}: {exc}")
+
+    finished_at = datetime.utcnow().isoformat()
+    for job in batch:
+        if job["status"] == "dropped":
+            job["status"] = "done"
+        job["finished_at"] = finished_at
+    await _settle_deprovision_failures(failed)
+
+
+async def _deprovision_worker() -> None:
+    """Drain queued removals in batches until the queue is empty."""
+    while not _deprovision_queue.empty():
+        batch = [_deprovision_queue.get_nowait()]
+        while len(batch) < DEPROVISION_BATCH_SIZE and not _deprovision_queue.empty():
+            batch.append(_deprovision_queue.get_nowait())
+        try:
+            await _run_deprovision_batch(batch)
+        except Exception as exc:
+            logger.error(f"deprovision batch failed: {exc}")
+            unsettled = [job for job in batch if job["status"] not in ("done", "failed", "retrying")]
+            for job in unsettled:
+                job["status"] = "failed"
+                job["error"] = str(exc)
+            await _settle_deprovision_failures(unsettled)
+
+
+@app.delete("/api/v1/deprovision/{subdomain}", status_code=202)
+async def deprovision_tenant(
+    subdomain: str,
+    archive: bool = True,
+    _auth: bool = Depends(verify_api_secret),
+):
+    """
+    Remove a tenant site (destructive — for cleanup/testing).
+    The SaaS Tenant row is tombstoned immediately so lookups stop returning it;
+    the drop-site and record removal run in the background. Poll
+    /api/v1/deprovision/jobs/{job_id} for the outcome.
+    """
+    site_name = get_site_name(subdomain)
+
+    try:
+        _tombstone_saas_tenants([subdomain])
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Could not tombstone tenant: {e}")
+
+    job = _enqueue_deprovision(site_name, subdomain, archive)
+    return {
+        "success": True,
+        "message": f"Site {site_name} queued for removal",
+        "job_id": job["job_id"],
+        "status": job["status"],
+    }
+
+
+@app.post("/api/v1/deprovision/bulk", status_code=202)
+async def bulk_deprovision_tenants(req: BulkDeprovisionRequest, _auth: bool = Depends(verify_api_secret)):
+    """
+    Tear down a fleet of test/demo tenants in one call.
+    All rows are tombstoned in a single master-site call; drops are batched in
+    the background. Archives are skipped unless archive=true.
+    """
+    master_subdomain = MASTER_SITE.split(".")[0]
+    if master_subdomain in req.subdomains and get_site_name(master_subdomain) == MASTER_SITE:
+        raise HTTPException(status_code=400, detail="Refusing to deprovision the master site")
+
+    try:
+        _tombstone_saas_tenants(req.subdomains)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not tombstone tenants: {e}")
+
+    jobs = [
+        _enqueue_deprovision(get_site_name(sub), sub, req.archive)
+        for sub in req.subdomains
+    ]
+    return {
+        "success": True,
+        "queued": len(jobs),
+        "jobs": [{"subdomain": j["subdomain"], "job_id": j["job_id"]} for j in jobs],
+    }
+
+
+@app.post("/api/v1/deprovision/{subdomain}/retry", status_code=202)
+async def retry_deprovision_tenant(
+    subdomain: str,
+    archive: bool = True,
+    _auth: bool = Depends(verify_api_secret),
+):
+    """
+    Requeue the removal of a tenant whose background deprovision failed (or was
+    lost in a restart). Only tenants already tombstoned or marked failed qualify.
+    """
+    site_name = get_site_name(subdomain)
+    if site_name == MASTER_SITE:
+        raise HTTPException(status_code=400, detail="Refusing to deprovision the master site")
+    pending = [
+        job for job in _DEPROVISION_JOBS.values()
+        if job["subdomain"] == subdomain and job["status"] not in ("done", "failed")
+    ]
+    if pending:
+        return {"success": True, "job_id": pending[0]["job_id"], "status": pending[0]["status"]}
+
+    status = (_query_tenant_status_on_master(subdomain) or {}).get("status")
+    # Compared like the master's case-insensitive collation does.
+    if str(status or "").lower() not in {s.lower() for s in HIDDEN_TENANT_STATUSES}:
+        raise HTTPException(status_code=409, detail=f"Tenant is not being deprovisioned (status: {status})")
+    try:
+        _tombstone_saas_tenants([subdomain])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not tombstone tenant: {e}")
+
+    job = _enqueue_deprovision(site_name, subdomain, archive)
+    return {"success": True, "job_id": job["job_id"], "status": job["status"]}
+
+
+@app.get("/api/v1/deprovision/jobs/{job_id}")
+async def get_deprovision_job(job_id: str, _auth: bool = Depends(verify_api_secret)):
+    """Status of a background deprovision job."""
+    job = _DEPROVISION_JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown deprovision job")
+    return job
 
 
 # ============================================================================
@@ -3248,17 +5690,12 @@ def _parse_json_output_list(output: str) -> list:
 
 
 def _cleanup_failed_site(site_name: str):
-    """Best-effort cleanup of a partially created site."""
-    logger.warning(f"Attempting cleanup of failed site: {site_name}")
-    try:
-        run_bench_command([
-            "drop-site", site_name,
-            "--db-root-password", DB_ROOT_PASSWORD,
-            "--force",
-        ], timeout=60)
-        logger.info(f"Cleanup successful: {site_name}")
+    """Best-effort cleanup of a partially created site (queued, never blocks the request)."""
+    logger.warning(f"Queueing cleanup of failed site: {site_name}")
+    try:
+        _enqueue_deprovision(site_name, None, archive=False)
     except Exception as e:
-        logger.error(f"Cleanup failed for {site_name}: {e}")
+        logger.error(f"Cleanup could not be queued for {site_name}: {e}")
 
 
 # ============================================================================
@@ -0,0 +1,62 @@
+"""
+Per-user `api_key_version` stamp, bumped whenever a User's api_key or api_secret
+changes. The provisioning service caches generated keys together with the stamp;
+while the stamp still matches, cached keys are current and need no validation.
+
+The stamp is read over HTTP (served by an already-running web worker) with this
+site's own `nexus_tenant_secret`, which the provisioning service writes into site
+config; the service's master secret never leaves it.
+"""
+
+import secrets
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_field
+
+VERSION_FIELD = "api_key_version"
+
+
+def ensure_version_field():
+	"""after_install / after_migrate: add the hidden Int field to User once."""
+	if frappe.db.exists("Custom Field", {"dt": "User", "fieldname": VERSION_FIELD}):
+		return
+	create_custom_field(
+		"User",
+		{
+			"fieldname": VERSION_FIELD,
+			"label": "API Key Version",
+			"fieldtype": "Int",
+			"insert_after": "api_secret",
+			"default": "0",
+			"hidden": 1,
+			"read_only": 1,
+			"no_copy": 1,
+		},
+	)
+
+
+def before_user_save(doc, method=None):
+	if not doc.meta.has_field(VERSION_FIELD):
+		return
+	if doc.is_new() and not doc.api_key:
+		return
+	# api_secret is a Password field: unchanged saves carry the masked value,
+	# so only a newly generated secret counts as a change.
+	if doc.has_value_changed("api_key") or doc.has_value_changed("api_secret"):
+		doc.set(VERSION_FIELD, (doc.get(VERSION_FIELD) or 0) + 1)
+
+
+def require_tenant_secret():
+	"""Guard for guest-callable methods that only the provisioning service may call."""
+	expected = frappe.conf.get("nexus_tenant_secret")
+	supplied = frappe.get_request_header("X-Tenant-Secret") or ""
+	if not expected or not secrets.compare_digest(supplied, expected):
+		frappe.throw("Not permitted", frappe.PermissionError)
+
+
+@frappe.whitelist(allow_guest=True, methods=["GET"])
+def get_api_key_version(user: str):
+	require_tenant_secret()
+	if not frappe.get_meta("User").has_field(VERSION_FIELD):
+		return {"version": None}
+	return {"version": frappe.db.get_value("User", user, VERSION_FIELD)}
@@ -0,0 +1,95 @@
+"""
+Latency benchmark for nexus_core.item_search on a large catalogue.
+
+Seeds synthetic items into a scratch copy of `tabItem` (same columns, plus the
+item_search_indexes patch's indexes) and times search_items() for code prefixes,
+name prefixes and word matches. The copy is a regular table because InnoDB
+temporary tables cannot hold a FULLTEXT index; it is dropped afterwards.
+
+	bench --site <tenant> execute nexus_core.benchmarks.item_search.run
+	bench --site <tenant> execute nexus_core.benchmarks.item_search.run \
+		--kwargs "{'items': 200000, 'max_median_ms': 50}"
+
+Raises AssertionError listing every query shape whose median latency exceeds the
+budget; prints the JSON report either way.
+"""
+
+import json
+import random
+import statistics
+import time
+from typing import Callable
+
+import frappe
+
+from nexus_core.item_search import search_items
+from nexus_core.patches.v1_0.item_search_indexes import ensure_search_indexes
+
+BENCH_TABLE = "_bench_nexus_item"
+MATERIALS = ("steel", "brass", "copper", "nylon", "rubber", "alloy", "carbon", "zinc", "timber", "glass")
+PARTS = ("bolt", "washer", "bracket", "hinge", "gasket", "valve", "bearing", "spring", "flange", "coupling")
+FINISHES = ("galvanised", "polished", "anodised", "painted", "raw")
+GROUPS = ("Products", "Raw Material", "Sub Assemblies", "Consumable", "Services")
+
+
+def _item(i: int) -> tuple:
+	name = f"{random.choice(FINISHES)} {random.choice(MATERIALS)} {random.choice(PARTS)} {random.randint(2, 64)}mm"
+	return (f"ITM-{i:07d}", f"ITM-{i:07d}", name.title(), random.choice(GROUPS))
+
+
+def _seed(items: int, batch: int = 5000) -> None:
+	now = frappe.utils.now()
+	for start in range(0, items, batch):
+		rows = [_item(i) for i in range(start, min(start + batch, items))]
+		frappe.db.sql(
+			f"insert into `{BENCH_TABLE}` (name, item_code, item_name, item_group, disabled, creation, modified) values "
+			+ ", ".join(["(%s, %s, %s, %s, 0, %s, %s)"] * len(rows)),
+			[field for row in rows for field in (*row, now, now)],
+		)
+	frappe.db.sql(f"analyze table `{BENCH_TABLE}`")
+
+
+def _queries(items: int) -> dict[str, Callable[[], str]]:
+	"""shape -> search term factory. Mirrors what people type in the search box."""
+	return {
+		"code_prefix": lambda: f"ITM-{random.randrange(items):07d}"[:8],
+		"name_prefix": lambda: random.choice(FINISHES)[:4],
+		"word": lambda: random.choice(PARTS),
+		"two_words": lambda: f"{random.choice(MATERIALS)} {random.choice(PARTS)}",
+		"no_match": lambda: "unobtainium",
+	}
+
+
+def run(items: int = 200000, runs: int = 200, limit: int = 20, max_median_ms: float = 50.0) -> dict:
+	frappe.db.sql_ddl(f"drop table if exists `{BENCH_TABLE}`")
+	frappe.db.sql_ddl(f"create table `{BENCH_TABLE}` like `tabItem`")
+	try:
+		started = time.perf_counter()
+		_seed(items)
+		ensure_search_indexes(BENCH_TABLE)
+		report = {"items": items, "limit": limit, "seed_sec": round(time.perf_counter() - started, 1), "queries": {}}
+
+		failures = []
+		for shape, term in _queries(items).items():
+			samples, hits = [], []
+			for _ in range(runs):
+				query = term()
+				began = time.perf_counter()
+				hits.append(len(search_items(query, limit=limit, table=BENCH_TABLE)))
+				samples.append((time.perf_counter() - began) * 1000)
+			samples.sort()
+			median = round(statistics.median(samples), 3)
+			report["queries"][shape] = {
+				"median_ms": median,
+				"p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+				"avg_hits": round(sum(hits) / len(hits), 1),
+			}
+			if median > max_median_ms:
+				failures.append(f"{shape}: median {median}ms > {max_median_ms}ms")
+		report["failures"] = failures
+	finally:
+		frappe.db.sql_ddl(f"drop table if exists `{BENCH_TABLE}`")
+
+	print(json.dumps(report, indent=2, default=str))
+	assert not failures, "Item search benchmark failed:\n" + "\n".join(failures)
+	return report
@@ -0,0 +1,153 @@
+"""
+Query-plan and latency benchmark for the SaaS Tenant lookups the provisioning service runs.
+
+Seeds synthetic tenants into a TEMPORARY copy of `tabSaaS Tenant` (same columns,
+plus the indexes from the saas_tenant_indexes patch) and their owners into a
+TEMPORARY copy of `tabUser`, shaped like real users (name = email, username
+derived from the email the way Frappe suggests one), so it never touches real
+rows and every username lookup resolves to a tenant owner. Run it on the
+master site:
+
+	bench --site erp.localhost execute nexus_core.benchmarks.saas_tenant_lookups.run
+	bench --site erp.localhost execute nexus_core.benchmarks.saas_tenant_lookups.run \
+		--kwargs "{'tenants': 100000, 'max_median_ms': 5}"
+
+Raises AssertionError listing every lookup whose plan scans the table or whose
+median latency exceeds the budget; prints the JSON report either way.
+"""
+
+import json
+import random
+import statistics
+import time
+from typing import Callable
+
+import frappe
+
+from nexus_core.patches.v1_0.saas_tenant_indexes import ensure_indexes, normalize_status
+
+BENCH_TABLE = "_bench_saas_tenant"
+BENCH_USER_TABLE = "_bench_user"
+# Legacy spellings are included so normalize_status has work to do, as on a real master.
+STATUS_MIX = (("Active", 80), ("active", 3), ("provisioned", 2), ("Pending", 5), ("Suspended", 5), ("Deprovisioning", 5))
+FIRST_NAMES = ("aarav", "priya", "rahul", "sneha", "vikram", "ananya", "arjun", "kavya", "rohan", "isha")
+LAST_NAMES = ("sharma", "patel", "iyer", "reddy", "singh", "nair", "gupta", "menon", "das", "joshi")
+
+
+def _owner(i: int) -> tuple[str, str, str]:
+	"""(email, username, first name) for tenant i, e.g. sneha.iyer.123@iyer-builders123.in -> snehaiyer123."""
+	first = FIRST_NAMES[i % len(FIRST_NAMES)]
+	last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+	email = f"{first}.{last}.{i}@{last}-builders{i}.in"
+	# Frappe's suggest_username keeps the alphanumerics of the email's local part.
+	return email, f"{first}{last}{i}", first.title()
+
+
+def _seed(tenants: int, batch: int = 5000) -> None:
+	statuses = [status for status, weight in STATUS_MIX for _ in range(weight)]
+	now = frappe.utils.now()
+	for start in range(0, tenants, batch):
+		values = []
+		users = []
+		for i in range(start, min(start + batch, tenants)):
+			sub = f"bench-tenant-{i}"
+			email, username, first_name = _owner(i)
+			values.append((sub, sub, email, random.choice(statuses), now, now))
+			users.append((email, email, username, first_name, now, now))
+		frappe.db.sql(
+			f"insert into `{BENCH_TABLE}` (name, subdomain, owner_email, status, creation, modified) values "
+			+ ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(values)),
+			[field for row in values for field in row],
+		)
+		frappe.db.sql(
+			f"insert into `{BENCH_USER_TABLE}` (name, email, username, first_name, creation, modified) values "
+			+ ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(users)),
+			[field for row in users for field in row],
+		)
+	frappe.db.sql(f"analyze table `{BENCH_TABLE}`")
+	frappe.db.sql(f"analyze table `{BENCH_USER_TABLE}`")
+
+
+def _lookups(tenants: int) -> dict[str, tuple[str, Callable[[], tuple]]]:
+	"""name -> (SQL, params factory). Mirrors the service's frappe.get_all shapes."""
+	pick = lambda: random.randrange(tenants)  # noqa: E731
+	return {
+		"subdomain": (
+			f"select name from `{BENCH_TABLE}` where subdomain = %s and status != 'Deprovisioning' limit 1",
+			lambda: (f"bench-tenant-{pick()}",),
+		),
+		"owner_email": (
+			f"select name from `{BENCH_TABLE}` where owner_email = %s and status != 'Deprovisioning' limit 1",
+			lambda: (_owner(pick())[0],),
+		),
+		"owner_email_count": (
+			f"select count(*) from `{BENCH_TABLE}` where owner_email = %s",
+			lambda: (_owner(pick())[0],),
+		),
+		"active_page": (
+			f"select name from `{BENCH_TABLE}` where status = 'Active' order by modified desc limit 100",
+			lambda: (),
+		),
+		"username_to_email": (
+			f"select email from `{BENCH_USER_TABLE}` where username = %s limit 1",
+			lambda: (_owner(pick())[1],),
+		),
+	}
+
+
+def _match_rate(sql: str, params_factory, runs: int) -> float:
+	"""Share of sampled lookups that return a row; synthetic keys that never match measure nothing."""
+	return sum(1 for _ in range(runs) if frappe.db.sql(sql, params_factory())) / runs
+
+
+def _plan(sql: str, params: tuple) -> dict:
+	row = frappe.db.sql(f"explain {sql}", params, as_dict=True)[0]
+	return {"type": row.get("type"), "key": row.get("key"), "rows": row.get("rows"), "extra": row.get("Extra")}
+
+
+def _median_ms(sql: str, params_factory, runs: int) -> float:
+	samples = []
+	for _ in range(runs):
+		params = params_factory()
+		started = time.perf_counter()
+		frappe.db.sql(sql, params)
+		samples.append((time.perf_counter() - started) * 1000)
+	return round(statistics.median(samples), 3)
+
+
+def run(tenants: int = 100000, runs: int = 200, max_median_ms: float = 5.0) -> dict:
+	if not frappe.db.table_exists("SaaS Tenant"):
+		frappe.throw("Run this on the master site (SaaS Tenant not found)")
+
+	for table, source in ((BENCH_TABLE, "tabSaaS Tenant"), (BENCH_USER_TABLE, "tabUser")):
+		frappe.db.sql(f"drop temporary table if exists `{table}`")
+		frappe.db.sql(f"create temporary table `{table}` like `{source}`")
+	try:
+		started = time.perf_counter()
+		_seed(tenants)
+		normalize_status(BENCH_TABLE)
+		ensure_indexes(BENCH_TABLE)
+		report = {"tenants": tenants, "seed_sec": round(time.perf_counter() - started, 1), "lookups": {}}
+
+		failures = []
+		for name, (sql, params_factory) in _lookups(tenants).items():
+			plan = _plan(sql, params_factory())
+			median = _median_ms(sql, params_factory, runs)
+			matched = _match_rate(sql, params_factory, min(runs, 50))
+			report["lookups"][name] = {"plan": plan, "median_ms": median, "match_rate": matched}
+			if not matched:
+				failures.append(f"{name}: no sampled lookup matched a row")
+			if plan["type"] == "ALL" or not plan["key"]:
+				failures.append(f"{name}: full scan ({plan})")
+			elif "filesort" in (plan["extra"] or ""):
+				failures.append(f"{name}: filesort ({plan})")
+			if median > max_median_ms:
+				failures.append(f"{name}: median {median}ms > {max_median_ms}ms")
+		report["failures"] = failures
+	finally:
+		for table in (BENCH_TABLE, BENCH_USER_TABLE):
+			frappe.db.sql(f"drop temporary table if exists `{table}`")
+
+	print(json.dumps(report, indent=2, default=str))
+	assert not failures, "SaaS Tenant lookup benchmark failed:\n" + "\n".join(failures)
+	return report
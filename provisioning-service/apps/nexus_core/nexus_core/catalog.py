@@ -0,0 +1,25 @@
+"""
+Stamp over the Item Group and UOM tables. The provisioning service caches each
+tenant's resolved catalog defaults together with the stamp and re-resolves only
+when it changes: max(modified) moves on inserts and edits, the row count on deletes.
+"""
+
+import frappe
+
+from nexus_core.api_keys import require_tenant_secret
+
+CATALOG_DOCTYPES = ("Item Group", "UOM")
+
+
+def catalog_stamp() -> str:
+	parts = []
+	for doctype in CATALOG_DOCTYPES:
+		modified, count = frappe.db.sql(f"select max(modified), count(*) from `tab{doctype}`")[0]
+		parts.append(f"{doctype}={modified}/{count}")
+	return ";".join(parts)
+
+
+@frappe.whitelist(allow_guest=True, methods=["GET"])
+def get_catalog_stamp():
+	require_tenant_secret()
+	return {"stamp": catalog_stamp()}
@@ -70,6 +70,14 @@ app_license = "mit"
 # before_install = "nexus_core.install.before_install"
 # after_install = "nexus_core.install.after_install"
 
+# User.api_key_version stamp read by the provisioning service's key cache; item
+# search indexes (patches are marked done, not run, when the app is installed).
+after_install = [
+	"nexus_core.api_keys.ensure_version_field",
+	"nexus_core.patches.v1_0.item_search_indexes.execute",
+]
+after_migrate = "nexus_core.api_keys.ensure_version_field"
+
 # Uninstallation
 # ------------
 
@@ -130,6 +138,17 @@ app_license = "mit"
 # 	}
 # }
 
+# Keep the master-site membership index (SaaS Tenant Member) current, and stamp
+# key changes for the provisioning service's key cache.
+doc_events = {
+	"User": {
+		"before_save": "nexus_core.api_keys.before_user_save",
+		"on_update": "nexus_core.membership.on_user_update",
+		"on_trash": "nexus_core.membership.on_user_trash",
+		"after_rename": "nexus_core.membership.after_user_rename",
+	}
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -151,6 +170,13 @@ app_license = "mit"
 # 	],
 # }
 
+# Re-send membership events the provisioning service did not accept.
+scheduler_events = {
+	"hourly": [
+		"nexus_core.membership.flush_pending_events"
+	],
+}
+
 # Testing
 # -------
 
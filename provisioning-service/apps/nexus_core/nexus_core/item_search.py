@@ -0,0 +1,81 @@
+"""
+Relevance-ordered Item search for the catalogue search box.
+
+Each tier is one indexed lookup; tiers run in order until `limit` items are found:
+
+	0. exact item_code
+	1. item_code prefix                     (item_code_search index)
+	2. item_name prefix                     (item_name_search index)
+	3. word prefixes anywhere in code/name  (item_search_ft FULLTEXT, by MATCH score)
+	4. substring anywhere in code/name      (scan, limited to `limit` rows)
+
+FULLTEXT only matches from the start of a word, so fragments inside a word or
+code ("0123" in ITM-0000123, "olt" in Bolt) are left to tier 4, which runs only
+when the indexed tiers found fewer than `limit` items. Indexes come from the
+item_search_indexes patch; until it has run, or when every word of the query is
+shorter than MIN_FULLTEXT_WORD, tier 3 is skipped.
+"""
+
+import re
+
+import frappe
+
+FIELDS = ("item_code", "item_name", "description", "item_group", "standard_rate", "is_stock_item")
+FULLTEXT_INDEX = "item_search_ft"
+# InnoDB does not index shorter tokens (innodb_ft_min_token_size).
+MIN_FULLTEXT_WORD = 3
+
+_fulltext_tables: dict[tuple[str, str], bool] = {}
+
+
+def has_fulltext(table: str) -> bool:
+	key = (frappe.local.site, table)
+	if key not in _fulltext_tables:
+		_fulltext_tables[key] = bool(
+			frappe.db.sql(f"show index from `{table}` where Key_name = %s", FULLTEXT_INDEX)
+		)
+	return _fulltext_tables[key]
+
+
+def _escape_like(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fulltext_terms(q: str) -> str:
+	"""'steel bolt' -> '+steel* +bolt*' (every word required, each as a prefix)."""
+	words = [word for word in re.split(r"\W+", q) if len(word) >= MIN_FULLTEXT_WORD]
+	return " ".join(f"+{word}*" for word in words)
+
+
+def search_items(q: str, item_group: str | None = None, limit: int = 20, table: str = "tabItem") -> list[dict]:
+	q = (q or "").strip()
+	if not q:
+		return []
+	base = f"select {', '.join(f'`{field}`' for field in FIELDS)} from `{table}` where disabled = 0"
+	if item_group:
+		base += " and item_group = %(item_group)s"
+	params = {"q": q, "prefix": _escape_like(q) + "%", "item_group": item_group, "limit": limit}
+
+	tiers = [
+		base + " and item_code = %(q)s",
+		base + " and item_code like %(prefix)s order by item_code limit %(limit)s",
+		base + " and item_name like %(prefix)s order by item_name, item_code limit %(limit)s",
+	]
+	terms = _fulltext_terms(q) if has_fulltext(table) else ""
+	if terms:
+		params["terms"] = terms
+		match = "match(item_code, item_name) against (%(terms)s in boolean mode)"
+		tiers.append(f"{base} and {match} order by {match} desc, item_code limit %(limit)s")
+	params["substring"] = "%" + _escape_like(q) + "%"
+	tiers.append(
+		base + " and (item_code like %(substring)s or item_name like %(substring)s)"
+		" order by item_group, item_code limit %(limit)s"
+	)
+
+	found: dict[str, dict] = {}
+	for sql in tiers:
+		for row in frappe.db.sql(sql, params, as_dict=True):
+			found.setdefault(row.item_code, row)
+		if len(found) >= limit:
+			break
+	return list(found.values())[:limit]
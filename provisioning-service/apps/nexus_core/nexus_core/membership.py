@@ -0,0 +1,102 @@
+"""
+Report User changes on a tenant site to the provisioning service, which keeps the
+master-site user -> tenant membership index (SaaS Tenant Member) current.
+
+The provisioning service writes `nexus_provisioning_url` and this site's own
+`nexus_tenant_secret` into site config when it provisions the tenant (or on its
+membership backfill); sites without them, the master site included, do nothing.
+Events the service did not accept are kept and re-sent hourly; anything older
+than that is repaired by the provisioning service's membership backfill.
+"""
+
+import json
+
+import frappe
+import requests
+
+SYSTEM_USERS = ("Administrator", "Guest")
+# Undelivered events, kept in the site DB until a push succeeds.
+PENDING_KEY = "nexus_membership_pending_events"
+MAX_PENDING = 500
+
+
+def _configured() -> bool:
+	return bool(frappe.conf.get("nexus_provisioning_url") and frappe.conf.get("nexus_tenant_secret"))
+
+
+def _queue(events: list[dict]) -> None:
+	events = [event for event in events if event["email"] not in SYSTEM_USERS]
+	if not events or not _configured():
+		return
+	frappe.enqueue(
+		"nexus_core.membership.push_membership_events",
+		queue="short",
+		enqueue_after_commit=True,
+		events=events,
+	)
+
+
+def on_user_update(doc, method=None):
+	# Also fires on insert, where has_value_changed is always true.
+	if doc.has_value_changed("enabled"):
+		_queue([{"email": doc.name, "enabled": bool(doc.enabled), "removed": False}])
+
+
+def on_user_trash(doc, method=None):
+	_queue([{"email": doc.name, "enabled": False, "removed": True}])
+
+
+def after_user_rename(doc, method=None, old=None, new=None, merge=False):
+	_queue([
+		{"email": old, "enabled": False, "removed": True},
+		{"email": new, "enabled": bool(doc.enabled), "removed": False},
+	])
+
+
+def _pending() -> list[dict]:
+	try:
+		return json.loads(frappe.db.get_global(PENDING_KEY) or "[]")
+	except ValueError:
+		return []
+
+
+def _set_pending(events: list[dict]) -> None:
+	frappe.db.set_global(PENDING_KEY, json.dumps(events[-MAX_PENDING:]) if events else None)
+	frappe.db.commit()
+
+
+def push_membership_events(events: list[dict] | None = None) -> None:
+	"""Background job: send `events` after any still pending.
+
+	On failure everything is kept for the next push or the hourly flush, and
+	the error is raised so the job shows up as failed in RQ.
+	"""
+	if not _configured():
+		return
+	batch = _pending() + list(events or [])
+	if not batch:
+		return
+	url = frappe.conf.get("nexus_provisioning_url").rstrip("/") + "/api/v1/tenant-members/events"
+	try:
+		for start in range(0, len(batch), MAX_PENDING):
+			response = requests.post(
+				url,
+				json={"events": batch[start:start + MAX_PENDING]},
+				headers={
+					"X-Tenant-Site": frappe.local.site,
+					"X-Tenant-Secret": frappe.conf.get("nexus_tenant_secret"),
+				},
+				timeout=10,
+			)
+			response.raise_for_status()
+	except Exception:
+		_set_pending(batch)
+		raise
+	if len(batch) > len(events or []):
+		_set_pending([])
+
+
+def flush_pending_events():
+	"""Hourly: retry events a previous push could not deliver."""
+	if _configured() and _pending():
+		push_membership_events()
@@ -0,0 +1,48 @@
+"""
+Index tabItem for nexus_core.item_search: B-tree indexes for item_code / item_name
+prefix lookups and a FULLTEXT index for word matches anywhere in code or name.
+
+MariaDB has no ngram parser, so substring search is word-prefix search through the
+FULLTEXT index rather than n-gram matching. Also run from after_install, because
+Frappe marks existing patches as done when the app is installed on a new site.
+"""
+
+import frappe
+
+from nexus_core.item_search import FULLTEXT_INDEX
+
+TABLE = "tabItem"
+
+# name -> leading column served by a plain index.
+PREFIX_INDEXES = {
+	"item_code_search": "item_code",
+	"item_name_search": "item_name",
+}
+FULLTEXT_COLUMNS = ("item_code", "item_name")
+
+
+def execute():
+	if frappe.db.db_type != "mariadb" or not frappe.db.table_exists("Item"):
+		return
+	ensure_search_indexes(TABLE)
+
+
+def _indexes(table: str) -> dict[str, tuple[tuple[str, ...], str]]:
+	"""Existing indexes as name -> (columns, index type)."""
+	columns: dict[str, list[tuple[int, str]]] = {}
+	kinds: dict[str, str] = {}
+	for row in frappe.db.sql(f"show index from `{table}`", as_dict=True):
+		columns.setdefault(row.Key_name, []).append((row.Seq_in_index, row.Column_name))
+		kinds[row.Key_name] = row.Index_type
+	return {name: (tuple(col for _, col in sorted(cols)), kinds[name]) for name, cols in columns.items()}
+
+
+def ensure_search_indexes(table: str) -> None:
+	existing = _indexes(table)
+	for name, column in PREFIX_INDEXES.items():
+		if any(cols[0] == column and kind == "BTREE" for cols, kind in existing.values()):
+			continue
+		frappe.db.sql_ddl(f"alter table `{table}` add index `{name}` (`{column}`)")
+	if not any(cols == FULLTEXT_COLUMNS and kind == "FULLTEXT" for cols, kind in existing.values()):
+		column_sql = ", ".join(f"`{col}`" for col in FULLTEXT_COLUMNS)
+		frappe.db.sql_ddl(f"alter table `{table}` add fulltext index `{FULLTEXT_INDEX}` ({column_sql})")
@@ -0,0 +1,92 @@
+"""
+Index the master-site SaaS Tenant table for the provisioning service's lookups and
+normalise `status` so "active" is one equality check instead of a mixed-case IN list.
+
+Only the master site has SaaS Tenant; on tenant sites the patch does nothing.
+"""
+
+import frappe
+
+TABLE = "tabSaaS Tenant"
+
+# lower(status) -> canonical spelling. Older provisioning code wrote the
+# lower-case and "provisioned" forms; anything not listed is left as written
+# (multi-word statuses such as "Deprovision Failed" are not Title-case-able).
+STATUS_ALIASES = {
+	"active": "Active",
+	"provisioned": "Active",
+	"pending": "Pending",
+	"failed": "Failed",
+	"suspended": "Suspended",
+	"deprovisioning": "Deprovisioning",
+	"deprovision failed": "Deprovision Failed",
+}
+
+# name -> (columns, unique). Shapes served:
+#   subdomain = %s                                  (tenant-record/subdomain, preflight)
+#   owner_email = %s [and status != ...]            (owner lookup, preflight count)
+#   status = 'Active' order by modified desc        (active tenant listing)
+INDEXES = {
+	"subdomain_unique": (["subdomain"], True),
+	"owner_email_status": (["owner_email", "status"], False),
+	"status_modified": (["status", "modified"], False),
+}
+
+
+def execute():
+	if not frappe.db.table_exists("SaaS Tenant"):
+		return
+	normalize_status(TABLE)
+	ensure_indexes(TABLE)
+
+
+def normalize_status(table: str) -> None:
+	canonical: dict[str, list[str]] = {}
+	for alias, status in STATUS_ALIASES.items():
+		canonical.setdefault(status, []).append(alias)
+	for status, aliases in canonical.items():
+		frappe.db.sql(
+			f"""update `{table}` set status = %(status)s
+			where lower(status) in %(aliases)s and binary status != binary %(status)s""",
+			{"status": status, "aliases": tuple(aliases)},
+		)
+
+
+def _leading_indexes(table: str) -> dict[tuple[str, ...], bool]:
+	"""Existing indexes as column tuple -> unique."""
+	columns: dict[str, list[tuple[int, str]]] = {}
+	unique: dict[str, bool] = {}
+	for row in frappe.db.sql(f"show index from `{table}`", as_dict=True):
+		columns.setdefault(row.Key_name, []).append((row.Seq_in_index, row.Column_name))
+		unique[row.Key_name] = not row.Non_unique
+	return {tuple(col for _, col in sorted(cols)): unique[key] for key, cols in columns.items()}
+
+
+def ensure_indexes(table: str) -> None:
+	existing = _leading_indexes(table)
+	for name, (columns, unique) in INDEXES.items():
+		key = tuple(columns)
+		if key in existing and (existing[key] or not unique):
+			continue
+		if unique and _has_duplicates(table, columns):
+			# Keep the lookup fast; the duplicates need a manual clean-up first.
+			frappe.log_error(
+				title="SaaS Tenant index",
+				message=f"Duplicate {columns} values in {table}; added a non-unique index instead",
+			)
+			unique = False
+			if key in existing:
+				continue
+		column_sql = ", ".join(f"`{col}`" for col in columns)
+		kind = "unique index" if unique else "index"
+		frappe.db.sql_ddl(f"alter table `{table}` add {kind} `{name}` ({column_sql})")
+
+
+def _has_duplicates(table: str, columns: list[str]) -> bool:
+	column_sql = ", ".join(f"`{col}`" for col in columns)
+	return bool(
+		frappe.db.sql(
+			f"select 1 from `{table}` where ifnull(`{columns[0]}`, '') != '' "
+			f"group by {column_sql} having count(*) > 1 limit 1"
+		)
+	)
@@ -0,0 +1,111 @@
+"""
+Shared Custom Field manifests and the bulk reconcile script used by provisioning and seeding.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+# Rental fields used by the Nexus ERP frontend on quotation / order / invoice lines.
+# These MUST exist on the tenant site or Frappe silently drops the custom_* payload.
+RENTAL_TARGET_DOCTYPES: list[str] = ["Quotation Item", "Sales Order Item", "Sales Invoice Item"]
+
+RENTAL_FIELD_SPECS: list[dict[str, Any]] = [
+    # Rental flags + schedule
+    {"fieldname": "custom_is_rental", "label": "Is Rental", "fieldtype": "Check", "insert_after": "description"},
+    {"fieldname": "custom_rental_type", "label": "Rental Type", "fieldtype": "Select", "options": "Hours\nDays\nMonths", "insert_after": "custom_is_rental"},
+    {"fieldname": "custom_rental_duration", "label": "Rental Duration", "fieldtype": "Int", "insert_after": "custom_rental_type"},
+    {"fieldname": "custom_rental_start_date", "label": "Rental Start Date", "fieldtype": "Date", "insert_after": "custom_rental_duration"},
+    {"fieldname": "custom_rental_end_date", "label": "Rental End Date", "fieldtype": "Date", "insert_after": "custom_rental_start_date"},
+    {"fieldname": "custom_rental_start_time", "label": "Rental Start Time", "fieldtype": "Time", "insert_after": "custom_rental_end_date"},
+    {"fieldname": "custom_rental_end_time", "label": "Rental End Time", "fieldtype": "Time", "insert_after": "custom_rental_start_time"},
+
+    # Operator
+    {"fieldname": "custom_requires_operator", "label": "Requires Operator", "fieldtype": "Check", "insert_after": "custom_rental_end_time"},
+    {"fieldname": "custom_operator_included", "label": "Operator Included", "fieldtype": "Check", "insert_after": "custom_requires_operator"},
+    {"fieldname": "custom_operator_name", "label": "Operator Name", "fieldtype": "Data", "insert_after": "custom_operator_included"},
+
+    # Pricing components (Currency so ERPNext formats correctly)
+    {"fieldname": "custom_base_rental_cost", "label": "Base Rental Cost", "fieldtype": "Currency", "insert_after": "custom_operator_name"},
+    {"fieldname": "custom_accommodation_charges", "label": "Accommodation Charges", "fieldtype": "Currency", "insert_after": "custom_base_rental_cost"},
+    {"fieldname": "custom_usage_charges", "label": "Usage Charges", "fieldtype": "Currency", "insert_after": "custom_accommodation_charges"},
+    {"fieldname": "custom_fuel_charges", "label": "Fuel Charges", "fieldtype": "Currency", "insert_after": "custom_usage_charges"},
+    {"fieldname": "custom_elongation_charges", "label": "Elongation Charges", "fieldtype": "Currency", "insert_after": "custom_fuel_charges"},
+    {"fieldname": "custom_risk_charges", "label": "Risk Charges", "fieldtype": "Currency", "insert_after": "custom_elongation_charges"},
+    {"fieldname": "custom_commercial_charges", "label": "Commercial Charges", "fieldtype": "Currency", "insert_after": "custom_risk_charges"},
+    {"fieldname": "custom_incidental_charges", "label": "Incidental Charges", "fieldtype": "Currency", "insert_after": "custom_commercial_charges"},
+    {"fieldname": "custom_other_charges", "label": "Other Charges", "fieldtype": "Currency", "insert_after": "custom_incidental_charges"},
+    {"fieldname": "custom_total_rental_cost", "label": "Total Rental Cost", "fieldtype": "Currency", "insert_after": "custom_other_charges"},
+
+    # Debug/support payload (JSON string)
+    {"fieldname": "custom_rental_data", "label": "Rental Data", "fieldtype": "Long Text", "insert_after": "custom_total_rental_cost"},
+]
+
+
+def normalize_field_specs(specs: list[dict[str, Any]], default_insert_after: str) -> list[dict[str, Any]]:
+    """Fill label / fieldtype / insert_after so the tenant script gets complete Custom Field dicts."""
+    normalized = []
+    for spec in specs:
+        field = {
+            "fieldname": spec["fieldname"],
+            "label": spec.get("label") or spec["fieldname"],
+            "fieldtype": spec.get("fieldtype") or "Data",
+            "insert_after": spec.get("insert_after") or default_insert_after,
+            "reqd": 0,
+        }
+        if spec.get("options"):
+            field["options"] = spec["options"]
+        normalized.append(field)
+    return normalized
+
+
+def rental_custom_field_targets() -> dict[str, list[dict[str, Any]]]:
+    specs = normalize_field_specs(RENTAL_FIELD_SPECS, "description")
+    return {dt: specs for dt in RENTAL_TARGET_DOCTYPES}
+
+
+# Defines reconcile_custom_fields(targets) inside a tenant script. Existing
+# fields for every target doctype are read in one query; the missing ones are
+# created through create_custom_fields, which defers the ALTER TABLE and the
+# meta reload until all fields of a doctype are in (one of each per doctype).
+CUSTOM_FIELD_RECONCILE_SNIPPET = """
+def reconcile_custom_fields(targets):
+    from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+    out = {"created": [], "skipped": [], "errors": []}
+    fieldnames = sorted({spec["fieldname"] for specs in targets.values() for spec in specs})
+    existing = {
+        (row["dt"], row["fieldname"])
+        for row in frappe.get_all(
+            "Custom Field",
+            filters={"dt": ["in", list(targets)], "fieldname": ["in", fieldnames]},
+            fields=["dt", "fieldname"],
+        )
+    }
+    for dt, specs in targets.items():
+        missing = []
+        for spec in specs:
+            if (dt, spec["fieldname"]) in existing:
+                out["skipped"].append(f"{dt}:{spec['fieldname']}")
+            else:
+                missing.append(spec)
+        if not missing:
+            continue
+        try:
+            create_custom_fields({dt: missing}, update=False)
+            out["created"].extend(f"{dt}:{spec['fieldname']}" for spec in missing)
+        except Exception as exc:
+            out["errors"].append(f"{dt}: {exc}")
+    return out
+"""
+
+
+def build_seed_custom_fields_frappe_code(targets: dict[str, list[dict[str, Any]]]) -> str:
+    """Idempotent: create every missing Custom Field in `targets` ({doctype: [field specs]})."""
+    return f"""import json
+{CUSTOM_FIELD_RECONCILE_SNIPPET}
+result = reconcile_custom_fields({json.dumps(targets)})
+frappe.db.commit()
+print(json.dumps(result))
+"""
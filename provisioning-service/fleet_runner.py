@@ -0,0 +1,83 @@
+"""
+Build long-lived multi-site Frappe scripts for fleet-wide seed / reconcile runs.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+# Prefix of the one stdout line each site emits when it finishes; everything
+# else the seed code prints (debug output, warnings) is captured per site.
+FLEET_RESULT_MARKER = "__NEXUS_FLEET_RESULT__ "
+
+
+def shard_round_robin(items: list[Any], shards: int) -> list[list[Any]]:
+    """Split `items` into at most `shards` non-empty, evenly sized lists."""
+    shards = max(1, min(shards, len(items)))
+    return [items[i::shards] for i in range(shards)]
+
+
+def build_multisite_script(
+    sites_path: str,
+    plan: dict[str, list[str]],
+    operations: dict[str, str],
+) -> str:
+    """One interpreter that runs `operations[op]` for every (site, op) in `plan`.
+
+    Sites are switched with frappe.init / connect / destroy, so the Python and
+    Frappe import cost is paid once per script instead of once per tenant. Each
+    operation's stdout is captured and its last line reported as the result.
+    """
+    return f"""import contextlib
+import io
+import json
+import os
+import time
+
+import frappe
+
+SITES_PATH = {json.dumps(sites_path)}
+PLAN = {json.dumps(plan)}
+OPERATIONS = {json.dumps(operations)}
+COMPILED = {{name: compile(code, "<fleet:" + name + ">", "exec") for name, code in OPERATIONS.items()}}
+
+os.makedirs(os.path.join(os.path.dirname(SITES_PATH), "logs"), exist_ok=True)
+
+for site, ops in PLAN.items():
+    started = time.time()
+    report = {{"site": site, "operations": {{}}, "error": None}}
+    try:
+        os.makedirs(os.path.join(SITES_PATH, site, "logs"), exist_ok=True)
+        frappe.init(site=site, sites_path=SITES_PATH)
+        frappe.connect()
+        for op in ops:
+            buffer = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(buffer):
+                    exec(COMPILED[op], {{"__name__": "__fleet__", "frappe": frappe}})
+                lines = [line for line in buffer.getvalue().splitlines() if line.strip()]
+                report["operations"][op] = {{"output": lines[-1] if lines else ""}}
+            except Exception as exc:
+                frappe.db.rollback()
+                report["operations"][op] = {{"error": str(exc)}}
+    except Exception as exc:
+        report["error"] = str(exc)
+    finally:
+        try:
+            frappe.destroy()
+        except Exception:
+            pass
+    report["duration_sec"] = round(time.time() - started, 3)
+    print({json.dumps(FLEET_RESULT_MARKER)} + json.dumps(report, default=str), flush=True)
+"""
+
+
+def parse_fleet_line(line: str) -> Optional[dict[str, Any]]:
+    """Decode a site report line, or None for ordinary script output."""
+    if not line.startswith(FLEET_RESULT_MARKER):
+        return None
+    try:
+        return json.loads(line[len(FLEET_RESULT_MARKER):])
+    except json.JSONDecodeError:
+        return None
@@ -0,0 +1,231 @@
+"""
+Pooled async HTTP to tenant Frappe sites with per-site route memoization.
+
+A site is reachable through several routes (internal loopback with a Host header,
+the public FQDN over https or http). The router remembers which route last worked
+for each site and tries it first, and backs off from routes that failed, so a warm
+call is one keep-alive request to a known-good route.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+
+
+@dataclass(frozen=True)
+class Route:
+    """One way to reach a site: a base URL plus the headers that select the site."""
+
+    base_url: str
+    headers: tuple[tuple[str, str], ...] = ()
+
+    @property
+    def key(self) -> str:
+        return self.base_url + "|" + ",".join(f"{k}={v}" for k, v in self.headers)
+
+
+@dataclass
+class _Backoff:
+    failures: int = 0
+    retry_at: float = 0.0
+    last_error: str = ""
+
+
+class FrappeHTTPError(Exception):
+    """Frappe answered with a non-2xx status; the route itself works."""
+
+    def __init__(self, status_code: int, payload: Any):
+        super().__init__(f"HTTP {status_code}: {str(payload)[:300]}")
+        self.status_code = status_code
+        self.payload = payload
+
+
+class NoRouteError(Exception):
+    """Every route failed or is backing off after recent failures."""
+
+
+def is_connect_error(exc: BaseException) -> bool:
+    """Failures that say nothing about the site: the base URL itself is unreachable.
+
+    A read timeout or dropped response only shows that one site was slow.
+    """
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def _is_frappe_response(response: httpx.Response) -> bool:
+    # The public FQDN may land on the Next.js app (HTML 404) instead of Frappe;
+    # only a JSON answer proves the route reaches Frappe.
+    return "json" in response.headers.get("content-type", "")
+
+
+def _close_on_loop(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a client opened on another loop; only that loop can close its connections.
+
+    A loop that has already closed took its selector with it, so the dropped
+    client's sockets are freed when it is garbage collected.
+    """
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+
+class FrappeRouter:
+    """Shared httpx.AsyncClient plus the per-site route memo and per-route backoff."""
+
+    def __init__(
+        self,
+        max_connections: int = 50,
+        max_keepalive: int = 20,
+        backoff_base_sec: float = 2.0,
+        backoff_max_sec: float = 300.0,
+    ):
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=30,
+        )
+        self.backoff_base_sec = backoff_base_sec
+        self.backoff_max_sec = backoff_max_sec
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._memo: dict[str, Route] = {}
+        self._backoff: dict[str, _Backoff] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # A client's pooled connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop is not loop:
+            _close_on_loop(self._client, self._client_loop)
+            self._client = None
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=self._limits, follow_redirects=False)
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, loop = self._client, self._client_loop
+        self._client = self._client_loop = None
+        if client is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await client.aclose()
+        else:
+            _close_on_loop(client, loop)
+
+    def _backing_off(self, key: str, now: float) -> bool:
+        state = self._backoff.get(key)
+        return state is not None and state.retry_at > now
+
+    def ordered(self, site: str, routes: list[Route]) -> list[Route]:
+        """Memoized route first, then the rest in order, minus routes backing off."""
+        now = time.time()
+        with self._lock:
+            memo = self._memo.get(site)
+            ordered = [memo] if memo in routes else []
+            ordered += [route for route in routes if route != memo]
+            return [
+                route for route in ordered
+                if not self._backing_off(route.base_url, now) and not self._backing_off(route.key, now)
+            ]
+
+    def record_success(self, site: str, route: Route) -> None:
+        with self._lock:
+            self._memo[site] = route
+            self._backoff.pop(route.base_url, None)
+            self._backoff.pop(route.key, None)
+
+    def record_failure(self, site: str, route: Route, error: str, *, transport: bool) -> None:
+        """Back off from the route; a transport error (connection refused or timed
+        out, see is_connect_error) marks the whole base URL, since it fails the
+        same way for every site behind it."""
+        now = time.time()
+        with self._lock:
+            if self._memo.get(site) == route:
+                del self._memo[site]
+            # Entries idle for a full max backoff no longer affect anything.
+            for key in [k for k, v in self._backoff.items() if v.retry_at + self.backoff_max_sec < now]:
+                del self._backoff[key]
+            state = self._backoff.setdefault(route.base_url if transport else route.key, _Backoff())
+            state.failures += 1
+            state.retry_at = now + min(
+                self.backoff_max_sec, self.backoff_base_sec * 2 ** (state.failures - 1)
+            )
+            state.last_error = error[:200]
+
+    async def send(
+        self,
+        route: Route,
+        path: str,
+        method: str = "GET",
+        headers: Optional[dict[str, str]] = None,
+        body: Optional[dict[str, Any]] = None,
+        timeout: float = 15,
+    ) -> httpx.Response:
+        """One pooled request on `route`, no memo or backoff bookkeeping."""
+        return await self._get_client().request(
+            method,
+            route.base_url.rstrip("/") + path,
+            headers={"Content-Type": "application/json", **dict(route.headers), **(headers or {})},
+            content=json.dumps(body).encode() if body is not None else None,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 3.0)),
+        )
+
+    async def request_json(
+        self,
+        site: str,
+        routes: list[Route],
+        path: str,
+        method: str = "GET",
+        headers: Optional[dict[str, str]] = None,
+        body: Optional[dict[str, Any]] = None,
+        timeout: float = 15,
+    ) -> dict[str, Any]:
+        """JSON from the first route that reaches Frappe.
+
+        Raises FrappeHTTPError when Frappe answers non-2xx (the route is kept),
+        NoRouteError when no route is usable.
+        """
+        candidates = self.ordered(site, routes)
+        if not candidates:
+            raise NoRouteError(f"all routes to {site} are backing off after failures")
+        errors: list[str] = []
+        for route in candidates:
+            try:
+                response = await self.send(route, path, method, headers, body, timeout)
+            except httpx.HTTPError as exc:
+                errors.append(f"{route.base_url}: {exc!r}")
+                self.record_failure(site, route, repr(exc), transport=is_connect_error(exc))
+                continue
+            if not _is_frappe_response(response):
+                errors.append(f"{route.base_url}: HTTP {response.status_code} (not Frappe)")
+                self.record_failure(site, route, f"HTTP {response.status_code} not Frappe", transport=False)
+                continue
+            self.record_success(site, route)
+            payload = response.json() if response.content else {}
+            if response.is_success:
+                return payload
+            raise FrappeHTTPError(response.status_code, payload)
+        raise NoRouteError(f"no route reached Frappe for {site}: {'; '.join(errors)}")
+
+    def stats(self) -> dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "memoized_sites": len(self._memo),
+                "backing_off": {
+                    key: {
+                        "failures": state.failures,
+                        "retry_in_sec": round(max(0.0, state.retry_at - now), 1),
+                        "last_error": state.last_error,
+                    }
+                    for key, state in self._backoff.items()
+                    if state.retry_at > now
+                },
+            }
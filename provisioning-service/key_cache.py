@@ -0,0 +1,351 @@
+"""
+Cache of tenant user API key material for generate-user-keys, shared across workers.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+# hits/misses: cache lookups; stale: cached keys that failed validation;
+# validations: hits that needed a full key validation (no usable version stamp);
+# reads: existing keys read from the tenant; rotations: new keys generated;
+# premints: keys minted or read when a user was created, ahead of first login;
+# lock_waits: requests that waited on another request for the same (site, user).
+KEY_CACHE_COUNTERS = (
+    "hits", "misses", "stale", "validations", "reads", "rotations", "premints", "lock_waits",
+)
+
+
+# Filesystems that never reach persistent storage.
+MEMORY_FILESYSTEMS = ("tmpfs", "ramfs")
+
+
+def is_memory_backed(path: Path) -> bool:
+    """Whether `path` sits on tmpfs/ramfs, per the longest matching /proc/mounts entry."""
+    target = str(path.resolve())
+    best, fstype = "", ""
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts:
+            for line in mounts:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace("\\040", " ")
+                inside = target == mount_point or target.startswith(mount_point.rstrip("/") + "/")
+                if inside and len(mount_point) > len(best):
+                    best, fstype = mount_point, parts[2]
+    except OSError:
+        return False
+    return fstype in MEMORY_FILESYSTEMS
+
+
+class KeyCache(ABC):
+    """Interface of both backends, plus the derived metrics they share."""
+
+    ttl_sec: float
+    lease_sec: float
+    # Upper bound on any entry's lifetime, whatever TTL the caller asks for.
+    max_ttl_sec: float
+
+    def _expires_at(self, now: float, ttl_sec: Optional[float]) -> float:
+        return now + min(ttl_sec or self.ttl_sec, self.max_ttl_sec)
+
+    @abstractmethod
+    def get(self, site: str, user: str) -> Optional[dict[str, Any]]:
+        """The live entry for (site, user): api_key, api_secret, version, stored_at, expires_at."""
+
+    @abstractmethod
+    def put(
+        self,
+        site: str,
+        user: str,
+        api_key: str,
+        api_secret: str,
+        version: Optional[int] = None,
+        ttl_sec: Optional[float] = None,
+    ) -> None:
+        """Store keys for `ttl_sec` (default `ttl_sec`, capped at `max_ttl_sec`)."""
+
+    @abstractmethod
+    def invalidate(self, site: str, user: str) -> None:
+        ...
+
+    @abstractmethod
+    def acquire(self, site: str, user: str, timeout: float) -> Optional[str]:
+        """Take the (site, user) lock; returns a release token, or None after `timeout`."""
+
+    @abstractmethod
+    def release(self, site: str, user: str, token: str) -> None:
+        ...
+
+    @abstractmethod
+    def incr(self, counter: str, amount: int = 1) -> None:
+        ...
+
+    @abstractmethod
+    def counters(self) -> dict[str, int]:
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        counters = self.counters()
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": self.size(),
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else None,
+            "rotation_rate": round(counters["rotations"] / lookups, 4) if lookups else None,
+            "ttl_sec": self.ttl_sec,
+            "max_ttl_sec": self.max_ttl_sec,
+        }
+
+
+class LocalKeyCache(KeyCache):
+    """In-process stand-in for tests and single-worker runs; LRU-bounded entries and locks."""
+
+    def __init__(
+        self,
+        ttl_sec: float = 120,
+        max_entries: int = 10000,
+        lease_sec: float = 300,
+        max_ttl_sec: float = 86400,
+    ):
+        self.ttl_sec = ttl_sec
+        self.lease_sec = lease_sec
+        self.max_entries = max_entries
+        self.max_ttl_sec = max_ttl_sec
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+        self._locks: OrderedDict[tuple[str, str], threading.Lock] = OrderedDict()
+        self._counters = {name: 0 for name in KEY_CACHE_COUNTERS}
+
+    def get(self, site: str, user: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get((site, user))
+            if entry is None:
+                return None
+            if time.time() >= entry["expires_at"]:
+                del self._entries[(site, user)]
+                return None
+            self._entries.move_to_end((site, user))
+            return dict(entry)
+
+    def put(
+        self,
+        site: str,
+        user: str,
+        api_key: str,
+        api_secret: str,
+        version: Optional[int] = None,
+        ttl_sec: Optional[float] = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries[(site, user)] = {
+                "api_key": api_key,
+                "api_secret": api_secret,
+                "version": version,
+                "stored_at": now,
+                "expires_at": self._expires_at(now, ttl_sec),
+            }
+            self._entries.move_to_end((site, user))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, site: str, user: str) -> None:
+        with self._lock:
+            self._entries.pop((site, user), None)
+
+    def acquire(self, site: str, user: str, timeout: float) -> Optional[str]:
+        with self._lock:
+            lock = self._locks.get((site, user))
+            if lock is None:
+                lock = self._locks[(site, user)] = threading.Lock()
+                # Evict the least recently used locks nobody holds.
+                for key in list(self._locks):
+                    if len(self._locks) <= self.max_entries:
+                        break
+                    if key != (site, user) and not self._locks[key].locked():
+                        del self._locks[key]
+            self._locks.move_to_end((site, user))
+        if not lock.acquire(blocking=False):
+            self.incr("lock_waits")
+            if not lock.acquire(timeout=timeout):
+                return None
+        return "local"
+
+    def release(self, site: str, user: str, token: str) -> None:
+        lock = self._locks.get((site, user))
+        if lock is not None and lock.locked():
+            lock.release()
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    def counters(self) -> dict[str, int]:
+        return dict(self._counters)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteKeyCache(KeyCache):
+    """Key cache in one SQLite file that every worker opens (WAL, short transactions).
+
+    Locks are lease rows: a holder that dies without releasing is taken over
+    once its lease expires. Entries beyond `max_entries` are evicted least
+    recently used first.
+
+    The file holds plaintext API secrets, so it is created owner-only (0600)
+    and must be on tmpfs unless `allow_persistent` is set; ValueError otherwise.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        ttl_sec: float = 120,
+        max_entries: int = 10000,
+        lease_sec: float = 300,
+        max_ttl_sec: float = 86400,
+        allow_persistent: bool = False,
+    ):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.lease_sec = lease_sec
+        self.max_entries = max_entries
+        self.max_ttl_sec = max_ttl_sec
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not allow_persistent and not is_memory_backed(path.parent):
+            raise ValueError(f"{path} is not on tmpfs; refusing to store API secrets on persistent disk")
+        # SQLite creates the -wal / -shm files with the database file's mode.
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        for existing in (path, Path(f"{path}-wal"), Path(f"{path}-shm")):
+            if existing.exists():
+                os.chmod(existing, 0o600)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS user_keys (
+                    site TEXT,
+                    user TEXT,
+                    api_key TEXT,
+                    api_secret TEXT,
+                    version INTEGER,
+                    stored_at REAL,
+                    expires_at REAL,
+                    used_at REAL,
+                    PRIMARY KEY (site, user)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS user_keys_used_at ON user_keys (used_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS key_locks (site TEXT, user TEXT, token TEXT, expires_at REAL, PRIMARY KEY (site, user))")
+            conn.execute("CREATE TABLE IF NOT EXISTS key_cache_counters (name TEXT PRIMARY KEY, value INTEGER)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO key_cache_counters (name, value) VALUES (?, 0)",
+                [(name,) for name in KEY_CACHE_COUNTERS],
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def get(self, site: str, user: str) -> Optional[dict[str, Any]]:
+        now = time.time()
+        with contextlib.closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT api_key, api_secret, version, stored_at, expires_at FROM user_keys WHERE site = ? AND user = ?",
+                (site, user),
+            ).fetchone()
+            if row is None:
+                return None
+            if now >= row[4]:
+                conn.execute("DELETE FROM user_keys WHERE site = ? AND user = ?", (site, user))
+                return None
+            conn.execute("UPDATE user_keys SET used_at = ? WHERE site = ? AND user = ?", (now, site, user))
+        return {"api_key": row[0], "api_secret": row[1], "version": row[2], "stored_at": row[3], "expires_at": row[4]}
+
+    def put(
+        self,
+        site: str,
+        user: str,
+        api_key: str,
+        api_secret: str,
+        version: Optional[int] = None,
+        ttl_sec: Optional[float] = None,
+    ) -> None:
+        now = time.time()
+        expires_at = self._expires_at(now, ttl_sec)
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO user_keys "
+                "(site, user, api_key, api_secret, version, stored_at, expires_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (site, user, api_key, api_secret, version, now, expires_at, now),
+            )
+            conn.execute(
+                "DELETE FROM user_keys WHERE rowid IN ("
+                "SELECT rowid FROM user_keys ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, site: str, user: str) -> None:
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("DELETE FROM user_keys WHERE site = ? AND user = ?", (site, user))
+
+    def acquire(self, site: str, user: str, timeout: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        deadline = time.time() + timeout
+        waited = False
+        with contextlib.closing(self._connect()) as conn:
+            while True:
+                now = time.time()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("DELETE FROM key_locks WHERE expires_at < ?", (now,))
+                    acquired = conn.execute(
+                        "INSERT OR IGNORE INTO key_locks (site, user, token, expires_at) VALUES (?, ?, ?, ?)",
+                        (site, user, token, now + self.lease_sec),
+                    ).rowcount == 1
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                if acquired:
+                    return token
+                if not waited:
+                    waited = True
+                    self.incr("lock_waits")
+                if now >= deadline:
+                    return None
+                time.sleep(0.05)
+
+    def release(self, site: str, user: str, token: str) -> None:
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("DELETE FROM key_locks WHERE site = ? AND user = ? AND token = ?", (site, user, token))
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("UPDATE key_cache_counters SET value = value + ? WHERE name = ?", (amount, counter))
+
+    def counters(self) -> dict[str, int]:
+        with contextlib.closing(self._connect()) as conn:
+            rows = dict(conn.execute("SELECT name, value FROM key_cache_counters"))
+        return {name: int(rows.get(name) or 0) for name in KEY_CACHE_COUNTERS}
+
+    def size(self) -> int:
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM user_keys").fetchone()[0]
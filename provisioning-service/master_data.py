@@ -0,0 +1,74 @@
+"""
+Bulk seeding of tree (nested set) and flat master data inside tenant scripts.
+"""
+
+from __future__ import annotations
+
+# Defines seed_tree(...) and seed_flat_master(...) inside a tenant script.
+#
+# Tree doctypes (Territory, Customer Group, Item Group) are nested sets: a
+# controller insert renumbers lft/rgt across the whole tree for every node. The
+# missing nodes are instead written in one bulk insert (no controller, so no
+# nested-set maintenance) and the tree is rebuilt once afterwards. Flat master
+# data is diffed against one existence query and the missing rows bulk inserted.
+MASTER_DATA_SEED_SNIPPET = """
+def bulk_insert_docs(doctype, rows):
+    now = frappe.utils.now()
+    user = frappe.session.user
+    columns = sorted({key for row in rows for key in row if key != "name"})
+    frappe.db.bulk_insert(
+        doctype,
+        fields=["name", "creation", "modified", "owner", "modified_by", "docstatus", "idx"] + columns,
+        values=[[row["name"], now, now, user, user, 0, 0] + [row.get(c) for c in columns] for row in rows],
+        ignore_duplicates=True,
+    )
+
+
+def rebuild_nested_set(doctype, parent_field):
+    from frappe.utils.nestedset import rebuild_tree
+    try:
+        rebuild_tree(doctype)
+    except TypeError:
+        # Older Frappe versions take the parent field explicitly.
+        rebuild_tree(doctype, parent_field)
+
+
+def seed_tree(doctype, root_name, children, seed_when="no_root"):
+    \"\"\"Ensure root + leaf children exist. seed_when: no_root | no_leaf | always.\"\"\"
+    parent_field = "parent_" + frappe.scrub(doctype)
+    name_field = frappe.scrub(doctype) + "_name"
+    nodes = frappe.get_all(doctype, fields=["name", parent_field, "is_group"])
+    roots = [n["name"] for n in nodes if not n.get(parent_field)]
+    if seed_when == "no_root" and roots:
+        return f"exists: {roots[0]}"
+    leaves = [n["name"] for n in nodes if not n.get("is_group")]
+    if seed_when == "no_leaf" and leaves:
+        return f"exists: {len(leaves)} groups"
+
+    root = roots[0] if roots else root_name
+    existing = {n["name"] for n in nodes}
+    rows = []
+    if root not in existing:
+        rows.append({"name": root, name_field: root, parent_field: "", "is_group": 1, "lft": 0, "rgt": 0})
+    for child in children:
+        if child not in existing:
+            rows.append({"name": child, name_field: child, parent_field: root, "is_group": 0, "lft": 0, "rgt": 0})
+    if not rows:
+        return "seeded (all already existed)"
+    bulk_insert_docs(doctype, rows)
+    rebuild_nested_set(doctype, parent_field)
+    return f"seeded: {[row['name'] for row in rows]}"
+
+
+def seed_flat_master(doctype, name_field, rows):
+    \"\"\"rows: names or dicts with "name" (+ extra field values). Returns the names created.\"\"\"
+    rows = [{"name": row} if isinstance(row, str) else dict(row) for row in rows]
+    existing = set(frappe.get_all(doctype, filters={"name": ["in", [row["name"] for row in rows]]}, pluck="name"))
+    missing = [row for row in rows if row["name"] not in existing]
+    if name_field:
+        for row in missing:
+            row.setdefault(name_field, row["name"])
+    if missing:
+        bulk_insert_docs(doctype, missing)
+    return [row["name"] for row in missing]
+"""
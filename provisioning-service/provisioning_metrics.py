@@ -0,0 +1,227 @@
+"""
+Persist per-step provisioning timings and model step duration against bench load.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+# Steps of provision_tenant, in execution order.
+PROVISION_STEPS: tuple[str, ...] = (
+    "preflight",
+    "site_create",
+    "ping",
+    "install_apps",
+    "roles",
+    "administrator_keys",
+    "owner",
+    "owner_roles",
+    "agent_doctypes",
+    "docperms",
+    "custom_fields",
+    "defaults",
+    "owner_keys",
+    "register",
+    "validation",
+    "nginx",
+)
+
+# Cold-start priors (seconds at a load of one) used until enough runs are recorded.
+# Most steps are a single bench bootstrap; new-site and install-app dominate.
+DEFAULT_STEP_SECONDS: dict[str, float] = {
+    "preflight": 8.0,
+    "site_create": 240.0,
+    "ping": 8.0,
+    "install_apps": 90.0,
+    "roles": 8.0,
+    "administrator_keys": 8.0,
+    "owner": 10.0,
+    "owner_roles": 8.0,
+    "agent_doctypes": 12.0,
+    "docperms": 15.0,
+    "custom_fields": 25.0,
+    "defaults": 15.0,
+    "owner_keys": 8.0,
+    "register": 8.0,
+    "validation": 35.0,
+    "nginx": 10.0,
+}
+
+MIN_SAMPLES_FOR_FIT = 5
+SAMPLE_WINDOW = 200
+
+
+class ProvisionMetricsStore:
+    """SQLite-backed history of provision runs and their step durations."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS provision_runs (
+                    run_id TEXT PRIMARY KEY,
+                    subdomain TEXT,
+                    queued_at REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    success INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS provision_steps (
+                    run_id TEXT,
+                    step TEXT,
+                    started_at REAL,
+                    duration_sec REAL,
+                    concurrency INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_provision_steps_step
+                    ON provision_steps (step, started_at);
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def record_run(self, run: dict[str, Any]) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO provision_runs VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    run["run_id"],
+                    run.get("subdomain"),
+                    run.get("queued_at"),
+                    run.get("started_at"),
+                    run.get("finished_at") or time.time(),
+                    1 if run.get("success") else 0,
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO provision_steps VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        run["run_id"],
+                        step["step"],
+                        step["started_at"],
+                        step["duration_sec"],
+                        step["concurrency"],
+                    )
+                    for step in run.get("steps") or []
+                    if step.get("duration_sec") is not None
+                ],
+            )
+
+    def step_samples(self) -> dict[str, list[tuple[int, float]]]:
+        """Most recent (concurrency, duration) samples per step."""
+        samples: dict[str, list[tuple[int, float]]] = {}
+        with self._lock, self._connect() as conn:
+            for step in PROVISION_STEPS:
+                rows = conn.execute(
+                    "SELECT concurrency, duration_sec FROM provision_steps "
+                    "WHERE step = ? ORDER BY started_at DESC LIMIT ?",
+                    (step, SAMPLE_WINDOW),
+                ).fetchall()
+                samples[step] = [(int(c or 1), float(d)) for c, d in rows]
+        return samples
+
+    def run_count(self) -> int:
+        with self._lock, self._connect() as conn:
+            return int(conn.execute("SELECT COUNT(*) FROM provision_runs").fetchone()[0])
+
+
+def _fit_line(samples: list[tuple[int, float]], prior: float) -> tuple[float, float]:
+    """Least-squares duration = intercept + slope * concurrency (slope clamped to >= 0).
+
+    With fewer than MIN_SAMPLES_FOR_FIT samples the mean is shrunk toward the
+    prior so a single unusual run cannot swing the prediction.
+    """
+    if not samples:
+        return prior, 0.0
+    mean_duration = sum(d for _, d in samples) / len(samples)
+    if len(samples) < MIN_SAMPLES_FOR_FIT:
+        weight = MIN_SAMPLES_FOR_FIT - len(samples)
+        return (prior * weight + mean_duration * len(samples)) / MIN_SAMPLES_FOR_FIT, 0.0
+    mean_load = sum(c for c, _ in samples) / len(samples)
+    var_load = sum((c - mean_load) ** 2 for c, _ in samples)
+    if var_load == 0:
+        return mean_duration, 0.0
+    cov = sum((c - mean_load) * (d - mean_duration) for c, d in samples)
+    slope = max(0.0, cov / var_load)
+    return max(0.0, mean_duration - slope * mean_load), slope
+
+
+class StepDurationModel:
+    """Per-step linear model of duration versus concurrent provisions."""
+
+    def __init__(self, fits: dict[str, tuple[float, float]], sample_counts: dict[str, int]):
+        self.fits = fits
+        self.sample_counts = sample_counts
+
+    @classmethod
+    def from_samples(cls, samples: dict[str, list[tuple[int, float]]]) -> "StepDurationModel":
+        fits: dict[str, tuple[float, float]] = {}
+        for step in PROVISION_STEPS:
+            fits[step] = _fit_line(samples.get(step) or [], DEFAULT_STEP_SECONDS.get(step, 10.0))
+        return cls(fits, {step: len(samples.get(step) or []) for step in PROVISION_STEPS})
+
+    def predict(self, step: str, load: int) -> float:
+        intercept, slope = self.fits.get(step, (DEFAULT_STEP_SECONDS.get(step, 10.0), 0.0))
+        return intercept + slope * max(1, load)
+
+    def predict_total(self, load: int) -> float:
+        return sum(self.predict(step, load) for step in PROVISION_STEPS)
+
+    def predict_remaining(self, current_step: Optional[str], elapsed_in_step: float, load: int) -> float:
+        """Seconds left for a run that is `elapsed_in_step` into `current_step`."""
+        if current_step not in PROVISION_STEPS:
+            return self.predict_total(load)
+        index = PROVISION_STEPS.index(current_step)
+        # Never predict a finished step: assume at least a few seconds remain.
+        remaining = max(self.predict(current_step, load) - elapsed_in_step, 2.0)
+        return remaining + sum(self.predict(step, load) for step in PROVISION_STEPS[index + 1:])
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            step: {
+                "intercept_sec": round(intercept, 2),
+                "sec_per_concurrent_run": round(slope, 2),
+                "samples": self.sample_counts.get(step, 0),
+            }
+            for step, (intercept, slope) in self.fits.items()
+        }
+
+
+def sustainable_per_hour(model: StepDurationModel, pool_size: int) -> float:
+    """Provisions per hour when `pool_size` runs execute back to back."""
+    pool_size = max(1, pool_size)
+    total = model.predict_total(pool_size)
+    return 0.0 if total <= 0 else pool_size * 3600.0 / total
+
+
+def forecast_queue(
+    model: StepDurationModel,
+    running_remaining: list[float],
+    queued_count: int,
+    pool_size: int,
+) -> list[float]:
+    """Seconds until each queued run (in queue order) is expected to finish.
+
+    Simulates the bench pool: a queued run starts when the earliest slot frees
+    and then takes a full run at the pool's load.
+    """
+    pool_size = max(1, pool_size)
+    slots = sorted(running_remaining)[:pool_size]
+    slots += [0.0] * (pool_size - len(slots))
+    full_run = model.predict_total(pool_size)
+    etas: list[float] = []
+    for _ in range(queued_count):
+        slots.sort()
+        finish = slots.pop(0) + full_run
+        etas.append(finish)
+        slots.append(finish)
+    return etas
@@ -0,0 +1,80 @@
+"""
+Content hashes of seed manifests and the per-site record of which hash was last applied.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+def manifest_hash(*parts: Any) -> str:
+    """Stable sha256 over JSON-serialisable manifest parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SeedFingerprintStore:
+    """SQLite-backed (site, manifest) -> applied hash + last result, cached in memory."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory: dict[tuple[str, str], dict[str, Any]] = {}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS seed_fingerprints (
+                    site TEXT,
+                    manifest TEXT,
+                    hash TEXT,
+                    applied_at REAL,
+                    result TEXT,
+                    PRIMARY KEY (site, manifest)
+                )
+                """
+            )
+            for site, manifest, digest, applied_at, result in conn.execute(
+                "SELECT site, manifest, hash, applied_at, result FROM seed_fingerprints"
+            ):
+                self._memory[(site, manifest)] = {
+                    "hash": digest,
+                    "applied_at": applied_at,
+                    "result": json.loads(result) if result else None,
+                }
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, site: str, manifest: str) -> Optional[dict[str, Any]]:
+        return self._memory.get((site, manifest))
+
+    def set(self, site: str, manifest: str, digest: str, result: Any) -> None:
+        entry = {"hash": digest, "applied_at": time.time(), "result": result}
+        with self._lock:
+            self._memory[(site, manifest)] = entry
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO seed_fingerprints VALUES (?, ?, ?, ?, ?)",
+                    (site, manifest, digest, entry["applied_at"], json.dumps(result, default=str)),
+                )
+
+    def invalidate(self, site: str, manifest: Optional[str] = None) -> None:
+        """Forget applied hashes so the next call runs a full reconcile."""
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == site and (manifest is None or k[1] == manifest)]:
+                self._memory.pop(key, None)
+            with self._connect() as conn:
+                if manifest is None:
+                    conn.execute("DELETE FROM seed_fingerprints WHERE site = ?", (site,))
+                else:
+                    conn.execute(
+                        "DELETE FROM seed_fingerprints WHERE site = ? AND manifest = ?",
+                        (site, manifest),
+                    )
@@ -0,0 +1,85 @@
+"""
+In-memory index of taken and reserved subdomains for signup availability checks.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Callable, Iterable
+
+# Never handed out to a tenant: infrastructure hosts and app routes on the parent domain.
+RESERVED_SUBDOMAINS = frozenset({
+    "admin", "api", "app", "assets", "auth", "billing", "blog", "dashboard", "dev",
+    "docs", "erp", "files", "help", "login", "mail", "master", "provisioning",
+    "signup", "smtp", "static", "staging", "status", "support", "test", "www",
+})
+
+# Appended to the requested name (through generate_subdomain) when it is taken.
+SUGGESTION_SUFFIXES = ("hq", "app", "team", "erp", "online")
+
+
+class SubdomainIndex:
+    """Sorted array of unavailable subdomains plus an exact set for membership.
+
+    The set answers `is_taken`; the sorted array finds every taken name that
+    starts with a prefix, so the next free numeric suffix is one bisect away.
+    """
+
+    def __init__(self, reserved: Iterable[str] = RESERVED_SUBDOMAINS):
+        self._reserved = frozenset(s.lower() for s in reserved)
+        self._lock = threading.Lock()
+        self._taken: frozenset[str] = self._reserved
+        self._sorted: list[str] = sorted(self._taken)
+        self.loaded = False
+
+    def rebuild(self, subdomains: Iterable[str]) -> None:
+        taken = self._reserved | {s.lower() for s in subdomains if s}
+        with self._lock:
+            self._taken = taken
+            self._sorted = sorted(taken)
+            self.loaded = True
+
+    def add(self, subdomain: str) -> None:
+        subdomain = subdomain.lower()
+        with self._lock:
+            if subdomain in self._taken:
+                return
+            self._taken = self._taken | {subdomain}
+            bisect.insort(self._sorted, subdomain)
+
+    def is_reserved(self, subdomain: str) -> bool:
+        return subdomain in self._reserved
+
+    def is_taken(self, subdomain: str) -> bool:
+        return subdomain in self._taken
+
+    def with_prefix(self, prefix: str) -> list[str]:
+        start = bisect.bisect_left(self._sorted, prefix)
+        end = bisect.bisect_left(self._sorted, prefix + "\x7f")
+        return self._sorted[start:end]
+
+    def suggest(self, base: str, slugify: Callable[[str], str], count: int = 3) -> list[str]:
+        """Free alternatives to `base`: word suffixes first, then the next numeric suffixes."""
+        suggestions: list[str] = []
+        for suffix in SUGGESTION_SUFFIXES:
+            candidate = slugify(f"{base} {suffix}")
+            if candidate not in suggestions and not self.is_taken(candidate):
+                suggestions.append(candidate)
+            if len(suggestions) >= count:
+                return suggestions
+
+        used = set()
+        for name in self.with_prefix(f"{base}-"):
+            tail = name[len(base) + 1:]
+            if tail.isdigit():
+                used.add(int(tail))
+        for number in range(2, 2 + count + len(used) + 1):
+            if len(suggestions) >= count:
+                break
+            if number in used:
+                continue
+            candidate = slugify(f"{base} {number}")
+            if not self.is_taken(candidate) and candidate not in suggestions:
+                suggestions.append(candidate)
+        return suggestions
@@ -0,0 +1,46 @@
+"""
+Per-tenant credential shared by a tenant site and the provisioning service.
+
+Derived from the service's own secret and the site name, so the service keeps
+no per-tenant state and a tenant holding its credential can neither act as
+another tenant nor call the service's admin endpoints. Tenant sites present it
+(with their site name) when they report membership events; the service presents
+it to the tenant's nexus_core guest methods.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+
+TENANT_SITE_HEADER = "X-Tenant-Site"
+TENANT_SECRET_HEADER = "X-Tenant-Secret"
+# site_config.json keys on the tenant site.
+TENANT_SECRET_KEY = "nexus_tenant_secret"
+CALLBACK_URL_KEY = "nexus_provisioning_url"
+
+
+def tenant_secret(master_secret: str, site: str) -> str:
+    return hmac.new(master_secret.encode(), f"nexus-tenant:{site}".encode(), hashlib.sha256).hexdigest()
+
+
+def verify_tenant_secret(master_secret: str, site: str, supplied: str) -> bool:
+    return bool(site and supplied) and hmac.compare_digest(tenant_secret(master_secret, site), supplied)
+
+
+def build_tenant_config_code(config_by_site: dict[str, dict[str, str]]) -> str:
+    """Tenant-side snippet writing the running site's entry into its site_config.json.
+
+    Keyed by site so one snippet serves every site of a fleet interpreter; keys
+    that already hold the value are not rewritten. Prints nothing, so it can be
+    prepended to any script that reports through its last stdout line.
+    """
+    return f"""
+import json
+from frappe.installer import update_site_config as _update_site_config
+for _key, _value in json.loads({json.dumps(json.dumps(config_by_site))}).get(frappe.local.site, {{}}).items():
+    if frappe.conf.get(_key) != _value:
+        _update_site_config(_key, _value)
+        frappe.conf[_key] = _value
+"""
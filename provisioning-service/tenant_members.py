@@ -0,0 +1,118 @@
+"""
+User -> tenant membership index (SaaS Tenant Member on the master site).
+
+Tenant sites report User insert / enable / delete through nexus_core doc_events;
+a backfill walks every tenant once. Login resolution then reads the index
+instead of querying each tenant site for a User row.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from agent_doctypes import frappe_config_dir
+from master_data import MASTER_DATA_SEED_SNIPPET
+
+TENANT_MEMBER_DOCTYPE = "SaaS Tenant Member"
+TENANT_MEMBER_FIXTURE = "saas_tenant_member.json"
+
+# Users that exist on every site and never identify a workspace member.
+SYSTEM_USERS = ("Administrator", "Guest")
+
+
+def load_member_doctype_fixture() -> dict[str, Any]:
+    with (frappe_config_dir() / TENANT_MEMBER_FIXTURE).open(encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+# Runs on a tenant site (fleet interpreter): every real user and its enabled flag.
+TENANT_USERS_CODE = f"""
+import json
+rows = frappe.get_all(
+    "User",
+    filters={{"name": ["not in", {json.dumps(list(SYSTEM_USERS))}]}},
+    fields=["name", "enabled"],
+    limit=0,
+)
+print(json.dumps({{"users": [[row["name"], int(row["enabled"] or 0)] for row in rows]}}))
+"""
+
+
+def build_sync_members_frappe_code(
+    fixture: dict[str, Any],
+    members_by_subdomain: dict[str, list[dict[str, Any]]],
+    replace: bool,
+) -> str:
+    """Master-site script applying membership changes for one or more tenants.
+
+    Each member is {"email", "enabled", "removed"}. With `replace`, the given
+    members are the tenant's complete user list (backfill) and any other row
+    for that tenant is deleted.
+    """
+    return f"""
+import json
+import frappe
+{MASTER_DATA_SEED_SNIPPET}
+DOCTYPE = {json.dumps(TENANT_MEMBER_DOCTYPE)}
+fixture = json.loads({json.dumps(json.dumps(fixture))})
+members_by_subdomain = json.loads({json.dumps(json.dumps(members_by_subdomain))})
+replace = {replace!r}
+result = {{"inserted": 0, "updated": 0, "deleted": 0}}
+
+if not frappe.db.exists("DocType", DOCTYPE):
+    frappe.get_doc(fixture).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+for subdomain, members in members_by_subdomain.items():
+    wanted = {{}}
+    for member in members:
+        email = (member.get("email") or "").strip().lower()
+        if email:
+            wanted[subdomain + ":" + email] = member
+    filters = {{"subdomain": subdomain}} if replace else {{"name": ["in", list(wanted) or [""]]}}
+    existing = {{row["name"]: row["enabled"] for row in frappe.get_all(DOCTYPE, filters=filters, fields=["name", "enabled"], limit=0)}}
+
+    removed = [key for key, m in wanted.items() if m.get("removed") and key in existing]
+    if replace:
+        removed += [key for key in existing if key not in wanted]
+    if removed:
+        frappe.db.delete(DOCTYPE, {{"name": ["in", removed]}})
+        result["deleted"] += len(removed)
+
+    rows = []
+    for key, member in wanted.items():
+        if member.get("removed"):
+            continue
+        enabled = 1 if member.get("enabled", True) else 0
+        if key not in existing:
+            email = key.split(":", 1)[1]
+            rows.append({{"name": key, "member_key": key, "user_email": email, "subdomain": subdomain, "enabled": enabled}})
+        elif int(existing[key] or 0) != enabled:
+            frappe.db.set_value(DOCTYPE, key, "enabled", enabled, update_modified=False)
+            result["updated"] += 1
+    if rows:
+        bulk_insert_docs(DOCTYPE, rows)
+        result["inserted"] += len(rows)
+
+frappe.db.commit()
+print(json.dumps(result))
+"""
+
+
+def build_member_lookup_frappe_code(email: str) -> str:
+    """Master-site script: subdomains where `email` is an enabled member (one indexed read)."""
+    return f"""
+import json
+import frappe
+subdomains = []
+if frappe.db.exists("DocType", {json.dumps(TENANT_MEMBER_DOCTYPE)}):
+    subdomains = frappe.get_all(
+        {json.dumps(TENANT_MEMBER_DOCTYPE)},
+        filters={{"user_email": {json.dumps(email.strip().lower())}, "enabled": 1}},
+        pluck="subdomain",
+        limit=0,
+        ignore_permissions=True,
+    )
+print(json.dumps({{"subdomains": subdomains}}))
+"""
@@ -0,0 +1,178 @@
+"""
+In-process copy of the master-site SaaS Tenant registry, indexed for login-path lookups.
+"""
+
+from __future__ import annotations
+
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+# Lookup fields served from memory; anything else goes to the master site.
+REGISTRY_INDEXED_FIELDS = ("subdomain", "owner_email", "name")
+
+
+def _key(field: str, value: Any) -> str:
+    # Emails are matched case-insensitively, like the MariaDB collation on master.
+    text = str(value or "").strip()
+    return text.lower() if field == "owner_email" else text
+
+
+class TenantRegistry:
+    """Tenant rows indexed by subdomain, owner email and name.
+
+    The whole table is replaced by `refresh` (one master query); `upsert`
+    adds read-through hits. `invalidate` marks the copy stale so the next
+    read reloads it, used when this service provisions or deprovisions.
+    Rows in `hidden_statuses` are left out of lookups but their subdomains
+    still count as taken. Listeners run after every refresh or upsert.
+
+    `version` increases whenever the visible rows change; each change is kept
+    in a bounded log so replicas can catch up with `changes_since`. `epoch`
+    identifies this process, since versions restart with it.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], list[dict[str, Any]]],
+        active_statuses: list[str],
+        hidden_statuses: tuple[str, ...] = (),
+        change_log_size: int = 10000,
+    ):
+        self._loader = loader
+        self._active_statuses = {s.lower() for s in active_statuses}
+        self._hidden_statuses = {s.lower() for s in hidden_statuses}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._listeners: list[Callable[["TenantRegistry"], None]] = []
+        self._rows: dict[str, dict[str, Any]] = {}
+        self._taken_subdomains: frozenset[str] = frozenset()
+        self._indexes: dict[str, dict[str, list[dict[str, Any]]]] = {f: {} for f in REGISTRY_INDEXED_FIELDS}
+        self.loaded_at: Optional[float] = None
+        self.stale = True
+        # Bumped by invalidate(); a load that began under an older generation
+        # may predate the change, so it does not clear `stale`.
+        self._generation = 0
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        self._changes: deque[dict[str, Any]] = deque(maxlen=change_log_size)
+
+    def _rebuild_indexes(self) -> None:
+        indexes: dict[str, dict[str, list[dict[str, Any]]]] = {f: {} for f in REGISTRY_INDEXED_FIELDS}
+        for row in self._rows.values():
+            for field in REGISTRY_INDEXED_FIELDS:
+                if row.get(field):
+                    indexes[field].setdefault(_key(field, row[field]), []).append(row)
+        self._indexes = indexes
+
+    def refresh(self) -> None:
+        """Reload every row from master; concurrent callers wait for one load."""
+        started = time.time()
+        with self._refresh_lock:
+            if self.loaded_at is not None and self.loaded_at >= started and not self.stale:
+                return  # another thread refreshed while we waited
+            generation = self._generation
+            rows = self._loader()
+            with self._lock:
+                self._taken_subdomains = frozenset(
+                    str(row["subdomain"]).lower() for row in rows if row.get("subdomain")
+                )
+                rows_by_name = {row["name"]: row for row in rows if row.get("name") and not self._hidden(row)}
+                changes = [
+                    {"op": "upsert", "name": name, "tenant": row}
+                    for name, row in rows_by_name.items()
+                    if self._rows.get(name) != row
+                ] + [
+                    {"op": "remove", "name": name, "tenant": None}
+                    for name in self._rows
+                    if name not in rows_by_name
+                ]
+                self._rows = rows_by_name
+                self._record(changes, initial=self.loaded_at is None)
+                self._rebuild_indexes()
+                self.loaded_at = time.time()
+                self.stale = self._generation != generation
+            self._notify()
+
+    def ensure_fresh(self, max_age_sec: float) -> None:
+        if self.stale or self.loaded_at is None or time.time() - self.loaded_at > max_age_sec:
+            self.refresh()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.stale = True
+
+    def upsert(self, row: dict[str, Any]) -> None:
+        if not row.get("name") or self._hidden(row):
+            return
+        with self._lock:
+            if self._rows.get(row["name"]) == row:
+                return
+            self._rows[row["name"]] = row
+            self._record([{"op": "upsert", "name": row["name"], "tenant": row}])
+            if row.get("subdomain"):
+                self._taken_subdomains = self._taken_subdomains | {str(row["subdomain"]).lower()}
+            self._rebuild_indexes()
+        self._notify()
+
+    def _record(self, changes: list[dict[str, Any]], initial: bool = False) -> None:
+        # Caller holds self._lock; the first load is a snapshot, not a delta.
+        if not changes and not initial:
+            return
+        self.version += 1
+        if initial:
+            return
+        for change in changes:
+            self._changes.append({"version": self.version, **change})
+
+    def snapshot(self) -> tuple[int, list[dict[str, Any]]]:
+        with self._lock:
+            return self.version, list(self._rows.values())
+
+    def changes_since(self, version: int) -> tuple[int, Optional[list[dict[str, Any]]]]:
+        """(current version, changes after `version`); None when the log no longer reaches back."""
+        with self._lock:
+            if version == self.version:
+                return self.version, []
+            if version > self.version or not self._changes or self._changes[0]["version"] > version + 1:
+                return self.version, None
+            return self.version, [change for change in self._changes if change["version"] > version]
+
+    def subscribe(self, listener: Callable[["TenantRegistry"], None]) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            listener(self)
+
+    def _hidden(self, row: dict[str, Any]) -> bool:
+        return str(row.get("status") or "").lower() in self._hidden_statuses
+
+    def taken_subdomains(self) -> frozenset[str]:
+        """Subdomains of every row, hidden ones included (their sites still exist)."""
+        return self._taken_subdomains
+
+    def get(self, field: str, value: Any) -> Optional[dict[str, Any]]:
+        matches = self._indexes.get(field, {}).get(_key(field, value))
+        return matches[0] if matches else None
+
+    def find_all(self, field: str, value: Any) -> list[dict[str, Any]]:
+        return list(self._indexes.get(field, {}).get(_key(field, value)) or [])
+
+    def rows(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return list(self._rows.values())
+
+    def active_rows(self) -> list[dict[str, Any]]:
+        return [r for r in self.rows() if str(r.get("status") or "").lower() in self._active_statuses]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "rows": len(self._rows),
+            "loaded_at": self.loaded_at,
+            "age_sec": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            "stale": self.stale,
+        }
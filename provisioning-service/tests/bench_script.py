@@ -0,0 +1,27 @@
+"""Run a generated bench script in-process against fake frappe modules."""
+
+import contextlib
+import io
+import json
+import sys
+
+
+def run_script(code: str, modules: dict) -> str:
+    """Exec ``code`` with ``modules`` installed in sys.modules; return what it printed."""
+    saved = {name: sys.modules.get(name) for name in modules}
+    sys.modules.update(modules)
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            exec(code, {"frappe": modules["frappe"]})
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+    return out.getvalue()
+
+
+def last_json(output: str) -> dict:
+    return json.loads(output.strip().splitlines()[-1])
@@ -0,0 +1,18 @@
+"""
+Unit tests for the provisioning service's pure modules. Run from provisioning-service/:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Importing app reads its configuration at import time; keep it off shared paths.
+_data_dir = tempfile.mkdtemp(prefix="provisioning-tests-")
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("PROVISIONING_DATA_DIR", _data_dir)
+os.environ.setdefault("USER_KEY_CACHE_BACKEND", "local")
@@ -0,0 +1,130 @@
+"""Agent DocType seeding: a small check first, fixtures shipped only for missing or outdated DocTypes."""
+
+import types
+
+import pytest
+
+import app
+from agent_doctypes import AGENT_ACTION_LOG_CUSTOM_FIELDS, FIXTURE_HASH_KEY, agent_doctype_payload
+from bench_script import run_script
+
+SITE = "acme.localhost"
+PAYLOAD = agent_doctype_payload()
+
+
+class FakeAgentSite:
+    def __init__(self):
+        self.doctypes = {}
+        self.custom_fields = {}
+        self.globals = {}
+        self.scripts = []
+
+    def install(self, name, fixture_hash=None, fields=None):
+        fixture = next(f for f in PAYLOAD.fixtures if f["name"] == name)
+        self.doctypes[name] = [f["fieldname"] for f in fixture.get("fields") or [] if f.get("fieldname")] if fields is None else fields
+        self.globals[FIXTURE_HASH_KEY + name] = fixture_hash or PAYLOAD.hashes[name]
+
+    def modules(self):
+        site = self
+
+        class DocType:
+            def __init__(self, spec):
+                self.spec = dict(spec)
+
+            def insert(self, ignore_permissions=False):
+                site.doctypes[self.spec["name"]] = [f["fieldname"] for f in self.spec.get("fields") or [] if f.get("fieldname")]
+
+            def set(self, key, value):
+                self.spec[key] = value
+
+            def save(self, ignore_permissions=False):
+                self.insert()
+
+        def get_doc(spec, name=None):
+            return DocType({"name": name} if name else spec)
+
+        def get_all(doctype, filters=None, fields=None, pluck=None):
+            if doctype == "DocType":
+                return [name for name in site.doctypes if name in filters["name"][1]]
+            if doctype == "DocField":
+                return list(site.doctypes.get(filters["parent"], []))
+            rows = [{"name": f"{dt}-{fn}", "dt": dt, "fieldname": fn} for dt, fns in site.custom_fields.items() for fn in fns]
+            dts = filters["dt"][1] if isinstance(filters["dt"], list) else [filters["dt"]]
+            rows = [r for r in rows if r["dt"] in dts and ("fieldname" not in filters or r["fieldname"] in filters["fieldname"][1])]
+            return [r[pluck] for r in rows] if pluck else [{f: r[f] for f in fields} for r in rows]
+
+        def delete_doc(doctype, name, ignore_permissions=False):
+            dt, fieldname = name.split("-")
+            site.custom_fields[dt].remove(fieldname)
+
+        def create_custom_fields(targets, update=True):
+            for dt, specs in targets.items():
+                site.custom_fields.setdefault(dt, []).extend(spec["fieldname"] for spec in specs)
+
+        frappe = types.ModuleType("frappe")
+        frappe.get_all = get_all
+        frappe.get_doc = get_doc
+        frappe.delete_doc = delete_doc
+        frappe.clear_cache = lambda doctype: None
+        frappe.db = types.SimpleNamespace(
+            exists=lambda doctype, name: name in site.doctypes,
+            get_global=site.globals.get,
+            set_global=site.globals.__setitem__,
+            commit=lambda: None,
+        )
+        custom_field = types.ModuleType("frappe.custom.doctype.custom_field.custom_field")
+        custom_field.create_custom_fields = create_custom_fields
+        return {"frappe": frappe, "frappe.custom.doctype.custom_field.custom_field": custom_field}
+
+    def run_frappe_code(self, site_name, code):
+        assert site_name == SITE
+        self.scripts.append(code)
+        return run_script(code, self.modules())
+
+
+@pytest.fixture
+def site(monkeypatch):
+    fake = FakeAgentSite()
+    monkeypatch.setattr(app, "run_frappe_code", fake.run_frappe_code)
+    return fake
+
+
+def test_an_up_to_date_site_only_runs_the_check(site):
+    for name in PAYLOAD.names:
+        site.install(name)
+    site.doctypes["Agent Action Log"] += [f["fieldname"] for f in AGENT_ACTION_LOG_CUSTOM_FIELDS]
+    result = app.seed_agent_doctypes_on_site(SITE)
+    assert result["checked_only"]
+    assert site.scripts == [PAYLOAD.check_code]
+
+
+def test_only_the_missing_fixture_is_shipped(site):
+    site.install("Agent Action Log")
+    site.doctypes["Agent Action Log"] += [f["fieldname"] for f in AGENT_ACTION_LOG_CUSTOM_FIELDS]
+    result = app.seed_agent_doctypes_on_site(SITE)
+    assert result["imported"] == ["Agent Audit Log"]
+    assert result["skipped"] == ["Agent Action Log"]
+    assert site.scripts[1] == PAYLOAD.seed_code(["Agent Audit Log"])
+    assert site.globals[FIXTURE_HASH_KEY + "Agent Audit Log"] == PAYLOAD.hashes["Agent Audit Log"]
+    assert app.seed_agent_doctypes_on_site(SITE)["checked_only"]
+
+
+def test_an_outdated_doctype_is_upgraded_and_its_shims_removed(site):
+    for name in PAYLOAD.names:
+        site.install(name)
+    site.install("Agent Action Log", fixture_hash="older", fields=["status"])
+    site.custom_fields["Agent Action Log"] = ["tool_name"]
+    result = app.seed_agent_doctypes_on_site(SITE)
+    assert result["upgraded"] == ["Agent Action Log"]
+    assert "tool_name" in site.doctypes["Agent Action Log"]
+    assert site.custom_fields["Agent Action Log"] == []
+    assert app.seed_agent_doctypes_on_site(SITE)["checked_only"]
+
+
+def test_missing_action_log_fields_are_added_without_reimporting(site):
+    for name in PAYLOAD.names:
+        site.install(name)
+    site.doctypes["Agent Action Log"] = [f for f in site.doctypes["Agent Action Log"] if f != "tool_name"]
+    result = app.seed_agent_doctypes_on_site(SITE)
+    assert (result["imported"], result["upgraded"]) == ([], [])
+    assert result["custom_fields"]["created"] == ["Agent Action Log:tool_name"]
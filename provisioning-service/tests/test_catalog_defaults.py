@@ -0,0 +1,190 @@
+"""Catalog defaults and create-item against a fake tenant that runs the generated bench scripts."""
+
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import types
+from collections import OrderedDict
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from frappe_http import FrappeHTTPError, NoRouteError
+
+SITE = "acme.localhost"
+HEADERS = {"X-Provisioning-Secret": app.PROVISIONING_SECRET}
+SHIPPED_CONFIG = Path(__file__).resolve().parents[2] / "frappe-config" / "common_site_config.json"
+
+
+class LinkValidationError(Exception):
+    pass
+
+
+class DuplicateEntryError(Exception):
+    pass
+
+
+class FakeTenant:
+    """site_config, Item Group / UOM names and inserted Items of one site."""
+
+    def __init__(self):
+        self.conf = json.loads(SHIPPED_CONFIG.read_text())
+        self.groups = ["Equipment", "Services"]
+        self.uoms = ["Nos"]
+        self.stamp_edits = 0
+        self.items = []
+        self.bench_calls = 0
+        self.http_up = True
+
+    def stamp(self):
+        return f"edits={self.stamp_edits}"
+
+    def _frappe(self):
+        tenant = self
+
+        class Doc:
+            def __init__(self, doc):
+                self.doc = doc
+                self.name = doc["item_code"]
+
+            def insert(self, ignore_permissions=False):
+                if self.doc["item_group"] not in tenant.groups:
+                    raise LinkValidationError(f"Could not find Item Group: {self.doc['item_group']}")
+                if any(item["item_code"] == self.name for item in tenant.items):
+                    raise DuplicateEntryError(f"Item {self.name} already exists")
+                tenant.items.append(self.doc)
+
+        def exists(doctype, name):
+            return name in {"Item Group": self.groups, "UOM": self.uoms}[doctype]
+
+        def get_all(doctype, filters=None, fields=None, order_by=None, limit=None):
+            return [{"name": name} for name in {"Item Group": self.groups, "UOM": self.uoms}[doctype]]
+
+        installer = types.ModuleType("frappe.installer")
+        installer.update_site_config = self.conf.__setitem__
+        frappe = types.ModuleType("frappe")
+        frappe.installer = installer
+        frappe.local = types.SimpleNamespace(site=SITE)
+        frappe.conf = self.conf
+        frappe.get_all = get_all
+        frappe.get_doc = Doc
+        frappe.LinkValidationError = LinkValidationError
+        frappe.db = types.SimpleNamespace(commit=lambda: None, rollback=lambda: None, exists=exists)
+        catalog = types.ModuleType("nexus_core.catalog")
+        catalog.catalog_stamp = self.stamp
+        return {"frappe": frappe, "frappe.installer": installer, "nexus_core": types.ModuleType("nexus_core"), "nexus_core.catalog": catalog}
+
+    def run_frappe_code(self, site, code):
+        assert site == SITE
+        self.bench_calls += 1
+        modules = self._frappe()
+        saved = {name: sys.modules.get(name) for name in modules}
+        sys.modules.update(modules)
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                exec(code, {"frappe": modules["frappe"]})
+        finally:
+            for name, module in saved.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+        return out.getvalue()
+
+    async def get_catalog_stamp(self, site, routes, path, method="GET", headers=None, body=None, timeout=15):
+        assert path == "/api/method/nexus_core.catalog.get_catalog_stamp"
+        if not self.http_up:
+            raise NoRouteError(f"no route reached Frappe for {site}")
+        # nexus_core.api_keys.require_tenant_secret
+        expected = self.conf.get("nexus_tenant_secret")
+        if not expected or (headers or {}).get("X-Tenant-Secret") != expected:
+            raise FrappeHTTPError(403, {"exc_type": "PermissionError"})
+        return {"message": {"stamp": self.stamp()}}
+
+
+@pytest.fixture
+def tenant(monkeypatch):
+    fake = FakeTenant()
+    monkeypatch.setattr(app, "run_frappe_code", fake.run_frappe_code)
+    monkeypatch.setattr(app._frappe_router, "request_json", fake.get_catalog_stamp)
+    monkeypatch.setattr(app, "_catalog_defaults_cache", OrderedDict())
+    monkeypatch.setattr(app, "_catalog_defaults_locks", OrderedDict())
+    return fake
+
+
+def _create(client, **item):
+    response = client.post("/api/v1/create-item/acme", json={"item_code": "EX-1", "item_name": "Excavator", **item}, headers=HEADERS)
+    assert response.status_code == 200, response.text
+    return response.json()["item"]
+
+
+def test_defaults_are_served_from_cache_once_the_tenant_credential_is_installed(tenant):
+    client = TestClient(app.app)
+    first = client.get("/api/v1/catalog-defaults/acme", headers=HEADERS)
+    assert first.json()["defaults"]["item_group"] == "Equipment"
+    assert tenant.conf["nexus_tenant_secret"] == app.tenant_secret(app.PROVISIONING_SECRET, SITE)
+    assert tenant.bench_calls == 1
+
+    assert client.get("/api/v1/catalog-defaults/acme", headers=HEADERS).json() == first.json()
+    assert client.get("/api/v1/catalog-defaults/acme", headers={**HEADERS, "If-None-Match": first.headers["etag"]}).status_code == 304
+    assert tenant.bench_calls == 1
+
+    tenant.groups.insert(0, "Heavy Equipment Rental")
+    tenant.stamp_edits += 1
+    assert client.get("/api/v1/catalog-defaults/acme", headers=HEADERS).json()["defaults"]["item_group"] == "Heavy Equipment Rental"
+    assert tenant.bench_calls == 2
+
+
+def test_create_item_is_one_bench_script_with_or_without_a_cache(tenant):
+    client = TestClient(app.app)
+    assert _create(client, item_group="Services") == {"name": "EX-1", "item_group": "Services", "stock_uom": "Nos"}
+    assert tenant.bench_calls == 1
+    # The insert script's resolution refilled the cache with the tenant defaults.
+    assert app._catalog_defaults_cache[SITE]["defaults"]["item_group"] == "Equipment"
+
+    assert _create(client, item_code="EX-2")["item_group"] == "Equipment"
+    assert tenant.bench_calls == 2
+
+
+def test_create_item_without_a_readable_stamp_stays_one_bench_script(tenant):
+    tenant.http_up = False
+    client = TestClient(app.app)
+    for code in ("EX-1", "EX-2"):
+        _create(client, item_code=code)
+    assert tenant.bench_calls == 2
+    assert [item["item_group"] for item in tenant.items] == ["Equipment", "Equipment"]
+
+
+def test_a_link_the_stamp_missed_is_resolved_again_in_the_retry(tenant):
+    client = TestClient(app.app)
+    _create(client)
+    # Renamed without moving the stamp.
+    tenant.groups[0] = "Machinery"
+    assert _create(client, item_code="EX-2")["item_group"] == "Machinery"
+    assert tenant.bench_calls == 3
+
+
+def test_other_insert_failures_are_not_retried(tenant):
+    client = TestClient(app.app)
+    _create(client)
+    assert SITE in app._catalog_defaults_cache
+    response = client.post("/api/v1/create-item/acme", json={"item_code": "EX-1", "item_name": "Excavator"}, headers=HEADERS)
+    assert response.status_code == 500
+    assert "already exists" in response.json()["detail"]
+    assert tenant.bench_calls == 2
+    assert len(tenant.items) == 1
+
+
+def test_locks_and_entries_stay_bounded(tenant, monkeypatch):
+    monkeypatch.setattr(app, "CATALOG_DEFAULTS_MAX_SITES", 2)
+    asyncio.run(app._catalog_defaults_lock("held.localhost").acquire())
+    for i in range(5):
+        app._catalog_defaults_lock(f"t{i}.localhost")
+        app._store_catalog_defaults(f"t{i}.localhost", {"item_group": "Equipment", "stamp": "s"})
+    assert list(app._catalog_defaults_locks) == ["held.localhost", "t4.localhost"]
+    assert list(app._catalog_defaults_cache) == ["t3.localhost", "t4.localhost"]
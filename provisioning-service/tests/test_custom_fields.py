@@ -0,0 +1,78 @@
+"""Custom Field reconcile: one read for every target, one create call per doctype with missing fields."""
+
+import types
+
+from bench_script import last_json, run_script
+from custom_fields import (
+    RENTAL_FIELD_SPECS,
+    RENTAL_TARGET_DOCTYPES,
+    build_seed_custom_fields_frappe_code,
+    rental_custom_field_targets,
+)
+
+
+class FakeCustomFields:
+    def __init__(self, existing=()):
+        self.fields = set(existing)
+        self.reads = 0
+        self.creates = []
+        self.failing = set()
+
+    def modules(self):
+        def get_all(doctype, filters=None, fields=None):
+            assert doctype == "Custom Field"
+            self.reads += 1
+            return [{"dt": dt, "fieldname": fn} for dt, fn in self.fields
+                    if dt in filters["dt"][1] and fn in filters["fieldname"][1]]
+
+        def create_custom_fields(targets, update=True):
+            ((dt, specs),) = targets.items()
+            if dt in self.failing:
+                raise Exception("Row size too large")
+            self.creates.append((dt, [spec["fieldname"] for spec in specs]))
+            self.fields |= {(dt, spec["fieldname"]) for spec in specs}
+
+        frappe = types.ModuleType("frappe")
+        frappe.get_all = get_all
+        frappe.db = types.SimpleNamespace(commit=lambda: None)
+        custom_field = types.ModuleType("frappe.custom.doctype.custom_field.custom_field")
+        custom_field.create_custom_fields = create_custom_fields
+        return {"frappe": frappe, "frappe.custom.doctype.custom_field.custom_field": custom_field}
+
+    def reconcile(self, targets):
+        return last_json(run_script(build_seed_custom_fields_frappe_code(targets), self.modules()))
+
+
+def test_missing_fields_are_created_in_one_call_per_doctype():
+    site = FakeCustomFields({("Quotation Item", "custom_is_rental")})
+    result = site.reconcile(rental_custom_field_targets())
+    assert site.reads == 1
+    assert [dt for dt, _ in site.creates] == RENTAL_TARGET_DOCTYPES
+    assert "custom_is_rental" not in site.creates[0][1]
+    assert len(site.creates[1][1]) == len(RENTAL_FIELD_SPECS)
+    assert result["skipped"] == ["Quotation Item:custom_is_rental"]
+    assert len(result["created"]) == 3 * len(RENTAL_FIELD_SPECS) - 1
+    assert result["errors"] == []
+
+
+def test_a_complete_site_is_one_read_and_no_creates():
+    site = FakeCustomFields()
+    site.reconcile(rental_custom_field_targets())
+    site.creates, site.reads = [], 0
+    result = site.reconcile(rental_custom_field_targets())
+    assert (site.reads, site.creates, result["created"]) == (1, [], [])
+
+
+def test_a_failing_doctype_does_not_stop_the_others():
+    site = FakeCustomFields()
+    site.failing.add("Sales Order Item")
+    result = site.reconcile(rental_custom_field_targets())
+    assert [dt for dt, _ in site.creates] == ["Quotation Item", "Sales Invoice Item"]
+    assert result["errors"] == ["Sales Order Item: Row size too large"]
+
+
+def test_targets_get_complete_field_dicts():
+    for specs in rental_custom_field_targets().values():
+        assert all({"fieldname", "label", "fieldtype", "insert_after"} <= set(spec) for spec in specs)
+    rental_type = next(s for s in rental_custom_field_targets()["Sales Order Item"] if s["fieldname"] == "custom_rental_type")
+    assert rental_type["options"] == "Hours\nDays\nMonths"
@@ -0,0 +1,101 @@
+"""Background deprovisioning: batched drops, retries with backoff, failures recorded on master."""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+class FakeFleet:
+    """Drop-site and master-site calls, failing on demand."""
+
+    def __init__(self):
+        self.drops = []
+        self.deleted = []
+        self.tombstoned = []
+        self.drop_failures = {}
+        self.delete_failures = 0
+
+    def drop_site(self, site_name, archive):
+        self.drops.append(site_name)
+        if self.drop_failures.get(site_name, 0) > 0:
+            self.drop_failures[site_name] -= 1
+            raise Exception("bench drop-site failed: database busy")
+
+    def delete_rows(self, subdomains):
+        if self.delete_failures > 0:
+            self.delete_failures -= 1
+            return {"deleted": [], "errors": [{"subdomain": s, "error": "locked"} for s in subdomains]}
+        self.deleted += subdomains
+        return {"deleted": subdomains, "errors": []}
+
+    def tombstone(self, subdomains, status=app.TOMBSTONED_TENANT_STATUS):
+        self.tombstoned.append((list(subdomains), status))
+        return {"tombstoned": subdomains, "missing": []}
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    fake = FakeFleet()
+    monkeypatch.setattr(app, "_drop_site", fake.drop_site)
+    monkeypatch.setattr(app, "_delete_saas_tenant_rows", fake.delete_rows)
+    monkeypatch.setattr(app, "_tombstone_saas_tenants", fake.tombstone)
+    monkeypatch.setattr(app, "_deprovision_queue", asyncio.Queue())
+    monkeypatch.setattr(app, "_deprovision_worker_task", None)
+    monkeypatch.setattr(app, "_DEPROVISION_JOBS", {})
+    monkeypatch.setattr(app, "DEPROVISION_RETRY_BASE_SEC", 0.01)
+    monkeypatch.setattr(app, "DEPROVISION_MAX_ATTEMPTS", 3)
+    return fake
+
+
+def _run(subdomains):
+    async def main():
+        jobs = [app._enqueue_deprovision(app.get_site_name(sub), sub, archive=False) for sub in subdomains]
+        for _ in range(500):
+            if all(job["status"] in ("done", "failed") for job in jobs):
+                return jobs
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"jobs did not settle: {jobs}")
+
+    return asyncio.run(main())
+
+
+def test_batch_drops_every_site_then_removes_the_rows_in_one_call(fleet):
+    jobs = _run(["a", "b", "c"])
+    assert [job["status"] for job in jobs] == ["done"] * 3
+    assert sorted(fleet.drops) == [app.get_site_name(s) for s in "abc"]
+    assert fleet.deleted == ["a", "b", "c"]
+    assert fleet.tombstoned == []
+
+
+def test_failed_drop_is_retried_with_backoff(fleet):
+    fleet.drop_failures[app.get_site_name("a")] = 1
+    (job,) = _run(["a"])
+    assert (job["status"], job["attempts"], job["error"]) == ("done", 2, None)
+    assert fleet.deleted == ["a"]
+
+
+def test_a_dropped_site_is_not_dropped_again_when_only_the_row_removal_failed(fleet):
+    fleet.delete_failures = 1
+    (job,) = _run(["a"])
+    assert job["status"] == "done"
+    assert fleet.drops == [app.get_site_name("a")]
+    assert fleet.deleted == ["a"]
+
+
+def test_exhausted_retries_mark_the_tenant_failed_on_master(fleet):
+    fleet.drop_failures[app.get_site_name("a")] = 99
+    (job,) = _run(["a"])
+    assert (job["status"], job["attempts"]) == ("failed", 3)
+    assert "drop-site failed" in job["error"]
+    assert fleet.deleted == []
+    assert fleet.tombstoned == [(["a"], app.DEPROVISION_FAILED_STATUS)]
+
+
+def test_endpoint_tombstones_before_answering(fleet):
+    response = TestClient(app.app).delete("/api/v1/deprovision/a", headers={"X-Provisioning-Secret": app.PROVISIONING_SECRET})
+    assert response.status_code == 202
+    assert fleet.tombstoned[0] == (["a"], app.TOMBSTONED_TENANT_STATUS)
+    assert app._DEPROVISION_JOBS[response.json()["job_id"]]["subdomain"] == "a"
@@ -0,0 +1,90 @@
+"""DocPerm matrix reconcile: one read, writes only for rows that drifted."""
+
+import itertools
+import types
+
+import app
+from bench_script import last_json, run_script
+
+PERM_FIELDS = ["read", "write", "create", "delete", "submit", "cancel", "amend"]
+MATRIX = [
+    {"doctype": "Lead", "role": "Sales Manager", "read": 1, "write": 1, "create": 1, "delete": 1},
+    {"doctype": "Lead", "role": "Sales User", "read": 1, "write": 0, "create": 0, "delete": 0},
+    {"doctype": "Item", "role": "Stock User", "read": 1, "write": 0, "create": 0, "delete": 0},
+]
+
+
+class FakeDocPerms:
+    def __init__(self, rows):
+        names = itertools.count(1)
+        self.rows = [
+            {"name": f"p{next(names)}", "parent": r["doctype"], "role": r["role"], "idx": i + 1, "permlevel": 0,
+             **{f: int(r.get(f, 0)) for f in PERM_FIELDS}}
+            for i, r in enumerate(rows)
+        ]
+        self.reads = 0
+        self.writes = []
+        self.cleared = []
+
+    def frappe(self):
+        def get_all(doctype, filters=None, fields=None, order_by=None, group_by=None):
+            assert doctype == "DocPerm"
+            parents = filters["parent"][1]
+            rows = [r for r in self.rows if r["parent"] in parents]
+            if group_by:
+                return [{"parent": p, "max_idx": max(r["idx"] for r in rows if r["parent"] == p)} for p in {r["parent"] for r in rows}]
+            self.reads += 1
+            return [dict(r) for r in rows if r["permlevel"] == filters["permlevel"]]
+
+        def bulk_update(doctype, updates):
+            self.writes.append(("update", sorted(updates)))
+            for row in self.rows:
+                row.update(updates.get(row["name"], {}))
+
+        def bulk_insert(doctype, fields, values):
+            self.writes.append(("insert", len(values)))
+            self.rows += [dict(zip(fields, v)) for v in values]
+
+        frappe = types.ModuleType("frappe")
+        frappe.get_all = get_all
+        frappe.db = types.SimpleNamespace(bulk_update=bulk_update, bulk_insert=bulk_insert, commit=lambda: None)
+        frappe.clear_cache = lambda doctype: self.cleared.append(doctype)
+        frappe.utils = types.SimpleNamespace(now=lambda: "2026-01-01 00:00:00")
+        frappe.session = types.SimpleNamespace(user="Administrator")
+        frappe.generate_hash = lambda length=10: f"new{len(self.rows)}"
+        return frappe
+
+    def reconcile(self, matrix):
+        return last_json(run_script(app.build_docperm_reconcile_code(matrix), {"frappe": self.frappe()}))
+
+    def matrix(self):
+        return {(r["parent"], r["role"]): {f: r[f] for f in ("read", "write", "create", "delete")} for r in self.rows}
+
+
+def test_a_matching_site_costs_one_read_and_no_writes():
+    site = FakeDocPerms(MATRIX)
+    result = site.reconcile(MATRIX)
+    assert (result["unchanged"], result["count"], result["errors"]) == (3, 3, [])
+    assert (site.reads, site.writes, site.cleared) == (1, [], [])
+
+
+def test_only_drifted_rows_are_written_and_only_their_doctypes_cleared():
+    drifted = [dict(MATRIX[0], delete=0), MATRIX[2]]
+    site = FakeDocPerms(drifted)
+    result = site.reconcile(MATRIX)
+    assert result["updated"] == ["Lead:Sales Manager"]
+    assert result["inserted"] == ["Lead:Sales User"]
+    assert result["count"] == 3
+    assert site.writes == [("update", ["p1"]), ("insert", 1)]
+    assert site.cleared == ["Lead"]
+    expected = {(r["doctype"], r["role"]): {f: r[f] for f in ("read", "write", "create", "delete")} for r in MATRIX}
+    assert site.matrix() == expected
+    # A second pass finds nothing left to do.
+    site.writes = []
+    assert site.reconcile(MATRIX)["unchanged"] == 3
+    assert site.writes == []
+
+
+def test_the_shipped_matrix_has_one_row_per_doctype_and_role():
+    keys = [(r["doctype"], r["role"]) for r in app.DOC_PERM_MINIMUM]
+    assert len(keys) == len(set(keys))
@@ -0,0 +1,71 @@
+"""Fleet drift scan: tenant x check matrix, cached per tenant for FLEET_DRIFT_TTL_SEC."""
+
+import asyncio
+import json
+
+import pytest
+
+import app
+
+CLEAN = {name: {"ok": True, "missing": []} for name in app.DRIFT_CHECKS}
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    scans = []
+    monkeypatch.setattr(app, "_DRIFT_CACHE", {})
+    monkeypatch.setattr(app, "_drift_scan_lock", asyncio.Lock())
+    monkeypatch.setattr(app, "_list_active_saas_tenant_rows", lambda limit: [{"subdomain": "a"}, {"subdomain": "b"}])
+
+    def scan(sites, code, workers):
+        scans.append(sorted(sites))
+        checks = {site: dict(CLEAN) for site in sites}
+        if app.get_site_name("b") in checks:
+            checks[app.get_site_name("b")].update(
+                docperms={"ok": False, "missing": ["Lead:Sales User"]},
+                fiscal_year={"ok": False, "error": "Table 'tabFiscal Year' doesn't exist"},
+            )
+        return checks
+
+    monkeypatch.setattr(app, "_scan_drift", scan)
+    return scans
+
+
+def _scan(refresh=False):
+    return asyncio.run(app.fleet_drift_scan(refresh=refresh, _auth=True))
+
+
+def test_matrix_reports_ok_drift_and_error_cells(fleet):
+    report = _scan()
+    assert report["tenants"] == 2 and report["scanned"] == 2
+    assert set(report["matrix"]["a"].values()) == {"ok"}
+    assert report["matrix"]["b"]["docperms"] == "drift"
+    assert report["matrix"]["b"]["fiscal_year"] == "error"
+    assert report["drifted"] == {**{name: 0 for name in app.DRIFT_CHECKS}, "docperms": 1, "fiscal_year": 1}
+    assert report["details"] == {"b": {"docperms": ["Lead:Sales User"], "fiscal_year": "Table 'tabFiscal Year' doesn't exist"}}
+
+
+def test_results_are_cached_until_the_ttl_or_a_refresh(fleet, monkeypatch):
+    _scan()
+    assert _scan()["scanned"] == 0
+    assert _scan(refresh=True)["scanned"] == 2
+    app._DRIFT_CACHE[app.get_site_name("a")]["checked_at"] -= app.FLEET_DRIFT_TTL_SEC
+    assert _scan()["scanned"] == 1
+    assert fleet[-1] == [app.get_site_name("a")]
+
+
+def test_a_site_without_a_report_is_an_error_on_every_check(monkeypatch):
+    def run(sites, name, code, on_report, workers):
+        on_report({"site": sites[0], "operations": {"drift": {"output": json.dumps(CLEAN)}}})
+        on_report({"site": sites[1], "error": "interpreter crashed"})
+
+    monkeypatch.setattr(app, "_run_fleet_operation", run)
+    checks = app._scan_drift(["a.site", "b.site"], "code", 2)
+    assert checks["a.site"] == CLEAN
+    assert checks["b.site"] == {name: {"ok": False, "error": "interpreter crashed"} for name in app.DRIFT_CHECKS}
+
+
+def test_the_check_script_compiles_for_every_seed_manifest():
+    compile(app.build_drift_check_code(), "<drift>", "exec")
+    for checks in app.SEED_DRIFT_CHECKS.values():
+        compile(app.build_drift_check_code(checks), "<drift>", "exec")
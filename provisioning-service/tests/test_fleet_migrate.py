@@ -0,0 +1,96 @@
+"""Rolling fleet migrate: ordering, pause on error rate with the fleet lock released, resume."""
+
+import asyncio
+import types
+
+import pytest
+from fastapi import HTTPException
+
+import app
+
+SIZES = {"small": 10, "medium": 20, "large": 30, "huge": 40, "giant": 50, "unknown": None}
+
+
+class FakeFleet:
+    def __init__(self):
+        self.migrated = []
+        self.failing = set()
+
+    def run_bench_command(self, args, timeout=None):
+        site = args[1]
+        self.migrated.append(site.split(".")[0])
+        failed = site.split(".")[0] in self.failing
+        return types.SimpleNamespace(returncode=1 if failed else 0, stdout="", stderr="ImportError" if failed else "")
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    fake = FakeFleet()
+    monkeypatch.setattr(app, "_fleet_lock", asyncio.Lock())
+    monkeypatch.setattr(app, "_MIGRATION_JOBS", {})
+    monkeypatch.setattr(app, "_list_active_saas_tenant_rows", lambda limit: [{"subdomain": sub} for sub in SIZES])
+    monkeypatch.setattr(app, "_site_sizes", lambda sites: {app.get_site_name(sub): size for sub, size in SIZES.items()})
+    monkeypatch.setattr(app, "run_bench_command", fake.run_bench_command)
+    monkeypatch.setattr(app, "_migration_health_check", lambda site: {"message": "pong"})
+    return fake
+
+
+def _start(**kwargs):
+    return app.start_fleet_migration(app.FleetMigrateRequest(concurrency=1, **kwargs), _auth=True)
+
+
+def test_priority_then_smallest_first_with_unknown_sizes_last(fleet):
+    async def main():
+        started = await _start(priority=["huge"])
+        await app._MIGRATION_JOBS[started["job_id"]]["task"]
+        return app._MIGRATION_JOBS[started["job_id"]]
+
+    job = asyncio.run(main())
+    assert fleet.migrated == ["huge", "small", "medium", "large", "giant", "unknown"]
+    assert job["status"] == "done"
+    assert not app._fleet_lock.locked()
+
+
+def test_a_paused_job_releases_the_fleet_and_resumes_where_it_stopped(fleet):
+    fleet.failing = {"small", "medium"}
+
+    async def main():
+        started = await _start(min_sample=2, max_error_rate=0.5)
+        job = app._MIGRATION_JOBS[started["job_id"]]
+        await job["task"]
+        paused = (job["status"], job["pause_reason"], app._fleet_lock.locked(), list(fleet.migrated))
+
+        # Another fleet operation holding the lock blocks the resume.
+        await app._fleet_lock.acquire()
+        with pytest.raises(HTTPException) as busy:
+            await app.resume_fleet_migration(job["job_id"], _auth=True)
+        app._fleet_lock.release()
+
+        fleet.failing = set()
+        await app.resume_fleet_migration(job["job_id"], _auth=True)
+        await job["task"]
+        return job, paused, busy.value.status_code
+
+    job, paused, busy = asyncio.run(main())
+    assert paused == ("paused", "error rate 2/2 exceeded 50%", False, ["small", "medium"])
+    assert busy == 409
+    assert fleet.migrated == ["small", "medium", "large", "huge", "giant", "unknown"]
+    assert job["status"] == "done"
+    assert [t["status"] for t in job["tenants"]][:2] == ["failed", "failed"]
+    assert not app._fleet_lock.locked()
+
+
+def test_cancelling_a_paused_job_finishes_it(fleet):
+    fleet.failing = set(SIZES)
+
+    async def main():
+        started = await _start(min_sample=1, max_error_rate=0)
+        job = app._MIGRATION_JOBS[started["job_id"]]
+        await job["task"]
+        await app.cancel_fleet_migration(job["job_id"], _auth=True)
+        return job
+
+    job = asyncio.run(main())
+    assert job["status"] == "cancelled" and job["finished_at"]
+    assert fleet.migrated == ["small"]
+    assert not app._fleet_lock.locked()
@@ -0,0 +1,97 @@
+"""Fleet runner: multi-site interpreter scripts, sharding and the per-shard time limit."""
+
+import contextlib
+import io
+import json
+import sys
+import types
+
+import app
+from fleet_runner import FLEET_RESULT_MARKER, build_multisite_script, parse_fleet_line, shard_round_robin
+
+
+def test_shard_round_robin_balances_and_never_returns_empty_shards():
+    assert shard_round_robin([1, 2, 3, 4, 5], 2) == [[1, 3, 5], [2, 4]]
+    assert shard_round_robin([1, 2], 8) == [[1], [2]]
+    assert shard_round_robin([1, 2], 0) == [[1, 2]]
+
+
+def test_parse_fleet_line():
+    assert parse_fleet_line("ordinary output") is None
+    assert parse_fleet_line(FLEET_RESULT_MARKER + "{broken") is None
+    assert parse_fleet_line(FLEET_RESULT_MARKER + json.dumps({"site": "a"})) == {"site": "a"}
+
+
+def _fake_frappe(fail_site: str):
+    events = []
+    frappe = types.ModuleType("frappe")
+
+    def init(site, sites_path):
+        events.append(("init", site))
+        frappe.local = types.SimpleNamespace(site=site)
+
+    def connect():
+        if frappe.local.site == fail_site:
+            raise RuntimeError("cannot connect")
+
+    frappe.init = init
+    frappe.connect = connect
+    frappe.destroy = lambda: events.append(("destroy", frappe.local.site))
+    frappe.db = types.SimpleNamespace(rollback=lambda: events.append(("rollback", frappe.local.site)))
+    return frappe, events
+
+
+def test_multisite_script_reports_every_site(tmp_path, monkeypatch):
+    frappe, events = _fake_frappe(fail_site="down.localhost")
+    monkeypatch.setitem(sys.modules, "frappe", frappe)
+    script = build_multisite_script(
+        str(tmp_path / "sites"),
+        {"a.localhost": ["ok", "boom"], "down.localhost": ["ok"]},
+        {
+            "ok": "print('noise')\nprint(frappe.local.site)",
+            "boom": "raise ValueError('bad op')",
+        },
+    )
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        exec(compile(script, "<fleet>", "exec"), {"__name__": "__main__"})
+    reports = [r for r in map(parse_fleet_line, out.getvalue().splitlines()) if r]
+
+    assert [r["site"] for r in reports] == ["a.localhost", "down.localhost"]
+    assert reports[0]["operations"] == {"ok": {"output": "a.localhost"}, "boom": {"error": "bad op"}}
+    assert reports[0]["error"] is None
+    assert reports[1]["error"] == "cannot connect"
+    assert ("rollback", "a.localhost") in events
+    assert ("destroy", "down.localhost") in events
+
+
+class FakeInterpreter:
+    """docker exec of a fleet interpreter that reports the first site, then is killed."""
+
+    def __init__(self, cmd, stdout=None, stderr=None, text=None):
+        self.cmd = cmd
+        self.stdout = iter([
+            "DEBUG: noise\n",
+            FLEET_RESULT_MARKER + json.dumps({"site": "a.localhost", "operations": {"ok": {"output": "1"}}}) + "\n",
+        ])
+        self.returncode = None
+
+    def wait(self):
+        self.returncode = 137
+
+    def kill(self):
+        raise AssertionError("the local docker exec client must not be the one enforcing the limit")
+
+
+def test_shard_limit_is_enforced_inside_the_container(monkeypatch):
+    procs = []
+    monkeypatch.setattr(app, "docker_exec", lambda *args, **kwargs: types.SimpleNamespace(returncode=0, stderr=""))
+    monkeypatch.setattr(app.subprocess, "Popen", lambda *args, **kwargs: procs.append(FakeInterpreter(*args, **kwargs)) or procs[-1])
+    reports = []
+    app._run_fleet_shard({"a.localhost": ["ok"], "b.localhost": ["ok"]}, {"ok": "print(1)"}, reports.append, timeout=4.5)
+
+    (proc,) = procs
+    assert f"exec timeout -s KILL 5 {app.BENCH_PATH}/env/bin/python -u /tmp/_fleet_" in proc.cmd[-1]
+    assert [r["site"] for r in reports] == ["a.localhost", "b.localhost"]
+    assert reports[0]["operations"] == {"ok": {"output": "1"}}
+    assert reports[1]["error"] == "interpreter killed after 5s"
@@ -0,0 +1,188 @@
+"""Frappe HTTP router: route memo, backoff and the pooled client's event loop."""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from frappe_http import FrappeHTTPError, FrappeRouter, NoRouteError, Route
+
+INTERNAL = Route("http://frappe:8080", (("Host", "a.localhost"),))
+PUBLIC = Route("http://a.localhost")
+
+
+def _run(router: FrappeRouter, handler, coro_factory):
+    async def main():
+        router._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        router._client_loop = asyncio.get_running_loop()
+        try:
+            return await coro_factory()
+        finally:
+            await router.aclose()
+
+    return asyncio.run(main())
+
+
+def _json(payload, status=200):
+    return httpx.Response(status, json=payload)
+
+
+def test_falls_through_to_a_working_route_and_memoizes_it():
+    router = FrappeRouter()
+    hits = []
+
+    def handler(request):
+        hits.append(request.url.host)
+        if request.url.host == "a.localhost":
+            return httpx.Response(404, text="<html>next.js</html>", headers={"content-type": "text/html"})
+        return _json({"message": "ok"})
+
+    result = _run(router, handler, lambda: router.request_json("a.localhost", [PUBLIC, INTERNAL], "/api/x"))
+    assert result == {"message": "ok"}
+    assert hits == ["a.localhost", "frappe"]
+    # Next call: memoized route first, and the HTML route is still backing off.
+    assert router.ordered("a.localhost", [PUBLIC, INTERNAL]) == [INTERNAL]
+
+
+def test_non_frappe_answer_backs_off_that_route_only():
+    router = FrappeRouter()
+    router.record_failure("a.localhost", PUBLIC, "HTTP 404 not Frappe", transport=False)
+    other_site = Route("http://a.localhost", (("Host", "b.localhost"),))
+    assert router.ordered("a.localhost", [PUBLIC]) == []
+    assert router.ordered("b.localhost", [other_site]) == [other_site]
+
+
+def test_transport_failure_backs_off_the_base_url():
+    router = FrappeRouter()
+    router.record_failure("a.localhost", INTERNAL, "ConnectError", transport=True)
+    sibling = Route("http://frappe:8080", (("Host", "b.localhost"),))
+    assert router.ordered("b.localhost", [sibling]) == []
+
+
+def test_backoff_doubles_and_is_capped():
+    router = FrappeRouter(backoff_base_sec=2, backoff_max_sec=5)
+    for expected in (2, 4, 5, 5):
+        router.record_failure("a.localhost", PUBLIC, "boom", transport=False)
+        retry_in = router.stats()["backing_off"][PUBLIC.key]["retry_in_sec"]
+        assert retry_in == pytest.approx(expected, abs=0.2)
+
+
+def test_success_clears_backoff():
+    router = FrappeRouter()
+    router.record_failure("a.localhost", PUBLIC, "boom", transport=False)
+    router.record_success("a.localhost", PUBLIC)
+    assert router.ordered("a.localhost", [PUBLIC]) == [PUBLIC]
+    assert router.stats()["memoized_sites"] == 1
+
+
+def test_frappe_error_status_keeps_the_route():
+    router = FrappeRouter()
+
+    def handler(request):
+        return _json({"exc_type": "PermissionError"}, status=403)
+
+    with pytest.raises(FrappeHTTPError) as err:
+        _run(router, handler, lambda: router.request_json("a.localhost", [INTERNAL], "/api/x"))
+    assert err.value.status_code == 403
+    assert router.ordered("a.localhost", [INTERNAL]) == [INTERNAL]
+
+
+def test_no_usable_route_raises():
+    router = FrappeRouter()
+    router.record_failure("a.localhost", PUBLIC, "boom", transport=False)
+
+    def handler(request):
+        raise AssertionError("no request expected")
+
+    with pytest.raises(NoRouteError):
+        _run(router, handler, lambda: router.request_json("a.localhost", [PUBLIC], "/api/x"))
+
+
+def test_read_timeout_backs_off_only_that_route():
+    router = FrappeRouter()
+
+    def handler(request):
+        if request.headers.get("host") == "a.localhost":
+            raise httpx.ReadTimeout("slow site", request=request)
+        return _json({"message": "ok"})
+
+    with pytest.raises(NoRouteError):
+        _run(router, handler, lambda: router.request_json("a.localhost", [INTERNAL], "/api/x"))
+    sibling = Route("http://frappe:8080", (("Host", "b.localhost"),))
+    assert router.ordered("a.localhost", [INTERNAL]) == []
+    assert router.ordered("b.localhost", [sibling]) == [sibling]
+
+
+def test_connect_error_backs_off_the_base_url_for_every_site():
+    router = FrappeRouter()
+
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    with pytest.raises(NoRouteError):
+        _run(router, handler, lambda: router.request_json("a.localhost", [INTERNAL], "/api/x"))
+    sibling = Route("http://frappe:8080", (("Host", "b.localhost"),))
+    assert router.ordered("b.localhost", [sibling]) == []
+
+
+def test_long_expired_backoff_entries_are_pruned(monkeypatch):
+    router = FrappeRouter(backoff_base_sec=1, backoff_max_sec=10)
+    router.record_failure("a.localhost", PUBLIC, "boom", transport=False)
+    later = time.time() + 60
+    monkeypatch.setattr("frappe_http.time.time", lambda: later)
+    router.record_failure("b.localhost", INTERNAL, "boom", transport=False)
+    assert set(router._backoff) == {INTERNAL.key}
+
+
+class LoopThread:
+    """An event loop running in a background thread, like a second worker loop."""
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        return self
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(5)
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+
+
+def _wait_closed(client):
+    deadline = time.monotonic() + 5
+    while not client.is_closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return client.is_closed
+
+
+async def _client_of(router):
+    return router._get_client()
+
+
+def test_a_client_left_behind_on_another_running_loop_is_closed_there():
+    router = FrappeRouter()
+    with LoopThread() as other:
+        old = other.run(_client_of(router))
+        new = asyncio.run(_client_of(router))
+        assert new is not old
+        assert _wait_closed(old)
+        assert not new.is_closed
+        # aclose from a different loop hands the close to the owning loop.
+        current = other.run(_client_of(router))
+        asyncio.run(router.aclose())
+        assert router._client is None
+        assert _wait_closed(current)
+
+
+def test_a_client_whose_loop_has_closed_is_replaced():
+    router = FrappeRouter()
+    old = asyncio.run(_client_of(router))
+    new = asyncio.run(_client_of(router))
+    assert new is not old and router._client is new
+
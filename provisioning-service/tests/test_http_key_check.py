@@ -0,0 +1,113 @@
+"""Key validation over HTTP: routes raced happy-eyeballs style, bench only as a fallback."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import app
+from frappe_http import FrappeRouter
+
+SITE = app.get_site_name("acme")
+USER = "owner@acme.example"
+# _frappe_internal_routes + _frappe_public_routes for SITE, in race order.
+SITE_SCOPED, LOOPBACK, PUBLIC = [
+    route.base_url for route in app._frappe_internal_routes(SITE) + app._frappe_public_routes(SITE)
+]
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = FrappeRouter()
+    monkeypatch.setattr(app, "_frappe_router", router)
+    return router
+
+
+def _run(router, handler, coro_factory):
+    async def main():
+        router._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        router._client_loop = asyncio.get_running_loop()
+        try:
+            return await coro_factory()
+        finally:
+            await router.aclose()
+
+    return asyncio.run(main())
+
+
+def _route(request):
+    return f"{request.url.scheme}://{request.url.netloc.decode()}"
+
+
+def test_first_decisive_answer_wins_and_cancels_the_slower_probe(router):
+    started, cancelled = [], []
+
+    async def handler(request):
+        started.append(_route(request))
+        if _route(request) == SITE_SCOPED:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(_route(request))
+                raise
+        return httpx.Response(200, json={"message": USER})
+
+    began = time.monotonic()
+    verdict = _run(router, handler, lambda: app._http_check_user_api_token(SITE, USER, "k", "s", stagger=0.05))
+    assert verdict == "ok"
+    assert time.monotonic() - began < 1
+    # The loopback probe started one stagger later and answered first; the
+    # public route was never needed.
+    assert started == [SITE_SCOPED, LOOPBACK]
+    assert cancelled == [SITE_SCOPED]
+
+
+def test_a_failed_probe_starts_the_next_without_waiting_out_the_stagger(router):
+    def handler(request):
+        if _route(request) == SITE_SCOPED:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"message": USER})
+
+    began = time.monotonic()
+    verdict = _run(router, handler, lambda: app._http_check_user_api_token(SITE, USER, "k", "s", stagger=5))
+    assert verdict == "ok"
+    assert time.monotonic() - began < 1
+    # The refused base URL backs off for later calls.
+    assert [route.base_url for route in router.ordered(SITE, app._frappe_internal_routes(SITE))] == [LOOPBACK]
+
+
+def test_html_from_the_public_host_is_not_an_answer(router):
+    def handler(request):
+        if _route(request) == PUBLIC:
+            return httpx.Response(200, text="<html>next.js</html>", headers={"content-type": "text/html"})
+        raise httpx.ConnectError("refused", request=request)
+
+    verdict = _run(router, handler, lambda: app._http_check_user_api_token(SITE, USER, "k", "s", stagger=0.01))
+    assert verdict == "unreachable"
+
+
+def test_rejected_keys_are_retried_then_invalid_without_a_bench_call(router, monkeypatch):
+    hits = []
+
+    def handler(request):
+        hits.append(_route(request))
+        return httpx.Response(401, json={"exc_type": "AuthenticationError"})
+
+    def bench(*args):
+        raise AssertionError("Frappe answered over HTTP; the bench must not run")
+
+    monkeypatch.setattr(app, "_validate_user_api_token_bench", bench)
+    assert _run(router, handler, lambda: app._validate_user_api_token(SITE, USER, "k", "s")) is False
+    # Two attempts (retries=2), each answered by the memoized first route.
+    assert hits == [SITE_SCOPED, SITE_SCOPED]
+
+
+def test_unreachable_http_falls_back_to_the_bench_check(router, monkeypatch):
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    calls = []
+    monkeypatch.setattr(app, "_validate_user_api_token_bench", lambda *args: calls.append(args) or True)
+    assert _run(router, handler, lambda: app._validate_user_api_token(SITE, USER, "k", "s")) is True
+    assert calls == [(SITE, USER, "k", "s")]
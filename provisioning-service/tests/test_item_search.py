@@ -0,0 +1,118 @@
+"""nexus_core item search tiers, against an in-memory Item table that answers each tier's query."""
+
+import importlib
+import re
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+NEXUS_CORE = Path(__file__).resolve().parents[1] / "apps" / "nexus_core"
+
+ITEMS = [
+    ("ITM-0000123", "Hex Bolt M12", "Hardware"),
+    ("ITM-0000124", "Steel Plate", "Hardware"),
+    ("BOLT-01", "Anchor Bolt", "Hardware"),
+    ("EX-200", "Excavator 20t", "Equipment"),
+    ("BOLTCUT", "Bolt Cutter", "Tools"),
+]
+
+
+class Row(dict):
+    __getattr__ = dict.__getitem__
+
+
+class FakeItems:
+    def __init__(self, fulltext=True):
+        self.fulltext = fulltext
+        self.tiers = []
+
+    def sql(self, query, params=None, as_dict=False):
+        if query.startswith("show index"):
+            return [("tabItem",)] if self.fulltext else []
+        rows = [
+            Row(item_code=code, item_name=name, item_group=group)
+            for code, name, group in ITEMS
+            if not params.get("item_group") or group == params["item_group"]
+        ]
+        q = params["q"].lower()
+        if "item_code = %(q)s" in query:
+            tier, match = "exact", lambda r: r.item_code.lower() == q
+        elif "item_code like %(prefix)s" in query:
+            tier, match = "code_prefix", lambda r: r.item_code.lower().startswith(q)
+        elif "item_name like %(prefix)s" in query:
+            tier, match = "name_prefix", lambda r: r.item_name.lower().startswith(q)
+        elif "match(" in query:
+            words = [w.lstrip("+").rstrip("*").lower() for w in params["terms"].split()]
+
+            def match(r):
+                tokens = re.split(r"\W+", f"{r.item_code} {r.item_name}".lower())
+                return all(any(t.startswith(w) for t in tokens) for w in words)
+
+            tier = "fulltext"
+        else:
+            tier, match = "substring", lambda r: q in r.item_code.lower() or q in r.item_name.lower()
+        self.tiers.append(tier)
+        return [r for r in rows if match(r)][: params["limit"]]
+
+
+@pytest.fixture
+def search(monkeypatch):
+    def make(fulltext=True):
+        items = FakeItems(fulltext)
+        frappe = types.ModuleType("frappe")
+        frappe.db = types.SimpleNamespace(sql=items.sql)
+        frappe.local = types.SimpleNamespace(site="acme.localhost")
+        monkeypatch.setitem(sys.modules, "frappe", frappe)
+        monkeypatch.syspath_prepend(str(NEXUS_CORE))
+        for name in [m for m in sys.modules if m.startswith("nexus_core")]:
+            monkeypatch.delitem(sys.modules, name)
+        module = importlib.import_module("nexus_core.item_search")
+
+        def run(q, limit=20, item_group=None):
+            items.tiers.clear()
+            return [row["item_code"] for row in module.search_items(q, item_group, limit)], list(items.tiers)
+
+        return run
+
+    return make
+
+
+def test_exact_and_prefix_matches_come_first_and_stop_the_tiers(search):
+    run = search()
+    assert run("BOLT-01", limit=1) == (["BOLT-01"], ["exact"])
+    codes, tiers = run("bolt", limit=2)
+    assert codes == ["BOLT-01", "BOLTCUT"]
+    assert tiers == ["exact", "code_prefix"]
+
+
+def test_word_prefixes_are_served_by_fulltext(search):
+    codes, tiers = search()("bolt")
+    assert codes[:2] == ["BOLT-01", "BOLTCUT"]
+    assert set(codes) == {"BOLT-01", "BOLTCUT", "ITM-0000123"}
+    assert "fulltext" in tiers
+
+
+@pytest.mark.parametrize("q, code", [("0123", "ITM-0000123"), ("olt", "BOLTCUT"), ("xcavat", "EX-200")])
+def test_fragments_inside_a_word_or_code_are_still_found(search, q, code):
+    codes, tiers = search()(q)
+    assert code in codes
+    assert tiers[-1] == "substring"
+
+
+def test_substring_scan_is_skipped_once_the_page_is_full(search):
+    codes, tiers = search()("bolt", limit=3)
+    assert len(codes) == 3
+    assert "substring" not in tiers
+
+
+def test_without_the_index_substring_replaces_fulltext(search):
+    codes, tiers = search(fulltext=False)("olt")
+    assert set(codes) == {"ITM-0000123", "BOLT-01", "BOLTCUT"}
+    assert "fulltext" not in tiers and tiers[-1] == "substring"
+
+
+def test_item_group_filters_every_tier(search):
+    codes, _ = search()("bolt", item_group="Tools")
+    assert codes == ["BOLTCUT"]
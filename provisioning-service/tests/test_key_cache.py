@@ -0,0 +1,144 @@
+import stat
+import threading
+import time
+
+import pytest
+
+from key_cache import KeyCache, LocalKeyCache, SQLiteKeyCache, is_memory_backed
+
+
+@pytest.fixture(params=["local", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "local":
+        return LocalKeyCache(ttl_sec=60, max_entries=3, lease_sec=5, max_ttl_sec=600)
+    return SQLiteKeyCache(
+        tmp_path / "keys.sqlite3", ttl_sec=60, max_entries=3, lease_sec=5, max_ttl_sec=600, allow_persistent=True
+    )
+
+
+def test_backends_implement_the_whole_interface(cache):
+    assert isinstance(cache, KeyCache)
+
+    class Partial(KeyCache):
+        def get(self, site, user):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_put_get_invalidate(cache):
+    cache.put("a.site", "u@x", "key", "secret", version=2)
+    entry = cache.get("a.site", "u@x")
+    assert (entry["api_key"], entry["api_secret"], entry["version"]) == ("key", "secret", 2)
+    cache.invalidate("a.site", "u@x")
+    assert cache.get("a.site", "u@x") is None
+
+
+def test_expired_entry_is_dropped(cache):
+    cache.put("a.site", "u@x", "key", "secret", ttl_sec=0.01)
+    time.sleep(0.02)
+    assert cache.get("a.site", "u@x") is None
+    assert cache.size() == 0
+
+
+def test_ttl_is_capped(cache):
+    cache.put("a.site", "u@x", "key", "secret", ttl_sec=7 * 86400)
+    entry = cache.get("a.site", "u@x")
+    assert entry["expires_at"] - entry["stored_at"] == pytest.approx(600, abs=1)
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for user in ("a", "b", "c"):
+        cache.put("s", user, "k", "v")
+        time.sleep(0.01)
+    assert cache.get("s", "a") is not None  # a is now the most recently used
+    time.sleep(0.01)
+    cache.put("s", "d", "k", "v")
+    assert cache.size() == 3
+    assert cache.get("s", "b") is None
+    assert all(cache.get("s", user) is not None for user in ("a", "c", "d"))
+
+
+def test_lock_is_exclusive_until_released(cache):
+    token = cache.acquire("s", "u", timeout=1)
+    assert token is not None
+    assert cache.acquire("s", "u", timeout=0.1) is None
+    assert cache.acquire("s", "other", timeout=0.1) is not None
+    cache.release("s", "u", token)
+    assert cache.acquire("s", "u", timeout=0.1) is not None
+    assert cache.counters()["lock_waits"] >= 1
+
+
+def test_single_flight_runs_one_holder_at_a_time(cache):
+    active = []
+    overlaps = []
+
+    def worker():
+        token = cache.acquire("s", "u", timeout=5)
+        assert token is not None
+        active.append(1)
+        if len(active) > 1:
+            overlaps.append(len(active))
+        time.sleep(0.02)
+        active.pop()
+        cache.release("s", "u", token)
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+
+
+def test_sqlite_lease_expires_for_a_dead_holder(tmp_path):
+    cache = SQLiteKeyCache(tmp_path / "keys.sqlite3", lease_sec=0.05, allow_persistent=True)
+    assert cache.acquire("s", "u", timeout=1) is not None
+    # The holder never releases; its lease runs out and the next caller takes over.
+    assert cache.acquire("s", "u", timeout=1) is not None
+
+
+def test_sqlite_release_needs_the_holders_token(tmp_path):
+    cache = SQLiteKeyCache(tmp_path / "keys.sqlite3", allow_persistent=True)
+    token = cache.acquire("s", "u", timeout=1)
+    cache.release("s", "u", "not-the-token")
+    assert cache.acquire("s", "u", timeout=0.1) is None
+    cache.release("s", "u", token)
+    assert cache.acquire("s", "u", timeout=0.1) is not None
+
+
+def test_local_cache_evicts_unheld_locks_only():
+    cache = LocalKeyCache(max_entries=2)
+    held = cache.acquire("s", "held", timeout=1)
+    for user in ("a", "b", "c"):
+        cache.release("s", user, cache.acquire("s", user, timeout=1))
+    assert ("s", "held") in cache._locks
+    assert len(cache._locks) == 2
+    cache.release("s", "held", held)
+
+
+def test_sqlite_file_is_owner_only(tmp_path):
+    path = tmp_path / "keys.sqlite3"
+    cache = SQLiteKeyCache(path, allow_persistent=True)
+    cache.put("s", "u", "k", "v")
+    for file in tmp_path.iterdir():
+        assert stat.S_IMODE(file.stat().st_mode) == 0o600, file
+
+
+def test_sqlite_refuses_persistent_disk(tmp_path):
+    if is_memory_backed(tmp_path):
+        pytest.skip("the test tmp dir is itself on tmpfs")
+    with pytest.raises(ValueError):
+        SQLiteKeyCache(tmp_path / "keys.sqlite3")
+    assert not (tmp_path / "keys.sqlite3").exists()
+
+
+def test_stats_derive_rates(cache):
+    cache.incr("hits", 3)
+    cache.incr("misses")
+    cache.incr("rotations")
+    stats = cache.stats()
+    assert stats["hit_rate"] == 0.75
+    assert stats["rotation_rate"] == 0.25
+    assert stats["max_ttl_sec"] == 600
@@ -0,0 +1,59 @@
+"""Tenant list paging: keyset cursors and modified_since in the site's time zone."""
+
+import types
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from fastapi import HTTPException
+
+import app
+from app import _decode_list_cursor, _encode_list_cursor, _parse_modified_since
+from bench_script import run_script
+
+
+def test_cursor_round_trip():
+    cursor = _encode_list_cursor(["2026-01-01 10:00:00", "ITEM-0001"], "2026-01-01 09:00:00")
+    assert "=" not in cursor
+    assert _decode_list_cursor(cursor) == (["2026-01-01 10:00:00", "ITEM-0001"], "2026-01-01 09:00:00")
+
+
+def test_no_keys_means_no_next_page():
+    assert _encode_list_cursor(None, "t") is None
+    assert _decode_list_cursor(None) == (None, None)
+    assert _decode_list_cursor("") == (None, None)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", _encode_list_cursor(["only-one"], "t")])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as err:
+        _decode_list_cursor(cursor)
+    assert err.value.status_code == 400
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("2026-03-01 09:30:00", "2026-03-01 09:30:00.000000"),
+    ("2026-03-01T09:30:00Z", "2026-03-01 09:30:00.000000+00:00"),
+    ("2026-03-01T15:00:00+05:30", "2026-03-01 09:30:00.000000+00:00"),
+])
+def test_modified_since_keeps_offsets_as_utc(value, expected):
+    assert _parse_modified_since(value) == expected
+
+
+def test_unparseable_modified_since_is_a_400():
+    with pytest.raises(HTTPException) as err:
+        _parse_modified_since("yesterday")
+    assert err.value.status_code == 400
+
+
+def test_the_tenant_script_converts_utc_to_the_site_time_zone():
+    utils = types.ModuleType("frappe.utils")
+    utils.get_datetime = datetime.fromisoformat
+    utils.convert_utc_to_system_timezone = lambda utc: utc.replace(tzinfo=timezone.utc).astimezone(ZoneInfo("Asia/Kolkata"))
+    frappe = types.ModuleType("frappe")
+    code = app._KEYSET_PAGE_SNIPPET + "\nfor value in values:\n    print(site_datetime(value))\n"
+    code = "values = " + repr([_parse_modified_since("2026-03-01T09:30:00Z"), _parse_modified_since("2026-03-01 15:00:00"), None]) + "\n" + code
+    out = run_script(code, {"frappe": frappe, "frappe.utils": utils}).splitlines()
+    assert out == ["2026-03-01 15:00:00.000000", "2026-03-01 15:00:00.000000", "None"]
+
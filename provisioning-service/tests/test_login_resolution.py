@@ -0,0 +1,83 @@
+"""Login resolution: candidate workspaces from the registry / member index, probed in one interpreter."""
+
+import asyncio
+import json
+
+import pytest
+
+import app
+
+EMAIL = "sam@acme.example"
+OWNED = {"subdomain": "acme", "owner_email": EMAIL, "status": "Active"}
+
+
+class FakeFleet:
+    def __init__(self):
+        self.shards = []
+        self.probes = {}
+
+    def run_shard(self, plan, operations, emit, timeout=None):
+        self.shards.append((sorted(plan), timeout))
+        assert EMAIL in operations["login"]
+        for site in plan:
+            probe = self.probes.get(site.split(".")[0], {"exists": False})
+            if "error" in probe:
+                emit({"site": site, "operations": {}, "error": probe["error"]})
+            else:
+                emit({"site": site, "operations": {"login": {"output": json.dumps(probe)}}})
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    fake = FakeFleet()
+    monkeypatch.setattr(app, "_run_fleet_shard", fake.run_shard)
+    monkeypatch.setattr(app, "_fleet_lock", asyncio.Lock())
+    monkeypatch.setattr(app, "_lookup_saas_tenant_on_master", lambda filters: {"found": True, "tenant": OWNED})
+    monkeypatch.setattr(app, "_member_index_live", lambda: False)
+    monkeypatch.setattr(app, "_list_active_saas_tenant_rows", lambda limit: [{"subdomain": s} for s in ("acme", "beta", "gamma")])
+    monkeypatch.setattr(app, "_find_tenants_for_user_email", lambda email: [{"subdomain": "beta"}])
+    return fake
+
+
+def test_scan_probes_every_candidate_in_one_interpreter(fleet):
+    fleet.probes = {
+        "acme": {"exists": True, "enabled": True, "providers": ["google"], "has_api_keys": True},
+        "beta": {"exists": True, "enabled": True, "providers": [], "has_api_keys": False},
+    }
+    result = app._resolve_login(EMAIL)
+    assert fleet.shards == [([app.get_site_name(s) for s in ("acme", "beta", "gamma")], app.LOGIN_PROBE_TIMEOUT_SEC)]
+    assert result["source"] == "scan"
+    assert [(w["subdomain"], w["is_owner"], w["has_social_login"], w["has_api_keys"]) for w in result["workspaces"]] == [
+        ("acme", True, True, True),
+        ("beta", False, False, False),
+    ]
+
+
+def test_the_live_index_limits_the_probe_to_members(fleet, monkeypatch):
+    monkeypatch.setattr(app, "_member_index_live", lambda: True)
+    fleet.probes = {"beta": {"error": "site did not boot"}}
+    result = app._resolve_login(EMAIL)
+    assert fleet.shards[0][0] == [app.get_site_name("acme"), app.get_site_name("beta")]
+    assert result["source"] == "index"
+    # An indexed member is listed even when its probe failed; a site that
+    # answered that the user does not exist is not.
+    assert [w["subdomain"] for w in result["workspaces"]] == ["beta"]
+    assert result["errors"] == {"beta": "site did not boot"}
+
+
+def test_candidates_are_capped(fleet, monkeypatch):
+    monkeypatch.setattr(app, "LOGIN_PROBE_MAX_SITES", 2)
+    app._resolve_login(EMAIL)
+    assert len(fleet.shards[0][0]) == 2
+
+
+def test_no_probe_while_a_fleet_operation_holds_the_bench(fleet):
+    async def locked():
+        async with app._fleet_lock:
+            return await asyncio.to_thread(app._resolve_login, EMAIL)
+
+    result = asyncio.run(locked())
+    assert fleet.shards == []
+    assert result["probe_skipped"]
+    assert [w["subdomain"] for w in result["workspaces"]] == ["acme"]
+    assert result["errors"] == {"acme": "a fleet operation is running"}
@@ -0,0 +1,79 @@
+"""Tree and flat master data seeding: one bulk insert and one nested-set rebuild per tree."""
+
+import json
+import types
+
+from bench_script import last_json, run_script
+from master_data import MASTER_DATA_SEED_SNIPPET
+
+
+class FakeMasters:
+    def __init__(self, tables=None):
+        self.tables = {doctype: [dict(row) for row in rows] for doctype, rows in (tables or {}).items()}
+        self.inserts = []
+        self.rebuilds = []
+
+    def modules(self):
+        def get_all(doctype, filters=None, fields=None, pluck=None):
+            rows = self.tables.get(doctype, [])
+            if filters:
+                rows = [row for row in rows if row["name"] in filters["name"][1]]
+            return [row[pluck] for row in rows] if pluck else [{f: row.get(f) for f in fields} for row in rows]
+
+        def bulk_insert(doctype, fields, values, ignore_duplicates=False):
+            self.inserts.append((doctype, [v[0] for v in values]))
+            self.tables.setdefault(doctype, []).extend(dict(zip(fields, v)) for v in values)
+
+        frappe = types.ModuleType("frappe")
+        frappe.get_all = get_all
+        frappe.scrub = lambda text: text.replace(" ", "_").lower()
+        frappe.db = types.SimpleNamespace(bulk_insert=bulk_insert)
+        frappe.utils = types.SimpleNamespace(now=lambda: "2026-01-01 00:00:00")
+        frappe.session = types.SimpleNamespace(user="Administrator")
+        nestedset = types.ModuleType("frappe.utils.nestedset")
+        nestedset.rebuild_tree = self.rebuilds.append
+        return {"frappe": frappe, "frappe.utils": types.ModuleType("frappe.utils"), "frappe.utils.nestedset": nestedset}
+
+    def run(self, call):
+        return last_json(run_script(f"import json\n{MASTER_DATA_SEED_SNIPPET}\nprint(json.dumps({call}))", self.modules()))
+
+
+def test_a_new_tree_is_one_bulk_insert_and_one_rebuild():
+    site = FakeMasters()
+    result = site.run('seed_tree("Customer Group", "All Customer Groups", ["Commercial", "Retail"])')
+    assert result == "seeded: ['All Customer Groups', 'Commercial', 'Retail']"
+    assert site.inserts == [("Customer Group", ["All Customer Groups", "Commercial", "Retail"])]
+    assert site.rebuilds == ["Customer Group"]
+    children = [row for row in site.tables["Customer Group"] if row["parent_customer_group"]]
+    assert {row["customer_group_name"] for row in children} == {"Commercial", "Retail"}
+    assert {row["parent_customer_group"] for row in children} == {"All Customer Groups"}
+
+
+def test_seed_when_leaves_existing_trees_alone():
+    tree = {"Territory": [{"name": "All Territories", "parent_territory": "", "is_group": 1}]}
+    site = FakeMasters(tree)
+    assert site.run('seed_tree("Territory", "All Territories", ["India"])') == "exists: All Territories"
+
+    groups = {"Item Group": [
+        {"name": "All Item Groups", "parent_item_group": "", "is_group": 1},
+        {"name": "Services", "parent_item_group": "All Item Groups", "is_group": 0},
+    ]}
+    site = FakeMasters(groups)
+    assert site.run('seed_tree("Item Group", "All Item Groups", ["Crane"], seed_when="no_leaf")') == "exists: 1 groups"
+    assert (site.inserts, site.rebuilds) == ([], [])
+
+
+def test_children_go_under_the_existing_root():
+    site = FakeMasters({"Item Group": [{"name": "Root Group", "parent_item_group": "", "is_group": 1}]})
+    site.run('seed_tree("Item Group", "All Item Groups", ["Crane"], seed_when="no_leaf")')
+    assert site.inserts == [("Item Group", ["Crane"])]
+    assert site.tables["Item Group"][-1]["parent_item_group"] == "Root Group"
+
+
+def test_flat_masters_insert_only_the_missing_rows():
+    site = FakeMasters({"UOM": [{"name": "Nos"}]})
+    rows = json.dumps([{"name": "Nos", "must_be_whole_number": 1}, {"name": "Kg", "must_be_whole_number": 0}])
+    assert site.run(f'seed_flat_master("UOM", "uom_name", {rows})') == ["Kg"]
+    assert site.tables["UOM"][-1]["uom_name"] == "Kg"
+    assert site.run(f'seed_flat_master("UOM", "uom_name", {rows})') == []
+    assert site.inserts == [("UOM", ["Kg"])]
@@ -0,0 +1,102 @@
+"""Pre-minted API keys: readable keys are reused, missing ones minted, and both loaded into the key cache."""
+
+import json
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from bench_script import last_json, run_script
+
+SITE = app.get_site_name("acme")
+HEADERS = {"X-Provisioning-Secret": app.PROVISIONING_SECRET}
+
+
+class FakeUsers:
+    """User rows with api_key and the decryptable api_secret from __Auth."""
+
+    def __init__(self, users):
+        self.users = users
+        self.saves = []
+        self.hashes = 0
+
+    def modules(self):
+        fake = self
+
+        class User:
+            def __init__(self, doctype, email):
+                self.email = email
+                self.api_key = fake.users[email].get("api_key")
+
+            def get(self, field):
+                return fake.users[self.email].get(field)
+
+            def save(self, ignore_permissions=False):
+                fake.saves.append(self.email)
+                fake.users[self.email].update(api_key=self.api_key, api_secret=self.api_secret)
+
+        def generate_hash(length=10):
+            fake.hashes += 1
+            return f"h{fake.hashes}"
+
+        frappe = types.ModuleType("frappe")
+        frappe.get_doc = User
+        frappe.generate_hash = generate_hash
+        frappe.get_all = lambda doctype, filters=None, pluck=None, limit=None: list(self.users)
+        frappe.db = types.SimpleNamespace(commit=lambda: None)
+        password = types.ModuleType("frappe.utils.password")
+        password.get_decrypted_password = lambda doctype, name, field, raise_exception=True: self.users[name].get("api_secret")
+        return {"frappe": frappe, "frappe.utils": types.ModuleType("frappe.utils"), "frappe.utils.password": password}
+
+    def run_frappe_code(self, site, code):
+        assert site == SITE
+        return run_script(code, self.modules())
+
+
+@pytest.fixture
+def tenant(monkeypatch):
+    fake = FakeUsers({
+        "owner@acme.example": {"api_key": "k-owner", "api_secret": "s-owner", "api_key_version": 2},
+        "new@acme.example": {},
+        "half@acme.example": {"api_key": "k-half"},
+    })
+    monkeypatch.setattr(app, "run_frappe_code", fake.run_frappe_code)
+    monkeypatch.setattr(app, "_user_key_cache", app.LocalKeyCache())
+    return fake
+
+
+def test_readable_keys_are_kept_and_missing_ones_minted(tenant):
+    code = f"import json\n{app._MINT_USER_KEYS_SNIPPET}\nprint(json.dumps({{e: mint_user_keys(e) for e in {json.dumps(list(tenant.users))}}}))"
+    keys = last_json(tenant.run_frappe_code(SITE, code))
+    assert keys["owner@acme.example"] == {"api_key": "k-owner", "api_secret": "s-owner", "api_key_version": 2, "minted": False}
+    assert keys["new@acme.example"]["minted"] and keys["new@acme.example"]["api_secret"]
+    # A key without a readable secret keeps its api_key; only the secret is new.
+    assert keys["half@acme.example"]["api_key"] == "k-half" and keys["half@acme.example"]["minted"]
+    assert tenant.saves == ["new@acme.example", "half@acme.example"]
+
+
+def test_premint_loads_every_user_into_the_key_cache(tenant):
+    response = TestClient(app.app).post("/api/v1/premint-user-keys/acme", headers=HEADERS)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"success": True, "site": SITE, "users": 3, "minted": 2, "cached": 3, "errors": {}}
+
+    entry = app._user_key_cache.get(SITE, "owner@acme.example")
+    assert (entry["api_key"], entry["api_secret"], entry["version"]) == ("k-owner", "s-owner", 2)
+    assert entry["expires_at"] - entry["stored_at"] == pytest.approx(app.USER_KEY_PREMINT_TTL_SEC, abs=1)
+    assert app._user_key_cache.counters()["premints"] == 3
+
+    # A second run rotates nothing.
+    tenant.saves.clear()
+    assert TestClient(app.app).post("/api/v1/premint-user-keys/acme", headers=HEADERS).json()["minted"] == 0
+    assert tenant.saves == []
+
+
+def test_failed_users_are_reported_and_not_cached(tenant, monkeypatch):
+    monkeypatch.setattr(tenant, "run_frappe_code", lambda site, code: json.dumps({
+        "keys": {"owner@acme.example": {"error": "User disabled"}, "new@acme.example": {"api_key": "k", "api_secret": "s"}},
+    }))
+    monkeypatch.setattr(app, "run_frappe_code", tenant.run_frappe_code)
+    result = TestClient(app.app).post("/api/v1/premint-user-keys/acme", headers=HEADERS).json()
+    assert (result["cached"], result["errors"]) == (1, {"owner@acme.example": "User disabled"})
+    assert app._user_key_cache.get(SITE, "owner@acme.example") is None
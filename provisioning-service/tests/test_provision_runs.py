@@ -0,0 +1,80 @@
+"""Provisioning runs: one run per tenant at a time, cleanup only of sites a run created."""
+
+import asyncio
+import json
+import threading
+import types
+
+import pytest
+
+import app
+
+REQUEST = app.ProvisionRequest(organization_name="Acme Rentals", admin_email="owner@acme.example", plan_type="Free")
+
+
+@pytest.fixture(autouse=True)
+def runs(monkeypatch):
+    monkeypatch.setattr(app, "_PROVISION_RUNS", {})
+    monkeypatch.setattr(app, "_provision_slots", asyncio.Semaphore(2))
+    monkeypatch.setattr(app._provision_metrics, "record_run", lambda run: None)
+    monkeypatch.setattr(app, "_invalidate_tenant_registry", lambda: None)
+
+
+def test_a_second_request_for_an_in_flight_tenant_is_refused(monkeypatch):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def steps(req, run, loop):
+        calls.append(req.admin_email)
+        started.set()
+        release.wait(5)
+        return app.ProvisionResponse(success=True, subdomain=run["subdomain"])
+
+    monkeypatch.setattr(app, "_provision_tenant_steps", steps)
+    same_email = REQUEST.model_copy(update={"organization_name": "Other Org"})
+
+    async def main():
+        first = asyncio.create_task(app.provision_tenant(REQUEST, _auth=True))
+        await asyncio.to_thread(started.wait, 5)
+        duplicates = [await app.provision_tenant(REQUEST, _auth=True), await app.provision_tenant(same_email, _auth=True)]
+        release.set()
+        return await first, duplicates
+
+    first, duplicates = asyncio.run(main())
+    assert first.success
+    assert [d.success for d in duplicates] == [False, False]
+    assert "already in progress" in duplicates[0].error
+    assert len(calls) == 1
+    # Finished runs leave the in-flight set, so a later request is accepted.
+    assert app._PROVISION_RUNS == {}
+
+
+class FakeBench:
+    def __init__(self, new_site_output):
+        self.new_site_output = new_site_output
+
+    def run_bench_command(self, args, timeout=None):
+        if args[0] == "new-site":
+            return types.SimpleNamespace(returncode=1 if self.new_site_output else 0, stdout="", stderr=self.new_site_output)
+        return types.SimpleNamespace(returncode=0, stdout="", stderr="")
+
+    def run_frappe_code(self, site, code):
+        if site == app.MASTER_SITE:
+            return json.dumps({"subdomain_exists": False, "email_exists": 0})
+        if "owner_roles = [" in code:
+            raise Exception("owner step failed")
+        return "{}"
+
+
+@pytest.mark.parametrize("new_site_output, cleaned", [("", True), ("Site acme-rentals.localhost already exists", False)])
+def test_owner_failure_cleans_up_only_a_site_this_run_created(monkeypatch, new_site_output, cleaned):
+    bench = FakeBench(new_site_output)
+    monkeypatch.setattr(app, "run_bench_command", bench.run_bench_command)
+    monkeypatch.setattr(app, "run_frappe_code", bench.run_frappe_code)
+    monkeypatch.setattr(app, "_ping_site_via_bench", lambda site: None)
+    scheduled = []
+    loop = types.SimpleNamespace(call_soon_threadsafe=lambda fn, *args: scheduled.append((fn, args)))
+    run = {"run_id": "r", "subdomain": "acme-rentals", "steps": []}
+
+    response = app._provision_tenant_steps(REQUEST, run, loop)
+    assert not response.success
+    assert scheduled == ([(app._cleanup_failed_site, (app.get_site_name("acme-rentals"),))] if cleaned else [])
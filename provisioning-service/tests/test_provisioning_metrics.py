@@ -0,0 +1,68 @@
+import pytest
+
+from provisioning_metrics import (
+    DEFAULT_STEP_SECONDS,
+    MIN_SAMPLES_FOR_FIT,
+    PROVISION_STEPS,
+    ProvisionMetricsStore,
+    StepDurationModel,
+    _fit_line,
+    forecast_queue,
+    sustainable_per_hour,
+)
+
+
+def test_fit_without_samples_uses_the_prior():
+    assert _fit_line([], 10.0) == (10.0, 0.0)
+
+
+def test_few_samples_are_shrunk_toward_the_prior():
+    intercept, slope = _fit_line([(1, 30.0)], 10.0)
+    weight = MIN_SAMPLES_FOR_FIT - 1
+    assert intercept == pytest.approx((10.0 * weight + 30.0) / MIN_SAMPLES_FOR_FIT)
+    assert slope == 0.0
+
+
+def test_fit_recovers_a_linear_load_model():
+    samples = [(load, 5.0 + 3.0 * load) for load in (1, 2, 3, 4, 1, 2, 3, 4)]
+    intercept, slope = _fit_line(samples, 100.0)
+    assert intercept == pytest.approx(5.0)
+    assert slope == pytest.approx(3.0)
+
+
+def test_negative_slope_is_clamped():
+    samples = [(load, 20.0 - load) for load in (1, 2, 3, 4, 5)]
+    assert _fit_line(samples, 10.0)[1] == 0.0
+
+
+def test_predict_remaining_counts_later_steps():
+    model = StepDurationModel.from_samples({})
+    last = PROVISION_STEPS[-1]
+    assert model.predict_remaining(last, 0.0, 1) == pytest.approx(DEFAULT_STEP_SECONDS[last])
+    assert model.predict_remaining(last, 10_000.0, 1) == 2.0
+    assert model.predict_remaining(None, 0.0, 1) == pytest.approx(sum(DEFAULT_STEP_SECONDS.values()))
+
+
+def test_forecast_queue_simulates_the_pool():
+    model = StepDurationModel({step: (0.0, 0.0) for step in PROVISION_STEPS}, {})
+    model.fits[PROVISION_STEPS[0]] = (100.0, 0.0)
+    # Two slots free at 10s and 40s; each queued run takes 100s.
+    assert forecast_queue(model, [40.0, 10.0], 3, 2) == [110.0, 140.0, 210.0]
+    assert sustainable_per_hour(model, 2) == pytest.approx(72.0)
+
+
+def test_store_round_trip(tmp_path):
+    store = ProvisionMetricsStore(tmp_path / "metrics.sqlite3")
+    store.record_run({
+        "run_id": "r1",
+        "subdomain": "acme",
+        "success": True,
+        "steps": [
+            {"step": "ping", "started_at": 1.0, "duration_sec": 4.0, "concurrency": 2},
+            {"step": "roles", "started_at": 2.0, "duration_sec": None, "concurrency": 2},
+        ],
+    })
+    samples = store.step_samples()
+    assert samples["ping"] == [(2, 4.0)]
+    assert samples["roles"] == []
+    assert store.run_count() == 1
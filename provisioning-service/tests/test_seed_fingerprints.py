@@ -0,0 +1,109 @@
+"""Seed manifest fingerprints: matching calls answer without a tenant round trip, drift is caught out of band."""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import app
+from seed_fingerprints import SeedFingerprintStore, manifest_hash
+
+SITE = app.get_site_name("acme")
+
+
+def test_manifest_hash_ignores_key_order_but_not_content():
+    assert manifest_hash({"a": 1, "b": [1, 2]}) == manifest_hash({"b": [1, 2], "a": 1})
+    assert manifest_hash({"a": 1}) != manifest_hash({"a": 2})
+
+
+def test_store_persists_and_invalidates(tmp_path):
+    store = SeedFingerprintStore(tmp_path / "fp.sqlite3")
+    store.set("a.site", "docperms", "h1", {"changed": 0})
+    store.set("a.site", "custom_fields", "h2", None)
+    assert SeedFingerprintStore(tmp_path / "fp.sqlite3").get("a.site", "docperms")["hash"] == "h1"
+    store.invalidate("a.site", "docperms")
+    assert store.get("a.site", "docperms") is None
+    assert SeedFingerprintStore(tmp_path / "fp.sqlite3").get("a.site", "custom_fields")["hash"] == "h2"
+
+
+class FakeSite:
+    def __init__(self):
+        self.reconciles = 0
+        self.probes = 0
+        self.drifted = {}
+
+    def run_frappe_code(self, site, code):
+        assert site == SITE
+        if "drifted = {" in code:
+            self.probes += 1
+            return json.dumps({"drifted": self.drifted, "healed": None})
+        self.reconciles += 1
+        self.drifted = {}
+        return json.dumps({"changed": 1, "errors": []})
+
+
+@pytest.fixture
+def site(monkeypatch, tmp_path):
+    fake = FakeSite()
+    monkeypatch.setattr(app, "run_frappe_code", fake.run_frappe_code)
+    monkeypatch.setattr(app, "_seed_fingerprints", SeedFingerprintStore(tmp_path / "fp.sqlite3"))
+    monkeypatch.setattr(app, "_seed_probe_started", {})
+    monkeypatch.setattr(app, "_DRIFT_CACHE", {})
+    return fake
+
+
+def _seed(times=1):
+    async def main():
+        results = []
+        for _ in range(times):
+            results.append(await app.seed_tenant_docperms("acme", force=False, _auth=True))
+            # Let any background drift probe finish.
+            await asyncio.gather(*(t for t in asyncio.all_tasks() if t is not asyncio.current_task()))
+        return results
+
+    return asyncio.run(main())
+
+
+def test_matching_fingerprint_answers_without_a_bench_call(site):
+    first, second, third = _seed(3)
+    assert (first["cached"], second["cached"], third["cached"]) == (False, True, True)
+    assert second["result"] == first["result"]
+    assert site.reconciles == 1
+    # One out-of-band probe per SEED_DRIFT_PROBE_SEC, not one per call.
+    assert site.probes == 1
+
+
+def test_drift_found_by_the_probe_reconciles_on_the_next_call(site, monkeypatch):
+    _seed()
+    site.drifted = {"docperms": {"ok": False, "missing": ["Lead:Sales User"]}}
+    second, third = _seed(2)
+    assert second["cached"] and site.probes == 1
+    assert not third["cached"]
+    assert site.reconciles == 2
+
+
+def test_a_fresh_fleet_scan_showing_drift_reconciles_inline(site):
+    _seed()
+    app._DRIFT_CACHE[SITE] = {"checked_at": time.time(), "code_hash": "x", "checks": {"docperms": {"ok": False}}}
+    (result,) = _seed()
+    assert (result["cached"], result["drifted"]) == (False, ["docperms"])
+    assert site.probes == 0
+
+
+def test_a_fresh_clean_fleet_scan_needs_no_probe(site):
+    _seed()
+    app._DRIFT_CACHE[SITE] = {"checked_at": time.time(), "code_hash": "x", "checks": {"docperms": {"ok": True}}}
+    (result,) = _seed()
+    assert result["cached"]
+    assert site.probes == 0
+
+
+def test_manifest_change_reconciles(site, monkeypatch):
+    _seed()
+    monkeypatch.setattr(app, "DOC_PERM_MINIMUM", app.DOC_PERM_MINIMUM + [
+        {"doctype": "Lead", "role": "Employee", "read": 1, "write": 0, "create": 0, "delete": 0},
+    ])
+    (result,) = _seed()
+    assert not result["cached"]
+    assert site.reconciles == 2
@@ -0,0 +1,44 @@
+"""Subdomain availability index: reserved names, case-insensitive membership, prefix lookups."""
+
+import re
+
+from subdomain_index import RESERVED_SUBDOMAINS, SubdomainIndex
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def test_reserved_names_are_taken_before_any_load():
+    index = SubdomainIndex()
+    assert not index.loaded
+    assert all(index.is_taken(name) for name in RESERVED_SUBDOMAINS)
+    assert index.is_reserved("www") and not index.is_reserved("acme")
+
+
+def test_rebuild_and_add_are_case_insensitive():
+    index = SubdomainIndex(reserved=())
+    index.rebuild(["Acme", "", "beta"])
+    index.add("GAMMA")
+    index.add("gamma")
+    assert index.loaded
+    assert [index.is_taken(s) for s in ("acme", "beta", "gamma", "delta")] == [True, True, True, False]
+    assert index.with_prefix("") == ["acme", "beta", "gamma"]
+
+
+def test_with_prefix_uses_the_sorted_array():
+    index = SubdomainIndex(reserved=())
+    index.rebuild(["acme", "acme-2", "acme-10", "acmecorp", "beta"])
+    assert index.with_prefix("acme-") == ["acme-10", "acme-2"]
+
+
+def test_suggest_prefers_free_word_suffixes():
+    index = SubdomainIndex(reserved=())
+    index.rebuild(["acme", "acme-hq"])
+    assert index.suggest("acme", slugify) == ["acme-app", "acme-team", "acme-erp"]
+
+
+def test_suggest_skips_taken_numbers():
+    index = SubdomainIndex(reserved=())
+    index.rebuild(["acme", "acme-2", "acme-3", "acme-5"] + [f"acme-{s}" for s in ("hq", "app", "team", "erp", "online")])
+    assert index.suggest("acme", slugify, count=3) == ["acme-4", "acme-6", "acme-7"]
@@ -0,0 +1,35 @@
+"""Per-tenant credentials: site-scoped secrets and the site_config snippet that installs them."""
+
+import json
+import sys
+import types
+
+from tenant_credentials import build_tenant_config_code, tenant_secret, verify_tenant_secret
+
+
+def test_secret_is_scoped_to_one_site():
+    secret = tenant_secret("master", "a.localhost")
+    assert verify_tenant_secret("master", "a.localhost", secret)
+    assert not verify_tenant_secret("master", "b.localhost", secret)
+    assert not verify_tenant_secret("other-master", "a.localhost", secret)
+    assert not verify_tenant_secret("master", "a.localhost", "")
+
+
+def test_config_snippet_writes_only_the_running_sites_changed_keys(monkeypatch):
+    written = {}
+    installer = types.ModuleType("frappe.installer")
+    installer.update_site_config = lambda key, value: written.__setitem__(key, value)
+    frappe = types.ModuleType("frappe")
+    frappe.installer = installer
+    frappe.local = types.SimpleNamespace(site="a.localhost")
+    frappe.conf = {"nexus_provisioning_url": "http://svc"}
+    monkeypatch.setitem(sys.modules, "frappe", frappe)
+    monkeypatch.setitem(sys.modules, "frappe.installer", installer)
+
+    code = build_tenant_config_code({
+        "a.localhost": {"nexus_provisioning_url": "http://svc", "nexus_tenant_secret": "s-a"},
+        "b.localhost": {"nexus_tenant_secret": "s-b"},
+    })
+    exec(code, {"frappe": frappe, "json": json})
+    assert written == {"nexus_tenant_secret": "s-a"}
+    assert frappe.conf["nexus_tenant_secret"] == "s-a"
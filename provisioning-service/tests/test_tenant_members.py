@@ -0,0 +1,149 @@
+"""Membership index: tenant events scoped by the tenant credential, the master-side sync, the backfill."""
+
+import asyncio
+import json
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from bench_script import last_json, run_script
+from tenant_members import build_sync_members_frappe_code, load_member_doctype_fixture
+
+SITE = app.get_site_name("acme")
+
+
+class FakeMaster:
+    """SaaS Tenant Member rows on the master site."""
+
+    def __init__(self):
+        self.rows = {}
+        self.doctype = False
+
+    def modules(self):
+        def get_all(doctype, filters=None, fields=None, limit=None):
+            if "subdomain" in filters:
+                rows = [r for r in self.rows.values() if r["subdomain"] == filters["subdomain"]]
+            else:
+                rows = [r for name, r in self.rows.items() if name in filters["name"][1]]
+            return [{f: r[f] for f in fields} for r in rows]
+
+        def bulk_insert(doctype, fields, values, ignore_duplicates=False):
+            for value in values:
+                row = dict(zip(fields, value))
+                self.rows[row["name"]] = row
+
+        def delete(doctype, filters):
+            for name in filters["name"][1]:
+                self.rows.pop(name)
+
+        def set_value(doctype, name, field, value, update_modified=True):
+            self.rows[name][field] = value
+
+        frappe = types.ModuleType("frappe")
+        frappe.get_all = get_all
+        frappe.get_doc = lambda spec: types.SimpleNamespace(insert=lambda ignore_permissions=False: setattr(self, "doctype", True))
+        frappe.db = types.SimpleNamespace(
+            exists=lambda doctype, name: self.doctype,
+            bulk_insert=bulk_insert,
+            delete=delete,
+            set_value=set_value,
+            commit=lambda: None,
+        )
+        frappe.utils = types.SimpleNamespace(now=lambda: "2026-01-01 00:00:00")
+        frappe.session = types.SimpleNamespace(user="Administrator")
+        return {"frappe": frappe}
+
+    def sync(self, members_by_subdomain, replace):
+        code = build_sync_members_frappe_code(load_member_doctype_fixture(), members_by_subdomain, replace)
+        return last_json(run_script(code, self.modules()))
+
+    def members(self, subdomain):
+        return {r["user_email"]: r["enabled"] for r in self.rows.values() if r["subdomain"] == subdomain}
+
+
+def test_events_insert_update_and_remove_members():
+    master = FakeMaster()
+    assert master.sync({"acme": [{"email": "A@acme.example"}, {"email": "b@acme.example"}]}, False)["inserted"] == 2
+    assert master.doctype
+    result = master.sync({"acme": [{"email": "a@acme.example", "enabled": False}, {"email": "b@acme.example", "removed": True}]}, False)
+    assert (result["updated"], result["deleted"]) == (1, 1)
+    assert master.members("acme") == {"a@acme.example": 0}
+
+
+def test_backfill_replaces_a_tenants_members_only():
+    master = FakeMaster()
+    master.sync({"acme": [{"email": "old@acme.example"}], "beta": [{"email": "x@beta.example"}]}, False)
+    result = master.sync({"acme": [{"email": "new@acme.example"}]}, True)
+    assert (result["inserted"], result["deleted"]) == (1, 1)
+    assert master.members("acme") == {"new@acme.example": 1}
+    assert master.members("beta") == {"x@beta.example": 1}
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, "_sync_tenant_members", lambda members, replace: calls.append((members, replace)) or {"inserted": 1})
+    return calls
+
+
+def _post_events(site, secret):
+    return TestClient(app.app).post(
+        "/api/v1/tenant-members/events",
+        json={"events": [{"email": "new@acme.example"}]},
+        headers={"X-Tenant-Site": site, "X-Tenant-Secret": secret},
+    )
+
+
+def test_events_are_applied_to_the_site_the_credential_was_issued_to(synced):
+    response = _post_events(SITE, app.tenant_secret(app.PROVISIONING_SECRET, SITE))
+    assert response.status_code == 200, response.text
+    assert synced == [({"acme": [{"email": "new@acme.example", "enabled": True, "removed": False}]}, False)]
+
+
+@pytest.mark.parametrize("site, secret_site", [
+    (app.get_site_name("beta"), SITE),
+    (app.MASTER_SITE, app.MASTER_SITE),
+])
+def test_another_sites_credential_or_the_master_site_is_refused(synced, site, secret_site):
+    assert _post_events(site, app.tenant_secret(app.PROVISIONING_SECRET, secret_site)).status_code == 401
+    assert synced == []
+
+
+def test_backfill_goes_live_only_when_every_tenant_reported(synced, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "_MEMBER_INDEX_STATE_PATH", tmp_path / "index.json")
+    monkeypatch.setattr(app, "_member_index_cache", None)
+    monkeypatch.setattr(app, "_member_backfill_job", {"status": "idle"})
+    monkeypatch.setattr(app, "PROVISIONING_CALLBACK_URL", "http://provisioning:8001")
+    monkeypatch.setattr(app, "MEMBER_BACKFILL_BATCH", 1)
+    monkeypatch.setattr(app, "_list_active_saas_tenant_rows", lambda limit: [{"subdomain": "acme"}, {"subdomain": "beta"}])
+    failing = {app.get_site_name("beta")}
+    codes = []
+
+    def run(sites, name, code, collect, workers=None):
+        codes.append(code)
+        for site in sites:
+            if site in failing:
+                collect({"site": site, "error": "site did not boot"})
+            else:
+                collect({"site": site, "operations": {"users": {"output": json.dumps({"users": [["u@" + site, 1]]})}}})
+
+    monkeypatch.setattr(app, "_run_fleet_operation", run)
+
+    async def backfill():
+        job = await app.backfill_tenant_members(_auth=True)
+        while job["status"] == "running":
+            await asyncio.sleep(0.01)
+        return job
+
+    job = asyncio.run(backfill())
+    assert (job["status"], job["scanned"], job["failed"]) == ("partial", 1, {app.get_site_name("beta"): "site did not boot"})
+    assert synced == [({"acme": [{"email": "u@" + SITE, "enabled": True}]}, True)]
+    assert not app._member_index_live()
+    # The same pass installs each tenant's credential and callback URL.
+    assert app.tenant_secret(app.PROVISIONING_SECRET, SITE) in codes[0]
+
+    failing.clear()
+    assert asyncio.run(backfill())["status"] == "done"
+    assert app._member_index_live()
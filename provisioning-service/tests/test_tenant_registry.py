@@ -0,0 +1,99 @@
+"""In-process SaaS Tenant registry: indexed lookups, staleness, refresh, listeners and versioned deltas."""
+
+import threading
+
+from tenant_registry import TenantRegistry
+
+
+def _row(name, status="Active", owner=None):
+    return {"name": name, "subdomain": name, "owner_email": owner or f"{name}@x.com", "status": status}
+
+
+def _registry(rows, **kwargs):
+    source = {"rows": rows}
+    registry = TenantRegistry(lambda: list(source["rows"]), ["Active", "provisioned"], **kwargs)
+    return registry, source
+
+
+def test_refresh_indexes_rows_and_matches_email_case_insensitively():
+    registry, _ = _registry([_row("acme", owner="Owner@Acme.com"), _row("beta", status="Provisioned")])
+    registry.refresh()
+    assert registry.get("owner_email", "owner@acme.COM")["name"] == "acme"
+    assert registry.get("subdomain", "beta")["name"] == "beta"
+    assert {r["name"] for r in registry.active_rows()} == {"acme", "beta"}
+    assert not registry.stale
+
+
+def test_invalidate_during_refresh_keeps_registry_stale():
+    loading = threading.Event()
+    release = threading.Event()
+
+    def loader():
+        loading.set()
+        release.wait(5)
+        return [_row("acme")]
+
+    registry = TenantRegistry(loader, ["Active"])
+    thread = threading.Thread(target=registry.refresh)
+    thread.start()
+    loading.wait(5)
+    registry.invalidate()
+    release.set()
+    thread.join()
+    assert registry.stale
+
+
+def test_ensure_fresh_reloads_only_when_needed():
+    calls = []
+    registry = TenantRegistry(lambda: calls.append(1) or [_row("acme")], ["Active"])
+    registry.ensure_fresh(60)
+    registry.ensure_fresh(60)
+    assert len(calls) == 1
+    registry.invalidate()
+    registry.ensure_fresh(60)
+    assert len(calls) == 2
+
+
+def test_hidden_rows_are_not_served_but_stay_taken():
+    registry, _ = _registry([_row("acme"), _row("gone", status="Tombstoned")], hidden_statuses=("Tombstoned",))
+    registry.refresh()
+    assert registry.get("subdomain", "gone") is None
+    assert "gone" in registry.taken_subdomains()
+    registry.upsert(_row("gone", status="Tombstoned"))
+    assert registry.get("subdomain", "gone") is None
+
+
+def test_listeners_run_after_refresh_and_upsert():
+    registry, _ = _registry([_row("acme")])
+    seen = []
+    registry.subscribe(lambda r: seen.append(len(r.rows())))
+    registry.refresh()
+    registry.upsert(_row("beta"))
+    assert seen == [1, 2]
+
+
+def test_changes_since_reports_deltas_and_resets():
+    registry, source = _registry([_row("acme")], change_log_size=2)
+    registry.refresh()
+    start = registry.version
+    assert registry.changes_since(start) == (start, [])
+
+    source["rows"] = [_row("beta")]
+    registry.refresh()
+    version, changes = registry.changes_since(start)
+    assert version == start + 1
+    assert sorted((c["op"], c["name"]) for c in changes) == [("remove", "acme"), ("upsert", "beta")]
+
+    registry.upsert(_row("gamma"))
+    registry.upsert(_row("delta"))
+    # The log holds two changes, so a replica at `start` is too far behind.
+    assert registry.changes_since(start)[1] is None
+    assert registry.changes_since(registry.version + 5)[1] is None
+
+
+def test_unchanged_upsert_does_not_bump_version():
+    registry, _ = _registry([_row("acme")])
+    registry.refresh()
+    version = registry.version
+    registry.upsert(_row("acme"))
+    assert registry.version == version
@@ -0,0 +1,73 @@
+"""SaaS Tenant status spellings: the nexus_core normalisation patch and the deprovision retry check."""
+
+import asyncio
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+import app
+
+NEXUS_CORE = Path(__file__).resolve().parents[1] / "apps" / "nexus_core"
+
+
+class FakeTable:
+    """`status` column of one table; runs the patch's UPDATE statements."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def sql(self, query, params=None):
+        assert query.lstrip().startswith("update")
+        aliases, status = params["aliases"], params["status"]
+        self.statuses = [
+            status if (current or "").lower() in aliases and current != status else current
+            for current in self.statuses
+        ]
+
+
+@pytest.fixture
+def patch_module(monkeypatch):
+    frappe = types.ModuleType("frappe")
+    monkeypatch.setitem(sys.modules, "frappe", frappe)
+    monkeypatch.syspath_prepend(str(NEXUS_CORE))
+    for name in [m for m in sys.modules if m.startswith("nexus_core")]:
+        monkeypatch.delitem(sys.modules, name)
+    module = importlib.import_module("nexus_core.patches.v1_0.saas_tenant_indexes")
+    return module, frappe
+
+
+def test_only_known_aliases_are_rewritten(patch_module):
+    module, frappe = patch_module
+    table = FakeTable(["active", "Provisioned", "Active", "pending", "Deprovision Failed", "DEPROVISIONING", "Trial Expired", None])
+    frappe.db = types.SimpleNamespace(sql=table.sql)
+    module.normalize_status("tabSaaS Tenant")
+    assert table.statuses == ["Active", "Active", "Active", "Pending", "Deprovision Failed", "Deprovisioning", "Trial Expired", None]
+
+
+def test_aliases_cover_the_services_hidden_statuses(patch_module):
+    module, _ = patch_module
+    for status in app.HIDDEN_TENANT_STATUSES:
+        assert module.STATUS_ALIASES[status.lower()] == status
+
+
+@pytest.mark.parametrize("status, retried", [
+    ("Deprovision Failed", True),
+    ("deprovision failed", True),
+    ("DEPROVISIONING", True),
+    ("Active", False),
+])
+def test_retry_accepts_hidden_statuses_in_any_case(monkeypatch, status, retried):
+    queued = []
+    monkeypatch.setattr(app, "_DEPROVISION_JOBS", {})
+    monkeypatch.setattr(app, "_query_tenant_status_on_master", lambda subdomain: {"status": status})
+    monkeypatch.setattr(app, "_tombstone_saas_tenants", lambda subdomains: None)
+    monkeypatch.setattr(app, "_enqueue_deprovision", lambda site, sub, archive: queued.append(sub) or {"job_id": "j", "status": "queued"})
+    try:
+        asyncio.run(app.retry_deprovision_tenant("acme", _auth=True))
+    except HTTPException as exc:
+        assert exc.status_code == 409
+    assert queued == (["acme"] if retried else [])
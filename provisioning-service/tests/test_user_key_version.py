@@ -0,0 +1,106 @@
+"""generate-user-keys end to end against a fake tenant that starts from the shipped config."""
+
+import json
+import re
+import sys
+import types
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from frappe_http import FrappeHTTPError
+
+SITE = app.get_site_name("acme")
+USER = "owner@acme.example"
+SHIPPED_CONFIG = Path(__file__).resolve().parents[2] / "frappe-config" / "common_site_config.json"
+
+
+class FakeTenant:
+    """site_config + User row; runs the tenant-config snippet of every bench script."""
+
+    def __init__(self):
+        self.conf = json.loads(SHIPPED_CONFIG.read_text())
+        self.keys = {"api_key": "key-1", "api_secret": "secret-1", "api_key_version": 3}
+        self.bench_calls = 0
+        self.http_checks = 0
+
+    def run_frappe_code(self, site, code):
+        assert site == SITE
+        self.bench_calls += 1
+        snippet = re.search(r"\nimport json\nfrom frappe\.installer.*?frappe\.conf\[_key\] = _value\n", code, re.S)
+        if snippet:
+            installer = types.ModuleType("frappe.installer")
+            installer.update_site_config = self.conf.__setitem__
+            frappe = types.SimpleNamespace(installer=installer, local=types.SimpleNamespace(site=site), conf=self.conf)
+            sys.modules["frappe.installer"] = installer
+            try:
+                exec(snippet.group(0), {"frappe": frappe})
+            finally:
+                del sys.modules["frappe.installer"]
+        if "validate_api_key_secret" in code:
+            return json.dumps({"valid": True})
+        return json.dumps(self.keys)
+
+    async def get_api_key_version(self, site, routes, path, method="GET", headers=None, body=None, timeout=15):
+        # nexus_core.api_keys.require_tenant_secret
+        expected = self.conf.get("nexus_tenant_secret")
+        if not expected or (headers or {}).get("X-Tenant-Secret") != expected:
+            raise FrappeHTTPError(403, {"exc_type": "PermissionError"})
+        return {"message": {"version": self.keys["api_key_version"]}}
+
+    async def send(self, route, path, method="GET", headers=None, body=None, timeout=15):
+        # frappe.auth.get_logged_user with token auth
+        self.http_checks += 1
+        if (headers or {}).get("Authorization") == f"token {self.keys['api_key']}:{self.keys['api_secret']}":
+            return httpx.Response(200, json={"message": USER})
+        return httpx.Response(401, json={"exc_type": "AuthenticationError"})
+
+
+@pytest.fixture
+def tenant(monkeypatch):
+    fake = FakeTenant()
+    monkeypatch.setattr(app, "run_frappe_code", fake.run_frappe_code)
+    monkeypatch.setattr(app._frappe_router, "request_json", fake.get_api_key_version)
+    monkeypatch.setattr(app._frappe_router, "send", fake.send)
+    monkeypatch.setattr(app, "_user_key_cache", app.LocalKeyCache())
+    return fake
+
+
+def _generate(client):
+    response = client.post(
+        "/api/v1/generate-user-keys/acme",
+        json={"user_email": USER},
+        headers={"X-Provisioning-Secret": app.PROVISIONING_SECRET},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_shipped_config_has_no_tenant_secret():
+    assert "nexus_tenant_secret" not in json.loads(SHIPPED_CONFIG.read_text())
+
+
+def test_cache_hit_needs_no_bench_call(tenant):
+    client = TestClient(app.app)
+    first = _generate(client)
+    # The read keys were validated over HTTP, not by a second bench script.
+    assert tenant.http_checks == 1
+    assert tenant.conf["nexus_tenant_secret"] == app.tenant_secret(app.PROVISIONING_SECRET, SITE)
+    calls = tenant.bench_calls
+
+    second = _generate(client)
+    assert second == first
+    assert tenant.bench_calls == calls
+    stats = app._user_key_cache.stats()
+    assert (stats["hits"], stats["validations"]) == (1, 0)
+
+
+def test_rotated_keys_are_noticed_by_the_stamp(tenant):
+    client = TestClient(app.app)
+    _generate(client)
+    tenant.keys = {"api_key": "key-2", "api_secret": "secret-2", "api_key_version": 4}
+    assert _generate(client)["api_key"] == "key-2"
+    assert app._user_key_cache.stats()["stale"] == 1
@@ -7,14 +7,15 @@ that were provisioned without ERPNext installed.
 
 Usage:
   Run on tenant site: python3 install-erpnext-on-tenants.py vfixit.avariq.in
-  Run on all sites: python3 install-erpnext-on-tenants.py --all
+  Run on all sites: python3 install-erpnext-on-tenants.py --all [--workers N] [--fresh]
+  (an interrupted --all run resumes from its progress file)
 """
 
+import argparse
 import sys
 import subprocess
 
-BACKEND_CONTAINER = "frappe_docker-backend-1"
-BENCH_PATH = "/home/frappe/frappe-bench"
+from tenant_fleet import BACKEND_CONTAINER, BENCH_PATH, add_fleet_arguments, list_tenant_sites, run_fleet
 
 def run_bench_command(args: list[str], timeout: int = 180):
     """Execute a bench command inside the backend container."""
@@ -51,38 +52,40 @@ def install_app(site_name: str, app_name: str):
         print(f"❌ Failed to install {app_name} on {site_name}")
         return False
 
-def get_all_sites():
-    """Get list of all sites in the bench."""
-    result = run_bench_command(["--site", "all", "list-sites"])
-    if result.returncode == 0:
-        sites = [s.strip() for s in result.stdout.strip().split('\n') if s.strip()]
-        return sites
-    return []
+def install_apps(site_name: str, apps: list[str]) -> bool:
+    """Install every app on one site; stops at the first failure."""
+    return all(install_app(site_name, app) for app in apps)
 
 def main():
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Install ERPNext on existing tenant sites")
+    parser.add_argument("site", nargs="?", help="site name, e.g. vfixit.avariq.in")
+    add_fleet_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.all and not args.site:
         print("Usage:")
         print("  Install on specific site: python3 install-erpnext-on-tenants.py vfixit.avariq.in")
         print("  Install on all sites: python3 install-erpnext-on-tenants.py --all")
         sys.exit(1)
-    
-    if sys.argv[1] == "--all":
-        sites = get_all_sites()
-        print(f"📋 Found {len(sites)} sites")
-        # Exclude master site
-        sites = [s for s in sites if "erp.localhost" not in s]
-    else:
-        sites = [sys.argv[1]]
-    
+
     apps_to_install = ["erpnext"]  # Add more apps here if needed
-    
-    for site in sites:
-        for app in apps_to_install:
-            install_app(site, app)
-    
+
+    if args.all:
+        summary = run_fleet(
+            "install-erpnext",
+            list_tenant_sites(),
+            lambda site: install_apps(site, apps_to_install),
+            workers=args.workers,
+            state_dir=args.state_dir,
+            fresh=args.fresh,
+        )
+        sys.exit(1 if summary["failed"] else 0)
+
+    ok = install_apps(args.site, apps_to_install)
     print("\n" + "="*60)
-    print("✅ DONE! All apps installed.")
+    print("✅ DONE! All apps installed." if ok else "❌ Install failed.")
     print("="*60)
+    sys.exit(0 if ok else 1)
 
 if __name__ == "__main__":
     main()
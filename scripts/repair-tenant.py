@@ -8,15 +8,21 @@ create the Company, seed CRM data, and set Global Defaults.
 
 Usage:
   python3 repair-tenant.py vfixit.avariq.in "VFixit"
-  python3 repair-tenant.py --all   # runs for all known tenants
+  python3 repair-tenant.py --all                # every tenant site, in parallel
+  python3 repair-tenant.py --all --workers 8    # resumes an interrupted run
+  python3 repair-tenant.py --all --fresh        # ignore saved progress
 """
 
+import argparse
 import sys
 import subprocess
 import base64
+import secrets
+from pathlib import Path
 
-BACKEND_CONTAINER = "frappe_docker-backend-1"
-BENCH_PATH = "/home/frappe/frappe-bench"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "provisioning-service"))
+from master_data import MASTER_DATA_SEED_SNIPPET  # noqa: E402
+from tenant_fleet import BACKEND_CONTAINER, BENCH_PATH, add_fleet_arguments, list_tenant_sites, run_fleet  # noqa: E402
 
 
 def docker_exec(args: list, timeout: int = 180):
@@ -39,7 +45,8 @@ finally:
     frappe.destroy()
 """
     encoded = base64.b64encode(full_script.encode()).decode()
-    tmp_file = f"/tmp/_repair_tenant.py"
+    # Unique per call so parallel / concurrent repairs never overwrite each other.
+    tmp_file = f"/tmp/_repair_tenant_{secrets.token_hex(8)}.py"
     docker_exec(["bash", "-c", f"echo '{encoded}' | base64 -d > {tmp_file}"])
     result = docker_exec(
         ["bash", "-c", f"cd {BENCH_PATH}/sites && {BENCH_PATH}/env/bin/python {tmp_file}"]
@@ -57,6 +64,7 @@ def repair_tenant(site_name: str, company_name: str):
 
     repair_code = f"""
 import json
+{MASTER_DATA_SEED_SNIPPET}
 
 # 1. Create Default Warehouse Types
 warehouse_types = ["Transit", "Store", "WIP", "Finished Goods"]
@@ -128,34 +136,14 @@ if not selling_settings.selling_price_list:
     selling_settings.save(ignore_permissions=True)
     print("Set Standard Selling as default price list")
 
-# 4c. Seed Salutations
-for s in ["Mr", "Ms", "Mrs", "Dr", "Prof"]:
-    if not frappe.db.exists("Salutation", s):
-        frappe.get_doc({{"doctype": "Salutation", "salutation": s}}).insert(ignore_permissions=True)
-
-# 5. Seed Lead Sources
-for src in ["Cold Calling", "Advertisement", "Reference", "Walk In", "Website", "Campaign", "Existing Customer"]:
-    if not frappe.db.exists("Lead Source", src):
-        frappe.get_doc({{"doctype": "Lead Source", "source_name": src}}).insert(ignore_permissions=True)
-
-# 6. Seed Industry Types
-for ind in ["Manufacturing", "Service", "Distribution", "Retail", "Technology", "Logistics", "Healthcare", "Insurance"]:
-    if not frappe.db.exists("Industry Type", ind):
-        frappe.get_doc({{"doctype": "Industry Type", "industry": ind}}).insert(ignore_permissions=True)
-
-# 7. Seed Opportunity Types  
-for ot in ["Sales", "Rental", "Maintenance", "Service"]:
-    if not frappe.db.exists("Opportunity Type", ot):
-        doc = frappe.new_doc("Opportunity Type")
-        doc.name = ot
-        doc.insert(ignore_permissions=True)
-
-# 8. Seed Sales Stages (use ERPNext exact default names)
-for stage in ["Prospecting", "Qualification", "Needs Analysis", "Value Proposition", "Identifying Decision Makers", "Perception Analysis", "Proposal/Price Quote", "Negotiation/Review", "Won", "Lost"]:
-    if not frappe.db.exists("Sales Stage", stage):
-        doc = frappe.new_doc("Sales Stage")
-        doc.stage_name = stage
-        doc.insert(ignore_permissions=True)
+# 4c-8. Seed flat CRM master data: one existence query per doctype, then a
+# bulk insert of only the missing names.
+seed_flat_master("Salutation", "salutation", ["Mr", "Ms", "Mrs", "Dr", "Prof"])
+seed_flat_master("Lead Source", "source_name", ["Cold Calling", "Advertisement", "Reference", "Walk In", "Website", "Campaign", "Existing Customer"])
+seed_flat_master("Industry Type", "industry", ["Manufacturing", "Service", "Distribution", "Retail", "Technology", "Logistics", "Healthcare", "Insurance"])
+seed_flat_master("Opportunity Type", None, ["Sales", "Rental", "Maintenance", "Service"])
+# Sales Stages use ERPNext exact default names
+seed_flat_master("Sales Stage", "stage_name", ["Prospecting", "Qualification", "Needs Analysis", "Value Proposition", "Identifying Decision Makers", "Perception Analysis", "Proposal/Price Quote", "Negotiation/Review", "Won", "Lost"])
 
 # 9. Ensure Admin User has Item Manager role
 admin_emails = frappe.get_all("User", filters={{"email": ["like", "%%"]}}, pluck="name")
@@ -175,34 +163,12 @@ for admin in admin_emails:
                 print(f"Added {{role}} role to {{admin}}")
         if changed:
             user.save(ignore_permissions=True)
-# 10. Seed Item Groups
-all_groups = frappe.get_all("Item Group", fields=["name", "parent_item_group"])
-root_group = None
-for g in all_groups:
-    if not g.get("parent_item_group"):
-        root_group = g.get("name")
-        break
-
-if not root_group:
-    root_group = "All Item Groups"
-    if not frappe.db.exists("Item Group", root_group):
-        frappe.get_doc({{
-            "doctype": "Item Group", 
-            "item_group_name": root_group, 
-            "is_group": 1
-        }}).insert(ignore_permissions=True)
-        print(f"Created Root Item Group: {{root_group}}")
-
-for ig in ["Heavy Equipment Rental", "Construction Services", "Consulting"]:
-    if not frappe.db.exists("Item Group", ig):
-        frappe.get_doc({{"doctype": "Item Group", "item_group_name": ig, "parent_item_group": root_group, "is_group": 0}}).insert(ignore_permissions=True)
-        print(f"Created Item Group: {{ig}} (parent: {{root_group}})")
+# 10. Seed Item Groups (bulk insert, nested set rebuilt once)
+print(f"Item Groups: {{seed_tree('Item Group', 'All Item Groups', ['Heavy Equipment Rental', 'Construction Services', 'Consulting'], seed_when='always')}}")
 
 # 11. Seed UOMs
-for u in ["Unit", "Nos", "Hr", "Day", "Month", "Year"]:
-    if not frappe.db.exists("UOM", u):
-        frappe.get_doc({{"doctype": "UOM", "uom_name": u}}).insert(ignore_permissions=True)
-        print(f"Created UOM: {{u}}")
+for u in seed_flat_master("UOM", "uom_name", ["Unit", "Nos", "Hr", "Day", "Month", "Year"]):
+    print(f"Created UOM: {{u}}")
 
 # 12. Seed Stock Entry Types
 stock_entry_types = [
@@ -225,15 +191,39 @@ print("REPAIR COMPLETE!")
 
     result = run_frappe_code(site_name, repair_code)
     print(result)
+    if "REPAIR COMPLETE!" not in result:
+        print(f"\n❌ Repair did not complete: {site_name}")
+        return False
     print(f"\n✅ Done repairing: {site_name}")
+    return True
+
+
+def default_company_name(site_name: str) -> str:
+    return site_name.split(".")[0].title()
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Repair existing tenant sites")
+    parser.add_argument("site", nargs="?", help="site name, e.g. vfixit.avariq.in")
+    parser.add_argument("company", nargs="?", help="company name (default: derived from the site)")
+    add_fleet_arguments(parser)
+    args = parser.parse_args()
+
+    if args.all:
+        summary = run_fleet(
+            "repair-tenant",
+            list_tenant_sites(),
+            lambda site: repair_tenant(site, default_company_name(site)),
+            workers=args.workers,
+            state_dir=args.state_dir,
+            fresh=args.fresh,
+        )
+        sys.exit(1 if summary["failed"] else 0)
+
+    if not args.site:
         print("Usage: python3 repair-tenant.py <site_name> [<company_name>]")
         print("Example: python3 repair-tenant.py vfixit.avariq.in VFixit")
         sys.exit(1)
 
-    site = sys.argv[1]
-    org = sys.argv[2] if len(sys.argv) > 2 else site.split(".")[0].title()
-    repair_tenant(site, org)
+    ok = repair_tenant(args.site, args.company or default_company_name(args.site))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tenant Fleet Runner
+===================
+Shared by the maintenance scripts (repair-tenant.py, install-erpnext-on-tenants.py)
+to run a per-site task across many tenant sites:
+
+  - bounded parallelism (a thread per in-flight site, each with its own
+    docker exec / temp script, so runs never collide)
+  - a progress file updated after every site, so an interrupted run resumes
+    where it stopped (sites already marked ok are skipped)
+  - per-site log files instead of interleaved console output
+  - a JSON summary of per-site outcomes and durations
+
+Not meant to be run directly.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+BACKEND_CONTAINER = os.environ.get("BACKEND_CONTAINER", "frappe_docker-backend-1")
+BENCH_PATH = os.environ.get("BENCH_PATH", "/home/frappe/frappe-bench")
+MASTER_SITE = os.environ.get("MASTER_SITE_NAME", "erp.localhost")
+DEFAULT_WORKERS = int(os.environ.get("FLEET_WORKERS", "4"))
+
+
+def list_tenant_sites() -> list[str]:
+    """Every site directory in the bench except the master site."""
+    cmd = [
+        "docker", "exec", BACKEND_CONTAINER, "bash", "-c",
+        f"cd {BENCH_PATH}/sites && ls -1d */site_config.json",
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not list sites: {result.stderr.strip()}")
+    sites = [line.split("/", 1)[0] for line in result.stdout.splitlines() if line.strip()]
+    return sorted(site for site in sites if site != MASTER_SITE)
+
+
+class _ThreadOutput:
+    """sys.stdout stand-in: writes from a worker thread go to that site's log buffer."""
+
+    def __init__(self, console):
+        self.console = console
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            return self.console.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        self.console.flush()
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2, default=str))
+    os.replace(tmp, path)
+
+
+def run_fleet(
+    name: str,
+    sites: list[str],
+    task: Callable[[str], bool],
+    workers: int = DEFAULT_WORKERS,
+    state_dir: Optional[Path] = None,
+    fresh: bool = False,
+) -> dict:
+    """Run `task(site)` on every site; a site fails if the task raises or returns False.
+
+    State lives in `state_dir` (default ./fleet-runs): `<name>.progress.json`,
+    `<name>.summary.json` and `<name>-logs/<site>.log`. Unless `fresh`, sites
+    that already finished ok in a previous run are skipped.
+    """
+    state_dir = Path(state_dir or "fleet-runs")
+    log_dir = state_dir / f"{name}-logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    progress_path = state_dir / f"{name}.progress.json"
+    summary_path = state_dir / f"{name}.summary.json"
+
+    progress = {"run": name, "started_at": datetime.utcnow().isoformat(), "sites": {}}
+    if progress_path.exists() and not fresh:
+        progress = json.loads(progress_path.read_text())
+    done = {site for site, entry in progress["sites"].items() if entry.get("status") == "ok"}
+    pending = [site for site in sites if site not in done]
+    print(f"📋 {name}: {len(sites)} sites, {len(done & set(sites))} already done, {len(pending)} to run ({workers} workers)")
+
+    lock = threading.Lock()
+    output = _ThreadOutput(sys.stdout)
+    started = time.time()
+
+    def run_one(site: str) -> tuple[str, dict]:
+        output.local.buffer = []
+        site_started = time.time()
+        entry = {"status": "failed", "error": None}
+        try:
+            entry["status"] = "ok" if task(site) is not False else "failed"
+        except Exception as exc:
+            entry["error"] = str(exc)
+        finally:
+            log_text = "".join(output.local.buffer)
+            output.local.buffer = None
+        entry["duration_sec"] = round(time.time() - site_started, 2)
+        entry["finished_at"] = datetime.utcnow().isoformat()
+        (log_dir / f"{site}.log").write_text(log_text)
+        with lock:
+            progress["sites"][site] = entry
+            _write_json(progress_path, progress)
+        return site, entry
+
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(run_one, site) for site in pending]
+            for index, future in enumerate(as_completed(futures), start=1):
+                site, entry = future.result()
+                mark = "✅" if entry["status"] == "ok" else "❌"
+                detail = f" — {entry['error']}" if entry.get("error") else ""
+                output.console.write(f"[{index}/{len(pending)}] {mark} {site} ({entry['duration_sec']}s){detail}\n")
+    finally:
+        sys.stdout = output.console
+
+    results = {site: progress["sites"].get(site, {"status": "pending"}) for site in sites}
+    durations = [e["duration_sec"] for e in results.values() if e.get("duration_sec") is not None]
+    summary = {
+        "run": name,
+        "finished_at": datetime.utcnow().isoformat(),
+        "wall_clock_sec": round(time.time() - started, 2),
+        "workers": workers,
+        "total": len(sites),
+        "ok": sum(1 for e in results.values() if e.get("status") == "ok"),
+        "failed": sorted(site for site, e in results.items() if e.get("status") == "failed"),
+        "skipped_from_previous_run": len(done & set(sites)),
+        "site_seconds_total": round(sum(durations), 2),
+        "sites": results,
+    }
+    _write_json(summary_path, summary)
+    print(f"\n📄 Summary: {summary_path} — {summary['ok']}/{summary['total']} ok, {len(summary['failed'])} failed")
+    print(f"   Logs: {log_dir}/")
+    if not summary["failed"]:
+        progress_path.unlink(missing_ok=True)
+    return summary
+
+
+def add_fleet_arguments(parser) -> None:
+    """--all / --workers / --fresh / --state-dir, shared by the maintenance scripts."""
+    parser.add_argument("--all", action="store_true", help="run on every tenant site (master excluded)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="sites processed in parallel")
+    parser.add_argument("--fresh", action="store_true", help="ignore the saved progress and start over")
+    parser.add_argument("--state-dir", default="fleet-runs", help="progress, summary and per-site logs")